@@ -8,11 +8,18 @@ from typing import Optional
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, date, timezone
+import base64
 import hashlib
+import hmac
 import secrets
 import logging
+import os
+import time
+import uuid
 from enum import Enum
 
+from config.settings import settings
+
 # Database imports
 try:
     from db.db_services import UserService
@@ -85,9 +92,64 @@ def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def generate_session_token() -> str:
-    """Generate a secure session token"""
-    return secrets.token_urlsafe(32)
+def _load_token_secret() -> bytes:
+    """Key signing session tokens: SESSION_TOKEN_SECRET, or one generated once under RUNTIME_DIR"""
+    if settings.SESSION_TOKEN_SECRET:
+        return settings.SESSION_TOKEN_SECRET.encode()
+    path = settings.SESSION_TOKEN_SECRET_FILE
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(secrets.token_hex(32))
+            os.chmod(tmp_path, 0o600)
+            try:
+                # Atomic and never overwrites: concurrent workers all end up with the first secret
+                os.link(tmp_path, path)
+                logger.info(f"✅ Generated session token secret in {path}")
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        with open(path, "r") as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode()
+        logger.error(f"❌ Session token secret file {path} is empty")
+    except OSError as e:
+        logger.error(f"❌ Failed to persist session token secret: {e}")
+    logger.warning("⚠️ Using a per-process session token secret - tokens are only valid until restart")
+    return secrets.token_hex(32).encode()
+
+_token_secret = _load_token_secret()
+
+def _sign_token(body: str) -> str:
+    digest = hmac.new(_token_secret, body.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def generate_session_token(user_id: str) -> str:
+    """Generate a signed session token for a user: <user_id>.<expires>.<signature>"""
+    expires = int(time.time() + settings.SESSION_TOKEN_TTL_HOURS * 3600)
+    body = f"{user_id}.{expires}"
+    return f"{body}.{_sign_token(body)}"
+
+def verify_session_token(token: Optional[str]) -> Optional[str]:
+    """User ID of a valid, unexpired session token; None otherwise"""
+    try:
+        user_id, expires, signature = str(token).rsplit(".", 2)
+        if not hmac.compare_digest(signature, _sign_token(f"{user_id}.{expires}")):
+            return None
+        if int(expires) < time.time():
+            return None
+        return str(uuid.UUID(user_id))
+    except ValueError:
+        return None
+
+def authenticate_websocket(websocket) -> Optional[str]:
+    """User of a WebSocket from its session token (Authorization: Bearer header or ?token=)"""
+    token = websocket.headers.get("authorization", "").replace("Bearer ", "").strip()
+    return verify_session_token(token or websocket.query_params.get("token"))
 
 async def get_current_user(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
@@ -97,6 +159,10 @@ async def get_current_user(
     This is intentionally permissive to support the Android demo client.
     """
     try:
+        if authorization:
+            token_user_id = verify_session_token(authorization.replace("Bearer ", "").strip())
+            if token_user_id:
+                return SimpleNamespace(id=token_user_id)
         if user_id:
             return SimpleNamespace(id=user_id)
         if authorization:
@@ -152,7 +218,7 @@ def add_auth_endpoints(app: FastAPI):
                 raise HTTPException(status_code=400, detail="Failed to create user. Email or phone may already exist.")
             
             # Generate session token
-            session_token = generate_session_token()
+            session_token = generate_session_token(str(user.id))
             
             # Create response
             user_data = {
@@ -235,7 +301,7 @@ def add_auth_endpoints(app: FastAPI):
                 raise HTTPException(status_code=500, detail="Internal server error")
             
             # Generate session token
-            session_token = generate_session_token()
+            session_token = generate_session_token(str(user_data['id']))
             
             # Create response
             user_response = UserResponse(
@@ -5,6 +5,7 @@ Handles memoir extraction, conversation history, and background processing
 from fastapi import FastAPI, HTTPException
 import datetime
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -69,14 +70,18 @@ def add_memoir_endpoints(app: FastAPI, memoir_extraction_service):
             raise HTTPException(status_code=500, detail=f"Failed to get file info: {str(e)}")
 
     @app.post("/api/memoir/extract-manual")
-    async def extract_memoir_manual():
-        """Manually extract important information from current conversation history.
+    async def extract_memoir_manual(conversation_id: Optional[str] = None):
+        """Manually extract important information from a conversation's history.
+        
+        Args:
+            conversation_id: Conversation (or live session) id to process. Only
+                the legacy history file is read if omitted.
         
         Returns:
             Results of memoir extraction process.
         """
         try:
-            result = await memoir_extraction_service.process_conversation_history_background()
+            result = await memoir_extraction_service.process_conversation_history_background(conversation_id)
             return {
                 "success": True,
                 "extraction_result": result,
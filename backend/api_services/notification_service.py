@@ -2,9 +2,18 @@
 Notification API Service
 Handles voice notifications, broadcasting, and WebSocket communication
 """
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
 import logging
 
+from services.audio_artifacts import AUDIO_DELIVERY_URL, ARTIFACT_URL_PATH, parse_range
+from services.audio_encoding import CODEC_PCM, negotiate_codec
+from services.voice_streaming import STREAM_AUDIO_FORMAT, VoiceChunkStream, relay_voice_stream
+
 logger = logging.getLogger(__name__)
 
 def add_notification_endpoints(app: FastAPI, notification_voice_service, websocket_manager):
@@ -21,10 +30,16 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
         """Generate voice notification from text and broadcast to connected clients.
         
         Args:
-            request: Request containing notification text and type.
+            request: Request containing notification text, type and optional
+                user_id (deliver to that user and their family instead of everyone).
             
         Returns:
-            Response with voice notification data.
+            Response with voice notification data, encoded with the first codec of
+            ``"audio_codecs"`` (e.g. ["opus", "aac"]) the server supports, PCM
+            otherwise. With ``"stream": true`` the
+            raw PCM is streamed as it is synthesized, and the recipients'
+            connected devices (every client without user_id) receive it as
+            voice_notification_chunk messages.
             
         Raises:
             HTTPException: If generation fails.
@@ -36,30 +51,71 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
             if not notification_text:
                 raise HTTPException(status_code=400, detail="Notification text is required")
             
-            # Generate voice notification
-            if notification_type == "emergency":
-                audio_base64 = await notification_voice_service.generate_voice_notification_base64(
-                    f"THÔNG BÁO KHẨN CẤP: {notification_text}"
+            if request.get("stream"):
+                spoken_text = f"THÔNG BÁO KHẨN CẤP: {notification_text}" if notification_type == "emergency" else notification_text
+                stream = VoiceChunkStream(notification_text, notification_type, request.get("request_id", ""))
+                send = websocket_manager.broadcast_message
+                if request.get("user_id"):
+                    # Only the user's devices and family members allowed to receive notifications
+                    send = await websocket_manager.users_sender([request["user_id"]])
+                chunks = relay_voice_stream(
+                    notification_voice_service.stream_voice_notification(spoken_text),
+                    stream,
+                    send,
+                )
+                return StreamingResponse(
+                    chunks,
+                    media_type=STREAM_AUDIO_FORMAT,
+                    headers={"X-Voice-Stream-Id": stream.stream_id, "Cache-Control": "no-store"},
                 )
-            else:
-                audio_base64 = await notification_voice_service.generate_voice_notification_base64(notification_text)
+            
+            # Generate voice notification (PCM for broadcasting, plus the caller's codec)
+            spoken_text = f"THÔNG BÁO KHẨN CẤP: {notification_text}" if notification_type == "emergency" else notification_text
+            audio_base64 = await notification_voice_service.generate_voice_notification_base64(spoken_text)
             
             if audio_base64:
                 response = notification_voice_service.create_notification_response(audio_base64, notification_text)
+                codec = negotiate_codec(request.get("audio_codecs"))
+                if codec != CODEC_PCM:
+                    payload = await notification_voice_service.generate_voice_notification_payload(spoken_text, codec)
+                    if payload:
+                        response = notification_voice_service.create_notification_response(payload[0], notification_text, payload[1])
+                if request.get("audio_delivery") == AUDIO_DELIVERY_URL:
+                    artifact = await notification_voice_service.generate_voice_notification_artifact(spoken_text, codec)
+                    if artifact:
+                        # Caller fetches the audio from the artifact endpoint instead
+                        response.pop("audioBase64")
+                        response.update({
+                            "audioUrl": artifact["url"],
+                            "audioHash": artifact["hash"],
+                            "audioSize": artifact["size"],
+                            "audioFormat": artifact["audio_format"],
+                        })
                 
                 # Try to broadcast to all connected WebSocket clients
                 try:
                     notification_data = {
                         "message": response["message"],
                         "notificationText": response["notificationText"],
-                        "audioBase64": response["audioBase64"],
-                        "audioFormat": response["audioFormat"],
+                        "audioBase64": audio_base64,
+                        "audioFormat": "audio/pcm",
                         "timestamp": response["timestamp"],
                         "service": response["service"]
                     }
+                    variants = await notification_voice_service.encode_voice_variants(
+                        spoken_text, websocket_manager.get_audio_codecs(), websocket_manager.has_audio_by_reference()
+                    )
                     
-                    await websocket_manager.broadcast_voice_notification(notification_data)
-                    logger.info(f"Voice notification broadcasted to {websocket_manager.get_connection_count()} clients")
+                    if request.get("user_id"):
+                        # Only the user's devices and family members allowed to receive notifications
+                        report = await websocket_manager.send_voice_notification_to_users(
+                            [request["user_id"]], notification_data, variants
+                        )
+                        logger.info(f"Voice notification sent to {report['sent']}/{report['recipients']} devices of user {request['user_id']}")
+                    else:
+                        report = await websocket_manager.broadcast_voice_notification(notification_data, variants)
+                        logger.info(f"Voice notification broadcasted to {report['sent']}/{report['recipients']} clients")
+                    response["delivery"] = report
                 except Exception as broadcast_error:
                     logger.error(f"Broadcast failed: {broadcast_error}")
                     # Continue anyway - API should still return the response
@@ -81,7 +137,8 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
         """Endpoint để test broadcast voice notification từ Python script.
         
         Args:
-            request: Request containing notification text and type.
+            request: Request containing notification text, type and optional
+                user_id (deliver to that user and their family instead of everyone).
             
         Returns:
             Response with broadcast status.
@@ -94,12 +151,8 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
                 raise HTTPException(status_code=400, detail="Notification text is required")
             
             # Generate voice notification
-            if notification_type == "emergency":
-                audio_base64 = await notification_voice_service.generate_voice_notification_base64(
-                    f"THÔNG BÁO KHẨN CẤP: {notification_text}"
-                )
-            else:
-                audio_base64 = await notification_voice_service.generate_voice_notification_base64(notification_text)
+            spoken_text = f"THÔNG BÁO KHẨN CẤP: {notification_text}" if notification_type == "emergency" else notification_text
+            audio_base64 = await notification_voice_service.generate_voice_notification_base64(spoken_text)
             
             if audio_base64:
                 response = notification_voice_service.create_notification_response(audio_base64, notification_text)
@@ -113,14 +166,23 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
                     "timestamp": response["timestamp"],
                     "service": response["service"]
                 }
+                # Compressed copies for clients that negotiated a codec
+                variants = await notification_voice_service.encode_voice_variants(
+                    spoken_text, websocket_manager.get_audio_codecs(), websocket_manager.has_audio_by_reference()
+                )
                 
-                connection_count = websocket_manager.get_connection_count()
-                await websocket_manager.broadcast_voice_notification(notification_data)
+                if request.get("user_id"):
+                    report = await websocket_manager.send_voice_notification_to_users(
+                        [request["user_id"]], notification_data, variants
+                    )
+                else:
+                    report = await websocket_manager.broadcast_voice_notification(notification_data, variants)
                 
                 return {
                     "success": True,
                     "message": f"Voice notification broadcasted successfully",
-                    "connectionCount": connection_count,
+                    "connectionCount": report["recipients"],
+                    "delivery": report,
                     "notificationText": notification_text,
                     "timestamp": response["timestamp"]
                 }
@@ -130,4 +192,55 @@ def add_notification_endpoints(app: FastAPI, notification_voice_service, websock
         except HTTPException:
             raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=str(e)) 
+
+    @app.api_route(ARTIFACT_URL_PATH + "/{name}", methods=["GET", "HEAD"])
+    async def notification_audio_endpoint(
+        name: str,
+        range_header: Optional[str] = Header(None, alias="Range"),
+        if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    ):
+        """Serve a notification audio artifact by content hash.
+        
+        Args:
+            name: "<sha256>.<ext>" from a push's audioUrl.
+            range_header: Optional single byte range.
+            if_none_match: ETag the client already holds.
+            
+        Returns:
+            The audio (200 / 206), or 304 if the client's copy is current.
+        """
+        artifacts = notification_voice_service.artifacts
+        resolved = artifacts.resolve(name)
+        if resolved is None:
+            raise HTTPException(status_code=404, detail="Audio not found")
+        path, digest, media_type = resolved
+        
+        etag = f'"{digest}"'
+        headers = {
+            "ETag": etag,
+            # Content-addressed: the bytes behind this URL never change
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Accept-Ranges": "bytes",
+        }
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            artifacts.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        
+        size = await asyncio.to_thread(os.path.getsize, path)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        
+        if byte_range is None:
+            status_code, start, end = 200, 0, size - 1
+        else:
+            status_code, (start, end) = 206, byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        
+        artifacts.served += 1
+        # The server drops the body of HEAD responses
+        body = await asyncio.to_thread(artifacts.read, path, start, end)
+        return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -12,6 +12,8 @@ from db.db_config import get_db
 from db.db_services.notification_service import NotificationDBService
 from db.models import NotificationType, User
 from api_services.auth_service import get_current_user
+from services.voice_prerender import get_voice_prerender_service
+from services.schedule_notification_service import get_schedule_notification_service
 
 def get_user_for_schedule(user_id: Optional[str] = Query(None), current_user: User = Depends(get_current_user)):
     """Get user for schedule operations with authentication bypass support"""
@@ -146,6 +148,16 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
             
             logger.info(f"Schedule created successfully: {title} (scheduled for {scheduled_datetime})")
             
+            # Render the reminder's voice now instead of at dispatch time
+            prerender_service = get_voice_prerender_service()
+            if prerender_service is not None:
+                prerender_service.schedule(notification["id"], scheduled_datetime)
+            
+            # Wake the dispatcher if it is due before its next window reload
+            dispatcher = get_schedule_notification_service()
+            if dispatcher is not None:
+                dispatcher.schedule(notification["id"], scheduled_datetime)
+            
             return {
                 "success": True,
                 "message": "Schedule created successfully",
@@ -248,12 +260,12 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
         """
         try:
             # Get existing notification
-            notification = await notification_db_service.get_notification(schedule_id)
+            notification = notification_db_service.get_notification_serialized(schedule_id)
             if not notification:
                 raise HTTPException(status_code=404, detail="Schedule not found")
             
             # Check if user owns this schedule
-            if str(notification.user_id) != str(current_user.id):
+            if notification["user_id"] != str(current_user.id):
                 raise HTTPException(status_code=403, detail="Access denied")
             
             # Prepare update data
@@ -271,7 +283,7 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
             if notification_type is not None:
                 try:
                     notification_type_enum = NotificationType(notification_type)
-                    update_data["notification_type"] = notification_type_enum
+                    update_data["notification_type"] = notification_type_enum.value
                 except ValueError:
                     raise HTTPException(status_code=400, detail=f"Invalid notification type")
             if category is not None:
@@ -280,26 +292,35 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
                 update_data["priority"] = priority
             
             # Update the notification
-            updated_notification = await notification_db_service.update_notification(
-                notification_id=schedule_id,
-                update_data=update_data
-            )
+            updated = await notification_db_service.update_notification(schedule_id, **update_data)
+            updated_at = datetime.utcnow()
+            updated_notification = notification_db_service.get_notification_serialized(schedule_id) if updated else None
             
             if not updated_notification:
                 raise HTTPException(status_code=500, detail="Failed to update schedule")
             
+            # New text or time - re-render the voice (stale audio is never played)
+            prerender_service = get_voice_prerender_service()
+            if prerender_service is not None and {"title", "message", "scheduled_at"} & update_data.keys():
+                prerender_service.schedule(schedule_id, updated_notification["scheduled_at"])
+            
+            # Rescheduled: move it in the dispatcher's queue (sent ones stay out)
+            dispatcher = get_schedule_notification_service()
+            if dispatcher is not None and "scheduled_at" in update_data and not updated_notification["is_sent"]:
+                dispatcher.schedule(schedule_id, updated_notification["scheduled_at"])
+            
             return {
                 "success": True,
                 "message": "Schedule updated successfully",
                 "schedule": {
-                    "id": str(updated_notification.id),
-                    "title": updated_notification.title,
-                    "message": updated_notification.message,
-                    "scheduled_at": updated_notification.scheduled_at.isoformat(),
-                    "notification_type": updated_notification.notification_type.value,
-                    "category": updated_notification.category,
-                    "priority": updated_notification.priority,
-                    "updated_at": updated_notification.updated_at.isoformat()
+                    "id": updated_notification["id"],
+                    "title": updated_notification["title"],
+                    "message": updated_notification["message"],
+                    "scheduled_at": updated_notification["scheduled_at"].isoformat(),
+                    "notification_type": updated_notification["notification_type"],
+                    "category": updated_notification["category"],
+                    "priority": updated_notification["priority"],
+                    "updated_at": updated_at.isoformat()
                 }
             }
             
@@ -371,6 +392,13 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
                     raise HTTPException(status_code=500, detail="Failed to delete schedule - still exists after commit")
                 else:
                     logger.info(f"✅ Successfully deleted schedule: {schedule_id}")
+                    dispatcher = get_schedule_notification_service()
+                    if dispatcher is not None:
+                        dispatcher.cancel(schedule_id)
+                    # Nothing left to render or play for it
+                    prerender_service = get_voice_prerender_service()
+                    if prerender_service is not None:
+                        await prerender_service.cancel(schedule_id)
                     
             except Exception as e:
                 logger.error(f"Error in transaction: {e}")
@@ -438,6 +466,11 @@ def add_schedule_endpoints(app: FastAPI, notification_db_service, notification_v
                 notification.is_sent = True
                 db.commit()
                 
+                # Completed before it was due: nothing to send
+                dispatcher = get_schedule_notification_service()
+                if dispatcher is not None:
+                    dispatcher.cancel(schedule_id)
+                
                 logger.info(f"Successfully marked schedule as complete: {schedule_id}")
                 
             except Exception as e:
@@ -5,6 +5,7 @@ Main FastAPI application with separated services
 import datetime
 import base64
 import logging
+from typing import Optional
 from fastapi import FastAPI, WebSocket, HTTPException, UploadFile, File, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -35,6 +36,10 @@ from services.gemini_service import GeminiService
 from services.notification_voice_service import NotificationVoiceService
 from services.memoir_extraction_service import MemoirExtractionService
 from services.websocket_manager import websocket_manager
+from services.notification_channel import NOTIFICATION_CHANNEL_PATH, handle_notification_channel
+from services.notification_recipients import NotificationRecipientResolver
+from services.notification_outbox import notification_outbox
+from services.live_session import live_session_registry
 
 # Import database services
 try:
@@ -50,10 +55,11 @@ except ImportError as e:
 
 # Import authentication endpoints
 try:
-    from api_services.auth_service import add_auth_endpoints
+    from api_services.auth_service import add_auth_endpoints, authenticate_websocket
     AUTH_ENDPOINTS_AVAILABLE = True
 except ImportError:
     AUTH_ENDPOINTS_AVAILABLE = False
+    authenticate_websocket = None
 
 
 # Initialize FastAPI app
@@ -82,12 +88,16 @@ text_extraction_service = TextExtractionService(openai_client)
 gemini_service = GeminiService(gemini_client)
 notification_voice_service = NotificationVoiceService(gemini_client)
 memoir_extraction_service = MemoirExtractionService(openai_client)
+# Targeted notifications are kept until a device of the recipient acknowledges them
+websocket_manager.outbox = notification_outbox
 
 # Initialize database services
 if DATABASE_SERVICES_AVAILABLE:
     conversation_service = ConversationService()
     memoir_db_service = MemoirDBService()
     user_service = UserService()
+    # Targeted notifications also reach family members allowed to receive them
+    websocket_manager.recipient_resolver = NotificationRecipientResolver(user_service)
     logger.info("Database services initialized")
 
 # Initialize notification_db_service variable
@@ -106,7 +116,7 @@ try:
 except ImportError:
     logger.warning("Daily memoir endpoints not available")
 
-# Add notification endpoints
+# Add notification endpoints (voice notification generate / broadcast / stream / audio)
 try:
     from api_services.notification_service import add_notification_endpoints
     add_notification_endpoints(app, notification_voice_service, websocket_manager)
@@ -128,15 +138,21 @@ try:
 except ImportError:
     logger.warning("Schedule endpoints not available")
 
-# Initialize schedule notification service
+# Initialize schedule notification service and ahead-of-time voice rendering
+schedule_notification_service = None
+voice_prerender_service = None
 try:
-    from services.schedule_notification_service import get_schedule_notification_service
+    from services.schedule_notification_service import initialize_schedule_notification_service
+    from services.voice_prerender import initialize_voice_prerender_service
     
     if DATABASE_SERVICES_AVAILABLE and notification_db_service:
-        schedule_notification_service = get_schedule_notification_service(
+        schedule_notification_service = initialize_schedule_notification_service(
             notification_db_service,
-            notification_voice_service,
-            websocket_manager
+            notification_voice_service
+        )
+        voice_prerender_service = initialize_voice_prerender_service(
+            notification_db_service,
+            notification_voice_service
         )
         logger.info("Schedule notification service initialized")
     else:
@@ -149,6 +165,11 @@ except ImportError:
 async def startup_event():
     """Initialize async services on startup"""
     try:
+        # Add columns the models gained since the database was created, before any query uses them
+        if DATABASE_SERVICES_AVAILABLE:
+            from db.db_config import apply_schema_upgrades
+            await asyncio.to_thread(apply_schema_upgrades)
+        
         # Start daily memoir scheduler in async context
         from services.daily_memoir_scheduler import daily_memoir_scheduler
         if hasattr(daily_memoir_scheduler, 'start_scheduler_async'):
@@ -158,16 +179,64 @@ async def startup_event():
             else:
                 logger.warning("❌ Failed to start daily memoir scheduler in async context")
         
+        # Pre-open Gemini Live sessions (no-op unless LIVE_WARM_POOL_SIZE > 0)
+        gemini_service.warm_pool.start()
+        
         # Start schedule notification service
-        if 'schedule_notification_service' in locals():
+        if schedule_notification_service is not None:
             asyncio.create_task(schedule_notification_service.start_service())
             logger.info("✅ Schedule notification service started successfully")
         else:
             logger.warning("⚠️ Schedule notification service not available")
+        
+        # Render the fixed phrases of reminder templates once per voice
+        if notification_voice_service.stitcher is not None:
+            asyncio.create_task(notification_voice_service.stitcher.prewarm())
+        
+        # Render voice of upcoming notifications ahead of their dispatch time
+        if voice_prerender_service is not None:
+            voice_prerender_service.start()
+        
+        # Drop notification audio artifacts nobody pushed for a while
+        asyncio.create_task(asyncio.to_thread(notification_voice_service.artifacts.purge_old_files))
             
     except Exception as e:
         logger.error(f"Error starting async services: {e}")
 
+# Shutdown event to flush buffered runtime data
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered services on shutdown"""
+    try:
+        if voice_prerender_service is not None:
+            await voice_prerender_service.stop()
+    except Exception as e:
+        logger.error(f"Error stopping voice pre-render: {e}")
+    try:
+        await websocket_manager.keepalive_wheel.stop()
+    except Exception as e:
+        logger.error(f"Error stopping WebSocket keepalive wheel: {e}")
+    try:
+        await gemini_service.warm_pool.shutdown()
+    except Exception as e:
+        logger.error(f"Error closing warm live sessions: {e}")
+    try:
+        await gemini_service.resumption_store.shutdown()
+    except Exception as e:
+        logger.error(f"Error saving resumption handles: {e}")
+    try:
+        from services.conversation_journal import conversation_journal
+        await conversation_journal.shutdown()
+        logger.info("✅ Conversation journal flushed")
+    except Exception as e:
+        logger.error(f"Error flushing conversation journal: {e}")
+    try:
+        from services.conversation_writer import conversation_writer
+        await conversation_writer.shutdown()
+        logger.info("✅ Pending conversation messages saved")
+    except Exception as e:
+        logger.error(f"Error draining conversation messages: {e}")
+
 # Exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -204,6 +273,16 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.datetime.now().isoformat(),
             "websocket_connections": ws_stats,
+            "live_sessions": live_session_registry.get_stats(),
+            "live_latency": gemini_service.latency_stats.get_stats(),
+            "live_warm_pool": gemini_service.warm_pool.get_stats(),
+            "live_config_cache": gemini_service.live_config_cache.get_stats(),
+            "resumption_handles": gemini_service.resumption_store.get_stats(),
+            "tts_cache": notification_voice_service.cache.get_stats(),
+            "notification_audio_encoding": notification_voice_service.encoder.get_stats(),
+            "notification_audio_artifacts": notification_voice_service.artifacts.get_stats(),
+            "voice_stitching": notification_voice_service.stitcher.get_stats() if notification_voice_service.stitcher else None,
+            "voice_prerender": voice_prerender_service.get_stats() if voice_prerender_service else None,
             "database_available": DATABASE_SERVICES_AVAILABLE,
             "services": {
                 "gemini_service": True,
@@ -224,7 +303,7 @@ async def health_check():
 async def websocket_status():
     """Get WebSocket connection status"""
     try:
-        # Cleanup dead connections first
+        # Drop sockets already known dead; pings are sent by the keepalive timer wheel
         cleaned_count = await websocket_manager.cleanup_dead_connections()
         
         return {
@@ -232,6 +311,7 @@ async def websocket_status():
             "data": {
                 "active_connections": websocket_manager.get_connection_count(),
                 "cleaned_connections": cleaned_count,
+                "keepalive": websocket_manager.get_keepalive_stats(),
                 "timestamp": datetime.datetime.now().isoformat()
             }
         }
@@ -787,124 +867,6 @@ async def extract_memoir_info_endpoint(request: TextExtractRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/generate-voice-notification")
-async def generate_voice_notification_endpoint(request: dict):
-    """Generate voice notification from text and broadcast to connected clients.
-    
-    Args:
-        request: Request containing notification text and type.
-        
-    Returns:
-        Response with voice notification data.
-        
-    Raises:
-        HTTPException: If generation fails.
-    """
-    try:
-        notification_text = request.get("text", "")
-        notification_type = request.get("type", "info")
-        
-        if not notification_text:
-            raise HTTPException(status_code=400, detail="Notification text is required")
-        
-        # Generate voice notification
-        if notification_type == "emergency":
-            audio_base64 = await notification_voice_service.generate_voice_notification_base64(
-                f"THÔNG BÁO KHẨN CẤP: {notification_text}"
-            )
-        else:
-            audio_base64 = await notification_voice_service.generate_voice_notification_base64(notification_text)
-        
-        if audio_base64:
-            response = notification_voice_service.create_notification_response(audio_base64, notification_text)
-            
-            # Try to broadcast to all connected WebSocket clients
-            try:
-                notification_data = {
-                    "message": response["message"],
-                    "notificationText": response["notificationText"],
-                    "audioBase64": response["audioBase64"],
-                    "audioFormat": response["audioFormat"],
-                    "timestamp": response["timestamp"],
-                    "service": response["service"]
-                }
-                
-                await websocket_manager.broadcast_voice_notification(notification_data)
-                logger.info(f"Voice notification broadcasted to {websocket_manager.get_connection_count()} clients")
-            except Exception as broadcast_error:
-                logger.error(f"Broadcast failed: {broadcast_error}")
-                # Continue anyway - API should still return the response
-            
-            return response
-        else:
-            error_response = notification_voice_service.create_error_response(
-                "Failed to generate voice notification", notification_text
-            )
-            raise HTTPException(status_code=500, detail=error_response["message"])
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/api/broadcast-voice-notification")
-async def broadcast_voice_notification_endpoint(request: dict):
-    """Endpoint để test broadcast voice notification từ Python script.
-    
-    Args:
-        request: Request containing notification text and type.
-        
-    Returns:
-        Response with broadcast status.
-    """
-    try:
-        notification_text = request.get("text", "")
-        notification_type = request.get("type", "info")
-        
-        if not notification_text:
-            raise HTTPException(status_code=400, detail="Notification text is required")
-        
-        # Generate voice notification
-        if notification_type == "emergency":
-            audio_base64 = await notification_voice_service.generate_voice_notification_base64(
-                f"THÔNG BÁO KHẨN CẤP: {notification_text}"
-            )
-        else:
-            audio_base64 = await notification_voice_service.generate_voice_notification_base64(notification_text)
-        
-        if audio_base64:
-            response = notification_voice_service.create_notification_response(audio_base64, notification_text)
-            
-            # Broadcast to all connected WebSocket clients
-            notification_data = {
-                "message": response["message"],
-                "notificationText": response["notificationText"],
-                "audioBase64": response["audioBase64"],
-                "audioFormat": response["audioFormat"],
-                "timestamp": response["timestamp"],
-                "service": response["service"]
-            }
-            
-            connection_count = websocket_manager.get_connection_count()
-            await websocket_manager.broadcast_voice_notification(notification_data)
-            
-            return {
-                "success": True,
-                "message": f"Voice notification broadcasted successfully",
-                "connectionCount": connection_count,
-                "notificationText": notification_text,
-                "timestamp": response["timestamp"]
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate voice notification")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @app.get("/api/services/status")
 async def get_services_status():
     """Get status of all services.
@@ -963,6 +925,7 @@ async def websocket_health_check():
     return {
         "status": "healthy",
         "websocket_endpoint": "/gemini-live",
+        "notification_channel_endpoint": NOTIFICATION_CHANNEL_PATH,
         "ping_interval_seconds": settings.WEBSOCKET_PING_INTERVAL,
         "session_timeout_seconds": settings.SESSION_TIMEOUT_SECONDS,
         "timestamp": datetime.datetime.now().isoformat()
@@ -1025,14 +988,18 @@ async def get_memoir_file_info():
 
 
 @app.post("/api/memoir/extract-manual")
-async def extract_memoir_manual():
-    """Manually extract important information from current conversation history.
+async def extract_memoir_manual(conversation_id: Optional[str] = None):
+    """Manually extract important information from a conversation's history.
+    
+    Args:
+        conversation_id: Conversation (or live session) id to process. Only
+            the legacy history file is read if omitted.
     
     Returns:
         Results of memoir extraction process.
     """
     try:
-        result = await memoir_extraction_service.process_conversation_history_background()
+        result = await memoir_extraction_service.process_conversation_history_background(conversation_id)
         return {
             "success": True,
             "extraction_result": result,
@@ -1144,8 +1111,9 @@ async def gemini_live_websocket(websocket: WebSocket):
         websocket_manager.add_connection(websocket)
         logger.info("WebSocket connection added to manager")
         
-        # Handle Gemini Live websocket
-        await gemini_service.handle_websocket_connection(websocket)
+        # Handle Gemini Live websocket; the user comes from the session token only
+        user_id = authenticate_websocket(websocket) if authenticate_websocket is not None else None
+        await gemini_service.handle_websocket_connection(websocket, user_id)
         
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected normally")
@@ -1161,6 +1129,27 @@ async def gemini_live_websocket(websocket: WebSocket):
         logger.info("WebSocket connection removed from manager")
 
 
+# Push channel for devices that only receive notifications (no Gemini session)
+@app.websocket(NOTIFICATION_CHANNEL_PATH)
+async def notification_channel_websocket(websocket: WebSocket):
+    """WebSocket endpoint delivering voice notifications with resume support.
+    
+    Args:
+        websocket: WebSocket connection.
+    """
+    try:
+        await websocket.accept()
+        # The user comes from the session token only, never from the query string
+        user_id = authenticate_websocket(websocket) if authenticate_websocket is not None else None
+        await handle_notification_channel(websocket, websocket_manager, user_id)
+    except Exception as e:
+        logger.error(f"Notification channel error: {e}")
+        try:
+            await websocket.close(code=4002, reason="Internal server error")
+        except Exception:
+            pass  # WebSocket might already be closed
+
+
 # Error handlers
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
@@ -31,6 +31,12 @@ class Settings:
     CORS_METHODS: list = ["*"]
     CORS_HEADERS: list = ["*"]
     
+    # Session tokens (signed, name their user). Without a secret one is generated once and
+    # kept in SESSION_TOKEN_SECRET_FILE, shared by every worker using the same RUNTIME_DIR;
+    # set it when several hosts serve the same clients
+    SESSION_TOKEN_SECRET: str = os.getenv('SESSION_TOKEN_SECRET', '')
+    SESSION_TOKEN_TTL_HOURS: float = float(os.getenv('SESSION_TOKEN_TTL_HOURS', '720'))
+    
     # Session settings
     # Compute project root based on this file location to build absolute runtime paths
     _CONFIG_DIR = os.path.dirname(__file__)
@@ -39,9 +45,57 @@ class Settings:
     RUNTIME_DIR: str = os.getenv('RUNTIME_DIR', _RUNTIME_DIR_DEFAULT)
     # Store runtime files outside code-watched dirs to avoid uvicorn reload loops
     SESSION_FILE: str = os.getenv('SESSION_FILE', os.path.join(RUNTIME_DIR, 'session_handle.json'))
+    SESSION_TOKEN_SECRET_FILE: str = os.getenv('SESSION_TOKEN_SECRET_FILE', os.path.join(RUNTIME_DIR, 'session_token_secret'))
     # Conversation history file path (used by Gemini service for backup persistence)
     CONVERSATION_HISTORY_FILE: str = os.getenv('CONVERSATION_HISTORY_FILE', os.path.join(RUNTIME_DIR, 'conversation_history.json'))
+    # Append-only per-conversation JSONL journal (replaces full rewrites of CONVERSATION_HISTORY_FILE)
+    CONVERSATION_JOURNAL_DIR: str = os.getenv('CONVERSATION_JOURNAL_DIR', os.path.join(RUNTIME_DIR, 'conversation_journal'))
+    CONVERSATION_JOURNAL_FLUSH_INTERVAL: float = float(os.getenv('CONVERSATION_JOURNAL_FLUSH_INTERVAL', '1.0'))  # seconds
+    CONVERSATION_JOURNAL_FSYNC_INTERVAL: float = float(os.getenv('CONVERSATION_JOURNAL_FSYNC_INTERVAL', '5.0'))  # seconds
+    CONVERSATION_JOURNAL_MAX_BYTES: int = int(os.getenv('CONVERSATION_JOURNAL_MAX_BYTES', str(5 * 1024 * 1024)))  # rotate at 5MB
+    # Content-addressed cache of synthesized notification audio
+    TTS_CACHE_DIR: str = os.getenv('TTS_CACHE_DIR', os.path.join(RUNTIME_DIR, 'tts_cache'))
+    TTS_CACHE_MEMORY_BYTES: int = int(os.getenv('TTS_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))  # 64MB
+    TTS_CACHE_DISK_BYTES: int = int(os.getenv('TTS_CACHE_DISK_BYTES', str(1024 * 1024 * 1024)))  # 1GB
+    # Compressed notification audio for clients announcing "audio_codecs" (needs pydub + ffmpeg)
+    NOTIFICATION_OPUS_BITRATE: int = int(os.getenv('NOTIFICATION_OPUS_BITRATE', '24000'))  # bits/s
+    NOTIFICATION_AAC_BITRATE: int = int(os.getenv('NOTIFICATION_AAC_BITRATE', '48000'))  # bits/s
+    # Notification audio pushed by reference (URL + content hash) instead of inline base64
+    AUDIO_ARTIFACT_DIR: str = os.getenv('AUDIO_ARTIFACT_DIR', os.path.join(RUNTIME_DIR, 'notification_audio'))
+    AUDIO_ARTIFACT_BASE_URL: str = os.getenv('AUDIO_ARTIFACT_BASE_URL', '')  # empty = URLs relative to this server
+    AUDIO_ARTIFACT_RETENTION_DAYS: int = int(os.getenv('AUDIO_ARTIFACT_RETENTION_DAYS', '30'))  # never below the outbox retention
+    # Seconds a user's resolved notification recipients (user + family) are reused
+    NOTIFICATION_RECIPIENT_CACHE_TTL: float = float(os.getenv('NOTIFICATION_RECIPIENT_CACHE_TTL', '300'))
+    # Durable outbox of targeted notifications, replayed to devices until acknowledged
+    NOTIFICATION_OUTBOX_FILE: str = os.getenv('NOTIFICATION_OUTBOX_FILE', os.path.join(RUNTIME_DIR, 'notification_outbox.jsonl'))
+    NOTIFICATION_OUTBOX_RETENTION_HOURS: float = float(os.getenv('NOTIFICATION_OUTBOX_RETENTION_HOURS', '48'))
+    NOTIFICATION_OUTBOX_COMPACT_AFTER: int = int(os.getenv('NOTIFICATION_OUTBOX_COMPACT_AFTER', '500'))  # dead log lines before rewrite
+    # Build template reminders from separately cached fixed phrases and slot values
+    VOICE_STITCHING_ENABLED: bool = os.getenv('VOICE_STITCHING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    VOICE_STITCH_CROSSFADE_MS: int = int(os.getenv('VOICE_STITCH_CROSSFADE_MS', '20'))
+    # Batched synthesis: texts are spoken turn by turn over a few shared Live sessions
+    VOICE_BATCH_SESSIONS: int = int(os.getenv('VOICE_BATCH_SESSIONS', '3'))
+    VOICE_BATCH_TURNS_PER_SESSION: int = int(os.getenv('VOICE_BATCH_TURNS_PER_SESSION', '20'))  # reconnect to keep the context short
+    VOICE_BATCH_ITEM_TIMEOUT: float = float(os.getenv('VOICE_BATCH_ITEM_TIMEOUT', '30'))  # seconds per utterance
+    # Ahead-of-time voice rendering of scheduled notifications
+    VOICE_PRERENDER_DIR: str = os.getenv('VOICE_PRERENDER_DIR', os.path.join(RUNTIME_DIR, 'notification_voice'))
+    VOICE_PRERENDER_HORIZON_HOURS: float = float(os.getenv('VOICE_PRERENDER_HORIZON_HOURS', '24'))
+    VOICE_PRERENDER_SCAN_INTERVAL: float = float(os.getenv('VOICE_PRERENDER_SCAN_INTERVAL', '300'))  # seconds
+    # Scheduled notifications: in-memory heap of the ones due within the window, reloaded periodically
+    SCHEDULE_DISPATCH_WINDOW_MINUTES: float = float(os.getenv('SCHEDULE_DISPATCH_WINDOW_MINUTES', '60'))
+    SCHEDULE_DISPATCH_RELOAD_MINUTES: float = float(os.getenv('SCHEDULE_DISPATCH_RELOAD_MINUTES', '10'))  # catches rows written elsewhere
+    SCHEDULE_DISPATCH_RETRY_SECONDS: float = float(os.getenv('SCHEDULE_DISPATCH_RETRY_SECONDS', '60'))  # retry when no device got it
+    SCHEDULE_CLAIM_LEASE_SECONDS: float = float(os.getenv('SCHEDULE_CLAIM_LEASE_SECONDS', '300'))  # a crashed worker's claims free up after this
+    SCHEDULE_CLAIM_BATCH_SIZE: int = int(os.getenv('SCHEDULE_CLAIM_BATCH_SIZE', '100'))
+    VOICE_PRERENDER_CONCURRENCY: int = int(os.getenv('VOICE_PRERENDER_CONCURRENCY', '2'))
+    VOICE_PRERENDER_RETENTION_DAYS: int = int(os.getenv('VOICE_PRERENDER_RETENTION_DAYS', '7'))
     SESSION_TIMEOUT_SECONDS: int = 60  # 1 minute
+    RESUMPTION_FLUSH_INTERVAL: float = float(os.getenv('RESUMPTION_FLUSH_INTERVAL', '2.0'))  # seconds between batched handle writes
+    
+    # Write-behind persistence of live conversation messages
+    CONVERSATION_WRITE_BATCH_SIZE: int = int(os.getenv('CONVERSATION_WRITE_BATCH_SIZE', '20'))  # flush early at this many pending messages
+    CONVERSATION_WRITE_FLUSH_INTERVAL: float = float(os.getenv('CONVERSATION_WRITE_FLUSH_INTERVAL', '2.0'))  # seconds
+    CONVERSATION_WRITE_MAX_RETRIES: int = int(os.getenv('CONVERSATION_WRITE_MAX_RETRIES', '5'))  # failed flushes before pending messages are dropped
     
     # WebSocket settings - OPTIMIZED FOR STABLE CONNECTIONS
     WEBSOCKET_PING_INTERVAL: int = 30  # Send ping every 30 seconds (increased for stability)
@@ -50,7 +104,41 @@ class Settings:
     WEBSOCKET_MESSAGE_TIMEOUT: int = 3600  # 1 hour timeout for messages (increased for long sessions)
     WEBSOCKET_CONFIG_TIMEOUT: int = 600  # 10 minutes timeout for config (increased for slow connections)
     WEBSOCKET_KEEPALIVE_INTERVAL: int = 30  # Send keepalive every 30 seconds
+    # One timer wheel drives keepalives / idle checks for all connections
+    WEBSOCKET_WHEEL_TICK: float = float(os.getenv('WEBSOCKET_WHEEL_TICK', '1.0'))  # seconds per slot
+    WEBSOCKET_WHEEL_SLOTS: int = int(os.getenv('WEBSOCKET_WHEEL_SLOTS', '64'))
+    WEBSOCKET_IDLE_TIMEOUT: int = int(os.getenv('WEBSOCKET_IDLE_TIMEOUT', '0'))  # close after N silent seconds; 0 = never
     WEBSOCKET_CONNECTION_TIMEOUT: int = 120  # 2 minutes timeout for new connections
+    WEBSOCKET_OUTBOUND_QUEUE_SIZE: int = int(os.getenv('WEBSOCKET_OUTBOUND_QUEUE_SIZE', '512'))  # queued frames per connection
+    WEBSOCKET_SEND_TIMEOUT: float = float(os.getenv('WEBSOCKET_SEND_TIMEOUT', '10.0'))  # seconds before a client is considered stuck
+    WEBSOCKET_BROADCAST_DEADLINE: float = float(os.getenv('WEBSOCKET_BROADCAST_DEADLINE', '5.0'))  # seconds a fan-out waits for delivery results
+    # Notification push channel (/notifications): recent notifications kept for resuming devices
+    NOTIFICATION_CHANNEL_REPLAY_SIZE: int = int(os.getenv('NOTIFICATION_CHANNEL_REPLAY_SIZE', '200'))
+    NOTIFICATION_CHANNEL_REPLAY_TTL: float = float(os.getenv('NOTIFICATION_CHANNEL_REPLAY_TTL', '3600'))  # seconds
+    
+    # Gemini Live audio protocol
+    LIVE_OPUS_BITRATE: int = int(os.getenv('LIVE_OPUS_BITRATE', '32000'))  # bits/s for the optional Opus downlink
+    # Uplink audio gate: client frames are coalesced into fixed chunks, silence is dropped when the VAD is on
+    LIVE_VAD_ENABLED: bool = os.getenv('LIVE_VAD_ENABLED', '').lower() in ('1', 'true', 'yes')
+    LIVE_VAD_CHUNK_MS: int = int(os.getenv('LIVE_VAD_CHUNK_MS', '100'))
+    LIVE_VAD_ENERGY_THRESHOLD_DBFS: float = float(os.getenv('LIVE_VAD_ENERGY_THRESHOLD_DBFS', '-48'))
+    LIVE_VAD_NOISE_MARGIN_DB: float = float(os.getenv('LIVE_VAD_NOISE_MARGIN_DB', '10'))  # dB above the tracked noise floor
+    LIVE_VAD_MAX_ZERO_CROSSING_RATE: float = float(os.getenv('LIVE_VAD_MAX_ZERO_CROSSING_RATE', '0.35'))
+    LIVE_VAD_HANGOVER_MS: int = int(os.getenv('LIVE_VAD_HANGOVER_MS', '800'))  # keep sending after speech so Gemini sees the pause
+    LIVE_VAD_PREROLL_MS: int = int(os.getenv('LIVE_VAD_PREROLL_MS', '300'))
+    # Camera frame gate (opt-in): only changed frames are forwarded, downscaled and re-encoded
+    LIVE_IMAGE_GATE_ENABLED: bool = os.getenv('LIVE_IMAGE_GATE_ENABLED', '').lower() in ('1', 'true', 'yes')
+    LIVE_IMAGE_HASH_THRESHOLD: int = int(os.getenv('LIVE_IMAGE_HASH_THRESHOLD', '6'))  # differing bits of 64 to count as changed
+    LIVE_IMAGE_MIN_INTERVAL: float = float(os.getenv('LIVE_IMAGE_MIN_INTERVAL', '0.5'))  # seconds between forwarded frames
+    LIVE_IMAGE_MAX_DIMENSION: int = int(os.getenv('LIVE_IMAGE_MAX_DIMENSION', '768'))  # pixels, longest side
+    LIVE_IMAGE_JPEG_QUALITY: int = int(os.getenv('LIVE_IMAGE_JPEG_QUALITY', '80'))
+    # Sessions pre-opened for connections without a resumption handle (0 = disabled)
+    LIVE_WARM_POOL_SIZE: int = int(os.getenv('LIVE_WARM_POOL_SIZE', '0'))
+    LIVE_WARM_POOL_MAX_AGE: float = float(os.getenv('LIVE_WARM_POOL_MAX_AGE', '120'))  # seconds before an idle session is recycled
+    # Offline stub for the Live API (testing / latency benchmarks)
+    GEMINI_LIVE_STUB: bool = os.getenv('GEMINI_LIVE_STUB', '').lower() in ('1', 'true', 'yes')
+    LIVE_STUB_CONNECT_DELAY: float = float(os.getenv('LIVE_STUB_CONNECT_DELAY', '0.8'))  # seconds
+    LIVE_STUB_RESPONSE_DELAY: float = float(os.getenv('LIVE_STUB_RESPONSE_DELAY', '0.3'))  # seconds
     
     def __init__(self):
         """Validate required environment variables."""
@@ -62,6 +150,7 @@ class Settings:
         try:
             os.makedirs(os.path.dirname(self.SESSION_FILE) or '.', exist_ok=True)
             os.makedirs(os.path.dirname(self.CONVERSATION_HISTORY_FILE) or '.', exist_ok=True)
+            os.makedirs(self.CONVERSATION_JOURNAL_DIR, exist_ok=True)
         except Exception:
             pass
 
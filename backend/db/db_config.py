@@ -84,6 +84,29 @@ def init_database():
         logger.error(f"Failed to initialize database: {e}")
         raise
 
+# Idempotent changes for databases created before a model gained columns or indexes.
+# create_all() and the init scripts only run on new databases, but the ORM selects
+# every mapped column, so these must be applied before the first query.
+SCHEMA_UPGRADES = [
+    # Dispatch claims of notifications (multi-worker sending)
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100)",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS idx_notifications_unsent_scheduled ON notifications (scheduled_at) WHERE is_sent = FALSE",
+]
+
+def apply_schema_upgrades() -> bool:
+    """Bring an existing database up to the current models (safe to run on every start)"""
+    try:
+        with get_db() as db:
+            for statement in SCHEMA_UPGRADES:
+                db.execute(text(statement))
+        logger.info("Database schema upgrades applied")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to apply database schema upgrades: {e}")
+        return False
+
 def check_database_connection() -> bool:
     """Check if database connection is working"""
     try:
@@ -2,11 +2,13 @@
 Conversation Management Service
 Replaces JSON file storage for conversation history with database storage
 """
+import asyncio
 import logging
+import uuid
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, func, insert, update
 
 from db.db_config import get_db
 from db.models import (
@@ -188,6 +190,62 @@ class ConversationService:
             self.logger.error(f"Failed to add message to conversation {conversation_id}: {e}")
             return None
     
+    async def add_messages_bulk(
+        self,
+        conversation_id: str,
+        messages: List[Dict[str, Any]]
+    ) -> int:
+        """Insert a batch of messages in one transaction.
+        
+        Uses a single multi-row INSERT and a single total_messages UPDATE.
+        Message order is assigned by the caller, so no lookup of the last
+        message is needed. Runs in a worker thread to keep the event loop free.
+        
+        Args:
+            conversation_id: Conversation the messages belong to
+            messages: Dicts with role, content, message_order and optional
+                timestamp, has_audio, audio_file_path, processing_time_ms
+        
+        Returns:
+            Number of inserted messages, 0 on failure
+        """
+        if not messages:
+            return 0
+        try:
+            return await asyncio.to_thread(self._insert_messages, conversation_id, messages)
+        except Exception as e:
+            self.logger.error(f"Failed to add {len(messages)} messages to conversation {conversation_id}: {e}")
+            return 0
+    
+    def _insert_messages(self, conversation_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Blocking part of add_messages_bulk"""
+        rows = []
+        for message in messages:
+            rows.append({
+                'id': uuid.uuid4(),
+                'conversation_id': conversation_id,
+                'role': message['role'],
+                'content': message['content'],
+                'message_order': message['message_order'],
+                'timestamp': message.get('timestamp') or datetime.now(),
+                'has_audio': message.get('has_audio', False),
+                'audio_file_path': message.get('audio_file_path'),
+                'processing_time_ms': message.get('processing_time_ms')
+            })
+        last_order = max(row['message_order'] for row in rows)
+        
+        with get_db() as db:
+            db.execute(insert(ConversationMessage).values(rows))
+            db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(total_messages=func.greatest(func.coalesce(Conversation.total_messages, 0), last_order))
+            )
+            db.commit()
+        
+        self.logger.info(f"Added {len(rows)} messages to conversation {conversation_id}")
+        return len(rows)
+    
     async def end_conversation(
         self,
         conversation_id: str,
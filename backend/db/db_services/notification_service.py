@@ -6,7 +6,7 @@ import logging
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, text
 
 from db.db_config import get_db
 from db.models import Notification, User, NotificationType
@@ -86,11 +86,43 @@ class NotificationDBService:
                 notification = db.query(Notification).filter(
                     Notification.id == notification_id
                 ).first()
+                # Detach so loaded attributes survive the commit in get_db()
+                db.expunge_all()
                 return notification
         except Exception as e:
             self.logger.error(f"Failed to get notification {notification_id}: {e}")
             return None
     
+    def get_notification_serialized(self, notification_id: str) -> Optional[dict]:
+        """Get a specific notification as a serialized dictionary"""
+        try:
+            with get_db() as db:
+                notification = db.query(Notification).filter(
+                    Notification.id == notification_id
+                ).first()
+                if not notification:
+                    return None
+                return {
+                    "id": str(notification.id),
+                    "user_id": str(notification.user_id),
+                    "notification_type": notification.notification_type,
+                    "title": notification.title,
+                    "message": notification.message,
+                    "scheduled_at": notification.scheduled_at,
+                    "sent_at": notification.sent_at,
+                    "is_sent": notification.is_sent,
+                    "is_read": notification.is_read,
+                    "has_voice": notification.has_voice,
+                    "voice_file_path": notification.voice_file_path,
+                    "voice_generated_at": notification.voice_generated_at,
+                    "priority": notification.priority,
+                    "category": notification.category,
+                    "created_at": notification.created_at
+                }
+        except Exception as e:
+            self.logger.error(f"Failed to get notification {notification_id}: {e}")
+            return None
+    
     async def get_user_notifications(
         self,
         user_id: str,
@@ -200,6 +232,8 @@ class NotificationDBService:
                     query = query.filter(Notification.scheduled_at <= datetime.utcnow())
                 
                 notifications = query.order_by(Notification.scheduled_at).all()
+                # Detach so loaded attributes survive the commit in get_db()
+                db.expunge_all()
                 return notifications
                 
         except Exception as e:
@@ -650,6 +684,8 @@ class NotificationDBService:
                         Notification.has_voice == True
                     )
                 ).order_by(Notification.scheduled_at).all()
+                # Detach so loaded attributes survive the commit in get_db()
+                db.expunge_all()
                 
                 self.logger.info(f"Found {len(notifications)} due notifications")
                 return notifications
@@ -658,6 +694,243 @@ class NotificationDBService:
             self.logger.error(f"Failed to get due notifications: {e}")
             return []
     
+    def get_notifications_needing_voice(
+        self,
+        until: datetime,
+        limit: int = 100
+    ) -> List[dict]:
+        """Get unsent voice notifications due before ``until`` that have no rendered audio yet
+        
+        Args:
+            until: Upper bound of scheduled_at (pre-render horizon)
+            limit: Maximum rows returned, earliest first
+            
+        Returns:
+            List of {id, title, message, scheduled_at} dictionaries
+        """
+        try:
+            with get_db() as db:
+                rows = db.query(
+                    Notification.id,
+                    Notification.title,
+                    Notification.message,
+                    Notification.scheduled_at
+                ).filter(
+                    and_(
+                        Notification.is_sent == False,
+                        Notification.has_voice == True,
+                        Notification.voice_file_path.is_(None),
+                        Notification.scheduled_at <= until
+                    )
+                ).order_by(Notification.scheduled_at).limit(limit).all()
+                
+                return [
+                    {
+                        "id": str(row.id),
+                        "title": row.title,
+                        "message": row.message,
+                        "scheduled_at": row.scheduled_at
+                    }
+                    for row in rows
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get notifications needing voice: {e}")
+            return []
+    
+    def get_unsent_schedule_window(
+        self,
+        until: datetime,
+        limit: int = 5000
+    ) -> List[dict]:
+        """Get (id, scheduled_at) of unsent notifications due before ``until``
+        
+        Range query on the partial index idx_notifications_unsent_scheduled;
+        overdue notifications are included.
+        
+        Args:
+            until: Upper bound of scheduled_at (dispatch window)
+            limit: Maximum rows returned, earliest first
+            
+        Returns:
+            List of {id, scheduled_at} dictionaries
+        """
+        try:
+            with get_db() as db:
+                rows = db.query(
+                    Notification.id,
+                    Notification.scheduled_at
+                ).filter(
+                    and_(
+                        Notification.is_sent == False,
+                        Notification.scheduled_at <= until
+                    )
+                ).order_by(Notification.scheduled_at).limit(limit).all()
+                
+                return [{"id": str(row.id), "scheduled_at": row.scheduled_at} for row in rows]
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get unsent schedule window: {e}")
+            return []
+    
+    def claim_due_notifications(
+        self,
+        owner: str,
+        lease_seconds: float,
+        due_before: Optional[datetime] = None,
+        notification_ids: Optional[List[str]] = None,
+        voice_only: bool = False,
+        limit: int = 100
+    ) -> List[Notification]:
+        """Atomically claim a batch of due, unsent notifications for one worker
+        
+        Rows locked or leased by another worker are skipped (FOR UPDATE SKIP
+        LOCKED), so several dispatchers - in one process or on several
+        servers - never get the same notification. A claim whose lease has
+        expired (worker died mid-send) can be claimed again.
+        
+        Args:
+            owner: Worker identity written to claimed_by
+            lease_seconds: How long the claim holds before others may take it
+            due_before: Upper bound of scheduled_at (default now)
+            notification_ids: Only claim among these (the dispatcher's due heap)
+            voice_only: Only notifications with has_voice
+            limit: Maximum rows claimed, earliest first
+            
+        Returns:
+            Claimed notifications (detached), earliest first
+        """
+        now = datetime.utcnow()
+        conditions = [
+            "is_sent = FALSE",
+            "scheduled_at <= :due_before",
+            "(claimed_until IS NULL OR claimed_until < :now)",
+        ]
+        params = {
+            "owner": owner,
+            "lease_until": now + timedelta(seconds=lease_seconds),
+            "due_before": due_before or now,
+            "now": now,
+            "limit": limit,
+        }
+        if notification_ids is not None:
+            if not notification_ids:
+                return []
+            conditions.append("id = ANY(CAST(:ids AS uuid[]))")
+            params["ids"] = [str(notification_id) for notification_id in notification_ids]
+        if voice_only:
+            conditions.append("has_voice = TRUE")
+        statement = text(f"""
+            UPDATE notifications
+            SET claimed_by = :owner, claimed_until = :lease_until
+            WHERE id IN (
+                SELECT id FROM notifications
+                WHERE {" AND ".join(conditions)}
+                ORDER BY scheduled_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        """)
+        try:
+            with get_db() as db:
+                claimed_ids = [row.id for row in db.execute(statement, params)]
+                if not claimed_ids:
+                    return []
+                notifications = db.query(Notification).filter(
+                    Notification.id.in_(claimed_ids)
+                ).order_by(Notification.scheduled_at).all()
+                # Detach so loaded attributes survive the commit in get_db()
+                db.expunge_all()
+                return notifications
+                
+        except Exception as e:
+            self.logger.error(f"Failed to claim due notifications: {e}")
+            return []
+    
+    def renew_notification_claims(self, owner: str, notification_ids: List[str], lease_seconds: float) -> List[str]:
+        """Extend the lease of claimed, still unsent notifications
+        
+        Called before each send of a batch, so a slow batch (TTS) never
+        outlives its lease while another worker reclaims the rest.
+        
+        Returns:
+            IDs still claimed by ``owner``; any other was lost and must not be sent
+        """
+        if not notification_ids:
+            return []
+        statement = text("""
+            UPDATE notifications
+            SET claimed_until = :lease_until
+            WHERE id = ANY(CAST(:ids AS uuid[]))
+              AND claimed_by = :owner
+              AND is_sent = FALSE
+            RETURNING id
+        """)
+        try:
+            with get_db() as db:
+                rows = db.execute(statement, {
+                    "owner": owner,
+                    "lease_until": datetime.utcnow() + timedelta(seconds=lease_seconds),
+                    "ids": [str(notification_id) for notification_id in notification_ids],
+                })
+                return [str(row.id) for row in rows]
+                
+        except Exception as e:
+            self.logger.error(f"Failed to renew notification claims: {e}")
+            return []
+    
+    def confirm_notifications_sent(self, owner: str, notification_ids: List[str]) -> int:
+        """Mark a batch of claimed notifications as sent in one update
+        
+        Only rows still claimed by ``owner`` are updated.
+        
+        Returns:
+            Number of notifications marked sent
+        """
+        if not notification_ids:
+            return 0
+        try:
+            with get_db() as db:
+                updated = db.query(Notification).filter(
+                    and_(
+                        Notification.id.in_([str(notification_id) for notification_id in notification_ids]),
+                        Notification.claimed_by == owner
+                    )
+                ).update({
+                    Notification.is_sent: True,
+                    Notification.sent_at: datetime.utcnow(),
+                    Notification.claimed_by: None,
+                    Notification.claimed_until: None
+                }, synchronize_session=False)
+                if updated < len(notification_ids):
+                    self.logger.warning(f"Confirmed {updated}/{len(notification_ids)} notifications - some claims expired")
+                return updated
+                
+        except Exception as e:
+            self.logger.error(f"Failed to confirm sent notifications: {e}")
+            return 0
+    
+    def release_notification_claims(self, owner: str, notification_ids: List[str]) -> int:
+        """Give claimed notifications back (not delivered) so any worker may retry them"""
+        if not notification_ids:
+            return 0
+        try:
+            with get_db() as db:
+                return db.query(Notification).filter(
+                    and_(
+                        Notification.id.in_([str(notification_id) for notification_id in notification_ids]),
+                        Notification.claimed_by == owner
+                    )
+                ).update({
+                    Notification.claimed_by: None,
+                    Notification.claimed_until: None
+                }, synchronize_session=False)
+                
+        except Exception as e:
+            self.logger.error(f"Failed to release notification claims: {e}")
+            return 0
+    
     async def update_notification_voice(
         self,
         notification_id: str,
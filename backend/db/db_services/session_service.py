@@ -2,11 +2,12 @@
 Session Management Service
 Replaces JSON file storage for user sessions with database storage
 """
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, update
 
 from db.db_config import get_db
 from db.models import UserSession, User
@@ -354,4 +355,91 @@ class SessionDBService:
                 
         except Exception as e:
             self.logger.error(f"Failed to update session device info {session_handle}: {e}")
-            return False 
\ No newline at end of file
+            return False
+    
+    async def save_resumption_handles(self, entries: List[Dict[str, Any]]) -> int:
+        """Write a batch of Gemini Live resumption handles in one transaction.
+        
+        One row is kept per live connection (websocket_session_id); its
+        session_handle and last_activity are updated with the latest handle.
+        Runs in a worker thread to keep the event loop free.
+        
+        Args:
+            entries: Dicts with user_id, device_id, websocket_session_id,
+                handle and updated_at (UTC datetime)
+        
+        Returns:
+            Number of written entries, 0 on failure
+        """
+        if not entries:
+            return 0
+        try:
+            return await asyncio.to_thread(self._upsert_resumption_handles, entries)
+        except Exception as e:
+            self.logger.error(f"Failed to save {len(entries)} resumption handles: {e}")
+            return 0
+    
+    def _upsert_resumption_handles(self, entries: List[Dict[str, Any]]) -> int:
+        with get_db() as db:
+            for entry in entries:
+                result = db.execute(
+                    update(UserSession)
+                    .where(UserSession.websocket_session_id == entry["websocket_session_id"])
+                    .values(
+                        session_handle=entry["handle"],
+                        last_activity=entry["updated_at"],
+                        is_active=True
+                    )
+                )
+                if result.rowcount == 0:
+                    db.add(UserSession(
+                        user_id=entry["user_id"],
+                        session_handle=entry["handle"],
+                        websocket_session_id=entry["websocket_session_id"],
+                        device_info={"device_id": entry["device_id"]},
+                        started_at=entry["updated_at"],
+                        last_activity=entry["updated_at"]
+                    ))
+            db.commit()
+        return len(entries)
+    
+    async def get_latest_resumption_handle(
+        self,
+        user_id: str,
+        device_id: str,
+        max_age_seconds: int
+    ) -> Optional[Tuple[str, datetime]]:
+        """Get the newest resumption handle of a user's device.
+        
+        Args:
+            user_id: User id
+            device_id: Device id stored in device_info
+            max_age_seconds: Ignore handles older than this
+        
+        Returns:
+            (handle, last_activity) or None
+        """
+        try:
+            return await asyncio.to_thread(self._select_latest_resumption_handle, user_id, device_id, max_age_seconds)
+        except Exception as e:
+            self.logger.error(f"Failed to load resumption handle for user {user_id}: {e}")
+            return None
+    
+    def _select_latest_resumption_handle(
+        self,
+        user_id: str,
+        device_id: str,
+        max_age_seconds: int
+    ) -> Optional[Tuple[str, datetime]]:
+        with get_db() as db:
+            cutoff_time = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+            session = db.query(UserSession).filter(
+                and_(
+                    UserSession.user_id == user_id,
+                    UserSession.device_info["device_id"].as_string() == device_id,
+                    UserSession.last_activity >= cutoff_time
+                )
+            ).order_by(desc(UserSession.last_activity)).first()
+            if not session:
+                return None
+            return session.session_handle, session.last_activity
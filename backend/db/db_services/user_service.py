@@ -491,6 +491,30 @@ class UserService:
             self.logger.error(f"Failed to get family members for {elderly_user_id}: {e}")
             return []
     
+    def get_notification_recipient_ids(self, elderly_user_id: str) -> List[str]:
+        """Get the users who receive an elderly user's notifications:
+        the elderly user plus active family members with can_receive_notifications"""
+        try:
+            with get_db() as db:
+                rows = db.query(FamilyProfile.user_id).join(
+                    FamilyRelationship, FamilyRelationship.family_member_id == FamilyProfile.id
+                ).join(
+                    ElderlyProfile, FamilyRelationship.elderly_id == ElderlyProfile.id
+                ).join(
+                    User, FamilyProfile.user_id == User.id
+                ).filter(
+                    ElderlyProfile.user_id == elderly_user_id,
+                    FamilyRelationship.can_receive_notifications == True,
+                    FamilyRelationship.is_active == True,
+                    User.is_active == True
+                ).all()
+                
+                return [str(elderly_user_id)] + [str(row.user_id) for row in rows]
+                
+        except Exception as e:
+            self.logger.error(f"Failed to get notification recipients for {elderly_user_id}: {e}")
+            return [str(elderly_user_id)]
+    
     def get_elderly_patients(self, family_member_id: str) -> List[Dict]:
         """Get all elderly users that a family member is connected to"""
         try:
@@ -300,6 +300,8 @@ CREATE TABLE IF NOT EXISTS notifications (
     sent_at TIMESTAMP,
     is_sent BOOLEAN DEFAULT FALSE,
     is_read BOOLEAN DEFAULT FALSE,
+    claimed_by VARCHAR(100),
+    claimed_until TIMESTAMP,
     has_voice BOOLEAN DEFAULT FALSE,
     voice_file_path VARCHAR(500),
     voice_generated_at TIMESTAMP,
@@ -473,6 +475,14 @@ ON health_records (user_id, recorded_at DESC);
 CREATE INDEX IF NOT EXISTS idx_notifications_user_scheduled 
 ON notifications (user_id, scheduled_at, is_sent);
 
+-- Dispatch claim columns for databases created before they existed
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100);
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+
+-- Index for the dispatcher's window of unsent notifications
+CREATE INDEX IF NOT EXISTS idx_notifications_unsent_scheduled 
+ON notifications (scheduled_at) WHERE is_sent = FALSE;
+
 -- Index for active sessions
 CREATE INDEX IF NOT EXISTS idx_user_sessions_active 
 ON user_sessions (user_id, is_active, last_activity);
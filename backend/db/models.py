@@ -346,6 +346,10 @@ class Notification(Base):
     is_sent = Column(Boolean, default=False)
     is_read = Column(Boolean, default=False)
     
+    # Dispatch claim: the worker sending it, until its lease expires
+    claimed_by = Column(String(100), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+    
     # Voice notification
     has_voice = Column(Boolean, default=False)
     voice_file_path = Column(String(500), nullable=True)
@@ -39,6 +39,7 @@ RELOAD_DIRS = [
 # Exclude runtime data files from triggering reloads (prevents WS reconnect loops)
 RELOAD_EXCLUDES = [
     "*.json",
+    "*.jsonl",
     "*.log",
     "*.txt",
     "conversation_history.json",
@@ -57,7 +58,7 @@ except Exception:
 
 # Import database components
 try:
-    from db.db_config import init_database, check_database_connection
+    from db.db_config import init_database, check_database_connection, apply_schema_upgrades
     from db.db_services import (
         UserService, ConversationService, HealthService,
         MedicineDBService, NotificationDBService, MemoirDBService,
@@ -107,6 +108,8 @@ def initialize_database():
         # Skip table creation - tables already exist from SQL script
         logger.info("Database tables already exist from SQL initialization script")
         # init_database()  # Commented out to avoid conflicts with existing tables
+        # Columns added since the database was created
+        apply_schema_upgrades()
         
         return True
         
@@ -0,0 +1,198 @@
+"""
+Content-addressed store of notification audio served over HTTP
+
+Instead of embedding the audio (base64) in every WebSocket push, pushes can
+carry a URL and the content hash:
+
+    {"audioUrl": "/api/notification-audio/<sha256>.ogg", "audioHash": "<sha256>", ...}
+
+Files are named by the sha256 of their bytes, so a URL never changes
+meaning: the endpoint serves them with a strong ``ETag``,
+``Cache-Control: immutable`` and byte ranges, and a device that already
+holds a hash plays it from its own cache without fetching anything.
+
+Clients opt in with ``"audio_delivery": "url"`` in the /gemini-live config
+message or in the notification API request.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_URL_PATH = "/api/notification-audio"
+AUDIO_DELIVERY_URL = "url"
+
+# MIME type (without parameters) -> file extension
+_EXTENSIONS = {
+    "audio/pcm": "pcm",
+    "audio/ogg": "ogg",
+    "audio/aac": "aac",
+}
+_MIME_TYPES = {
+    "pcm": "audio/pcm;rate=24000",
+    "ogg": "audio/ogg;codecs=opus",
+    "aac": "audio/aac",
+}
+_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.(pcm|ogg|aac)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range`` header.
+
+    Args:
+        header: Value of the Range header (e.g. "bytes=0-1023", "bytes=-500").
+        size: Size of the file.
+
+    Returns:
+        Inclusive (start, end), or None to serve the whole file (no header,
+        or a form that is not supported such as multiple ranges).
+
+    Raises:
+        ValueError: If the range cannot be satisfied (HTTP 416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+    if start >= size or end < start:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+class AudioArtifactStore:
+    """Immutable audio files named by their sha256."""
+
+    def __init__(self, root_dir: str = None, base_url: str = None):
+        """Initialize artifact store.
+
+        Args:
+            root_dir: Directory of the files. Uses settings if None.
+            base_url: Prefix of returned URLs (e.g. "https://api.example.com");
+                empty for URLs relative to this server. Uses settings if None.
+        """
+        self.root_dir = root_dir or settings.AUDIO_ARTIFACT_DIR
+        self.base_url = (settings.AUDIO_ARTIFACT_BASE_URL if base_url is None else base_url).rstrip("/")
+        # Stats
+        self.stored = 0
+        self.reused = 0
+        self.served = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def extension_for(mime_type: str) -> str:
+        """File extension of a MIME type (PCM for unknown types)."""
+        return _EXTENSIONS.get(mime_type.split(";")[0].strip().lower(), "pcm")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root_dir, name[:2], name)
+
+    def url_for(self, name: str) -> str:
+        return f"{self.base_url}{ARTIFACT_URL_PATH}/{name}"
+
+    def put(self, data: bytes, mime_type: str) -> dict:
+        """Store audio (blocking - call through asyncio.to_thread).
+
+        Args:
+            data: Encoded audio.
+            mime_type: MIME type of ``data``.
+
+        Returns:
+            {"url", "hash", "size", "audio_format"} describing the artifact.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        extension = self.extension_for(mime_type)
+        name = f"{digest}.{extension}"
+        path = self._path(name)
+        if os.path.exists(path):
+            # Same content already stored; bump mtime so retention keeps it
+            now = time.time()
+            os.utime(path, (now, now))
+            self.reused += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.stored += 1
+        return {
+            "url": self.url_for(name),
+            "hash": digest,
+            "size": len(data),
+            "audio_format": _MIME_TYPES[extension],
+        }
+
+    def resolve(self, name: str) -> Optional[Tuple[str, str, str]]:
+        """Look up a file name from a URL.
+
+        Returns:
+            (path, content hash, MIME type), or None if the name is invalid or unknown.
+        """
+        match = _NAME_PATTERN.match(name)
+        if not match:
+            return None
+        path = self._path(name)
+        if not os.path.isfile(path):
+            return None
+        return path, match.group(1), _MIME_TYPES[match.group(2)]
+
+    @staticmethod
+    def read(path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Read a file or an inclusive byte range of it (blocking)."""
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start + 1)
+
+    def purge_old_files(self) -> int:
+        """Delete artifacts not stored or reused for AUDIO_ARTIFACT_RETENTION_DAYS.
+
+        Never sooner than NOTIFICATION_OUTBOX_RETENTION_HOURS: unacknowledged
+        notifications are replayed from these files until the outbox expires them.
+        """
+        if not os.path.isdir(self.root_dir):
+            return 0
+        retention = max(
+            settings.AUDIO_ARTIFACT_RETENTION_DAYS * 86400,
+            settings.NOTIFICATION_OUTBOX_RETENTION_HOURS * 3600,
+        )
+        cutoff = time.time() - retention
+        removed = 0
+        for root, _, files in os.walk(self.root_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def get_stats(self) -> dict:
+        """Get artifact store statistics."""
+        return {
+            "stored": self.stored,
+            "reused": self.reused,
+            "served": self.served,
+            "not_modified": self.not_modified,
+        }
+
+
+# Global instance shared by the application
+audio_artifact_store = AudioArtifactStore()
@@ -0,0 +1,199 @@
+"""
+Compressed encodings of notification audio
+
+Synthesized notifications are 24kHz 16-bit mono PCM, roughly 48KB per
+second of speech, pushed as base64 inside JSON. Clients that can decode a
+compressed format announce it and receive Opus (Ogg) or AAC (ADTS) instead,
+typically 15-30x smaller:
+
+    {"audio_codecs": ["opus", "aac"]}
+
+in the /gemini-live config message or in the notification API request. The
+first codec in the client's list that this server can encode wins; PCM is
+always the fallback, so existing clients are unaffected.
+
+Encoding uses pydub, which needs the ``ffmpeg`` binary. Encoded artifacts
+are stored in the TTS cache next to the raw audio, under a key derived from
+the raw audio's key, codec and bitrate.
+"""
+import asyncio
+import io
+import logging
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from config.settings import settings
+from services.tts_cache import TTSAudioCache, tts_cache
+
+logger = logging.getLogger(__name__)
+
+# pydub is in requirements, but encoding also needs ffmpeg on the host
+try:
+    from pydub import AudioSegment
+    PYDUB_AVAILABLE = True
+except Exception:
+    AudioSegment = None
+    PYDUB_AVAILABLE = False
+
+FFMPEG_AVAILABLE = shutil.which("ffmpeg") is not None
+
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+CODEC_PCM = "pcm"
+CODEC_OPUS = "opus"
+CODEC_AAC = "aac"
+
+
+class AudioCodec:
+    """Output format of one codec."""
+
+    __slots__ = ("name", "mime_type", "export_format", "ffmpeg_codec", "parameters")
+
+    def __init__(self, name: str, mime_type: str, export_format: str = None, ffmpeg_codec: str = None, parameters: List[str] = None):
+        self.name = name
+        self.mime_type = mime_type
+        self.export_format = export_format
+        self.ffmpeg_codec = ffmpeg_codec
+        self.parameters = parameters or []
+
+
+CODECS: Dict[str, AudioCodec] = {
+    CODEC_PCM: AudioCodec(CODEC_PCM, "audio/pcm"),
+    # VOIP mode favours intelligibility of speech at low bitrates
+    CODEC_OPUS: AudioCodec(CODEC_OPUS, "audio/ogg;codecs=opus", "ogg", "libopus", ["-application", "voip"]),
+    CODEC_AAC: AudioCodec(CODEC_AAC, "audio/aac", "adts", "aac"),
+}
+
+
+def default_bitrate(codec: str) -> int:
+    """Configured bitrate (bits/s) of a codec."""
+    if codec == CODEC_OPUS:
+        return settings.NOTIFICATION_OPUS_BITRATE
+    if codec == CODEC_AAC:
+        return settings.NOTIFICATION_AAC_BITRATE
+    return 0
+
+
+def available_codecs() -> List[str]:
+    """Codecs this server can produce."""
+    if PYDUB_AVAILABLE and FFMPEG_AVAILABLE:
+        return list(CODECS)
+    return [CODEC_PCM]
+
+
+def negotiate_codec(accepted: Union[None, str, Iterable[str]]) -> str:
+    """Pick the notification audio codec for a client.
+
+    Args:
+        accepted: Codecs the client can decode, most preferred first
+            (a list, or a comma-separated string). None means PCM only.
+
+    Returns:
+        First accepted codec that can be encoded here, else ``"pcm"``.
+    """
+    if not accepted:
+        return CODEC_PCM
+    if isinstance(accepted, str):
+        accepted = accepted.split(",")
+    supported = available_codecs()
+    for codec in accepted:
+        codec = str(codec).strip().lower()
+        if codec in supported:
+            return codec
+    return CODEC_PCM
+
+
+def encode_pcm(pcm: bytes, codec: str, bitrate: int = None, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Encode 16-bit mono PCM. Blocking (runs ffmpeg); call through asyncio.to_thread.
+
+    Args:
+        pcm: Raw audio.
+        codec: Key of ``CODECS``.
+        bitrate: Target bits/s. Uses the codec's configured bitrate if None.
+        sample_rate: Sample rate of ``pcm``.
+
+    Returns:
+        Encoded audio.
+    """
+    spec = CODECS[codec]
+    if spec.export_format is None:
+        return pcm
+    segment = AudioSegment(data=pcm, sample_width=SAMPLE_WIDTH, frame_rate=sample_rate, channels=1)
+    output = io.BytesIO()
+    segment.export(
+        output,
+        format=spec.export_format,
+        codec=spec.ffmpeg_codec,
+        bitrate=f"{(bitrate or default_bitrate(codec)) // 1000}k",
+        parameters=spec.parameters,
+    )
+    return output.getvalue()
+
+
+class NotificationAudioEncoder:
+    """Encodes synthesized notifications, caching each (codec, bitrate) variant."""
+
+    def __init__(self, cache: TTSAudioCache = None):
+        """Initialize encoder.
+
+        Args:
+            cache: Cache holding the raw audio. Uses the shared cache if None.
+        """
+        self.cache = cache or tts_cache
+        # Stats
+        self.encoded = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def variant_key(key: str, codec: str, bitrate: int) -> str:
+        """Cache key of an encoded variant of the audio stored under ``key``."""
+        return f"{key}.{codec}{bitrate}"
+
+    async def encode(self, key: str, pcm: bytes, codec: str, bitrate: int = None) -> Tuple[bytes, str]:
+        """Encode audio, reusing a cached variant when there is one.
+
+        Args:
+            key: TTS cache key of the raw audio.
+            pcm: Raw audio.
+            codec: Negotiated codec.
+            bitrate: Target bits/s. Uses the codec's configured bitrate if None.
+
+        Returns:
+            (audio bytes, MIME type). Falls back to the raw PCM if encoding fails.
+        """
+        if codec == CODEC_PCM or codec not in available_codecs():
+            return pcm, CODECS[CODEC_PCM].mime_type
+        bitrate = bitrate or default_bitrate(codec)
+        mime_type = CODECS[codec].mime_type
+
+        variant_key = self.variant_key(key, codec, bitrate)
+        audio = await self.cache.get(variant_key)
+        if audio is not None:
+            self.cache_hits += 1
+            return audio, mime_type
+
+        try:
+            audio = await asyncio.to_thread(encode_pcm, pcm, codec, bitrate)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"⚠️ Could not encode notification audio as {codec}: {e}")
+            return pcm, CODECS[CODEC_PCM].mime_type
+        await self.cache.put(variant_key, audio)
+        self.encoded += 1
+        self.bytes_in += len(pcm)
+        self.bytes_out += len(audio)
+        return audio, mime_type
+
+    def get_stats(self) -> dict:
+        """Get encoder statistics."""
+        return {
+            "available_codecs": available_codecs(),
+            "encoded": self.encoded,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "compression_ratio": round(self.bytes_in / self.bytes_out, 1) if self.bytes_out else None,
+        }
@@ -0,0 +1,391 @@
+"""
+Append-only JSONL journal for live conversation backups
+
+Each conversation gets its own ``<key>.jsonl`` file under
+``settings.CONVERSATION_JOURNAL_DIR``. Entries are buffered in memory and
+written by a background flusher in a worker thread, so appending a message
+never touches the disk on the WebSocket path. Files are fsynced periodically
+and rotated into numbered segments (``<key>.000001.jsonl``) once they exceed
+``CONVERSATION_JOURNAL_MAX_BYTES``.
+
+Compaction (merging segments, dropping torn lines) can be run offline:
+
+    python -m services.conversation_journal compact [conversation_key]
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, IO, Iterator, List, Optional, Set
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_RE = re.compile(r"^(?P<key>.+)\.(?P<index>\d{6})\.jsonl$")
+_SAFE_KEY_RE = re.compile(r"[^A-Za-z0-9_\-]")
+
+
+class ConversationJournal:
+    """Buffered, append-only JSONL journal keyed by conversation."""
+
+    # Closed keys remembered for the flusher before the set is reset
+    MAX_CLOSED_KEYS = 10000
+
+    def __init__(
+        self,
+        journal_dir: str = None,
+        flush_interval: float = None,
+        fsync_interval: float = None,
+        max_bytes: int = None,
+    ):
+        """Initialize conversation journal.
+
+        Args:
+            journal_dir: Directory for journal files. Uses settings if None.
+            flush_interval: Seconds between background flushes.
+            fsync_interval: Minimum seconds between fsyncs of the same file.
+            max_bytes: Active file size that triggers rotation.
+        """
+        self.journal_dir = journal_dir or settings.CONVERSATION_JOURNAL_DIR
+        self.flush_interval = flush_interval or settings.CONVERSATION_JOURNAL_FLUSH_INTERVAL
+        self.fsync_interval = fsync_interval or settings.CONVERSATION_JOURNAL_FSYNC_INTERVAL
+        self.max_bytes = max_bytes or settings.CONVERSATION_JOURNAL_MAX_BYTES
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+        except Exception as e:
+            logger.error(f"Failed to prepare conversation journal directory: {e}")
+
+        # Pending serialized lines per key (guarded by _buffer_lock)
+        self._buffers: Dict[str, List[str]] = {}
+        self._buffer_lock = threading.Lock()
+        # Open handles and last fsync time per key (guarded by _io_lock, writer thread only)
+        self._handles: Dict[str, IO[str]] = {}
+        self._last_fsync: Dict[str, float] = {}
+        # Keys closed since their last append; the flusher never reopens them (guarded by _buffer_lock)
+        self._closed: Set[str] = set()
+        self._io_lock = threading.Lock()
+        self._flusher_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _safe_key(key: str) -> str:
+        return _SAFE_KEY_RE.sub("_", str(key))
+
+    def _active_path(self, key: str) -> str:
+        return os.path.join(self.journal_dir, f"{self._safe_key(key)}.jsonl")
+
+    def _segment_paths(self, key: str) -> List[str]:
+        """Rotated segments for a key, oldest first."""
+        safe_key = self._safe_key(key)
+        segments = []
+        try:
+            for name in os.listdir(self.journal_dir):
+                match = _SEGMENT_RE.match(name)
+                if match and match.group("key") == safe_key:
+                    segments.append((int(match.group("index")), os.path.join(self.journal_dir, name)))
+        except FileNotFoundError:
+            return []
+        return [path for _, path in sorted(segments)]
+
+    def list_keys(self) -> List[str]:
+        """Journal keys on disk, least recently written first."""
+        keys: Dict[str, float] = {}
+        try:
+            for name in os.listdir(self.journal_dir):
+                if not name.endswith(".jsonl"):
+                    continue
+                match = _SEGMENT_RE.match(name)
+                key = match.group("key") if match else name[:-len(".jsonl")]
+                mtime = os.path.getmtime(os.path.join(self.journal_dir, name))
+                keys[key] = max(keys.get(key, 0.0), mtime)
+        except FileNotFoundError:
+            return []
+        return sorted(keys, key=keys.get)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, key: str, entry: dict) -> None:
+        """Queue an entry for the journal of ``key``.
+
+        Never blocks on disk I/O; entries are written by the background flusher.
+
+        Args:
+            key: Conversation key (DB conversation id or live session id).
+            entry: JSON-serializable message entry.
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._buffer_lock:
+            # Writing to a closed conversation again (resumed session) reopens it
+            self._closed.discard(key)
+            self._buffers.setdefault(key, []).append(line)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        """Start the background flusher on the running loop if needed."""
+        if self._flusher_task and not self._flusher_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts/tools) - write synchronously
+            self._write_pending()
+            return
+        self._flusher_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                with self._buffer_lock:
+                    has_pending = any(self._buffers.values())
+                if has_pending:
+                    await asyncio.to_thread(self._write_pending)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Conversation journal flusher stopped: {e}")
+
+    def _take_pending(self, key: Optional[str] = None, close: bool = False) -> Dict[str, List[str]]:
+        with self._buffer_lock:
+            if key is None:
+                pending, self._buffers = self._buffers, {}
+            else:
+                lines = self._buffers.pop(key, None)
+                pending = {key: lines} if lines else {}
+            closed = set(self._closed)
+            if close and key is not None:
+                # Marked in the same lock hold as the take, so a later append reopens cleanly
+                self._closed.add(key)
+                if len(self._closed) > self.MAX_CLOSED_KEYS:
+                    self._closed.clear()
+        for journal_key in closed & set(pending):
+            logger.warning(f"Skipping {len(pending.pop(journal_key))} lines for closed conversation journal {journal_key}")
+        return pending
+
+    def _write_pending(self, key: Optional[str] = None, force_fsync: bool = False) -> None:
+        """Write buffered lines to disk (runs in a worker thread)."""
+        with self._io_lock:
+            self._write_pending_locked(key, force_fsync)
+
+    def _write_pending_locked(self, key: Optional[str] = None, force_fsync: bool = False, close: bool = False) -> None:
+        """Write buffered lines to disk (holds _io_lock).
+
+        Lines are taken under the I/O lock, so two writers never reorder them
+        and nothing is written after ``close`` released the handle.
+        """
+        pending = self._take_pending(key, close)
+        for journal_key, lines in pending.items():
+            try:
+                handle = self._get_handle(journal_key)
+                handle.write("".join(lines))
+                handle.flush()
+                now = time.monotonic()
+                if now - self._last_fsync.get(journal_key, 0.0) >= self.fsync_interval:
+                    os.fsync(handle.fileno())
+                    self._last_fsync[journal_key] = now
+                if handle.tell() >= self.max_bytes:
+                    self._rotate(journal_key)
+            except Exception as e:
+                logger.error(f"Failed to write conversation journal {journal_key}: {e}")
+        if force_fsync:
+            keys = [key] if key is not None else list(self._handles)
+            for journal_key in keys:
+                handle = self._handles.get(journal_key)
+                if handle is None:
+                    continue
+                try:
+                    os.fsync(handle.fileno())
+                    self._last_fsync[journal_key] = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Failed to fsync conversation journal {journal_key}: {e}")
+
+    def _get_handle(self, key: str) -> IO[str]:
+        handle = self._handles.get(key)
+        if handle is None or handle.closed:
+            handle = open(self._active_path(key), "a", encoding="utf-8")
+            self._handles[key] = handle
+        return handle
+
+    def _rotate(self, key: str) -> None:
+        """Move the active file to the next numbered segment (holds _io_lock)."""
+        handle = self._handles.pop(key, None)
+        if handle:
+            os.fsync(handle.fileno())
+            handle.close()
+        segments = self._segment_paths(key)
+        next_index = 1
+        if segments:
+            next_index = int(_SEGMENT_RE.match(os.path.basename(segments[-1])).group("index")) + 1
+        segment_path = os.path.join(self.journal_dir, f"{self._safe_key(key)}.{next_index:06d}.jsonl")
+        os.replace(self._active_path(key), segment_path)
+        self._last_fsync.pop(key, None)
+        logger.info(f"Rotated conversation journal {key} -> {os.path.basename(segment_path)}")
+
+    async def flush(self, key: Optional[str] = None) -> None:
+        """Write and fsync pending entries now.
+
+        Args:
+            key: Only flush this conversation. Flushes everything if None.
+        """
+        await asyncio.to_thread(self._write_pending, key, True)
+
+    async def close(self, key: str) -> None:
+        """Flush and release the file handle of a finished conversation."""
+
+        def _close_handle():
+            # Flush and close under one lock hold, so the flusher cannot write in between
+            with self._io_lock:
+                self._write_pending_locked(key, force_fsync=True, close=True)
+                handle = self._handles.pop(key, None)
+                self._last_fsync.pop(key, None)
+                if handle:
+                    handle.close()
+
+        await asyncio.to_thread(_close_handle)
+
+    async def shutdown(self) -> None:
+        """Stop the flusher, write everything and close all files."""
+        if self._flusher_task and not self._flusher_task.done():
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        for key in list(self._handles):
+            await self.close(key)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def _paths_for(self, key: str) -> List[str]:
+        paths = self._segment_paths(key)
+        active = self._active_path(key)
+        if os.path.exists(active):
+            paths.append(active)
+        return paths
+
+    def iter_entries(self, key: str) -> Iterator[dict]:
+        """Stream the entries of one conversation from disk, one line at a time.
+
+        Entries still sitting in the write buffer are not included; call
+        ``flush`` first when read-your-writes matters.
+
+        Args:
+            key: Conversation to read (journals hold many users' conversations,
+                so there is no read-everything mode).
+        """
+        if not key:
+            raise ValueError("A conversation key is required to read the journal")
+        for path in self._paths_for(key):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # Torn write at the tail of a crashed file
+                            logger.warning(f"Skipping malformed journal line in {path}")
+            except FileNotFoundError:
+                continue
+
+    async def aiter_entries(self, key: str, batch_size: int = 500) -> AsyncIterator[dict]:
+        """Async version of ``iter_entries`` reading batches in a worker thread.
+
+        Args:
+            key: Conversation to read.
+            batch_size: Number of entries read per thread hop.
+        """
+        iterator = self.iter_entries(key)
+
+        def _next_batch() -> List[dict]:
+            batch = []
+            for entry in iterator:
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    break
+            return batch
+
+        while True:
+            batch = await asyncio.to_thread(_next_batch)
+            if not batch:
+                return
+            for entry in batch:
+                yield entry
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self, key: str) -> int:
+        """Merge all segments of ``key`` into one file, dropping malformed lines.
+
+        Should not be run against a conversation that is still being written.
+
+        Args:
+            key: Conversation key to compact.
+
+        Returns:
+            Number of entries kept.
+        """
+        with self._io_lock:
+            handle = self._handles.pop(key, None)
+            if handle:
+                handle.close()
+            paths = self._paths_for(key)
+            if not paths:
+                return 0
+            tmp_path = self._active_path(key) + ".compact"
+            kept = 0
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                for path in paths:
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            try:
+                                json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            out.write(line + "\n")
+                            kept += 1
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self._active_path(key))
+            for path in paths:
+                if path != self._active_path(key):
+                    os.remove(path)
+        logger.info(f"Compacted conversation journal {key}: {kept} entries in {len(paths)} file(s)")
+        return kept
+
+    def compact_all(self) -> Dict[str, int]:
+        """Compact every journal on disk."""
+        return {key: self.compact(key) for key in self.list_keys()}
+
+
+# Global instance shared by the application
+conversation_journal = ConversationJournal()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python -m services.conversation_journal compact [conversation_key]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        print(f"{sys.argv[2]}: {conversation_journal.compact(sys.argv[2])} entries")
+    else:
+        for journal_key, count in conversation_journal.compact_all().items():
+            print(f"{journal_key}: {count} entries")
@@ -0,0 +1,227 @@
+"""
+Write-behind persistence of live conversation messages
+
+Messages produced on the Gemini Live path are queued per conversation and
+written in batches via ``ConversationService.add_messages_bulk`` (one
+multi-row INSERT plus one ``total_messages`` UPDATE per batch) instead of
+one transaction per message. ``message_order`` is assigned in memory when a
+message is queued.
+"""
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationMessageWriter:
+    """Buffered writer for the messages of one conversation."""
+
+    def __init__(
+        self,
+        conversation_service,
+        conversation_id: str,
+        start_order: int = 0,
+        batch_size: int = None,
+        flush_interval: float = None,
+        max_retries: int = None,
+    ):
+        """Initialize message writer.
+
+        Args:
+            conversation_service: ConversationService used for bulk inserts.
+            conversation_id: Conversation the messages belong to.
+            start_order: message_order of the last persisted message.
+            batch_size: Pending messages that trigger an immediate flush.
+            flush_interval: Seconds between background flushes.
+            max_retries: Consecutive failed flushes before pending messages are dropped.
+        """
+        self.conversation_service = conversation_service
+        self.conversation_id = conversation_id
+        self.batch_size = batch_size or settings.CONVERSATION_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.CONVERSATION_WRITE_FLUSH_INTERVAL
+        self.max_retries = max_retries if max_retries is not None else settings.CONVERSATION_WRITE_MAX_RETRIES
+        self._next_order = start_order
+        self._consecutive_failures = 0
+        self._pending: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Stats
+        self.messages_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.dropped_messages = 0
+
+    def start(self) -> None:
+        """Start the background flush task on the running loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, role, content: str, timestamp: Optional[datetime.datetime] = None, **extra) -> int:
+        """Queue a message for persistence.
+
+        Args:
+            role: ConversationRole enum value.
+            content: Message content.
+            timestamp: Time the message was produced. Defaults to now.
+            **extra: Optional has_audio, audio_file_path, processing_time_ms.
+
+        Returns:
+            message_order assigned to the message.
+        """
+        if self._closed:
+            raise RuntimeError(f"Writer for conversation {self.conversation_id} is closed")
+        self._next_order += 1
+        message = {
+            "role": role,
+            "content": content,
+            "message_order": self._next_order,
+            "timestamp": timestamp or datetime.datetime.now(),
+        }
+        message.update(extra)
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return self._next_order
+
+    async def _flush_loop(self) -> None:
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Message writer for conversation {self.conversation_id} stopped: {e}")
+
+    async def flush(self) -> bool:
+        """Write all pending messages as one batch.
+
+        Failed batches are put back in front of the queue and retried on the
+        next flush, up to ``max_retries`` consecutive failures; after that the
+        pending messages are dropped and logged.
+
+        Returns:
+            True if nothing is left pending.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, []
+            written = await self.conversation_service.add_messages_bulk(self.conversation_id, batch)
+            if written:
+                self.messages_written += written
+                self.batches_written += 1
+                self._consecutive_failures = 0
+                return not self._pending
+            self.failed_batches += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures > self.max_retries:
+                self.dropped_messages += len(batch)
+                self._consecutive_failures = 0
+                logger.error(f"Dropped {len(batch)} unsaved messages for conversation {self.conversation_id} after {self.max_retries} retries")
+                return not self._pending
+            self._pending = batch + self._pending
+            logger.warning(f"Batch of {len(batch)} messages for conversation {self.conversation_id} failed, will retry")
+            return False
+
+    async def close(self) -> None:
+        """Stop the background task and drain pending messages."""
+        self._closed = True
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if not await self.flush():
+            logger.error(f"Dropped {len(self._pending)} unsaved messages for conversation {self.conversation_id}")
+            self.dropped_messages += len(self._pending)
+            self._pending = []
+
+
+class ConversationWriteBehind:
+    """Registry of per-conversation message writers."""
+
+    def __init__(self, conversation_service=None):
+        """Initialize write-behind registry.
+
+        Args:
+            conversation_service: ConversationService instance. Created lazily if None.
+        """
+        self._conversation_service = conversation_service
+        self._writers: Dict[str, ConversationMessageWriter] = {}
+        self.messages_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.dropped_messages = 0
+
+    @property
+    def conversation_service(self):
+        if self._conversation_service is None:
+            from db.db_services.conversation_service import ConversationService
+            self._conversation_service = ConversationService()
+        return self._conversation_service
+
+    def open(self, conversation_id: str, start_order: int = 0) -> ConversationMessageWriter:
+        """Get or create the writer of a conversation.
+
+        Args:
+            conversation_id: Conversation id.
+            start_order: message_order of the last persisted message.
+        """
+        writer = self._writers.get(conversation_id)
+        if writer is None:
+            writer = ConversationMessageWriter(self.conversation_service, conversation_id, start_order)
+            writer.start()
+            self._writers[conversation_id] = writer
+        return writer
+
+    def enqueue(self, conversation_id: str, role, content: str, timestamp: Optional[datetime.datetime] = None, **extra) -> int:
+        """Queue a message for a conversation, opening its writer if needed."""
+        return self.open(conversation_id).enqueue(role, content, timestamp, **extra)
+
+    async def close(self, conversation_id: str) -> None:
+        """Drain and remove the writer of a finished conversation."""
+        writer = self._writers.pop(conversation_id, None)
+        if writer is None:
+            return
+        await writer.close()
+        self.messages_written += writer.messages_written
+        self.batches_written += writer.batches_written
+        self.failed_batches += writer.failed_batches
+        self.dropped_messages += writer.dropped_messages
+
+    async def shutdown(self) -> None:
+        """Drain every open writer."""
+        for conversation_id in list(self._writers):
+            await self.close(conversation_id)
+
+    def get_stats(self) -> dict:
+        """Get write-behind statistics."""
+        writers = list(self._writers.values())
+        return {
+            "open_conversations": len(writers),
+            "pending_messages": sum(w.pending_count for w in writers),
+            "messages_written": self.messages_written + sum(w.messages_written for w in writers),
+            "batches_written": self.batches_written + sum(w.batches_written for w in writers),
+            "failed_batches": self.failed_batches + sum(w.failed_batches for w in writers),
+            "dropped_messages": self.dropped_messages + sum(w.dropped_messages for w in writers),
+        }
+
+
+# Global instance shared by the application
+conversation_writer = ConversationWriteBehind()
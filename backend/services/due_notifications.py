@@ -0,0 +1,145 @@
+"""
+In-memory queue of scheduled notifications that are about to be due
+
+``ScheduleNotificationService`` keeps the unsent notifications due within
+SCHEDULE_DISPATCH_WINDOW_MINUTES in a min-heap ordered by ``scheduled_at``
+and sleeps until the earliest one, instead of loading every unsent row once
+a minute. The window is reloaded with one indexed range query every
+SCHEDULE_DISPATCH_RELOAD_MINUTES; between reloads the schedule endpoints keep
+the heap current (create / update / delete / complete).
+
+Cancelled and rescheduled entries are removed lazily: the heap may hold stale
+``(time, id)`` pairs, and only the pair matching ``_due_at[id]`` is live.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def to_timestamp(value: Union[datetime, float, int]) -> float:
+    """Epoch seconds of a ``scheduled_at`` (naive datetimes are UTC, as stored)."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class DueNotificationQueue:
+    """Min-heap of notification IDs by due time, limited to a rolling window."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        # notification id -> due timestamp of its live heap entry
+        self._due_at: Dict[str, float] = {}
+        # Entries due after this are left to the next reload
+        self.window_end = 0.0
+        # Changes made while a reload query runs, re-applied on top of its result
+        self._changes_during_reload: Optional[List[Tuple[str, Optional[float]]]] = None
+        self._changed = asyncio.Event()
+        # Stats
+        self.reloads = 0
+        self.popped = 0
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    def schedule(self, notification_id: str, scheduled_at: Union[datetime, float]) -> bool:
+        """Add or move a notification (after create / reschedule).
+
+        Returns:
+            True if it is inside the window and now queued.
+        """
+        notification_id = str(notification_id)
+        due_at = to_timestamp(scheduled_at)
+        if self._changes_during_reload is not None:
+            self._changes_during_reload.append((notification_id, due_at))
+        if due_at > self.window_end:
+            # Outside the window: the reload that covers it will pick it up
+            self._due_at.pop(notification_id, None)
+            return False
+        self._due_at[notification_id] = due_at
+        heapq.heappush(self._heap, (due_at, notification_id))
+        self._changed.set()
+        return True
+
+    def cancel(self, notification_id: str) -> None:
+        """Forget a notification (after delete / complete)."""
+        notification_id = str(notification_id)
+        if self._changes_during_reload is not None:
+            self._changes_during_reload.append((notification_id, None))
+        if self._due_at.pop(notification_id, None) is not None:
+            self._changed.set()
+
+    def begin_reload(self) -> None:
+        """Start recording changes; call before running the window query."""
+        self._changes_during_reload = []
+
+    def finish_reload(self, rows: Iterable[dict], window_end: float) -> None:
+        """Replace the queue with the rows of a window query.
+
+        Args:
+            rows: {"id", "scheduled_at"} of unsent notifications due before ``window_end``.
+            window_end: Upper bound (epoch seconds) of the query.
+        """
+        changes = self._changes_during_reload or []
+        self._changes_during_reload = None
+        self.window_end = window_end
+        self._due_at = {str(row["id"]): to_timestamp(row["scheduled_at"]) for row in rows}
+        self._heap = [(due_at, notification_id) for notification_id, due_at in self._due_at.items()]
+        heapq.heapify(self._heap)
+        # Endpoints that changed a row after the query ran win over its result
+        for notification_id, due_at in changes:
+            if due_at is None:
+                self._due_at.pop(notification_id, None)
+            else:
+                self.schedule(notification_id, due_at)
+        self.reloads += 1
+        self._changed.set()
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Due timestamp of the earliest queued notification."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float = None) -> List[str]:
+        """Remove and return the notifications due at ``now``, earliest first."""
+        now = time.time() if now is None else now
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, notification_id = heapq.heappop(self._heap)
+            del self._due_at[notification_id]
+            due.append(notification_id)
+            self._drop_stale()
+        self.popped += len(due)
+        return due
+
+    async def wait(self, timeout: float) -> None:
+        """Sleep up to ``timeout`` seconds, waking early when the queue changes."""
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+
+    def get_stats(self) -> dict:
+        """Get queue statistics."""
+        next_due = self.next_due()
+        return {
+            "queued": len(self._due_at),
+            "heap_entries": len(self._heap),
+            "next_due_in_seconds": round(next_due - time.time(), 1) if next_due is not None else None,
+            "window_end": datetime.fromtimestamp(self.window_end, timezone.utc).isoformat() if self.window_end else None,
+            "reloads": self.reloads,
+            "popped": self.popped,
+        }
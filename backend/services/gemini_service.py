@@ -4,23 +4,38 @@ Gemini Live WebSocket service
 import asyncio
 import json
 import base64
+import time
 import datetime
 import logging
-import os
-import json as json_lib
-from typing import Optional, Dict
+from typing import Optional
 
 from fastapi import WebSocket, WebSocketDisconnect
 from google import genai
 from google.genai import types
 
 from config.settings import settings
-from services.session_service import SessionService
+from services.live_session import LiveSessionContext, live_session_registry
+from services.live_protocol import negotiate_protocol
+from services.websocket_manager import websocket_manager
+from services.outbound_queue import PRIORITY_AUDIO, PRIORITY_CONTROL, PRIORITY_TEXT
+from services.live_pool import LiveConnection, WarmSessionPool, live_latency_stats
+from services.live_config_cache import LiveConfigCache
+from services.resumption_store import resumption_store
+from user_memory.config import MEMORY_CATEGORIES, SHARED_USER_KEY
+from user_memory.memory_store import memory_store
+from services.conversation_journal import conversation_journal
+from services.conversation_writer import conversation_writer
+from services.audio_artifacts import AUDIO_DELIVERY_URL
+from services.audio_encoding import CODECS, negotiate_codec
+from services.voice_streaming import VoiceChunkStream, send_voice_stream
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Config cache key of sessions opened before their user is known (no memory block)
+PRE_USER_CONFIG_KEY = "__pre_user__"
+
 
 class GeminiService:
     """Service for handling Gemini Live WebSocket connections."""
@@ -142,35 +157,36 @@ class GeminiService:
     - PHẢI luôn đưa ra thông tin hữu ích, ngay cả khi không có thông tin chính xác
     """
     
-    def __init__(self, client: genai.Client = None, model: str = None):
+    def __init__(self, client: genai.Client = None, model: str = None, live_client=None):
         """Initialize Gemini service.
         
         Args:
             client: Gemini client instance. Creates new if None.
             model: Model to use. Uses default from settings if None.
+            live_client: Client used for Live sessions only. Defaults to ``client``,
+                or to the offline stub when GEMINI_LIVE_STUB is set.
         """
         self.client = client or genai.Client(api_key=settings.GOOGLE_API_KEY)
         self.model = model or settings.GEMINI_MODEL
-        self.session_service = SessionService()
-        # User identification for database operations
-        self.current_user_id = None
-        # Conversation history tracking
-        self.conversation_history = []  # List of {role, text, timestamp}
-        # File to persist conversation history
-        self.conversation_history_file = getattr(settings, "CONVERSATION_HISTORY_FILE", "conversation_history.json")
-        # Temporary buffers for the current turn's texts
-        self._current_user_input = ""
-        self._current_assistant_output = ""
-
-        # Ensure conversation history file exists
-        try:
-            if not os.path.isfile(self.conversation_history_file):
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(self.conversation_history_file) or ".", exist_ok=True)
-                with open(self.conversation_history_file, "w", encoding="utf-8") as f:
-                    json_lib.dump([], f, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Failed to prepare conversation history file: {e}")
+        if live_client is None and settings.GEMINI_LIVE_STUB:
+            from services.live_stub import StubGenaiClient
+            live_client = StubGenaiClient()
+            logger.warning("⚠️ Using offline stub client for Gemini Live sessions")
+        self.live_client = live_client or self.client
+        # Pre-opened sessions for connections that start without a resumption handle
+        self.warm_pool = WarmSessionPool(self.live_client, self.model, self._create_pre_user_live_config)
+        self.latency_stats = live_latency_stats
+        # Built LiveConnectConfigs per (user, memory version); tools are built once
+        self.live_config_cache = LiveConfigCache()
+        self._live_tools = None
+        # Per-user categorized memory for the update_system_prompt tool
+        self.memory_store = memory_store
+        # Resumption handles per (user, device), written through to user_sessions
+        self.resumption_store = resumption_store
+        # Per-connection state (user, conversation, history) lives in LiveSessionContext
+        self.session_registry = live_session_registry
+        # Append-only JSONL journal used as file backup of each conversation
+        self.conversation_journal = conversation_journal
         # Initialize notification voice service
         from services.notification_voice_service import NotificationVoiceService
         self.notification_voice_service = NotificationVoiceService(self.client, self.model)
@@ -194,47 +210,64 @@ class GeminiService:
         try:
             from db.db_services.conversation_service import ConversationService
             self.conversation_service = ConversationService()
-            self.current_conversation_id = None
             logger.info("Database conversation service initialized")
         except Exception as e:
             logger.error(f"Failed to initialize database conversation service: {e}")
             self.conversation_service = None
         
-        # Per-connection send locks to prevent concurrent websocket.send_text errors
-        self._send_locks: Dict[WebSocket, asyncio.Lock] = {}
-
-    def _get_send_lock(self, websocket: WebSocket) -> asyncio.Lock:
-        """Get or create a send lock for the given websocket connection."""
-        lock = self._send_locks.get(websocket)
-        if lock is None:
-            lock = asyncio.Lock()
-            self._send_locks[websocket] = lock
-        return lock
+        # Batched write-behind queue for live conversation messages
+        self.message_writer = conversation_writer
     
-    def _create_live_config(self, previous_session_handle: Optional[str] = None) -> types.LiveConnectConfig:
+    def _create_live_config(self, previous_session_handle: Optional[str] = None, user_id: Optional[str] = None) -> types.LiveConnectConfig:
         """Create live connection configuration.
         
+        The config is cached per (user, memory version); only the resumption
+        handle is applied per connect.
+        
         Args:
             previous_session_handle: Optional previous session handle for resumption.
+            user_id: User the session belongs to, if known.
             
         Returns:
             LiveConnectConfig object.
         """
-        # Only include session resumption when a valid handle exists to avoid API errors
-        session_resumption_cfg = None
-        if previous_session_handle:
-            session_resumption_cfg = types.SessionResumptionConfig(handle=previous_session_handle)
-
-        # Log tools configuration
-        logger.info("=" * 60)
-        logger.info("🔧 TOOLS CONFIGURATION INITIALIZED")
-        logger.info("=" * 60)
-        logger.info("📱 Available tools:")
-        logger.info("   ✅ switch_to_main_screen: Chuyển sang màn hình chính của ứng dụng")
-        logger.info("   ✅ switch_to_medicine_scan_screen: Chuyển sang màn hình quét thuốc")
-        logger.info("   🔍 Google Search: Tìm kiếm thông tin cập nhật trên internet")
-        logger.info("=" * 60)
+        return self.live_config_cache.get(
+            user_id,
+            self._get_memory_version(user_id),
+            lambda: self._build_live_config(user_id),
+            previous_session_handle
+        )
+    
+    def _create_pre_user_live_config(self, previous_session_handle: Optional[str] = None) -> types.LiveConnectConfig:
+        """Create the config of a session opened before its user is known.
+        
+        Warm-pool and speculative sessions get the base instruction without any
+        memory block; the memory of the user who turns up is sent as context
+        once the config message identifies them.
         
+        Args:
+            previous_session_handle: Optional previous session handle for resumption.
+            
+        Returns:
+            LiveConnectConfig object.
+        """
+        return self.live_config_cache.get(
+            PRE_USER_CONFIG_KEY,
+            None,
+            lambda: self._build_live_config(None, include_memory=False),
+            previous_session_handle
+        )
+    
+    def _build_live_config(self, user_id: Optional[str] = None, include_memory: bool = True) -> types.LiveConnectConfig:
+        """Build a live connection configuration without session resumption.
+        
+        Args:
+            user_id: User the session belongs to, if known.
+            include_memory: Put the user's memory into the system instruction.
+            
+        Returns:
+            LiveConnectConfig object.
+        """
         return types.LiveConnectConfig(
             response_modalities=["AUDIO"],
             speech_config=types.SpeechConfig(
@@ -245,65 +278,141 @@ class GeminiService:
                 ),
                 language_code='vi-VN',
             ),
-            tools=[
-                types.Tool(
-                    function_declarations=[
-                        types.FunctionDeclaration(
-                            name="switch_to_main_screen",
-                            description="Chuyển sang màn hình chính của ứng dụng"
-                        ),
-                        types.FunctionDeclaration(
-                            name="switch_to_medicine_scan_screen", 
-                            description="Chuyển sang màn hình quét thuốc"
-                        ),
-                        types.FunctionDeclaration(
-                            name="update_system_prompt",
-                            description="Ghi nhớ thông tin quan trọng về người dùng để cải thiện trải nghiệm tương tác trong tương lai",
-                            parameters={
-                                "type": "object",
-                                "properties": {
-                                    "content": {
-                                        "type": "string",
-                                        "description": "Nội dung thông tin cần ghi nhớ về người dùng"
-                                    }
-                                },
-                                "required": ["content"]
-                            }
-                        )
-                    ],
-                    google_search=types.GoogleSearch()
-                )
-            ],
-            system_instruction=self._get_enhanced_system_instruction(),
-            session_resumption=session_resumption_cfg,
+            tools=self._get_live_tools(),
+            system_instruction=self._get_enhanced_system_instruction(user_id) if include_memory else self.SYSTEM_INSTRUCTION,
             output_audio_transcription=types.AudioTranscriptionConfig(),
             input_audio_transcription=types.AudioTranscriptionConfig(),
             temperature=0.6,
             top_p=0.85,
         )
     
-    async def handle_websocket_connection(self, websocket: WebSocket):
+    def _get_live_tools(self) -> list:
+        """Get tool declarations for live sessions (built once).
+        
+        Returns:
+            List of Tool objects.
+        """
+        if self._live_tools is not None:
+            return self._live_tools
+        
+        # Log tools configuration
+        logger.info("=" * 60)
+        logger.info("🔧 TOOLS CONFIGURATION INITIALIZED")
+        logger.info("=" * 60)
+        logger.info("📱 Available tools:")
+        logger.info("   ✅ switch_to_main_screen: Chuyển sang màn hình chính của ứng dụng")
+        logger.info("   ✅ switch_to_medicine_scan_screen: Chuyển sang màn hình quét thuốc")
+        logger.info("   🔍 Google Search: Tìm kiếm thông tin cập nhật trên internet")
+        logger.info("=" * 60)
+        
+        self._live_tools = [
+            types.Tool(
+                function_declarations=[
+                    types.FunctionDeclaration(
+                        name="switch_to_main_screen",
+                        description="Chuyển sang màn hình chính của ứng dụng"
+                    ),
+                    types.FunctionDeclaration(
+                        name="switch_to_medicine_scan_screen", 
+                        description="Chuyển sang màn hình quét thuốc"
+                    ),
+                    types.FunctionDeclaration(
+                        name="update_system_prompt",
+                        description="Ghi nhớ thông tin quan trọng về người dùng để cải thiện trải nghiệm tương tác trong tương lai",
+                        parameters={
+                            "type": "object",
+                            "properties": {
+                                "content": {
+                                    "type": "string",
+                                    "description": "Nội dung thông tin cần ghi nhớ về người dùng"
+                                },
+                                "category": {
+                                    "type": "string",
+                                    "enum": list(MEMORY_CATEGORIES.keys()),
+                                    "description": "Loại thông tin: " + ", ".join(f"{key} ({label})" for key, label in MEMORY_CATEGORIES.items())
+                                }
+                            },
+                            "required": ["content"]
+                        }
+                    )
+                ],
+                google_search=types.GoogleSearch()
+            )
+        ]
+        return self._live_tools
+    
+    def _get_memory_version(self, user_id: Optional[str] = None):
+        """Get the version of the user memory baked into the system instruction.
+        
+        Args:
+            user_id: User whose memory is used.
+            
+        Returns:
+            Hashable version token (bumped by the memory store on every write).
+        """
+        try:
+            return self.memory_store.get_version(user_id or SHARED_USER_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read user memory version: {e}")
+            return None
+    
+    async def handle_websocket_connection(self, websocket: WebSocket, user_id: Optional[str] = None):
         """Handle WebSocket connection for Gemini Live with proper error handling.
         
         Args:
             websocket: FastAPI WebSocket instance.
+            user_id: User authenticated from the session token. None keeps the
+                session anonymous: no notifications, conversations or personal memory.
         """
         # WebSocket is already accepted in the main endpoint
+        # Share the socket's send queue with the notification manager so there
+        # is exactly one writer per socket
+        shared_outbound = websocket_manager.get_outbound(websocket)
+        ctx = LiveSessionContext(websocket, shared_outbound)
+        if shared_outbound is None:
+            # Close the socket if the client stops reading (send timeout / error)
+            ctx.outbound.on_error = lambda e: asyncio.create_task(
+                self._close_websocket_safely(websocket, 1011, "Send failed")
+            )
+            ctx.outbound.start()
+        self.session_registry.register(ctx)
         
-        # Load previous session if available
-        previous_session_handle = self.session_service.load_previous_session_handle()
+        # The user comes from the session token, so the right resumption handle
+        # and memory are known before the config message
+        ctx.device_id = websocket.query_params.get("device_id") or None
+        previous_session_handle = None
+        if user_id or ctx.device_id:
+            previous_session_handle = await self.resumption_store.load(user_id, ctx.device_id)
         
-        logger.info("Starting Gemini session")
+        logger.info(f"Starting Gemini session {ctx.session_id}")
         
         # Initialize tasks list for proper cleanup
         send_task = None
         receive_task = None
         ping_task = None
+        live_connection = None
         
         try:
+            # Start the Gemini Live handshake now, in parallel with the config wait.
+            # Fresh sessions can come straight from the warm pool.
+            if not previous_session_handle:
+                live_connection = self.warm_pool.acquire()
+            if live_connection is None:
+                live_connection = LiveConnection(
+                    self.live_client,
+                    self.model,
+                    self._create_live_config(previous_session_handle, user_id)
+                    if user_id else self._create_pre_user_live_config(previous_session_handle),
+                    source="speculative"
+                ).start()
+            # Warm-pool sessions are opened before anyone connects, without memory
+            memory_in_config = user_id is not None and live_connection.source == "speculative"
+            ctx.connect_source = live_connection.source
+            self.latency_stats.count(f"connect_{live_connection.source}")
+
             # Send early setup ack so clients don't wait and close
             try:
-                await self._send_safely(websocket, {"setupComplete": {}})
+                await self._send_safely(ctx, {"setupComplete": {}})
             except Exception:
                 pass
 
@@ -321,79 +430,136 @@ class GeminiService:
             except json.JSONDecodeError:
                 logger.warning("Invalid JSON in config message - continuing with defaults")
 
-            # Extract user_id from config for database operations (optional)
-            user_id_raw = config_data.get("user_id") if isinstance(config_data, dict) else None
-            if user_id_raw:
+            # Negotiate audio wire protocol (binary frames / Opus) - defaults to legacy JSON
+            ctx.protocol = negotiate_protocol(config_data)
+            if ctx.protocol.binary_audio:
+                await self._send_safely(ctx, {"protocol": ctx.protocol.to_dict()})
+            logger.info(f"Session {ctx.session_id} using audio protocol v{ctx.protocol.version} ({ctx.protocol.audio_downlink})")
+            
+            # Codec of pushed voice notifications (compressed for clients that can decode it)
+            # and whether they arrive inline or as a URL to the audio artifact
+            if isinstance(config_data, dict) and (config_data.get("audio_codecs") or config_data.get("audio_delivery")):
+                codec = negotiate_codec(config_data.get("audio_codecs"))
+                by_reference = config_data.get("audio_delivery") == AUDIO_DELIVERY_URL
+                websocket_manager.set_audio_codec(websocket, codec)
+                websocket_manager.set_audio_by_reference(websocket, by_reference)
+                await self._send_safely(ctx, {
+                    "notification_audio": {
+                        "codec": codec,
+                        "audio_format": CODECS[codec].mime_type,
+                        "delivery": AUDIO_DELIVERY_URL if by_reference else "inline",
+                    }
+                })
+
+            # A user_id in the config or URL is still sent by older clients; it is
+            # never trusted on its own and must match the session token
+            ctx.user_id = user_id
+            claimed_user_id = config_data.get("user_id") if isinstance(config_data, dict) else None
+            claimed_user_id = claimed_user_id or websocket.query_params.get("user_id")
+            if claimed_user_id and str(claimed_user_id).lower() != str(ctx.user_id).lower():
+                logger.warning(f"Ignoring unverified user_id {claimed_user_id} for session {ctx.session_id}")
+            if ctx.user_id:
+                logger.info(f"User ID set for session {ctx.session_id}: {ctx.user_id}")
+            else:
+                logger.info(f"No valid session token - session {ctx.session_id} stays anonymous")
+            if isinstance(config_data, dict) and config_data.get("device_id"):
+                ctx.device_id = str(config_data["device_id"])
+            # Index the socket by user/device so notifications reach only their recipients.
+            # ctx.user_id is only set from a verified session token, so an anonymous
+            # socket can never read (replay) or acknowledge someone's outbox
+            if ctx.user_id:
+                websocket_manager.register_user(websocket, ctx.user_id, ctx.device_id)
+                # Only clients that acknowledge notifications get the durable outbox;
+                # legacy apps never ack and would hear every old reminder again
+                acks = config_data.get("acks") if isinstance(config_data, dict) else None
+                if str(acks or websocket.query_params.get("acks", "")).lower() in ("1", "true", "yes"):
+                    await websocket_manager.enable_acks(websocket, ctx.user_id)
+                # Notifications sent while this device was offline and not yet acknowledged
+                await websocket_manager.replay_pending(websocket, ctx.user_id)
+
+            config_received_at = time.monotonic()
+            reconnect_reason = None
+            # Resume this user's/device's previous session if the early connect could not
+            if (ctx.user_id, ctx.device_id) != (user_id, websocket.query_params.get("device_id") or None):
+                handle = await self.resumption_store.load(ctx.user_id, ctx.device_id)
+                if handle and handle != previous_session_handle:
+                    previous_session_handle = handle
+                    reconnect_reason = "resuming previous session"
+            # A session opened long before the config arrived may have gone stale
+            if not reconnect_reason and live_connection.age > settings.LIVE_WARM_POOL_MAX_AGE:
+                reconnect_reason = f"connection is {live_connection.age:.0f}s old"
+            if reconnect_reason:
+                logger.info(f"Reconnecting Gemini Live for session {ctx.session_id}: {reconnect_reason}")
+                await live_connection.close()
+                live_connection = LiveConnection(
+                    self.live_client,
+                    self.model,
+                    self._create_live_config(previous_session_handle, ctx.user_id),
+                    source="resume" if previous_session_handle else "direct"
+                ).start()
+                memory_in_config = True
+                ctx.connect_source = live_connection.source
+            
+            session = await live_connection.wait_ready()
+            now = time.monotonic()
+            self.latency_stats.record("live_ready_ms", (now - ctx.opened_monotonic) * 1000)
+            self.latency_stats.record("connect_wait_ms", (now - config_received_at) * 1000)
+            self.latency_stats.record("handshake_ms", live_connection.connect_ms)
+            logger.info(f"Gemini Live ready for session {ctx.session_id} via {ctx.connect_source} "
+                        f"(waited {(now - config_received_at) * 1000:.0f}ms after config)")
+            
+            # The session was configured before the user was known (speculative
+            # connect / warm pool) without memory, so hand the identified user's memory over as context
+            if not memory_in_config and ctx.user_id:
+                await self._send_user_memory_context(ctx, session)
+            
+            # Create conversation in database if user_id is available
+            if ctx.user_id and self.conversation_service:
                 try:
-                    import uuid
-                    if isinstance(user_id_raw, str):
-                        try:
-                            uuid.UUID(user_id_raw)
-                            self.current_user_id = user_id_raw
-                        except ValueError:
-                            if user_id_raw.startswith("test_"):
-                                self.current_user_id = "550e8400-e29b-41d4-a716-446655440000"
-                                logger.info(f"Test user ID detected, using test UUID: {self.current_user_id}")
-                            else:
-                                logger.warning(f"Invalid UUID format: {user_id_raw}")
-                                self.current_user_id = None
-                    else:
-                        self.current_user_id = str(user_id_raw)
-                    if self.current_user_id:
-                        logger.info(f"User ID set for session: {self.current_user_id}")
+                    conversation_id = await self.conversation_service.create_conversation(
+                        user_id=ctx.user_id,
+                        title=f"Cuộc trò chuyện {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}"
+                    )
+                    if conversation_id:
+                        ctx.conversation_id = conversation_id
+                        # New conversation: message_order starts at 1
+                        self.message_writer.open(conversation_id, start_order=0)
+                        logger.info(f"Created conversation {ctx.conversation_id} for user {ctx.user_id}")
                     else:
-                        logger.warning("Invalid user_id format - database operations disabled")
+                        logger.warning("Failed to create conversation in database")
                 except Exception as e:
-                    logger.error(f"Error processing user_id: {e}")
-                    self.current_user_id = None
-
-            # Create live connection config
-            config = self._create_live_config(previous_session_handle)
+                    logger.error(f"Error creating conversation in database: {e}")
+            
+            # Create tasks
+            send_task = asyncio.create_task(self._send_to_gemini(ctx, session))
+            receive_task = asyncio.create_task(self._receive_from_gemini(ctx, session))
+            if shared_outbound is None:
+                # Keepalives of managed sockets come from the WebSocket manager's timer wheel
+                ping_task = asyncio.create_task(self._ping_websocket(ctx))
+            
+            # Wait for any task to complete or fail
+            done, pending = await asyncio.wait(
+                [task for task in (send_task, receive_task, ping_task) if task is not None],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            
+            # Cancel remaining tasks
+            for task in pending:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Error cancelling task: {e}")
+            
+            # Check for exceptions in completed tasks
+            for task in done:
+                try:
+                    await task
+                except Exception as e:
+                    logger.error(f"Task completed with error: {e}")
             
-            async with self.client.aio.live.connect(model=self.model, config=config) as session:
-                # Create conversation in database if user_id is available
-                if self.current_user_id and self.conversation_service:
-                    try:
-                        conversation_id = await self.conversation_service.create_conversation(
-                            user_id=self.current_user_id,
-                            title=f"Cuộc trò chuyện {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                        )
-                        if conversation_id:
-                            self.current_conversation_id = conversation_id
-                            logger.info(f"Created conversation {self.current_conversation_id} for user {self.current_user_id}")
-                        else:
-                            logger.warning("Failed to create conversation in database")
-                    except Exception as e:
-                        logger.error(f"Error creating conversation in database: {e}")
-                
-                # Create tasks
-                send_task = asyncio.create_task(self._send_to_gemini(websocket, session))
-                receive_task = asyncio.create_task(self._receive_from_gemini(websocket, session))
-                ping_task = asyncio.create_task(self._ping_websocket(websocket))
-                
-                # Wait for any task to complete or fail
-                done, pending = await asyncio.wait(
-                    [send_task, receive_task, ping_task],
-                    return_when=asyncio.FIRST_COMPLETED
-                )
-                
-                # Cancel remaining tasks
-                for task in pending:
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-                    except Exception as e:
-                        logger.error(f"Error cancelling task: {e}")
-                
-                # Check for exceptions in completed tasks
-                for task in done:
-                    try:
-                        await task
-                    except Exception as e:
-                        logger.error(f"Task completed with error: {e}")
-                
         except WebSocketDisconnect:
             logger.info("WebSocket disconnected by client")
         except Exception as e:
@@ -415,19 +581,35 @@ class GeminiService:
             # Individual conversation memoir extraction is disabled
             logger.info("Session ended - memoir extraction will be handled by daily scheduler")
             
-            logger.info("Gemini session closed")
+            if ctx.conversation_id and self.conversation_service:
+                try:
+                    await self.message_writer.close(ctx.conversation_id)
+                except Exception as e:
+                    logger.error(f"Failed to drain conversation messages: {e}")
             
-            # Cleanup send lock for this connection
             try:
-                self._send_locks.pop(websocket, None)
-            except Exception:
-                pass
+                await self.conversation_journal.close(ctx.journal_key)
+            except Exception as e:
+                logger.error(f"Failed to close conversation journal: {e}")
+            
+            if live_connection is not None:
+                await live_connection.close()
+            
+            await ctx.outbound.close()
+            self.session_registry.unregister(ctx)
+            uplink = ctx.audio_gate.get_stats()
+            logger.info(
+                f"Gemini session {ctx.session_id} closed "
+                f"(uplink audio: {uplink['bytes_out']}/{uplink['bytes_in']} bytes, "
+                f"{uplink['chunks_out']}/{uplink['frames_in']} sends, "
+                f"images: {ctx.image_gate.frames_out}/{ctx.image_gate.frames_in} frames)"
+            )
     
-    async def _ping_websocket(self, websocket: WebSocket):
+    async def _ping_websocket(self, ctx: LiveSessionContext):
         """Send periodic keepalive messages to maintain WebSocket connection.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
             
         Note: FastAPI WebSocket doesn't have ping() method, so we send keepalive messages instead.
         """
@@ -437,7 +619,7 @@ class GeminiService:
                 await asyncio.sleep(settings.WEBSOCKET_PING_INTERVAL)
                 try:
                     # Check if WebSocket is still connected safely
-                    if hasattr(websocket, 'client_state') and websocket.client_state.name == 'CONNECTED':
+                    if hasattr(ctx.websocket, 'client_state') and ctx.websocket.client_state.name == 'CONNECTED':
                         # Send a keepalive message instead of ping
                         keepalive_data = {
                             "type": "keepalive", 
@@ -447,7 +629,7 @@ class GeminiService:
                         }
                         
                         # Use _send_safely method for consistent error handling
-                        await self._send_safely(websocket, keepalive_data)
+                        await self._send_safely(ctx, keepalive_data)
                         keepalive_count += 1
                         logger.debug(f"Sent WebSocket keepalive #{keepalive_count}")
                     else:
@@ -480,11 +662,11 @@ class GeminiService:
         except Exception as e:
             logger.error(f"Error closing WebSocket: {e}")
     
-    async def _send_to_gemini(self, websocket: WebSocket, session):
+    async def _send_to_gemini(self, ctx: LiveSessionContext, session):
         """Handle sending messages from WebSocket to Gemini with improved error handling.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
             session: Gemini live session.
         """
         try:
@@ -492,17 +674,16 @@ class GeminiService:
                 try:
                     # Add timeout for receiving messages (support both text and binary frames)
                     incoming = await asyncio.wait_for(
-                        websocket.receive(),
+                        ctx.websocket.receive(),
                         timeout=settings.WEBSOCKET_MESSAGE_TIMEOUT
                     )
+                    websocket_manager.touch(ctx.websocket)
                     
                     # Handle raw binary audio frames (PCM 16kHz)
                     if isinstance(incoming, dict) and incoming.get("bytes") is not None:
                         raw_audio = incoming.get("bytes") or b""
                         if raw_audio:
-                            await session.send_realtime_input(
-                                audio=types.Blob(data=raw_audio, mime_type="audio/pcm;rate=16000")
-                            )
+                            await self._forward_audio(ctx, session, raw_audio)
                         continue
                     
                     # Handle textual JSON messages
@@ -517,38 +698,52 @@ class GeminiService:
                     # Handle keepalive messages
                     if data.get("type") == "keepalive":
                         logger.debug("Received keepalive from client")
+                        websocket_manager.touch(ctx.websocket, pong=True)
                         # Send keepalive response to maintain connection
-                        await self._send_safely(websocket, {
+                        await self._send_safely(ctx, {
                             "type": "keepalive_response",
                             "timestamp": datetime.datetime.now().isoformat(),
                             "server_time": datetime.datetime.now().strftime("%H:%M:%S")
                         })
                         continue
                 
+                    # Client received notifications up to delivery_seq (durable outbox)
+                    if data.get("type") == "ack":
+                        if not ctx.user_id:
+                            await self._send_safely(ctx, {
+                                "type": "ack_rejected",
+                                "delivery_seq": data.get("delivery_seq"),
+                                "error": "A valid session token is required to acknowledge notifications"
+                            })
+                            continue
+                        await websocket_manager.ack_notifications(ctx.user_id, data.get("delivery_seq"))
+                        continue
+                
                     if "realtime_input" in data:
                         for chunk in data["realtime_input"]["media_chunks"]:
                             if chunk["mime_type"] == "audio/pcm":
-                                await session.send_realtime_input(
-                                    audio=types.Blob(data=chunk["data"], mime_type="audio/pcm;rate=16000")
-                                )
+                                await self._forward_audio(ctx, session, base64.b64decode(chunk["data"]))
                                 
                             elif chunk["mime_type"].startswith("image/"):
-                                await session.send_realtime_input(
-                                    media=types.Blob(data=chunk["data"], mime_type=chunk["mime_type"])
-                                )
+                                await self._forward_image(ctx, session, base64.b64decode(chunk["data"]), chunk["mime_type"])
 
                     elif "text" in data:
                         text_content = data["text"]
                         logger.info(f"Sending text: {text_content}")
+                        for pcm in ctx.audio_gate.flush():
+                            await session.send_realtime_input(
+                                audio=types.Blob(data=pcm, mime_type="audio/pcm;rate=16000")
+                            )
                         await session.send_client_content(
                             turns={"role": "user", "parts": [{"text": text_content}]}, turn_complete=True
                         )
+                        ctx.last_user_input_at = time.monotonic()
                         # Persist immediately for text input
-                        self._append_to_conversation_history("user", text_content)
+                        self._append_to_conversation_history(ctx, "user", text_content)
                     
                     # Handle voice notification requests
                     elif "voice_notification_request" in data:
-                        await self._handle_voice_notification_request(websocket, data["voice_notification_request"])
+                        await self._handle_voice_notification_request(ctx, data["voice_notification_request"])
                 
                 except asyncio.TimeoutError:
                     logger.warning("Timeout waiting for message from client - continuing to maintain connection")
@@ -574,11 +769,47 @@ class GeminiService:
         finally:
             logger.info("send_to_gemini closed")
     
-    async def _receive_from_gemini(self, websocket: WebSocket, session):
+    async def _forward_audio(self, ctx: LiveSessionContext, session, pcm: bytes):
+        """Pass uplink PCM through the session's audio gate and send what it lets through.
+        
+        Args:
+            ctx: Live session context for the connection.
+            session: Gemini live session.
+            pcm: 16kHz 16-bit mono PCM frame from the client.
+        """
+        chunks, speech_ended = ctx.audio_gate.feed(pcm)
+        for chunk in chunks:
+            await session.send_realtime_input(
+                audio=types.Blob(data=chunk, mime_type="audio/pcm;rate=16000")
+            )
+        if speech_ended:
+            # Audio pauses until the next speech segment - let Gemini flush what it buffered
+            await session.send_realtime_input(audio_stream_end=True)
+    
+    async def _forward_image(self, ctx: LiveSessionContext, session, image: bytes, mime_type: str):
+        """Send a camera frame to Gemini if it differs from the last one sent.
+        
+        Args:
+            ctx: Live session context for the connection.
+            session: Gemini live session.
+            image: Encoded image from the client.
+            mime_type: MIME type of the image.
+        """
+        if not ctx.image_gate.enabled:
+            # Gate off: the frame passes through untouched (stats only), no thread hop
+            data, mime_type = ctx.image_gate.process(image, mime_type)
+        else:
+            frame = await asyncio.to_thread(ctx.image_gate.process, image, mime_type)
+            if frame is None:
+                return
+            data, mime_type = frame
+        await session.send_realtime_input(media=types.Blob(data=data, mime_type=mime_type))
+    
+    async def _receive_from_gemini(self, ctx: LiveSessionContext, session):
         """Handle receiving messages from Gemini and sending to WebSocket with improved error handling.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
             session: Gemini live session.
         """
         try:
@@ -586,14 +817,14 @@ class GeminiService:
                 try:
                     async for response in session.receive():
                         # Check if WebSocket is still connected before sending
-                        if websocket.client_state.name != 'CONNECTED':
+                        if ctx.websocket.client_state.name != 'CONNECTED':
                             logger.warning("WebSocket not connected, stopping receive")
                             break
                             
                         # Xử lý turn detection events
                         if hasattr(response, 'turn_detection') and response.turn_detection:
                             if hasattr(response.turn_detection, 'type'):
-                                await self._send_safely(websocket, {
+                                await self._send_safely(ctx, {
                                     "turn_detection": {
                                         "type": response.turn_detection.type
                                     }
@@ -601,12 +832,18 @@ class GeminiService:
                         
                         # Handle tool calls
                         if hasattr(response, 'tool_call') and response.tool_call:
-                            await self._handle_tool_calls(websocket, session, response.tool_call)
+                            await self._handle_tool_calls(ctx, session, response.tool_call)
                             continue
                         
                         if response.server_content and hasattr(response.server_content, 'interrupted') and response.server_content.interrupted is not None:
                             logger.info(f"[{datetime.datetime.now()}] Generation interrupted")
-                            await self._send_safely(websocket, {"interrupted": "True"})
+                            # Drop assistant audio the client has not received yet
+                            ctx.protocol.interrupted()
+                            ctx.turn_audio_started = False
+                            purged = ctx.outbound.purge(PRIORITY_AUDIO)
+                            if purged:
+                                logger.info(f"Purged {purged} queued audio frames after interrupt")
+                            await self._send_safely(ctx, {"interrupted": "True"})
                             continue
 
                         if response.usage_metadata:
@@ -617,7 +854,7 @@ class GeminiService:
                             update = response.session_resumption_update
                             if update.resumable and update.new_handle:
                                 # The handle should be retained and linked to the session.
-                                self.session_service.save_previous_session_handle(update.new_handle)
+                                self.resumption_store.put(ctx.user_id, ctx.device_id, update.new_handle, ctx.session_id)
                                 logger.info(f"Resumed session update with handle: {update.new_handle}")
 
                         if response.server_content and hasattr(response.server_content, 'output_transcription') and response.server_content.output_transcription is not None:
@@ -630,21 +867,21 @@ class GeminiService:
                                 if is_finished:
                                     logger.info("   [Hoàn thành]")
                             
-                            await self._send_safely(websocket, {
+                            await self._send_safely(ctx, {
                                 "transcription": {
                                     "text": transcription_text,
                                     "sender": "Gemini",
                                     "finished": is_finished
                                 }
-                            })
+                            }, PRIORITY_TEXT)
                             # Accumulate assistant transcription
                             if transcription_text:
-                                self._current_assistant_output += transcription_text
+                                ctx.current_assistant_output += transcription_text
 
                             # When assistant transcription finished, store to history
-                            if is_finished and self._current_assistant_output.strip():
-                                self._append_to_conversation_history("assistant", self._current_assistant_output.strip())
-                                self._current_assistant_output = ""
+                            if is_finished and ctx.current_assistant_output.strip():
+                                self._append_to_conversation_history(ctx, "assistant", ctx.current_assistant_output.strip())
+                                ctx.current_assistant_output = ""
 
                         if response.server_content and hasattr(response.server_content, 'input_transcription') and response.server_content.input_transcription is not None:
                             user_transcription_text = response.server_content.input_transcription.text
@@ -657,20 +894,21 @@ class GeminiService:
                                     logger.info("   [Hoàn thành]")
                             # Accumulate user transcription
                             if user_transcription_text:
-                                self._current_user_input += user_transcription_text
+                                ctx.current_user_input += user_transcription_text
+                                ctx.last_user_input_at = time.monotonic()
                             
-                            await self._send_safely(websocket, {
+                            await self._send_safely(ctx, {
                                 "transcription": {
                                     "text": user_transcription_text,
                                     "sender": "User",
                                     "finished": is_user_finished
                                 }
-                            })
+                            }, PRIORITY_TEXT)
 
                             # When user transcription finished, store to history
-                            if is_user_finished and self._current_user_input.strip():
-                                self._append_to_conversation_history("user", self._current_user_input.strip())
-                                self._current_user_input = ""
+                            if is_user_finished and ctx.current_user_input.strip():
+                                self._append_to_conversation_history(ctx, "user", ctx.current_user_input.strip())
+                                ctx.current_user_input = ""
 
                         if response.server_content is None:
                             continue
@@ -679,38 +917,49 @@ class GeminiService:
                         if model_turn:
                             for part in model_turn.parts:
                                 if hasattr(part, 'text') and part.text is not None:
-                                    await self._send_safely(websocket, {"text": part.text})
+                                    await self._send_safely(ctx, {"text": part.text}, PRIORITY_TEXT)
                                 
                                 elif hasattr(part, 'inline_data') and part.inline_data is not None:
                                     try:
                                         audio_data = part.inline_data.data
-                                        base64_audio = base64.b64encode(audio_data).decode('utf-8')
-                                        await self._send_safely(websocket, {
-                                            "audio": base64_audio,
-                                        })
-                                        #logger.debug(f"Sent assistant audio to client: {base64_audio[:32]}...")
+                                        if not ctx.turn_audio_started:
+                                            self._record_first_audio(ctx)
+                                        if ctx.protocol.binary_audio:
+                                            # Raw PCM / Opus packets as binary frames, no base64
+                                            for frame in ctx.protocol.encode_audio(audio_data):
+                                                await self._send_bytes_safely(ctx, frame)
+                                        else:
+                                            base64_audio = base64.b64encode(audio_data).decode('utf-8')
+                                            await self._send_safely(ctx, {
+                                                "audio": base64_audio,
+                                            }, PRIORITY_AUDIO)
+                                        #logger.debug(f"Sent assistant audio to client: {len(audio_data)} bytes")
                                     except Exception as e:
                                         logger.error(f"Error processing assistant audio: {e}")
                         
                         if response.server_content and response.server_content.turn_complete:
                             logger.info('\n<Turn complete>')
+                            ctx.turn_audio_started = False
+                            # Flush the Opus tail before the turn-complete marker
+                            for frame in ctx.protocol.end_of_turn():
+                                await self._send_bytes_safely(ctx, frame)
                             logger.info("="*50)  # Thêm dòng phân cách rõ ràng hơn
-                            await self._send_safely(websocket, {
+                            await self._send_safely(ctx, {
                                 "transcription": {
                                     "text": "",
                                     "sender": "Gemini",
                                     "finished": True
                                 }
-                            })
+                            }, PRIORITY_TEXT)
 
                             # Persist any remaining buffered texts at end of turn
-                            if self._current_user_input.strip():
-                                self._append_to_conversation_history("user", self._current_user_input.strip())
-                                self._current_user_input = ""
+                            if ctx.current_user_input.strip():
+                                self._append_to_conversation_history(ctx, "user", ctx.current_user_input.strip())
+                                ctx.current_user_input = ""
 
-                            if self._current_assistant_output.strip():
-                                self._append_to_conversation_history("assistant", self._current_assistant_output.strip())
-                                self._current_assistant_output = ""
+                            if ctx.current_assistant_output.strip():
+                                self._append_to_conversation_history(ctx, "assistant", ctx.current_assistant_output.strip())
+                                ctx.current_assistant_output = ""
                             
                 except WebSocketDisconnect:
                     logger.info("WebSocket disconnected during receive")
@@ -726,20 +975,37 @@ class GeminiService:
         finally:
             logger.info("Gemini connection closed (receive)")
     
-    async def _send_safely(self, websocket: WebSocket, data: dict):
-        """Safely send data to WebSocket with error handling.
+    def _record_first_audio(self, ctx: LiveSessionContext):
+        """Record time-to-first-audio metrics for the current model turn.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
+        """
+        now = time.monotonic()
+        ctx.turn_audio_started = True
+        if ctx.first_audio_at is None:
+            ctx.first_audio_at = now
+            self.latency_stats.record("first_audio_ms", (now - ctx.opened_monotonic) * 1000)
+        if ctx.last_user_input_at is not None:
+            self.latency_stats.record("response_audio_ms", (now - ctx.last_user_input_at) * 1000)
+            ctx.last_user_input_at = None
+
+    async def _send_safely(self, ctx: LiveSessionContext, data: dict, priority: int = PRIORITY_CONTROL):
+        """Queue JSON data for the connection's writer task.
+        
+        Never waits on the client's network; a slow client only fills its
+        own outbound queue.
+        
+        Args:
+            ctx: Live session context for the connection.
             data: Data to send.
+            priority: PRIORITY_CONTROL, PRIORITY_TEXT or PRIORITY_AUDIO.
         """
         try:
+            websocket = ctx.websocket
             # Check if WebSocket is still connected before sending
             if hasattr(websocket, 'client_state') and websocket.client_state.name == 'CONNECTED':
-                # Serialize sends for this connection
-                lock = self._get_send_lock(websocket)
-                async with lock:
-                    await websocket.send_text(json.dumps(data))
+                ctx.outbound.put_json(data, priority)
             else:
                 logger.warning("Attempted to send data to disconnected WebSocket")
         except Exception as e:
@@ -747,10 +1013,27 @@ class GeminiService:
             # Don't re-raise for non-critical errors to maintain connection stability
             pass
 
-    def _append_to_conversation_history(self, role: str, text: str):
-        """Append a new message to the conversation history and persist it.
+    async def _send_bytes_safely(self, ctx: LiveSessionContext, data: bytes):
+        """Queue a binary audio frame for the connection's writer task.
+        
+        Args:
+            ctx: Live session context for the connection.
+            data: Raw frame payload.
+        """
+        try:
+            websocket = ctx.websocket
+            if hasattr(websocket, 'client_state') and websocket.client_state.name == 'CONNECTED':
+                ctx.outbound.put(data, PRIORITY_AUDIO)
+            else:
+                logger.warning("Attempted to send audio to disconnected WebSocket")
+        except Exception as e:
+            logger.error(f"Error sending audio to WebSocket: {e}")
+
+    def _append_to_conversation_history(self, ctx: LiveSessionContext, role: str, text: str):
+        """Append a new message to the session's conversation history and persist it.
 
         Args:
+            ctx: Live session context for the connection.
             role: "user" or "assistant".
             text: Message content.
         """
@@ -759,52 +1042,39 @@ class GeminiService:
             "text": text,
             "timestamp": datetime.datetime.now().isoformat()
         }
-        self.conversation_history.append(entry)
+        ctx.conversation_history.append(entry)
         
         # Save to database if available
-        if self.conversation_service and self.current_conversation_id:
+        if self.conversation_service and ctx.conversation_id:
             try:
                 # Convert role to enum
                 from db.models import ConversationRole
                 db_role = ConversationRole.USER if role == "user" else ConversationRole.ASSISTANT
                 
-                # Save message to database asynchronously
-                asyncio.create_task(self._save_message_to_database(db_role, text))
+                # Queue for batched write-behind persistence
+                self.message_writer.enqueue(
+                    ctx.conversation_id,
+                    db_role,
+                    text,
+                    timestamp=datetime.datetime.fromisoformat(entry["timestamp"])
+                )
             except Exception as e:
-                logger.error(f"Error saving message to database: {e}")
-        
-        # Also persist to file as backup
-        try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.conversation_history_file) or ".", exist_ok=True)
-            with open(self.conversation_history_file, "w", encoding="utf-8") as f:
-                json_lib.dump(self.conversation_history, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            logger.error(f"Failed to save conversation history to file: {e}")
-    
-    async def _save_message_to_database(self, role, content: str):
-        """Save a message to the database.
+                logger.error(f"Error queueing message for database: {e}")
         
-        Args:
-            role: ConversationRole enum value
-            content: Message content
-        """
+        # Also persist to the conversation journal as backup (buffered, flushed off the event loop)
         try:
-            if self.conversation_service and self.current_conversation_id:
-                await self.conversation_service.add_message(
-                    conversation_id=self.current_conversation_id,
-                    role=role,
-                    content=content
-                )
+            self.conversation_journal.append(ctx.journal_key, entry)
         except Exception as e:
-            logger.error(f"Failed to save message to database: {e}")
+            logger.error(f"Failed to journal conversation message: {e}")
     
-    async def extract_memoir_on_disconnect(self):
+    async def extract_memoir_on_disconnect(self, ctx: LiveSessionContext):
         """Extract memoir from entire conversation history when client disconnects.
         
         This method is called once when the WebSocket connection ends to process
         the complete conversation and extract important memoir information.
+        
+        Args:
+            ctx: Live session context of the finished connection.
         """
         try:
             # Skip if memoir service is not available
@@ -813,14 +1083,15 @@ class GeminiService:
                 return
                 
             # Check if we have any conversation to process
-            if not self.conversation_history or len(self.conversation_history) == 0:
+            if not ctx.conversation_history:
                 logger.info("No conversation history to process for memoir extraction")
                 return
                 
-            logger.info(f"🎭 Starting final memoir extraction for {len(self.conversation_history)} messages...")
+            logger.info(f"🎭 Starting final memoir extraction for {len(ctx.conversation_history)} messages...")
             
-            # Process the entire conversation history at once
-            result = await self.memoir_extraction_service.process_conversation_history_background()
+            # Process this conversation's journal at once (buffered lines written first)
+            await self.conversation_journal.flush(ctx.journal_key)
+            result = await self.memoir_extraction_service.process_conversation_history_background(ctx.journal_key)
             
             if result.get("success"):
                 if result.get("extracted_info"):
@@ -836,11 +1107,11 @@ class GeminiService:
             logger.error(f"Error in final memoir extraction: {e}")
             # Don't let memoir extraction errors affect the main conversation flow
 
-    async def _handle_voice_notification_request(self, websocket: WebSocket, request_data: dict):
+    async def _handle_voice_notification_request(self, ctx: LiveSessionContext, request_data: dict):
         """Handle voice notification generation request.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
             request_data: Voice notification request data.
         """
         try:
@@ -851,7 +1122,7 @@ class GeminiService:
             logger.info(f"Generating voice notification: {notification_text} (type: {notification_type})")
             
             if not notification_text:
-                await self._send_safely(websocket, {
+                await self._send_safely(ctx, {
                     "type": "voice_notification_response",
                     "success": False,
                     "error": "Notification text is required",
@@ -859,31 +1130,58 @@ class GeminiService:
                 })
                 return
             
-            # Generate voice notification
-            if notification_type == "emergency":
-                audio_base64 = await self.notification_voice_service.generate_voice_notification_base64(
-                    f"THÔNG BÁO KHẨN CẤP: {notification_text}"
+            spoken_text = f"THÔNG BÁO KHẨN CẤP: {notification_text}" if notification_type == "emergency" else notification_text
+            
+            if request_data.get("stream"):
+                # Chunks are forwarded as they are synthesized (start / chunk+seq / end messages)
+                stream = VoiceChunkStream(notification_text, notification_type, request_id)
+                # Same priority for every message so the end marker never overtakes a chunk
+                delivered = await send_voice_stream(
+                    self.notification_voice_service.stream_voice_notification(spoken_text),
+                    stream,
+                    lambda message: self._send_safely(ctx, message, PRIORITY_TEXT),
                 )
+                logger.info(f"Voice notification streamed in {stream.seq} chunks (success={delivered}): {notification_text}")
+                return
+            
+            # Generate voice notification in the codec the client negotiated
+            if request_data.get("audio_codecs"):
+                codec = negotiate_codec(request_data.get("audio_codecs"))
+            else:
+                codec = websocket_manager.get_audio_codec(ctx.websocket)
+            if "audio_delivery" in request_data:
+                by_reference = request_data.get("audio_delivery") == AUDIO_DELIVERY_URL
+            else:
+                by_reference = websocket_manager.is_audio_by_reference(ctx.websocket)
+            
+            if by_reference:
+                artifact = await self.notification_voice_service.generate_voice_notification_artifact(spoken_text, codec)
+                audio_data = {
+                    "audio_url": artifact["url"],
+                    "audio_hash": artifact["hash"],
+                    "audio_size": artifact["size"],
+                    "audio_format": artifact["audio_format"],
+                } if artifact else None
             else:
-                audio_base64 = await self.notification_voice_service.generate_voice_notification_base64(notification_text)
+                payload = await self.notification_voice_service.generate_voice_notification_payload(spoken_text, codec)
+                audio_data = {"audio_base64": payload[0], "audio_format": payload[1]} if payload else None
             
-            if audio_base64:
+            if audio_data:
                 response_data = {
                     "type": "voice_notification_response",
                     "success": True,
                     "data": {
                         "notification_text": notification_text,
-                        "audio_base64": audio_base64,
-                        "audio_format": "audio/pcm",
+                        **audio_data,
                         "notification_type": notification_type,
                         "timestamp": datetime.datetime.now().isoformat(),
                     },
                     "request_id": request_id
                 }
-                await self._send_safely(websocket, response_data)
+                await self._send_safely(ctx, response_data)
                 logger.info(f"Voice notification generated successfully for: {notification_text}")
             else:
-                await self._send_safely(websocket, {
+                await self._send_safely(ctx, {
                     "type": "voice_notification_response",
                     "success": False,
                     "error": "Failed to generate voice notification",
@@ -893,18 +1191,18 @@ class GeminiService:
                 
         except Exception as e:
             logger.error(f"Error handling voice notification request: {e}")
-            await self._send_safely(websocket, {
+            await self._send_safely(ctx, {
                 "type": "voice_notification_response",
                 "success": False,
                 "error": str(e),
                 "request_id": request_data.get("request_id", "")
             })
 
-    async def _handle_tool_calls(self, websocket: WebSocket, session, tool_call):
+    async def _handle_tool_calls(self, ctx: LiveSessionContext, session, tool_call):
         """Handle tool calls from Gemini and send responses.
         
         Args:
-            websocket: FastAPI WebSocket instance.
+            ctx: Live session context for the connection.
             session: Gemini live session.
             tool_call: Tool call response from Gemini.
         """
@@ -931,7 +1229,7 @@ class GeminiService:
                 logger.info("-" * 40)
                 
                 # Send tool call notification to frontend
-                await self._send_safely(websocket, {
+                await self._send_safely(ctx, {
                     "type": "tool_call",
                     "function_name": function_name,
                     "function_id": function_id,
@@ -944,7 +1242,7 @@ class GeminiService:
                     logger.info("   📱 Action: Chuyển về màn hình chính")
                     
                     # Send response to frontend to switch to main screen
-                    await self._send_safely(websocket, {
+                    await self._send_safely(ctx, {
                         "type": "screen_navigation",
                         "action": "switch_to_main_screen",
                         "message": "Đang chuyển sang màn hình chính...",
@@ -965,7 +1263,7 @@ class GeminiService:
                     logger.info("   📱 Action: Chuyển sang màn hình quét thuốc")
                     
                     # Send response to frontend to switch to medicine scan screen
-                    await self._send_safely(websocket, {
+                    await self._send_safely(ctx, {
                         "type": "screen_navigation",
                         "action": "switch_to_medicine_scan_screen", 
                         "message": "Đang chuyển sang màn hình quét thuốc...",
@@ -988,14 +1286,15 @@ class GeminiService:
                     # Get the arguments from function call
                     function_args = getattr(function_call, 'args', {})
                     memory_content = function_args.get('content', '')
+                    memory_category = function_args.get('category')
                     
                     if memory_content:
-                        # Update user memory file
-                        success = await self._update_user_memory(memory_content)
+                        # Store in the session user's memory
+                        success = await self._update_user_memory(memory_content, ctx.user_id, memory_category)
                         
                         if success:
                             # Send notification to frontend
-                            await self._send_safely(websocket, {
+                            await self._send_safely(ctx, {
                                 "type": "memory_update",
                                 "action": "update_system_prompt",
                                 "message": "Đã ghi nhớ thông tin mới về bạn",
@@ -1124,80 +1423,83 @@ class GeminiService:
             logger.error(f"Error analyzing image with Gemini: {e}")
             raise e
 
-    async def _update_user_memory(self, content: str) -> bool:
-        """Update user memory file with new information.
+    async def _update_user_memory(self, content: str, user_id: Optional[str] = None, category: Optional[str] = None) -> bool:
+        """Remember new information about a user.
         
         Args:
             content: New information to remember about the user.
+            user_id: User the information belongs to. Shared memory if None.
+            category: Optional MEMORY_CATEGORIES key chosen by the model.
             
         Returns:
             True if successful, False otherwise.
         """
         try:
-            # Ensure user_memory directory exists
-            memory_dir = os.path.join(os.path.dirname(__file__), '..', 'user_memory')
-            os.makedirs(memory_dir, exist_ok=True)
-            
-            # Path to user memory file
-            memory_file = os.path.join(memory_dir, 'user_memory.txt')
-            
-            # Read existing content if file exists
-            existing_content = ""
-            if os.path.exists(memory_file):
-                try:
-                    with open(memory_file, 'r', encoding='utf-8') as f:
-                        existing_content = f.read().strip()
-                except Exception as e:
-                    logger.warning(f"Could not read existing memory file: {e}")
-            
-            # Prepare new content with timestamp
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            new_entry = f"\n\n# {timestamp}\n{content}"
-            
-            # Combine existing and new content
-            updated_content = existing_content + new_entry
-            
-            # Write to file
-            with open(memory_file, 'w', encoding='utf-8') as f:
-                f.write(updated_content)
-            
-            logger.info(f"✅ User memory updated successfully: {content[:50]}...")
+            user_key = user_id or SHARED_USER_KEY
+            result = await asyncio.to_thread(self.memory_store.add_fact, user_key, content, category)
+            logger.info(f"✅ User memory {result['status']} ({result['category']}): {content[:50]}...")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to update user memory: {e}")
             return False
 
-    def _load_user_memory(self) -> str:
-        """Load user memory content from file.
+    def _load_user_memory(self, user_id: Optional[str] = None) -> str:
+        """Load the most relevant remembered facts about a user.
         
+        Facts are ranked without a query (category, mentions, recency): memory
+        is loaded before the first turn, when there is nothing to match yet, and
+        the text is baked into live configs cached per memory version, so it must
+        not depend on the conversation.
+        
+        Args:
+            user_id: User whose memory is loaded. Shared memory if None.
+            
         Returns:
-            User memory content as string, empty string if file doesn't exist.
+            Bounded, categorized memory text, empty string if nothing is remembered.
         """
         try:
-            memory_file = os.path.join(os.path.dirname(__file__), '..', 'user_memory', 'user_memory.txt')
-            
-            if os.path.exists(memory_file):
-                with open(memory_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    logger.info(f"✅ User memory loaded successfully ({len(content)} characters)")
-                    return content
+            content = self.memory_store.format_for_prompt(user_id or SHARED_USER_KEY)
+            if content:
+                logger.info(f"✅ User memory loaded successfully ({len(content)} characters)")
             else:
-                logger.info("ℹ️ User memory file does not exist yet")
-                return ""
+                logger.info("ℹ️ No user memory stored yet")
+            return content
                 
         except Exception as e:
             logger.error(f"❌ Failed to load user memory: {e}")
             return ""
 
-    def _get_enhanced_system_instruction(self) -> str:
+    async def _send_user_memory_context(self, ctx: LiveSessionContext, session):
+        """Send the session user's remembered facts to Gemini as initial context.
+        
+        Args:
+            ctx: Live session context for the connection.
+            session: Gemini live session.
+        """
+        try:
+            user_memory = await asyncio.to_thread(self._load_user_memory, ctx.user_id)
+            if not user_memory:
+                return
+            await session.send_client_content(
+                turns={"role": "user", "parts": [{"text": f"THÔNG TIN GHI NHỚ VỀ NGƯỜI DÙNG:\n{user_memory}\n\nLƯU Ý: Sử dụng thông tin trên để đưa ra câu trả lời phù hợp và cá nhân hóa hơn cho người dùng."}]},
+                turn_complete=False
+            )
+            logger.info(f"✅ Sent user memory context for session {ctx.session_id} ({len(user_memory)} characters)")
+        except Exception as e:
+            logger.error(f"❌ Failed to send user memory context: {e}")
+
+    def _get_enhanced_system_instruction(self, user_id: Optional[str] = None) -> str:
         """Get enhanced system instruction with user memory.
         
+        Args:
+            user_id: User whose memory is included. Shared memory if None.
+        
         Returns:
             Enhanced system instruction combining base instruction with user memory.
         """
         base_instruction = self.SYSTEM_INSTRUCTION
-        user_memory = self._load_user_memory()
+        user_memory = self._load_user_memory(user_id)
         
         if user_memory:
             enhanced_instruction = f"{base_instruction}\n\nTHÔNG TIN GHI NHỚ VỀ NGƯỜI DÙNG:\n{user_memory}\n\nLƯU Ý: Sử dụng thông tin trên để đưa ra câu trả lời phù hợp và cá nhân hóa hơn cho người dùng."
@@ -0,0 +1,91 @@
+"""
+Cache of built LiveConnectConfig objects
+
+Building a LiveConnectConfig (tool declarations, speech config, system
+instruction with user memory) is identical for every connection of the same
+user until that user's memory changes. Configs are cached per
+``(user_id, memory_version)``; only the session resumption handle varies per
+connect and is applied to a shallow copy.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+class LiveConfigCache:
+    """LRU cache of resumption-free LiveConnectConfig objects."""
+
+    def __init__(self, max_entries: int = 256):
+        """Initialize config cache.
+
+        Args:
+            max_entries: Maximum cached (user, memory version) combinations.
+        """
+        self.max_entries = max_entries
+        self._configs: "OrderedDict[Tuple[Optional[str], Hashable], types.LiveConnectConfig]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        user_id: Optional[str],
+        memory_version: Hashable,
+        builder: Callable[[], types.LiveConnectConfig],
+        previous_session_handle: Optional[str] = None,
+    ) -> types.LiveConnectConfig:
+        """Get the config for a connect, building it on a miss.
+
+        Args:
+            user_id: User the session belongs to (None for anonymous sessions).
+            memory_version: Version of the user's memory baked into the instruction.
+            builder: Builds the config without session resumption.
+            previous_session_handle: Resumption handle for this connect, if any.
+
+        Returns:
+            LiveConnectConfig. Never mutate it - it may be shared.
+        """
+        key = (user_id, memory_version)
+        with self._lock:
+            config = self._configs.get(key)
+            if config is not None:
+                self._configs.move_to_end(key)
+                self.hits += 1
+        if config is None:
+            config = builder()
+            with self._lock:
+                self.misses += 1
+                # Older memory versions of this user can never be hit again
+                for stale_key in [k for k in self._configs if k[0] == user_id and k != key]:
+                    del self._configs[stale_key]
+                self._configs[key] = config
+                while len(self._configs) > self.max_entries:
+                    self._configs.popitem(last=False)
+
+        if previous_session_handle:
+            return config.model_copy(update={
+                "session_resumption": types.SessionResumptionConfig(handle=previous_session_handle)
+            })
+        return config
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Drop cached configs of one user, or all of them."""
+        with self._lock:
+            if user_id is None:
+                self._configs.clear()
+            else:
+                for key in [k for k in self._configs if k[0] == user_id]:
+                    del self._configs[key]
+
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        return {
+            "entries": len(self._configs),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,189 @@
+"""
+Camera frame gate for Gemini Live
+
+The Android client streams camera frames continuously, even when the scene
+is static (e.g. a medicine box held in front of the camera). Each frame is
+billed as image input, so ``ImageFrameGate`` only forwards frames that
+changed meaningfully since the last forwarded one:
+
+- the frame is decoded at reduced resolution (JPEG DCT scaling, cheap) and
+  reduced to a 64-bit difference hash
+- frames whose hash is within LIVE_IMAGE_HASH_THRESHOLD bits of the last
+  forwarded frame are dropped, as are frames arriving faster than
+  LIVE_IMAGE_MIN_INTERVAL
+- forwarded frames are downscaled to LIVE_IMAGE_MAX_DIMENSION and re-encoded
+  as JPEG when that makes them smaller
+
+The gate is off unless LIVE_IMAGE_GATE_ENABLED is set. Without OpenCV, or
+when a frame cannot be decoded, frames pass through unchanged.
+"""
+import logging
+import time
+from typing import Iterable, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# OpenCV is in requirements, but keep the live path working without it
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    np = None
+    OPENCV_AVAILABLE = False
+
+HASH_SIZE = 8
+
+
+class ImageFrameGate:
+    """Per-connection change detector and downscaler for camera frames."""
+
+    def __init__(
+        self,
+        enabled: bool = None,
+        hash_threshold: int = None,
+        min_interval: float = None,
+        max_dimension: int = None,
+        jpeg_quality: int = None,
+    ):
+        """Initialize image gate.
+
+        Args:
+            enabled: Drop unchanged frames and downscale. Uses settings if None;
+                always off when OpenCV is not installed.
+            hash_threshold: Differing hash bits (of 64) below which a frame
+                counts as unchanged.
+            min_interval: Minimum seconds between forwarded frames.
+            max_dimension: Longest side of forwarded frames in pixels.
+            jpeg_quality: JPEG quality used when re-encoding.
+        """
+        if enabled is None:
+            enabled = settings.LIVE_IMAGE_GATE_ENABLED
+        self.enabled = bool(enabled) and OPENCV_AVAILABLE
+        self.hash_threshold = settings.LIVE_IMAGE_HASH_THRESHOLD if hash_threshold is None else hash_threshold
+        self.min_interval = settings.LIVE_IMAGE_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_dimension = max_dimension or settings.LIVE_IMAGE_MAX_DIMENSION
+        self.jpeg_quality = jpeg_quality or settings.LIVE_IMAGE_JPEG_QUALITY
+        self._last_hash: Optional[int] = None
+        self._last_sent_at: Optional[float] = None
+        # Stats
+        self.frames_in = 0
+        self.frames_out = 0
+        self.frames_unchanged = 0
+        self.frames_throttled = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def _dhash(gray) -> int:
+        """64-bit difference hash of a grayscale image."""
+        small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bit)
+        return value
+
+    def _hash_frame(self, data: bytes) -> Optional[int]:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        # Reduced decode only scales the DCT for JPEG; other formats decode fully
+        gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            return None
+        return self._dhash(gray)
+
+    def _downscale(self, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """Resize to max_dimension and re-encode as JPEG if that is smaller."""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return data, mime_type
+        height, width = image.shape[:2]
+        scale = self.max_dimension / float(max(height, width))
+        if scale < 1.0:
+            image = cv2.resize(
+                image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA
+            )
+        ok, encoded = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), int(self.jpeg_quality)])
+        if not ok or (scale >= 1.0 and len(encoded) >= len(data)):
+            return data, mime_type
+        return encoded.tobytes(), "image/jpeg"
+
+    def process(self, data: bytes, mime_type: str) -> Optional[Tuple[bytes, str]]:
+        """Decide whether to forward a frame. CPU-bound; run it off the event loop.
+
+        Args:
+            data: Encoded image bytes from the client.
+            mime_type: MIME type of ``data``.
+
+        Returns:
+            (image bytes, MIME type) to send to Gemini, or None to drop the frame.
+        """
+        self.frames_in += 1
+        self.bytes_in += len(data)
+        if not self.enabled:
+            return self._forward(data, mime_type)
+
+        now = time.monotonic()
+        if self._last_sent_at is not None and now - self._last_sent_at < self.min_interval:
+            self.frames_throttled += 1
+            return None
+        try:
+            frame_hash = self._hash_frame(data)
+        except Exception as e:
+            logger.warning(f"Could not hash camera frame: {e}")
+            frame_hash = None
+        if frame_hash is None:
+            return self._forward(data, mime_type)
+        if self._last_hash is not None and bin(frame_hash ^ self._last_hash).count("1") < self.hash_threshold:
+            self.frames_unchanged += 1
+            return None
+
+        try:
+            data, mime_type = self._downscale(data, mime_type)
+        except Exception as e:
+            logger.warning(f"Could not downscale camera frame: {e}")
+        self._last_hash = frame_hash
+        self._last_sent_at = now
+        return self._forward(data, mime_type)
+
+    def _forward(self, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        self.frames_out += 1
+        self.bytes_out += len(data)
+        return data, mime_type
+
+    def reset(self) -> None:
+        """Forget the last frame so the next one is always forwarded."""
+        self._last_hash = None
+        self._last_sent_at = None
+
+    def get_stats(self) -> dict:
+        """Get gate statistics."""
+        return {
+            "enabled": self.enabled,
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "frames_unchanged": self.frames_unchanged,
+            "frames_throttled": self.frames_throttled,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+def aggregate_stats(gates: Iterable[ImageFrameGate]) -> dict:
+    """Sum frame savings over several gates."""
+    totals = {
+        "frames_in": 0,
+        "frames_out": 0,
+        "frames_unchanged": 0,
+        "frames_throttled": 0,
+        "bytes_in": 0,
+        "bytes_out": 0,
+    }
+    for gate in gates:
+        stats = gate.get_stats()
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
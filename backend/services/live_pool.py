@@ -0,0 +1,296 @@
+"""
+Gemini Live connection helpers: background connects, warm pool, latency stats
+
+``client.aio.live.connect`` is an async context manager, so each
+``LiveConnection`` enters it inside its own task and keeps it open until
+released. That lets the handshake start before the client's config message
+arrives (or long before the client connects at all, for the warm pool) while
+still exiting the context from the task that entered it.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LiveConnection:
+    """A Gemini Live session opened in a background task."""
+
+    def __init__(self, client, model: str, config, source: str = "direct"):
+        """Initialize live connection.
+
+        Args:
+            client: genai.Client (or a stub with the same ``aio.live`` surface).
+            model: Live model name.
+            config: LiveConnectConfig for the session.
+            source: Label for metrics ("speculative", "warm_pool", ...).
+        """
+        self.client = client
+        self.model = model
+        self.config = config
+        self.source = source
+        self.created_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self._session_future: Optional[asyncio.Future] = None
+        self._release = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "LiveConnection":
+        """Begin connecting on the running loop."""
+        if self._task is None:
+            self._session_future = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self) -> None:
+        future = self._session_future
+        try:
+            async with self.client.aio.live.connect(model=self.model, config=self.config) as session:
+                self.ready_at = time.monotonic()
+                if not future.done():
+                    future.set_result(session)
+                await self._release.wait()
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            else:
+                logger.warning(f"Live connection ({self.source}) closed with error: {e}")
+
+    @property
+    def age(self) -> float:
+        """Seconds since the connect was started."""
+        return time.monotonic() - self.created_at
+
+    @property
+    def is_ready(self) -> bool:
+        """Connected, not failed and not yet released."""
+        future = self._session_future
+        return (
+            future is not None
+            and future.done()
+            and not future.cancelled()
+            and future.exception() is None
+            and not self._task.done()
+        )
+
+    @property
+    def connect_ms(self) -> Optional[float]:
+        """Handshake duration, once connected."""
+        if self.ready_at is None:
+            return None
+        return (self.ready_at - self.created_at) * 1000
+
+    async def wait_ready(self, timeout: float = None):
+        """Wait for the session.
+
+        Returns:
+            The live session object yielded by ``connect``.
+
+        Raises:
+            Whatever the connect raised, or asyncio.TimeoutError.
+        """
+        self.start()
+        return await asyncio.wait_for(asyncio.shield(self._session_future), timeout=timeout)
+
+    async def close(self) -> None:
+        """Release the session and wait for the context to exit."""
+        self._release.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout=settings.WEBSOCKET_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        except Exception:
+            pass
+        # Retrieve a failed connect so it is not reported as never retrieved
+        future = self._session_future
+        if future is not None and future.done() and not future.cancelled():
+            future.exception()
+
+
+class WarmSessionPool:
+    """Small pool of pre-opened live sessions for connections without a resumption handle."""
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        config_factory: Callable[[], object],
+        size: int = None,
+        max_age: float = None,
+    ):
+        """Initialize warm session pool.
+
+        Args:
+            client: genai.Client used to connect.
+            model: Live model name.
+            config_factory: Builds the LiveConnectConfig for a fresh (non-resumed) session.
+            size: Sessions to keep open. 0 disables the pool.
+            max_age: Seconds before an unused session is recycled.
+        """
+        self.client = client
+        self.model = model
+        self.config_factory = config_factory
+        self.size = settings.LIVE_WARM_POOL_SIZE if size is None else size
+        self.max_age = max_age or settings.LIVE_WARM_POOL_MAX_AGE
+        self._connections: Deque[LiveConnection] = deque()
+        self._refill = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self) -> None:
+        """Start the background refill task on the running loop."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._maintain_loop())
+            logger.info(f"Warm live session pool started (size={self.size})")
+
+    async def _maintain_loop(self) -> None:
+        try:
+            while True:
+                await self._maintain()
+                try:
+                    await asyncio.wait_for(self._refill.wait(), timeout=min(self.max_age / 4, 30.0))
+                except asyncio.TimeoutError:
+                    pass
+                self._refill.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Warm live session pool stopped: {e}")
+
+    async def _maintain(self) -> None:
+        """Drop stale or failed sessions and top the pool back up."""
+        keep: Deque[LiveConnection] = deque()
+        stale: List[LiveConnection] = []
+        for connection in self._connections:
+            pending = connection.ready_at is None and not connection._task.done()
+            if pending or (connection.is_ready and connection.age < self.max_age):
+                keep.append(connection)
+            else:
+                if not connection.is_ready and not pending:
+                    self.failed += 1
+                else:
+                    self.recycled += 1
+                stale.append(connection)
+        self._connections = keep
+        for connection in stale:
+            await connection.close()
+        while len(self._connections) < self.size:
+            try:
+                config = self.config_factory()
+            except Exception as e:
+                logger.error(f"Failed to build config for warm live session: {e}")
+                return
+            self._connections.append(LiveConnection(self.client, self.model, config, "warm_pool").start())
+
+    def acquire(self) -> Optional[LiveConnection]:
+        """Take a ready session out of the pool, if one is available."""
+        if not self.enabled:
+            return None
+        while self._connections:
+            connection = self._connections.popleft()
+            if connection.is_ready and connection.age < self.max_age:
+                self.hits += 1
+                self._refill.set()
+                return connection
+            if connection.ready_at is None and not connection._task.done():
+                # Still connecting - keep it for the next caller
+                self._connections.appendleft(connection)
+                break
+            asyncio.create_task(connection.close())
+        self.misses += 1
+        self._refill.set()
+        return None
+
+    async def invalidate(self) -> None:
+        """Close all pooled sessions (e.g. after the system instruction changed)."""
+        connections, self._connections = list(self._connections), deque()
+        for connection in connections:
+            await connection.close()
+        self.recycled += len(connections)
+        self._refill.set()
+
+    async def shutdown(self) -> None:
+        """Stop refilling and close every pooled session."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        connections, self._connections = list(self._connections), deque()
+        for connection in connections:
+            await connection.close()
+
+    def get_stats(self) -> dict:
+        """Get pool statistics."""
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "warm": sum(1 for c in self._connections if c.is_ready),
+            "connecting": sum(1 for c in self._connections if c.ready_at is None),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recycled": self.recycled,
+            "failed": self.failed,
+        }
+
+
+class LiveLatencyStats:
+    """Rolling latency samples (milliseconds) for the live path."""
+
+    def __init__(self, window: int = 500):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self.window = window
+
+    def record(self, metric: str, value_ms: Optional[float]) -> None:
+        """Add a sample to ``metric``."""
+        if value_ms is None:
+            return
+        self._samples.setdefault(metric, deque(maxlen=self.window)).append(value_ms)
+
+    def count(self, name: str) -> None:
+        """Increment a counter (e.g. the connect source of a session)."""
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    @staticmethod
+    def _percentile(ordered: List[float], pct: float) -> float:
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_stats(self) -> dict:
+        """Summaries per metric plus counters."""
+        summary = {}
+        for metric, samples in self._samples.items():
+            ordered = sorted(samples)
+            summary[metric] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered), 1),
+                "p50_ms": round(self._percentile(ordered, 50), 1),
+                "p95_ms": round(self._percentile(ordered, 95), 1),
+                "last_ms": round(samples[-1], 1),
+            }
+        return {"latency": summary, "counts": dict(self._counts)}
+
+
+# Global instance shared by the application
+live_latency_stats = LiveLatencyStats()
@@ -0,0 +1,175 @@
+"""
+Wire protocol negotiation for /gemini-live audio
+
+Protocol 1 (default, legacy clients): assistant audio is sent as
+``{"audio": "<base64 pcm>"}`` JSON text frames.
+
+Protocol 2: audio flows as binary WebSocket frames in both directions.
+
+- Uplink: each binary frame is raw 16-bit mono PCM at 16kHz.
+- Downlink: each binary frame is raw 16-bit mono PCM at 24kHz, or exactly
+  one Opus packet when the ``opus`` downlink codec was negotiated.
+- Text frames carry JSON control and transcription messages only.
+
+Clients opt in through the initial config message::
+
+    {"user_id": "...", "protocol": {"version": 2, "audio_downlink": "opus"}}
+
+and the server answers with a ``{"protocol": {...}}`` message describing
+what was actually selected (Opus falls back to PCM if opuslib is missing).
+"""
+import logging
+from typing import List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional Opus encoder for the compressed downlink
+try:
+    import opuslib
+    OPUS_AVAILABLE = True
+except Exception:
+    opuslib = None
+    OPUS_AVAILABLE = False
+
+PROTOCOL_JSON = 1
+PROTOCOL_BINARY = 2
+SUPPORTED_PROTOCOLS = (PROTOCOL_JSON, PROTOCOL_BINARY)
+
+DOWNLINK_PCM = "pcm"
+DOWNLINK_OPUS = "opus"
+
+INPUT_SAMPLE_RATE = 16000
+OUTPUT_SAMPLE_RATE = 24000
+OPUS_FRAME_MS = 20
+
+
+class OpusDownlinkEncoder:
+    """Re-frame Gemini's 24kHz PCM chunks into fixed-size Opus packets."""
+
+    def __init__(self, sample_rate: int = OUTPUT_SAMPLE_RATE, bitrate: int = None):
+        """Initialize Opus encoder.
+
+        Args:
+            sample_rate: PCM sample rate (must be an Opus rate, 24000 for Gemini).
+            bitrate: Target bitrate in bits per second. Uses settings if None.
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * OPUS_FRAME_MS // 1000
+        self.frame_bytes = self.frame_samples * 2  # 16-bit mono
+        self._encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate or settings.LIVE_OPUS_BITRATE
+        self._buffer = bytearray()
+
+    def encode(self, pcm: bytes) -> List[bytes]:
+        """Encode as many whole frames as are buffered.
+
+        Args:
+            pcm: 16-bit mono PCM chunk of any length.
+
+        Returns:
+            Opus packets, one per 20ms frame. The remainder stays buffered.
+        """
+        self._buffer.extend(pcm)
+        packets = []
+        while len(self._buffer) >= self.frame_bytes:
+            frame = bytes(self._buffer[:self.frame_bytes])
+            del self._buffer[:self.frame_bytes]
+            packets.append(self._encoder.encode(frame, self.frame_samples))
+        return packets
+
+    def flush(self) -> List[bytes]:
+        """Encode the buffered tail, padded with silence, at the end of a turn."""
+        if not self._buffer:
+            return []
+        self._buffer.extend(b"\x00" * (self.frame_bytes - len(self._buffer)))
+        return self.encode(b"")
+
+    def reset(self) -> None:
+        """Drop the buffered tail (e.g. when generation is interrupted)."""
+        self._buffer.clear()
+
+
+class LiveProtocol:
+    """Audio protocol selected for one /gemini-live connection."""
+
+    __slots__ = ("version", "audio_downlink", "encoder")
+
+    def __init__(self, version: int = PROTOCOL_JSON, audio_downlink: str = DOWNLINK_PCM):
+        self.version = version
+        self.audio_downlink = audio_downlink
+        self.encoder: Optional[OpusDownlinkEncoder] = None
+        if audio_downlink == DOWNLINK_OPUS:
+            self.encoder = OpusDownlinkEncoder()
+
+    @property
+    def binary_audio(self) -> bool:
+        """Whether audio is sent as binary frames."""
+        return self.version >= PROTOCOL_BINARY
+
+    def encode_audio(self, pcm: bytes) -> List[bytes]:
+        """Turn an assistant PCM chunk into the binary frames to send."""
+        if self.encoder is not None:
+            return self.encoder.encode(pcm)
+        return [pcm]
+
+    def end_of_turn(self) -> List[bytes]:
+        """Frames still pending at the end of a model turn."""
+        if self.encoder is not None:
+            return self.encoder.flush()
+        return []
+
+    def interrupted(self) -> None:
+        """Discard partially encoded audio after an interruption."""
+        if self.encoder is not None:
+            self.encoder.reset()
+
+    def to_dict(self) -> dict:
+        """Protocol ack sent back to the client."""
+        data = {
+            "version": self.version,
+            "audio_uplink": "binary" if self.binary_audio else "json",
+            "audio_downlink": self.audio_downlink if self.binary_audio else "base64",
+            "input_sample_rate": INPUT_SAMPLE_RATE,
+            "output_sample_rate": OUTPUT_SAMPLE_RATE,
+        }
+        if self.encoder is not None:
+            data["frame_ms"] = OPUS_FRAME_MS
+        return data
+
+
+def negotiate_protocol(config_data: dict) -> LiveProtocol:
+    """Pick the audio protocol from the client's config message.
+
+    Args:
+        config_data: Parsed config message (may be empty).
+
+    Returns:
+        LiveProtocol for the connection. Unknown or missing values fall back
+        to protocol 1 so existing clients keep working unchanged.
+    """
+    requested = config_data.get("protocol") if isinstance(config_data, dict) else None
+    if not isinstance(requested, dict):
+        return LiveProtocol()
+
+    try:
+        version = int(requested.get("version", PROTOCOL_JSON))
+    except (TypeError, ValueError):
+        version = PROTOCOL_JSON
+    if version not in SUPPORTED_PROTOCOLS:
+        logger.warning(f"Unsupported live protocol version {version}, using {PROTOCOL_JSON}")
+        version = PROTOCOL_JSON
+
+    audio_downlink = DOWNLINK_PCM
+    if version >= PROTOCOL_BINARY and requested.get("audio_downlink") == DOWNLINK_OPUS:
+        if OPUS_AVAILABLE:
+            audio_downlink = DOWNLINK_OPUS
+        else:
+            logger.warning("Opus downlink requested but opuslib is not installed - using PCM")
+
+    try:
+        return LiveProtocol(version, audio_downlink)
+    except Exception as e:
+        logger.error(f"Failed to initialize {audio_downlink} downlink, using PCM: {e}")
+        return LiveProtocol(version, DOWNLINK_PCM)
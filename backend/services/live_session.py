@@ -0,0 +1,146 @@
+"""
+Per-connection state for Gemini Live WebSocket sessions
+"""
+import datetime
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+from services.live_protocol import LiveProtocol
+from services.live_image_gate import ImageFrameGate, aggregate_stats as aggregate_image_stats
+from services.live_vad import UplinkAudioGate, aggregate_stats as aggregate_uplink_stats
+from services.outbound_queue import OutboundQueue, aggregate_stats
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSessionContext:
+    """Mutable state owned by a single /gemini-live connection.
+
+    GeminiService is shared by every connection, so anything that changes
+    during a conversation (user, DB conversation, history, turn buffers)
+    lives here instead of on the service.
+    """
+
+    __slots__ = (
+        "session_id",
+        "websocket",
+        "user_id",
+        "device_id",
+        "conversation_id",
+        "conversation_history",
+        "current_user_input",
+        "current_assistant_output",
+        "outbound",
+        "protocol",
+        "audio_gate",
+        "image_gate",
+        "started_at",
+        "opened_monotonic",
+        "connect_source",
+        "last_user_input_at",
+        "first_audio_at",
+        "turn_audio_started",
+    )
+
+    def __init__(self, websocket: WebSocket, outbound: Optional[OutboundQueue] = None):
+        """Initialize session context.
+
+        Args:
+            websocket: FastAPI WebSocket instance owned by this session.
+            outbound: Existing send queue of the socket (e.g. from the
+                WebSocket manager). A new one is created if None.
+        """
+        self.session_id: str = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user_id: Optional[str] = None
+        self.device_id: Optional[str] = None
+        self.conversation_id: Optional[str] = None
+        # List of {role, text, timestamp} for this connection only
+        self.conversation_history: List[dict] = []
+        # Temporary buffers for the current turn's texts
+        self.current_user_input = ""
+        self.current_assistant_output = ""
+        # Prioritized send queue; its writer task is the only sender on this socket
+        self.outbound = outbound or OutboundQueue(websocket, name=self.session_id[:8])
+        # Audio wire protocol, negotiated from the config message
+        self.protocol = LiveProtocol()
+        # Coalesces uplink PCM and drops silence before it reaches Gemini
+        self.audio_gate = UplinkAudioGate()
+        # Drops unchanged camera frames and downscales the rest
+        self.image_gate = ImageFrameGate()
+        self.started_at = datetime.datetime.now()
+        # Latency bookkeeping (time.monotonic() values)
+        self.opened_monotonic = time.monotonic()
+        self.connect_source: Optional[str] = None
+        self.last_user_input_at: Optional[float] = None
+        self.first_audio_at: Optional[float] = None
+        self.turn_audio_started = False
+
+    @property
+    def journal_key(self) -> str:
+        """Key of this session's conversation journal file."""
+        return self.conversation_id or self.session_id
+
+    def to_dict(self) -> dict:
+        """Summary of the session for status endpoints."""
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "conversation_id": self.conversation_id,
+            "messages": len(self.conversation_history),
+            "protocol": self.protocol.version,
+            "audio_downlink": self.protocol.audio_downlink,
+            "outbound": self.outbound.get_stats(),
+            "uplink_audio": self.audio_gate.get_stats(),
+            "uplink_images": self.image_gate.get_stats(),
+            "connect_source": self.connect_source,
+            "started_at": self.started_at.isoformat(),
+        }
+
+
+class LiveSessionRegistry:
+    """Registry of Gemini Live sessions that are currently open."""
+
+    def __init__(self):
+        self._sessions: Dict[str, LiveSessionContext] = {}
+
+    def register(self, context: LiveSessionContext) -> None:
+        """Add a session to the registry."""
+        self._sessions[context.session_id] = context
+        logger.info(f"Live session {context.session_id} registered. Active sessions: {len(self._sessions)}")
+
+    def unregister(self, context: LiveSessionContext) -> None:
+        """Remove a session from the registry."""
+        if self._sessions.pop(context.session_id, None) is not None:
+            logger.info(f"Live session {context.session_id} unregistered. Active sessions: {len(self._sessions)}")
+
+    def get(self, session_id: str) -> Optional[LiveSessionContext]:
+        """Get a session by its id."""
+        return self._sessions.get(session_id)
+
+    def get_user_sessions(self, user_id: str) -> List[LiveSessionContext]:
+        """Get all open sessions for a user."""
+        return [ctx for ctx in self._sessions.values() if ctx.user_id == user_id]
+
+    def count(self) -> int:
+        """Number of open sessions."""
+        return len(self._sessions)
+
+    def get_stats(self) -> dict:
+        """Get registry statistics."""
+        return {
+            "active_sessions": len(self._sessions),
+            "identified_users": len({ctx.user_id for ctx in self._sessions.values() if ctx.user_id}),
+            "outbound": aggregate_stats(ctx.outbound for ctx in self._sessions.values()),
+            "uplink_audio": aggregate_uplink_stats(ctx.audio_gate for ctx in self._sessions.values()),
+            "uplink_images": aggregate_image_stats(ctx.image_gate for ctx in self._sessions.values()),
+            "timestamp": datetime.datetime.now().isoformat(),
+        }
+
+
+# Global instance shared by the application
+live_session_registry = LiveSessionRegistry()
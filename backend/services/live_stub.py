@@ -0,0 +1,213 @@
+"""
+Offline stand-in for the google-genai Live client
+
+Implements just enough of ``client.aio.live.connect(...)`` and the live
+session (``send_realtime_input``, ``send_client_content``,
+``send_tool_response``, ``receive``) for GeminiService to run without
+network access. The handshake delay, response delay and audio size are
+configurable, which makes it usable for latency benchmarks of the
+connect/warm-pool path.
+
+Enable it for the live endpoint with ``GEMINI_LIVE_STUB=1``, or benchmark
+directly:
+
+    python -m services.live_stub [sessions]
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _message(**fields) -> SimpleNamespace:
+    """Build a LiveServerMessage-like object with every field defaulting to None."""
+    message = SimpleNamespace(
+        server_content=None,
+        tool_call=None,
+        usage_metadata=None,
+        session_resumption_update=None,
+        turn_detection=None,
+    )
+    for key, value in fields.items():
+        setattr(message, key, value)
+    return message
+
+
+def _server_content(**fields) -> SimpleNamespace:
+    content = SimpleNamespace(
+        model_turn=None,
+        turn_complete=None,
+        interrupted=None,
+        input_transcription=None,
+        output_transcription=None,
+    )
+    for key, value in fields.items():
+        setattr(content, key, value)
+    return content
+
+
+class StubLiveSession:
+    """Fake live session answering every user turn with a fixed reply."""
+
+    def __init__(
+        self,
+        response_delay: float,
+        audio_chunks: int = 10,
+        chunk_bytes: int = 4800,
+        audio_frames_per_turn: int = 50,
+        reply_text: str = "Xin chào, tôi có thể giúp gì cho bạn?",
+    ):
+        """Initialize stub session.
+
+        Args:
+            response_delay: Seconds between the end of a user turn and the first audio chunk.
+            audio_chunks: Audio chunks per reply.
+            chunk_bytes: Bytes of 24kHz PCM per chunk (4800 = 100ms).
+            audio_frames_per_turn: Uplink audio frames that count as one user turn.
+            reply_text: Transcription of the reply.
+        """
+        self.response_delay = response_delay
+        self.audio_chunks = audio_chunks
+        self.chunk_bytes = chunk_bytes
+        self.audio_frames_per_turn = audio_frames_per_turn
+        self.reply_text = reply_text
+        self._turns: asyncio.Queue = asyncio.Queue()
+        self._audio_frames = 0
+
+    async def send_realtime_input(self, audio=None, media=None, **kwargs) -> None:
+        if audio is None:
+            return
+        self._audio_frames += 1
+        if self._audio_frames >= self.audio_frames_per_turn:
+            self._audio_frames = 0
+            self._turns.put_nowait("(audio)")
+
+    async def send_client_content(self, turns=None, turn_complete: bool = True, **kwargs) -> None:
+        text = ""
+        if isinstance(turns, dict):
+            text = " ".join(part.get("text", "") for part in turns.get("parts", []))
+        if turn_complete:
+            self._turns.put_nowait(text)
+
+    async def send_tool_response(self, **kwargs) -> None:
+        return None
+
+    async def receive(self) -> AsyncIterator[SimpleNamespace]:
+        """Yield one model turn, like the real session does per ``receive()`` call."""
+        user_text = await self._turns.get()
+        yield _message(server_content=_server_content(
+            input_transcription=SimpleNamespace(text=user_text, finished=True)
+        ))
+        await asyncio.sleep(self.response_delay)
+        silence = b"\x00" * self.chunk_bytes
+        for index in range(self.audio_chunks):
+            yield _message(server_content=_server_content(
+                model_turn=SimpleNamespace(parts=[
+                    SimpleNamespace(text=None, inline_data=SimpleNamespace(data=silence, mime_type="audio/pcm;rate=24000"))
+                ])
+            ))
+            if index == 0:
+                yield _message(server_content=_server_content(
+                    output_transcription=SimpleNamespace(text=self.reply_text, finished=True)
+                ))
+            await asyncio.sleep(0)
+        yield _message(server_content=_server_content(turn_complete=True))
+
+
+class _StubLive:
+    def __init__(self, connect_delay: float, response_delay: float):
+        self.connect_delay = connect_delay
+        self.response_delay = response_delay
+        self.connects = 0
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model: str = None, config=None):
+        # Simulated websocket + setup handshake
+        await asyncio.sleep(self.connect_delay)
+        self.connects += 1
+        yield StubLiveSession(self.response_delay)
+
+
+class StubGenaiClient:
+    """Drop-in for ``genai.Client`` on the live path only."""
+
+    def __init__(self, connect_delay: float = None, response_delay: float = None):
+        """Initialize stub client.
+
+        Args:
+            connect_delay: Seconds a connect takes. Uses settings if None.
+            response_delay: Seconds before the first reply audio. Uses settings if None.
+        """
+        connect_delay = settings.LIVE_STUB_CONNECT_DELAY if connect_delay is None else connect_delay
+        response_delay = settings.LIVE_STUB_RESPONSE_DELAY if response_delay is None else response_delay
+        self.aio = SimpleNamespace(live=_StubLive(connect_delay, response_delay))
+
+
+class _BenchWebSocket:
+    """Minimal FastAPI WebSocket stand-in driving one scripted conversation."""
+
+    def __init__(self, config_delay: float, turns: int):
+        self.client_state = SimpleNamespace(name="CONNECTED")
+        self.query_params = {}
+        self.config_delay = config_delay
+        self.turns = turns
+        self.turn_done = asyncio.Event()
+        self.audio_frames = 0
+        self._config_sent = False
+
+    async def receive_text(self) -> str:
+        await asyncio.sleep(self.config_delay)
+        self._config_sent = True
+        return '{"protocol": {"version": 2}}'
+
+    async def receive(self) -> dict:
+        from fastapi import WebSocketDisconnect
+        if self.turns <= 0:
+            await self.turn_done.wait()
+            self.client_state.name = "DISCONNECTED"
+            raise WebSocketDisconnect(code=1000)
+        self.turns -= 1
+        self.turn_done.clear()
+        return {"type": "websocket.receive", "text": '{"text": "Xin chào"}'}
+
+    async def send_text(self, data: str) -> None:
+        if '"finished": true' in data and '"sender": "Gemini"' in data and '"text": ""' in data:
+            self.turn_done.set()
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.audio_frames += 1
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.client_state.name = "DISCONNECTED"
+
+
+async def _benchmark(sessions: int, config_delay: float) -> None:
+    from services.gemini_service import GeminiService
+    from services.live_pool import live_latency_stats
+
+    service = GeminiService(live_client=StubGenaiClient())
+    service.warm_pool.start()
+    started = time.monotonic()
+    for _ in range(sessions):
+        ws = _BenchWebSocket(config_delay=config_delay, turns=2)
+        await service.handle_websocket_connection(ws)
+    await service.warm_pool.shutdown()
+    elapsed = time.monotonic() - started
+    print(f"{sessions} sessions in {elapsed:.2f}s")
+    for metric, summary in live_latency_stats.get_stats()["latency"].items():
+        print(f"  {metric:<20} p50={summary['p50_ms']:>8}ms p95={summary['p95_ms']:>8}ms")
+    print(f"  connect sources: {live_latency_stats.get_stats()['counts']}")
+    print(f"  warm pool: {service.warm_pool.get_stats()}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5, config_delay=0.3))
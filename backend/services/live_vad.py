@@ -0,0 +1,224 @@
+"""
+Uplink audio gate for Gemini Live: frame coalescing and voice activity detection
+
+Clients send 16kHz 16-bit mono PCM in whatever frame size their recorder
+produces (often 20-40ms). ``UplinkAudioGate`` re-frames that stream into
+fixed-size chunks so each ``send_realtime_input`` call carries a useful
+amount of audio, and - when NumPy is available and LIVE_VAD_ENABLED is set -
+drops chunks that contain no speech.
+
+Speech detection is per chunk:
+
+- energy: RMS level in dBFS against an adaptive noise floor
+- zero-crossing rate: loud chunks with a very high ZCR are treated as hiss /
+  fan noise rather than voiced speech
+
+A short pre-roll of silent chunks is forwarded when speech starts (so word
+onsets are not clipped) and a hangover keeps forwarding after speech stops,
+which gives Gemini's own end-of-speech detection the trailing silence it
+needs. When the gate closes the caller should send ``audio_stream_end`` so
+Gemini flushes any audio it has buffered.
+"""
+import logging
+import math
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional NumPy for the VAD; without it the gate only coalesces frames
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    np = None
+    NUMPY_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+# dBFS reported for digital silence
+SILENCE_DBFS = -96.0
+
+
+class UplinkAudioGate:
+    """Per-connection coalescer and voice activity detector for uplink PCM."""
+
+    def __init__(
+        self,
+        vad_enabled: bool = None,
+        chunk_ms: int = None,
+        sample_rate: int = SAMPLE_RATE,
+        energy_threshold_dbfs: float = None,
+        noise_margin_db: float = None,
+        max_zero_crossing_rate: float = None,
+        hangover_ms: int = None,
+        preroll_ms: int = None,
+    ):
+        """Initialize audio gate.
+
+        Args:
+            vad_enabled: Drop non-speech chunks. Uses settings if None; always
+                off when NumPy is not installed.
+            chunk_ms: Duration of each forwarded chunk.
+            sample_rate: PCM sample rate of the uplink.
+            energy_threshold_dbfs: Minimum RMS level treated as speech.
+            noise_margin_db: Required level above the tracked noise floor.
+            max_zero_crossing_rate: Zero crossings per sample above which a
+                chunk that is not clearly loud counts as noise.
+            hangover_ms: Audio still forwarded after the last speech chunk.
+            preroll_ms: Audio kept from before speech onset.
+        """
+        if vad_enabled is None:
+            vad_enabled = settings.LIVE_VAD_ENABLED
+        self.vad_enabled = bool(vad_enabled) and NUMPY_AVAILABLE
+        self.chunk_ms = chunk_ms or settings.LIVE_VAD_CHUNK_MS
+        self.chunk_bytes = sample_rate * self.chunk_ms // 1000 * BYTES_PER_SAMPLE
+        self.energy_threshold_dbfs = (
+            settings.LIVE_VAD_ENERGY_THRESHOLD_DBFS if energy_threshold_dbfs is None else energy_threshold_dbfs
+        )
+        self.noise_margin_db = settings.LIVE_VAD_NOISE_MARGIN_DB if noise_margin_db is None else noise_margin_db
+        self.max_zero_crossing_rate = (
+            settings.LIVE_VAD_MAX_ZERO_CROSSING_RATE if max_zero_crossing_rate is None else max_zero_crossing_rate
+        )
+        hangover_ms = settings.LIVE_VAD_HANGOVER_MS if hangover_ms is None else hangover_ms
+        preroll_ms = settings.LIVE_VAD_PREROLL_MS if preroll_ms is None else preroll_ms
+        self.hangover_chunks = max(0, math.ceil(hangover_ms / self.chunk_ms))
+        self._buffer = bytearray()
+        self._preroll: Deque[bytes] = deque(maxlen=max(0, preroll_ms // self.chunk_ms))
+        self._speaking = False
+        self._hangover_left = 0
+        self._noise_floor_dbfs: Optional[float] = None
+        # Stats
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.chunks_out = 0
+        self.bytes_out = 0
+        self.speech_segments = 0
+
+    @property
+    def speaking(self) -> bool:
+        """Whether the gate is currently open."""
+        return self._speaking or not self.vad_enabled
+
+    def _analyze(self, chunk: bytes) -> Tuple[float, float]:
+        """Return (RMS level in dBFS, zero-crossing rate) of a PCM chunk."""
+        samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        level = 20.0 * math.log10(rms / 32768.0) if rms > 0 else SILENCE_DBFS
+        signs = np.signbit(samples)
+        zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / max(1, len(samples) - 1)
+        return level, zcr
+
+    def is_speech(self, chunk: bytes) -> bool:
+        """Classify one chunk and update the noise floor on non-speech."""
+        level, zcr = self._analyze(chunk)
+        threshold = self.energy_threshold_dbfs
+        if self._noise_floor_dbfs is not None:
+            threshold = max(threshold, self._noise_floor_dbfs + self.noise_margin_db)
+        # Clearly loud chunks count as speech even with a high ZCR (fricatives)
+        speech = level >= threshold and (
+            zcr <= self.max_zero_crossing_rate or level >= threshold + self.noise_margin_db
+        )
+        if not speech:
+            if self._noise_floor_dbfs is None:
+                self._noise_floor_dbfs = level
+            elif level < self._noise_floor_dbfs:
+                # Fall quickly, rise slowly
+                self._noise_floor_dbfs = level
+            else:
+                self._noise_floor_dbfs += 0.05 * (level - self._noise_floor_dbfs)
+        return speech
+
+    def _gate(self, chunk: bytes, out: List[bytes]) -> bool:
+        """Route one fixed-size chunk. Returns True when speech just ended."""
+        if self.is_speech(chunk):
+            if not self._speaking:
+                self._speaking = True
+                self.speech_segments += 1
+                out.extend(self._preroll)
+                self._preroll.clear()
+            self._hangover_left = self.hangover_chunks
+            out.append(chunk)
+            return False
+        if self._speaking:
+            if self._hangover_left > 0:
+                self._hangover_left -= 1
+                out.append(chunk)
+                return False
+            self._speaking = False
+            self._preroll.append(chunk)
+            return True
+        self._preroll.append(chunk)
+        return False
+
+    def feed(self, pcm: bytes) -> Tuple[List[bytes], bool]:
+        """Add one client frame.
+
+        Args:
+            pcm: 16-bit mono PCM of any length.
+
+        Returns:
+            (chunks to forward to Gemini, whether the speech segment ended and
+            the caller should signal ``audio_stream_end``).
+        """
+        self.frames_in += 1
+        self.bytes_in += len(pcm)
+        self._buffer.extend(pcm)
+        out: List[bytes] = []
+        stream_ended = False
+        while len(self._buffer) >= self.chunk_bytes:
+            chunk = bytes(self._buffer[:self.chunk_bytes])
+            del self._buffer[:self.chunk_bytes]
+            if not self.vad_enabled:
+                out.append(chunk)
+            elif self._gate(chunk, out):
+                stream_ended = True
+        self.chunks_out += len(out)
+        self.bytes_out += sum(len(chunk) for chunk in out)
+        return out, stream_ended
+
+    def flush(self) -> List[bytes]:
+        """Return the buffered partial chunk if the gate is open (e.g. before a text turn)."""
+        if not self._buffer or not self.speaking:
+            return []
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        self.chunks_out += 1
+        self.bytes_out += len(chunk)
+        return [chunk]
+
+    def get_stats(self) -> dict:
+        """Get gate statistics."""
+        pending = len(self._buffer) + sum(len(chunk) for chunk in self._preroll)
+        return {
+            "vad_enabled": self.vad_enabled,
+            "speaking": self.speaking,
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "chunks_out": self.chunks_out,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": max(0, self.bytes_in - self.bytes_out - pending),
+            "sends_saved": max(0, self.frames_in - self.chunks_out),
+            "speech_segments": self.speech_segments,
+            "noise_floor_dbfs": round(self._noise_floor_dbfs, 1) if self._noise_floor_dbfs is not None else None,
+        }
+
+
+def aggregate_stats(gates: Iterable[UplinkAudioGate]) -> dict:
+    """Sum uplink savings over several gates."""
+    totals = {
+        "frames_in": 0,
+        "bytes_in": 0,
+        "chunks_out": 0,
+        "bytes_out": 0,
+        "bytes_saved": 0,
+        "sends_saved": 0,
+        "speech_segments": 0,
+    }
+    for gate in gates:
+        stats = gate.get_stats()
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
@@ -5,12 +5,13 @@ Simplified for one-time extraction on conversation end
 import json
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from pathlib import Path
 
 from openai import AsyncOpenAI
 from fastapi import HTTPException
 from config.settings import settings
+from services.conversation_journal import conversation_journal
 
 
 class MemoirExtractionService:
@@ -84,15 +85,37 @@ class MemoirExtractionService:
         self.model = model or settings.OPENAI_TEXT_MODEL
         self.temperature = temperature
         self.conversation_file = Path("conversation_history.json")
+        self.conversation_journal = conversation_journal
         self.memoir_file = Path("my_life_stories.txt")
         
-    async def load_conversation_history(self) -> List[Dict]:
-        """Load conversation history from JSON file.
+    async def stream_conversation_history(self, conversation_key: str) -> AsyncIterator[Dict]:
+        """Stream conversation messages from the conversation journal.
+        
+        Args:
+            conversation_key: Conversation (or live session) id to read. The
+                journal holds every user's conversations, so a key is required.
+            
+        Yields:
+            Conversation messages ({role, text, timestamp}).
+        """
+        async for entry in self.conversation_journal.aiter_entries(conversation_key):
+            yield entry
+    
+    async def load_conversation_history(self, conversation_key: Optional[str] = None) -> List[Dict]:
+        """Load conversation history from the conversation journal.
+        
+        Without a conversation key only the legacy JSON file is read; the
+        journal is never scanned across conversations.
+        
+        Args:
+            conversation_key: Conversation (or live session) id to read.
         
         Returns:
             List of conversation messages.
         """
         try:
+            if conversation_key:
+                return [entry async for entry in self.stream_conversation_history(conversation_key)]
             if self.conversation_file.exists():
                 with open(self.conversation_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
@@ -280,15 +303,19 @@ class MemoirExtractionService:
             # Fallback: return new story if combination fails
             return new_story
     
-    async def process_conversation_history_background(self) -> Dict:
+    async def process_conversation_history_background(self, conversation_key: Optional[str] = None) -> Dict:
         """Process conversation history to extract memoir information.
         
+        Args:
+            conversation_key: Conversation (or live session) id to process.
+                Only the legacy history file is read if None.
+        
         Returns:
             Dictionary with processing results.
         """
         try:
             # Load conversation history
-            messages = await self.load_conversation_history()
+            messages = await self.load_conversation_history(conversation_key)
             
             if not messages:
                 return {"success": False, "message": "No conversation history found"}
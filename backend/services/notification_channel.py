@@ -0,0 +1,214 @@
+"""
+Lightweight push channel for notifications
+
+Devices that only wait for reminders connect to ``/notifications`` instead of
+holding a ``/gemini-live`` socket open. The channel never opens a Gemini Live
+session or a conversation; it only registers the socket with the WebSocket
+manager, so it receives the same pushes as Live clients.
+
+    ws://host/notifications?token=<session token>&device_id=<id>&audio_codecs=opus,aac
+        &audio_delivery=url&resume=<token>&acks=1
+
+The user is taken from the session token of /api/auth/login (``token`` query
+parameter or ``Authorization: Bearer`` header). A ``user_id`` parameter is
+still accepted from older clients but must match the token.
+
+Every notification carries a ``seq`` and a ``resume_token``. A device that
+reconnects with ``resume=<last token>`` first receives the notifications it
+missed, as long as they are still in the in-memory replay buffer (bounded by
+NOTIFICATION_CHANNEL_REPLAY_SIZE and NOTIFICATION_CHANNEL_REPLAY_TTL). If
+they are not - the server restarted or the device was away too long - the
+ready message says ``"resync": true`` and the app should refresh its
+notifications over the REST API.
+
+Clients that send ``acks=1`` promise to acknowledge notifications. For
+their users, targeted notifications also carry a ``delivery_seq``: they stay
+in the durable outbox (services/notification_outbox.py) and are pushed again
+on every connect until acknowledged, also across server restarts. Without
+``acks=1`` nothing is replayed from the outbox.
+
+Client messages: ``{"type": "ack", "delivery_seq": n}`` acknowledges the
+user's notifications up to ``n``; ``{"type": "ping"}`` is answered with a
+pong; anything else is ignored.
+"""
+import collections
+import datetime
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Deque, FrozenSet, List, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from config.settings import settings
+from services.audio_artifacts import AUDIO_DELIVERY_URL
+from services.audio_encoding import CODECS, negotiate_codec
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CHANNEL_PATH = "/notifications"
+
+# (seq, recorded_at, recipient user IDs or None for a broadcast, payload builder)
+_Entry = Tuple[int, float, Optional[FrozenSet[str]], Callable[[WebSocket], str]]
+
+
+class NotificationReplayBuffer:
+    """Recent notifications, numbered, for devices that resume after a disconnect."""
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        """Initialize replay buffer.
+
+        Args:
+            max_entries: Notifications kept. Uses settings if None.
+            ttl: Seconds a notification can be replayed. Uses settings if None.
+        """
+        self.max_entries = settings.NOTIFICATION_CHANNEL_REPLAY_SIZE if max_entries is None else max_entries
+        self.ttl = settings.NOTIFICATION_CHANNEL_REPLAY_TTL if ttl is None else ttl
+        # Tokens of a previous process never match: seq restarts at 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._entries: Deque[_Entry] = collections.deque(maxlen=max(self.max_entries, 1))
+        # Highest seq no longer replayable (evicted, expired, or never recorded)
+        self._evicted_through = 0
+        # Stats
+        self.resumed = 0
+        self.replayed = 0
+        self.resyncs = 0
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def token(self, seq: int) -> str:
+        """Resume token of a sequence number."""
+        return f"{self.epoch}:{seq}"
+
+    def record(self, seq: int, recipients: Optional[FrozenSet[str]], payload_for: Callable[[WebSocket], str]) -> None:
+        """Keep a sent notification for replay.
+
+        Args:
+            seq: Number from ``next_seq``.
+            recipients: User IDs it was addressed to, or None for everyone.
+            payload_for: Serialized message for a connection (codec / delivery variant).
+        """
+        if self.max_entries <= 0:
+            self._evicted_through = seq
+            return
+        if len(self._entries) == self._entries.maxlen:
+            self._evicted_through = self._entries[0][0]
+        self._entries.append((seq, time.monotonic(), recipients, payload_for))
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._entries and self._entries[0][1] < cutoff:
+            self._evicted_through = self._entries.popleft()[0]
+
+    def missed(self, token: str, user_id: str) -> Optional[List[Callable[[WebSocket], str]]]:
+        """Notifications for ``user_id`` sent after ``token``.
+
+        Returns:
+            Payload builders in send order, or None if some of them may be
+            gone (unknown epoch, or older than the buffer) and the client must resync.
+        """
+        self._expire()
+        epoch, _, seq_text = str(token).partition(":")
+        try:
+            last_seq = int(seq_text)
+        except ValueError:
+            return None
+        if epoch != self.epoch or last_seq > self.seq or last_seq < self._evicted_through:
+            return None
+        return [
+            payload_for
+            for seq, _, recipients, payload_for in self._entries
+            if seq > last_seq and (recipients is None or user_id in recipients)
+        ]
+
+    def get_stats(self) -> dict:
+        """Get replay buffer statistics."""
+        return {
+            "seq": self.seq,
+            "buffered": len(self._entries),
+            "resumed": self.resumed,
+            "replayed": self.replayed,
+            "resyncs": self.resyncs,
+        }
+
+
+async def handle_notification_channel(websocket: WebSocket, manager, user_id: Optional[str]) -> None:
+    """Serve one push-channel connection until the client disconnects.
+
+    Args:
+        websocket: Accepted WebSocket.
+        manager: WebSocketConnectionManager delivering notifications.
+        user_id: User authenticated from the session token (None = not authenticated).
+    """
+    params = websocket.query_params
+    if not user_id:
+        await websocket.close(code=4001, reason="A valid session token is required")
+        return
+    requested_user_id = params.get("user_id")
+    if requested_user_id and requested_user_id.lower() != user_id.lower():
+        await websocket.close(code=4003, reason="user_id does not match the session token")
+        return
+
+    manager.add_connection(websocket)
+    try:
+        manager.register_user(websocket, user_id, params.get("device_id"))
+        codec = negotiate_codec(params.get("audio_codecs"))
+        by_reference = params.get("audio_delivery") == AUDIO_DELIVERY_URL
+        manager.set_audio_codec(websocket, codec)
+        manager.set_audio_by_reference(websocket, by_reference)
+        if params.get("acks", "").lower() in ("1", "true", "yes"):
+            await manager.enable_acks(websocket, user_id)
+
+        buffer = manager.replay_buffer
+        token = params.get("resume")
+        missed = buffer.missed(token, str(user_id)) if token else []
+        if token:
+            buffer.resumed += 1
+            if missed is None:
+                buffer.resyncs += 1
+
+        # Ready message goes first; missed notifications follow in order
+        await manager.send_to_connection(websocket, {
+            "type": "notification_channel_ready",
+            "resume_token": buffer.token(buffer.seq),
+            "resync": missed is None,
+            "replayed": len(missed or []),
+            "pending": len(manager.outbox.pending(user_id)) if manager.outbox is not None and manager.supports_acks(websocket) else 0,
+            "notification_audio": {
+                "codec": codec,
+                "audio_format": CODECS[codec].mime_type,
+                "delivery": AUDIO_DELIVERY_URL if by_reference else "inline",
+            },
+            "timestamp": datetime.datetime.now().isoformat(),
+        })
+        if missed:
+            buffer.replayed += len(missed)
+            await manager.send_payloads(websocket, [payload_for(websocket) for payload_for in missed])
+        pending = await manager.replay_pending(websocket, user_id)
+        logger.info(f"Notification channel open for user {user_id} (replayed {len(missed or [])}, pending {pending})")
+
+        while True:
+            message = await websocket.receive_text()
+            manager.touch(websocket)
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "ack":
+                await manager.ack_notifications(user_id, data.get("delivery_seq"))
+            elif data.get("type") == "ping":
+                manager.touch(websocket, pong=True)
+                await manager.send_to_connection(websocket, {
+                    "type": "pong",
+                    "timestamp": datetime.datetime.now().isoformat(),
+                })
+    except WebSocketDisconnect:
+        logger.info(f"Notification channel closed for user {user_id}")
+    finally:
+        manager.remove_connection(websocket)
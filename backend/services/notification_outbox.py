@@ -0,0 +1,359 @@
+"""
+Durable outbox of targeted voice notifications
+
+Notifications sent to users (``send_voice_notification_to_users``) are
+written to an append-only JSONL log before they are pushed, and stay pending
+for each recipient until one of the recipient's devices acknowledges them.
+Only users whose app announced ack support (``acks=1`` on the socket) are
+recorded; users with only legacy clients keep fire-and-forget delivery and
+never get old notifications replayed. Acks look like:
+
+    {"type": "ack", "delivery_seq": 42}
+
+on ``/notifications`` or ``/gemini-live``. Acks are cumulative per user: the
+client plays notifications in ``delivery_seq`` order, so acking 42 also
+acknowledges every earlier notification of that user. When a device
+connects, everything still pending for its user is pushed again, so a
+reminder sent while the phone was offline arrives late instead of never.
+
+Audio is not kept in the log: every variant is put into the content-addressed
+audio artifact store and a replay is a file read, not a new synthesis.
+
+The log is loaded at startup and rewritten without acknowledged or expired
+(NOTIFICATION_OUTBOX_RETENTION_HOURS) entries once
+NOTIFICATION_OUTBOX_COMPACT_AFTER dead lines have accumulated. Log lines:
+
+    {"op": "seq", "seq": n}                      next seq floor (after compaction)
+    {"op": "put", "seq": n, "users": [...], "at": ts, "data": {...}, "audio": {...}}
+    {"op": "ack", "seq": n, "user": "..."}
+    {"op": "client", "user": "..."}              user has an ack-capable client
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from config.settings import settings
+from services.audio_artifacts import AudioArtifactStore, audio_artifact_store
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationOutbox:
+    """Per-user pending notifications, persisted in one append-only log."""
+
+    def __init__(self, log_path: str = None, artifacts: AudioArtifactStore = None):
+        """Initialize outbox and load pending notifications from the log.
+
+        Args:
+            log_path: JSONL log file. Uses settings if None.
+            artifacts: Store holding the audio. Uses the shared store if None.
+        """
+        self.log_path = log_path or settings.NOTIFICATION_OUTBOX_FILE
+        self.artifacts = artifacts or audio_artifact_store
+        self.retention = settings.NOTIFICATION_OUTBOX_RETENTION_HOURS * 3600
+        self.compact_after = settings.NOTIFICATION_OUTBOX_COMPACT_AFTER
+
+        # seq -> {"seq", "users" (still pending), "at", "data", "audio"}
+        self._items: Dict[int, dict] = {}
+        # user -> pending seqs, ascending
+        self._pending: Dict[str, List[int]] = {}
+        # Users that announced ack support; notifications for others are not kept
+        self._ack_users: Set[str] = set()
+        self._seq = 0
+        self._dead_lines = 0
+        self._io_lock = threading.Lock()
+        # Serializes log writes with state changes, so lines are in seq order
+        # and a compaction never misses a concurrent put
+        self._write_lock = asyncio.Lock()
+        # Stats
+        self.queued = 0
+        self.acked = 0
+        self.replayed = 0
+        self.expired = 0
+        self.compactions = 0
+
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"❌ Failed to load notification outbox: {e}")
+
+    # ------------------------------------------------------------------
+    # Log
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line after a crash
+                    continue
+                op = entry.get("op")
+                seq = int(entry.get("seq", 0))
+                self._seq = max(self._seq, seq)
+                if op == "put":
+                    self._add_item(seq, entry["users"], entry["at"], entry["data"], entry["audio"])
+                elif op == "ack":
+                    self._dead_lines += 1 + self._apply_ack(entry["user"], seq)
+                elif op == "client":
+                    self._ack_users.add(entry["user"])
+        self._expire()
+        pending = sum(len(seqs) for seqs in self._pending.values())
+        if pending:
+            logger.info(f"✅ Notification outbox loaded: {pending} pending deliveries for {len(self._pending)} users")
+
+    def _append(self, entries: Iterable[dict], sync: bool = False) -> None:
+        """Append log lines (blocking - call through asyncio.to_thread)."""
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with self._io_lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def _snapshot(self) -> List[dict]:
+        """Log lines describing the pending entries (taken on the event loop)."""
+        entries = [{"op": "seq", "seq": self._seq}]
+        entries.extend({"op": "client", "user": user_id} for user_id in sorted(self._ack_users))
+        for seq in sorted(self._items):
+            item = self._items[seq]
+            entries.append({
+                "op": "put",
+                "seq": seq,
+                "users": sorted(item["users"]),
+                "at": item["at"],
+                "data": item["data"],
+                "audio": item["audio"],
+            })
+        return entries
+
+    def _rewrite(self, entries: List[dict]) -> None:
+        """Replace the log with ``entries`` (blocking)."""
+        tmp_path = f"{self.log_path}.{os.getpid()}.tmp"
+        with self._io_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_path)
+
+    async def _maybe_compact(self) -> None:
+        """Rewrite the log once enough lines are dead (holds _write_lock)."""
+        if self._dead_lines < self.compact_after:
+            return
+        dead_lines, self._dead_lines = self._dead_lines, 0
+        try:
+            await asyncio.to_thread(self._rewrite, self._snapshot())
+            self.compactions += 1
+        except Exception as e:
+            self._dead_lines += dead_lines
+            logger.error(f"❌ Failed to compact notification outbox: {e}")
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+    def _add_item(self, seq: int, users: Iterable[str], at: float, data: dict, audio: dict) -> None:
+        users = set(str(user_id) for user_id in users)
+        self._items[seq] = {"seq": seq, "users": users, "at": at, "data": data, "audio": audio}
+        for user_id in users:
+            self._pending.setdefault(user_id, []).append(seq)
+
+    def _apply_ack(self, user_id: str, seq: int) -> int:
+        """Drop ``user_id``'s pending seqs up to ``seq``; returns entries no longer pending for anyone."""
+        seqs = self._pending.get(user_id)
+        if not seqs:
+            return 0
+        done = 0
+        while seqs and seqs[0] <= seq:
+            item = self._items.get(seqs.pop(0))
+            if item is None:
+                continue
+            item["users"].discard(user_id)
+            if not item["users"]:
+                del self._items[item["seq"]]
+                done += 1
+        if not seqs:
+            del self._pending[user_id]
+        return done
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.retention
+        for seq in [seq for seq, item in self._items.items() if item["at"] < cutoff]:
+            for user_id in self._items[seq]["users"]:
+                seqs = self._pending.get(user_id)
+                if seqs and seq in seqs:
+                    seqs.remove(seq)
+                    if not seqs:
+                        del self._pending[user_id]
+            del self._items[seq]
+            self._dead_lines += 1
+            self.expired += 1
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    async def add_ack_user(self, user_id: str) -> None:
+        """Remember that ``user_id`` has a client that acknowledges notifications."""
+        user_id = str(user_id)
+        if user_id in self._ack_users:
+            return
+        async with self._write_lock:
+            if user_id in self._ack_users:
+                return
+            try:
+                await asyncio.to_thread(self._append, [{"op": "client", "user": user_id}])
+            except Exception as e:
+                # Kept in memory only: lost on restart until the client connects again
+                logger.error(f"❌ Failed to record ack-capable client: {e}")
+            self._ack_users.add(user_id)
+
+    def accepts(self, user_id: str) -> bool:
+        """Whether notifications for ``user_id`` are kept until acknowledged."""
+        return str(user_id) in self._ack_users
+
+    async def put(self, user_ids: Iterable[str], notification_data: dict, variants: Optional[Dict[str, dict]] = None) -> Optional[int]:
+        """Persist a notification for its ack-capable recipients before it is pushed.
+
+        Args:
+            user_ids: Recipient users (already including family).
+            notification_data: Notification with PCM ``audioBase64``.
+            variants: Codec -> encoded copies, as passed to the WebSocket manager.
+
+        Returns:
+            Delivery sequence number, or None if no recipient acknowledges
+            notifications or it could not be persisted.
+        """
+        user_ids = sorted(set(str(user_id) for user_id in user_ids) & self._ack_users)
+        if not user_ids:
+            return None
+        data = {k: v for k, v in notification_data.items() if k not in ("audioBase64", "audioFormat")}
+        try:
+            audio = await asyncio.to_thread(self._store_audio, notification_data, variants or {})
+            async with self._write_lock:
+                seq = self._seq + 1
+                at = time.time()
+                await asyncio.to_thread(self._append, [{
+                    "op": "put", "seq": seq, "users": user_ids, "at": at, "data": data, "audio": audio,
+                }], True)
+                self._seq = seq
+                self._add_item(seq, user_ids, at, data, audio)
+                # Entries that expired since the last write count as dead lines too
+                self._expire()
+                await self._maybe_compact()
+        except Exception as e:
+            logger.error(f"❌ Failed to persist notification in outbox: {e}")
+            return None
+        self.queued += 1
+        return seq
+
+    def _store_audio(self, notification_data: dict, variants: Dict[str, dict]) -> dict:
+        """Put every inline audio variant into the artifact store (blocking).
+
+        Returns:
+            Codec -> {"name", "audio_format", "size"} of the stored artifact.
+        """
+        sources = {"pcm": notification_data}
+        sources.update({codec: fields for codec, fields in variants.items() if fields.get("audioBase64")})
+        audio = {}
+        for codec, fields in sources.items():
+            if not fields.get("audioBase64"):
+                continue
+            artifact = self.artifacts.put(
+                base64.b64decode(fields["audioBase64"]), fields.get("audioFormat") or "audio/pcm"
+            )
+            audio[codec] = {
+                "name": artifact["url"].rsplit("/", 1)[-1],
+                "audio_format": artifact["audio_format"],
+                "size": artifact["size"],
+            }
+        return audio
+
+    async def ack(self, user_id: str, seq: int) -> int:
+        """Acknowledge ``user_id``'s notifications up to ``seq``.
+
+        Returns:
+            Number of notifications acknowledged.
+        """
+        user_id = str(user_id)
+        try:
+            seq = int(seq)
+        except (TypeError, ValueError):
+            return 0
+        async with self._write_lock:
+            before = len(self._pending.get(user_id, []))
+            self._dead_lines += self._apply_ack(user_id, seq)
+            acked = before - len(self._pending.get(user_id, []))
+            if not acked:
+                return 0
+            self.acked += acked
+            try:
+                await asyncio.to_thread(self._append, [{"op": "ack", "seq": seq, "user": user_id}])
+                self._dead_lines += 1
+            except Exception as e:
+                # Only the durability of the ack is lost: the item may be replayed after a restart
+                logger.error(f"❌ Failed to record notification ack: {e}")
+            await self._maybe_compact()
+        return acked
+
+    def pending(self, user_id: str) -> List[dict]:
+        """Notifications not yet acknowledged by ``user_id``, oldest first."""
+        self._expire()
+        return [self._items[seq] for seq in self._pending.get(str(user_id), []) if seq in self._items]
+
+    async def audio_fields(self, item: dict, codec: str, by_reference: bool) -> Optional[dict]:
+        """Audio fields of a pending notification for one client.
+
+        Args:
+            item: Entry from ``pending``.
+            codec: Client's negotiated codec (falls back to PCM if not stored).
+            by_reference: Return the artifact URL instead of inline base64.
+
+        Returns:
+            {"audioFormat", "audioBase64"} or {"audioFormat", "audioUrl",
+            "audioHash", "audioSize"}; None if the audio is gone.
+        """
+        stored = item["audio"].get(codec) or item["audio"].get("pcm")
+        if stored is None:
+            return None
+        resolved = self.artifacts.resolve(stored["name"])
+        if resolved is None:
+            return None
+        path, digest, _ = resolved
+        fields = {"audioFormat": stored["audio_format"]}
+        if by_reference:
+            fields.update({
+                "audioUrl": self.artifacts.url_for(stored["name"]),
+                "audioHash": digest,
+                "audioSize": stored["size"],
+            })
+        else:
+            audio = await asyncio.to_thread(self.artifacts.read, path)
+            fields["audioBase64"] = base64.b64encode(audio).decode("utf-8")
+        self.replayed += 1
+        return fields
+
+    def get_stats(self) -> dict:
+        """Get outbox statistics."""
+        return {
+            "pending_notifications": len(self._items),
+            "users_with_pending": len(self._pending),
+            "ack_users": len(self._ack_users),
+            "queued": self.queued,
+            "acked": self.acked,
+            "replayed": self.replayed,
+            "expired": self.expired,
+            "compactions": self.compactions,
+        }
+
+
+# Global instance shared by the application
+notification_outbox = NotificationOutbox()
@@ -0,0 +1,68 @@
+"""
+Recipients of a user's notifications
+
+A reminder for an elderly user also goes to the family members allowed to
+receive notifications (``FamilyRelationship.can_receive_notifications``).
+Relationships change rarely, so the resolved user IDs are cached for
+NOTIFICATION_RECIPIENT_CACHE_TTL seconds instead of querying the database
+for every push.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRecipientResolver:
+    """Resolves a user ID to the user plus their notification-receiving family."""
+
+    def __init__(self, user_service, ttl: float = None):
+        """Initialize resolver.
+
+        Args:
+            user_service: UserService providing ``get_notification_recipient_ids``.
+            ttl: Seconds a resolved set is reused. Uses settings if None.
+        """
+        self.user_service = user_service
+        self.ttl = settings.NOTIFICATION_RECIPIENT_CACHE_TTL if ttl is None else ttl
+        self._cache: Dict[str, Tuple[float, Set[str]]] = {}
+        # Stats
+        self.hits = 0
+        self.lookups = 0
+
+    async def resolve(self, user_id: str) -> Set[str]:
+        """User IDs that receive ``user_id``'s notifications (always includes ``user_id``)."""
+        user_id = str(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        self.lookups += 1
+        try:
+            recipients = set(await asyncio.to_thread(self.user_service.get_notification_recipient_ids, user_id))
+        except Exception as e:
+            logger.error(f"❌ Failed to resolve notification recipients for {user_id}: {e}")
+            return {user_id}
+        recipients.add(user_id)
+        self._cache[user_id] = (time.monotonic() + self.ttl, recipients)
+        return recipients
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget one user's recipients (after a relationship change), or all."""
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(user_id), None)
+
+    def get_stats(self) -> dict:
+        """Get resolver statistics."""
+        return {
+            "cached_users": len(self._cache),
+            "hits": self.hits,
+            "lookups": self.lookups,
+        }
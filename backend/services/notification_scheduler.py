@@ -9,9 +9,11 @@ from typing import List, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+from config.settings import settings
 from db.db_services.notification_service import NotificationDBService
 from services.notification_voice_service import NotificationVoiceService
-from services.websocket_manager import WebSocketManager
+from services.schedule_notification_service import dispatch_owner_id
+from services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 
@@ -22,36 +24,68 @@ class NotificationScheduler:
         self.scheduler = AsyncIOScheduler()
         self.notification_service = NotificationDBService()
         self.voice_service = NotificationVoiceService()
-        self.websocket_manager = WebSocketManager()
+        self.websocket_manager = websocket_manager
         self.logger = logger
         self.is_running = False
+        # Due rows are claimed under this owner, so other workers skip them
+        self.owner = dispatch_owner_id("scheduler")
     
     async def check_and_send_scheduled_notifications(self):
         """Check for notifications that need to be sent and send them"""
+        failed = []
         try:
             self.logger.info("🔔 Checking for scheduled notifications to send...")
             
-            # Get all unsent notifications that are due
+            # Claim the unsent notifications that are due, one batch at a time
             current_time = datetime.utcnow()
-            notifications = await self._get_due_notifications(current_time)
-            
-            if not notifications:
-                self.logger.info("No notifications due for sending")
-                return
-            
-            self.logger.info(f"Found {len(notifications)} notifications to send")
-            
-            for notification in notifications:
-                await self._send_notification(notification)
+            while True:
+                notifications = await self._get_due_notifications(current_time)
+                
+                if not notifications:
+                    self.logger.info("No notifications due for sending")
+                    return
+                
+                self.logger.info(f"Claimed {len(notifications)} notifications to send")
+                
+                delivered = []
+                for index, notification in enumerate(notifications):
+                    # Extend the lease of the rest of the batch; skip anything another worker took over
+                    remaining = [item["id"] for item in notifications[index:]]
+                    owned = await asyncio.to_thread(
+                        self.notification_service.renew_notification_claims,
+                        self.owner, remaining, settings.SCHEDULE_CLAIM_LEASE_SECONDS
+                    )
+                    if notification["id"] not in owned:
+                        self.logger.warning(f"Lost claim on notification {notification['id']} - skipping")
+                        continue
+                    if await self._send_notification(notification):
+                        delivered.append(notification["id"])
+                    else:
+                        failed.append(notification["id"])
+                
+                await self._mark_notifications_sent(delivered)
+                if len(notifications) < settings.SCHEDULE_CLAIM_BATCH_SIZE:
+                    return
                 
         except Exception as e:
             self.logger.error(f"Error checking scheduled notifications: {e}")
+        finally:
+            # Kept claimed until the check ends so the loop does not claim them again;
+            # released now so the next check (of any worker) retries them
+            if failed:
+                await asyncio.to_thread(self.notification_service.release_notification_claims, self.owner, failed)
     
     async def _get_due_notifications(self, current_time: datetime) -> List[dict]:
-        """Get notifications that are due to be sent"""
+        """Claim a batch of notifications that are due to be sent"""
         try:
-            # Get all unsent notifications that are due
-            notifications = await self.notification_service.get_due_notifications(current_time)
+            # Rows claimed by another worker (or another scheduler loop) are skipped
+            notifications = await asyncio.to_thread(
+                self.notification_service.claim_due_notifications,
+                self.owner, settings.SCHEDULE_CLAIM_LEASE_SECONDS,
+                due_before=current_time,
+                voice_only=True,
+                limit=settings.SCHEDULE_CLAIM_BATCH_SIZE
+            )
             
             # Convert to list of dictionaries
             due_notifications = []
@@ -76,8 +110,12 @@ class NotificationScheduler:
             self.logger.error(f"Error getting due notifications: {e}")
             return []
     
-    async def _send_notification(self, notification: dict):
-        """Send a single notification"""
+    async def _send_notification(self, notification: dict) -> bool:
+        """Send a single notification
+        
+        Returns:
+            True if it reached a device or the outbox
+        """
         try:
             notification_id = notification["id"]
             user_id = notification["user_id"]
@@ -92,11 +130,12 @@ class NotificationScheduler:
             # TODO: Check user preferences for voice notifications
             
             # Generate voice notification
+            delivered = False
             try:
                 voice_base64 = await self.voice_service.generate_voice_notification_base64(message)
                 
                 if voice_base64:
-                    # Broadcast voice notification to connected clients
+                    # Deliver to the user's devices; kept in the outbox until acknowledged
                     notification_data = {
                         "type": "scheduled_notification",
                         "notification_id": notification_id,
@@ -107,37 +146,34 @@ class NotificationScheduler:
                         "timestamp": datetime.utcnow().isoformat()
                     }
                     
-                    await self.websocket_manager.broadcast_voice_notification(notification_data)
-                    self.logger.info(f"Voice notification sent for {notification_id}")
+                    report = await self.websocket_manager.send_voice_notification_to_users([user_id], notification_data)
+                    delivered = bool(report["sent"]) or report.get("delivery_seq") is not None
+                    self.logger.info(f"Voice notification sent for {notification_id} to {report['sent']} devices")
                 else:
                     self.logger.warning(f"Failed to generate voice for notification {notification_id}")
                     
             except Exception as voice_error:
                 self.logger.error(f"Voice generation failed for notification {notification_id}: {voice_error}")
             
-            # Mark notification as sent
-            await self._mark_notification_sent(notification_id)
+            # Sent once it reached a device or the outbox; otherwise retry next check
+            return delivered
             
         except Exception as e:
             self.logger.error(f"Error sending notification {notification.get('id', 'unknown')}: {e}")
+            return False
     
-    async def _mark_notification_sent(self, notification_id: str):
-        """Mark a notification as sent"""
+    async def _mark_notifications_sent(self, notification_ids: List[str]):
+        """Mark the delivered notifications of a claimed batch as sent in one update"""
+        if not notification_ids:
+            return
         try:
-            # Update notification in database
-            success = await self.notification_service.update_notification_status(
-                notification_id=notification_id,
-                is_sent=True,
-                sent_at=datetime.utcnow()
+            confirmed = await asyncio.to_thread(
+                self.notification_service.confirm_notifications_sent, self.owner, notification_ids
             )
-            
-            if success:
-                self.logger.info(f"Marked notification {notification_id} as sent")
-            else:
-                self.logger.warning(f"Failed to mark notification {notification_id} as sent")
+            self.logger.info(f"Marked {confirmed}/{len(notification_ids)} notifications as sent")
                 
         except Exception as e:
-            self.logger.error(f"Error marking notification {notification_id} as sent: {e}")
+            self.logger.error(f"Error marking notifications as sent: {e}")
     
     def start_scheduler(self):
         """Start the notification scheduler"""
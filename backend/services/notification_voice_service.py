@@ -4,13 +4,24 @@ Notification Voice service - gửi thông báo dạng voice
 import asyncio
 import json
 import base64
+import contextvars
 import datetime
-from typing import Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 from google import genai
 from google.genai import types
 
 from config.settings import settings
+from services.audio_artifacts import AudioArtifactStore, audio_artifact_store
+from services.audio_encoding import CODEC_PCM, NotificationAudioEncoder
+from services.tts_cache import TTSAudioCache, cache_key, tts_cache
+from services.voice_stitching import REMINDER_TEMPLATES, TemplateVoiceStitcher
+
+# Queue of the voice batch the current task belongs to (None outside batches)
+_batch_queue: contextvars.ContextVar = contextvars.ContextVar("voice_batch_queue", default=None)
+_BATCH_STOP = object()
+# Piece size when streaming already-synthesized audio (200ms of 24kHz PCM)
+STREAM_CHUNK_BYTES = 9600
 
 
 class NotificationVoiceService:
@@ -44,15 +55,29 @@ class NotificationVoiceService:
     - Phát âm tiếng Việt chuẩn và rõ ràng
     """
     
-    def __init__(self, client: genai.Client = None, model: str = None):
+    VOICE_NAME = "Aoede"  # Giọng nữ tự nhiên
+    LANGUAGE_CODE = "vi-VN"
+    # Cache namespace of audio stitched from template segments
+    STITCHED_SUFFIX = "#stitched"
+    
+    def __init__(self, client: genai.Client = None, model: str = None, cache: TTSAudioCache = None, stitching: bool = None, artifacts: AudioArtifactStore = None):
         """Initialize Notification Voice service.
         
         Args:
             client: Gemini client instance. Creates new if None.
             model: Model to use. Uses default from settings if None.
+            cache: Synthesized audio cache. Uses the shared cache if None.
+            stitching: Build template reminders from cached segments. Uses settings if None.
+            artifacts: Store of audio delivered by URL. Uses the shared store if None.
         """
         self.client = client or genai.Client(api_key=settings.GOOGLE_API_KEY)
         self.model = model or settings.GEMINI_MODEL
+        self.cache = cache or tts_cache
+        self.encoder = NotificationAudioEncoder(self.cache)
+        self.artifacts = artifacts or audio_artifact_store
+        if stitching is None:
+            stitching = settings.VOICE_STITCHING_ENABLED
+        self.stitcher = TemplateVoiceStitcher(self._synthesize_segment) if stitching else None
     
     def _create_voice_config(self) -> types.LiveConnectConfig:
         """Create voice generation configuration.
@@ -65,19 +90,29 @@ class NotificationVoiceService:
             speech_config=types.SpeechConfig(
                 voice_config=types.VoiceConfig(
                     prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                        voice_name="Aoede"  # Giọng nữ tự nhiên
+                        voice_name=self.VOICE_NAME
                     )
                 ),
-                language_code='vi-VN',
+                language_code=self.LANGUAGE_CODE,
             ),
             system_instruction=self.NOTIFICATION_SYSTEM_INSTRUCTION,
             temperature=0.3,  # Giảm nhiệt độ để có giọng nói ổn định hơn
             top_p=0.8,
         )
     
+    def get_cache_key(self, notification_text: str) -> str:
+        """Cache key of the audio for a notification text with this service's voice."""
+        model = self.model
+        if self.stitcher is not None and self.stitcher.can_render(notification_text):
+            model += self.STITCHED_SUFFIX
+        return cache_key(notification_text, self.VOICE_NAME, self.LANGUAGE_CODE, model)
+    
     async def generate_voice_notification(self, notification_text: str) -> Optional[bytes]:
         """Generate voice from notification text.
         
+        Identical texts are served from the TTS cache; concurrent requests for
+        the same text share one synthesis.
+        
         Args:
             notification_text: Text content to convert to voice.
             
@@ -87,53 +122,238 @@ class NotificationVoiceService:
         if not notification_text or not notification_text.strip():
             print("❌ Notification text is empty")
             return None
+        
+        return await self.cache.get_or_create(
+            self.get_cache_key(notification_text),
+            lambda: self._render(notification_text)
+        )
+    
+    async def _render(self, notification_text: str) -> Optional[bytes]:
+        """Stitch template reminders from segments; synthesize anything else in one go."""
+        if self.stitcher is not None:
+            audio = await self.stitcher.render(notification_text)
+            if audio:
+                return audio
+        return await self._synthesize(notification_text)
+    
+    async def _synthesize_segment(self, segment_text: str) -> Optional[bytes]:
+        """Synthesize one template segment through the cache (fixed phrase or slot value)."""
+        return await self.cache.get_or_create(
+            cache_key(segment_text, self.VOICE_NAME, self.LANGUAGE_CODE, self.model),
+            lambda: self._synthesize(segment_text)
+        )
+    
+    async def _synthesize(self, notification_text: str) -> Optional[bytes]:
+        """Synthesize notification text through a Gemini Live session (cache miss path).
+        
+        Inside ``generate_voice_notifications_batch`` the text is queued onto the
+        batch's shared sessions instead of opening a session of its own.
+        
+        Args:
+            notification_text: Text content to convert to voice.
             
-        print(f"🔊 Generating voice for: {notification_text}")
+        Returns:
+            Audio data as bytes, or None if failed.
+        """
+        batch_queue = _batch_queue.get()
+        if batch_queue is not None:
+            future = asyncio.get_running_loop().create_future()
+            batch_queue.put_nowait((notification_text, future))
+            return await future
         
         try:
             config = self._create_voice_config()
             
             async with self.client.aio.live.connect(model=self.model, config=config) as session:
-                # Gửi text để chuyển đổi thành giọng nói
-                await session.send_client_content(
-                    turns={"role": "user", "parts": [{"text": notification_text}]}, 
-                    turn_complete=True
-                )
-                
-                audio_chunks = []
-                
-                # Nhận phản hồi từ Gemini
-                async for response in session.receive():
-                    if response.server_content is None:
-                        continue
-                        
-                    model_turn = response.server_content.model_turn
-                    if model_turn:
-                        for part in model_turn.parts:
-                            # Xử lý audio response
-                            if hasattr(part, 'inline_data') and part.inline_data is not None:
-                                audio_data = part.inline_data.data
-                                audio_chunks.append(audio_data)
-                                print(f"📦 Received audio chunk: {len(audio_data)} bytes")
-                    
-                    # Kết thúc khi turn hoàn thành
-                    if response.server_content and response.server_content.turn_complete:
-                        print("✅ Voice generation completed")
-                        break
-                
-                # Ghép tất cả audio chunks
-                if audio_chunks:
-                    full_audio = b''.join(audio_chunks)
-                    print(f"🎵 Total audio size: {len(full_audio)} bytes")
-                    return full_audio
-                else:
-                    print("❌ No audio data received")
-                    return None
+                return await self._speak(session, notification_text)
                     
         except Exception as e:
             print(f"❌ Error generating voice notification: {e}")
             return None
     
+    async def _speak(self, session, notification_text: str) -> Optional[bytes]:
+        """Run one turn on an open voice session and collect its audio.
+        
+        Args:
+            session: Live session created with the voice config.
+            notification_text: Text content to convert to voice.
+            
+        Returns:
+            Audio data as bytes, or None if the turn produced no audio.
+        """
+        audio_chunks = [chunk async for chunk in self._speak_stream(session, notification_text)]
+        
+        # Ghép tất cả audio chunks
+        if audio_chunks:
+            full_audio = b''.join(audio_chunks)
+            print(f"🎵 Total audio size: {len(full_audio)} bytes")
+            return full_audio
+        else:
+            print("❌ No audio data received")
+            return None
+    
+    async def _speak_stream(self, session, notification_text: str) -> AsyncIterator[bytes]:
+        """Run one turn on an open voice session, yielding audio chunks as they arrive.
+        
+        Args:
+            session: Live session created with the voice config.
+            notification_text: Text content to convert to voice.
+            
+        Yields:
+            24kHz 16-bit mono PCM chunks.
+        """
+        print(f"🔊 Generating voice for: {notification_text}")
+        
+        # Gửi text để chuyển đổi thành giọng nói
+        await session.send_client_content(
+            turns={"role": "user", "parts": [{"text": notification_text}]}, 
+            turn_complete=True
+        )
+        
+        # Nhận phản hồi từ Gemini
+        async for response in session.receive():
+            if response.server_content is None:
+                continue
+                
+            model_turn = response.server_content.model_turn
+            if model_turn:
+                for part in model_turn.parts:
+                    # Xử lý audio response
+                    if hasattr(part, 'inline_data') and part.inline_data is not None:
+                        audio_data = part.inline_data.data
+                        print(f"📦 Received audio chunk: {len(audio_data)} bytes")
+                        yield audio_data
+            
+            # Kết thúc khi turn hoàn thành
+            if response.server_content and response.server_content.turn_complete:
+                print("✅ Voice generation completed")
+                break
+    
+    async def stream_voice_notification(self, notification_text: str) -> AsyncIterator[bytes]:
+        """Generate voice from notification text, yielding audio as soon as it exists.
+        
+        Cached (or stitched) audio is yielded in STREAM_CHUNK_BYTES pieces right
+        away; otherwise chunks are forwarded straight from the Live session and
+        the complete audio is cached when the turn ends.
+        
+        Args:
+            notification_text: Text content to convert to voice.
+            
+        Yields:
+            24kHz 16-bit mono PCM chunks.
+        """
+        if not notification_text or not notification_text.strip():
+            print("❌ Notification text is empty")
+            return
+        
+        key = self.get_cache_key(notification_text)
+        audio = await self.cache.get(key)
+        stitched = self.stitcher is not None and self.stitcher.can_render(notification_text)
+        if audio is None and (stitched or _batch_queue.get() is not None or not self.cache.begin_flight(key)):
+            # Assembled from cached segments, part of a batch, or already being synthesized
+            audio = await self.generate_voice_notification(notification_text)
+            if audio is None:
+                return
+        if audio is not None:
+            for offset in range(0, len(audio), STREAM_CHUNK_BYTES):
+                yield audio[offset:offset + STREAM_CHUNK_BYTES]
+            return
+        
+        audio_chunks = []
+        completed = False
+        try:
+            async with self.client.aio.live.connect(model=self.model, config=self._create_voice_config()) as session:
+                async for chunk in self._speak_stream(session, notification_text):
+                    audio_chunks.append(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            # Only a fully received turn is cached; errors propagate to the consumer
+            await self.cache.end_flight(key, b''.join(audio_chunks) if completed and audio_chunks else None)
+    
+    async def generate_voice_notifications_batch(self, notification_texts: List[str], max_sessions: int = None) -> List[Optional[bytes]]:
+        """Generate voice for many texts over a few shared Live sessions.
+        
+        Cached texts are returned directly; the rest are spoken turn by turn on
+        at most ``max_sessions`` sessions, each reconnecting after
+        VOICE_BATCH_TURNS_PER_SESSION turns or after a failed turn. A failure
+        only affects its own item.
+        
+        Args:
+            notification_texts: Texts to convert to voice (duplicates are synthesized once).
+            max_sessions: Concurrent Live sessions. Uses settings if None.
+            
+        Returns:
+            Audio bytes (or None if that item failed) in the order of ``notification_texts``.
+        """
+        if not notification_texts:
+            return []
+        max_sessions = max_sessions or settings.VOICE_BATCH_SESSIONS
+        queue: asyncio.Queue = asyncio.Queue()
+        token = _batch_queue.set(queue)
+        try:
+            # Tasks copy the current context, so their cache misses land on this batch's queue
+            items = [asyncio.create_task(self.generate_voice_notification(text)) for text in notification_texts]
+        finally:
+            _batch_queue.reset(token)
+        
+        workers = [asyncio.create_task(self._batch_worker(queue)) for _ in range(max_sessions)]
+        try:
+            results = await asyncio.gather(*items, return_exceptions=True)
+        finally:
+            for _ in workers:
+                queue.put_nowait(_BATCH_STOP)
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        audios = [result if isinstance(result, bytes) else None for result in results]
+        print(f"🎵 Batch voice generation: {sum(1 for audio in audios if audio)}/{len(audios)} succeeded")
+        return audios
+    
+    async def _batch_worker(self, queue: asyncio.Queue):
+        """Speak queued (text, future) items on one session, reconnecting as needed."""
+        current = await queue.get()
+        while current is not _BATCH_STOP:
+            speaking = None
+            connected = False
+            try:
+                async with self.client.aio.live.connect(model=self.model, config=self._create_voice_config()) as session:
+                    connected = True
+                    for _ in range(settings.VOICE_BATCH_TURNS_PER_SESSION):
+                        speaking, current = current, None
+                        ok = await self._speak_batch_item(session, *speaking)
+                        speaking = None
+                        current = await queue.get()
+                        if not ok or current is _BATCH_STOP:
+                            break
+            except Exception as e:
+                print(f"❌ Voice batch session error: {e}")
+                # Fail the item that was being spoken, or the one waiting for a session that never opened
+                failed = speaking if speaking is not None else (None if connected else current)
+                if failed is not None and not failed[1].done():
+                    failed[1].set_result(None)
+                if failed is current:
+                    current = None
+            if current is None:
+                current = await queue.get()
+    
+    async def _speak_batch_item(self, session, notification_text: str, future: asyncio.Future) -> bool:
+        """Speak one batch item. Returns False if the session should be replaced."""
+        if future.done():
+            return True
+        try:
+            audio = await asyncio.wait_for(
+                self._speak(session, notification_text),
+                timeout=settings.VOICE_BATCH_ITEM_TIMEOUT
+            )
+        except Exception as e:
+            print(f"❌ Error generating voice in batch: {e}")
+            if not future.done():
+                future.set_result(None)
+            return False
+        if not future.done():
+            future.set_result(audio)
+        return True
+    
     async def generate_voice_notification_base64(self, notification_text: str) -> Optional[str]:
         """Generate voice from notification text and return as base64.
         
@@ -156,6 +376,83 @@ class NotificationVoiceService:
         
         return None
     
+    async def _encoded_voice(self, notification_text: str, codec: str, bitrate: int = None) -> Optional[Tuple[bytes, str]]:
+        """Generate voice and encode it; returns (audio, MIME type) or None."""
+        audio_data = await self.generate_voice_notification(notification_text)
+        if not audio_data:
+            return None
+        
+        encoded, audio_format = await self.encoder.encode(
+            self.get_cache_key(notification_text), audio_data, codec, bitrate
+        )
+        print(f"🔗 Audio encoded as {audio_format}: {len(audio_data)} -> {len(encoded)} bytes")
+        return encoded, audio_format
+    
+    async def generate_voice_notification_payload(self, notification_text: str, codec: str = CODEC_PCM, bitrate: int = None) -> Optional[Tuple[str, str]]:
+        """Generate voice from notification text in the client's negotiated codec.
+        
+        Args:
+            notification_text: Text content to convert to voice.
+            codec: Result of ``negotiate_codec`` ("pcm", "opus", "aac").
+            bitrate: Target bits/s. Uses the configured bitrate if None.
+            
+        Returns:
+            (base64 audio, audio format MIME type), or None if failed.
+        """
+        encoded = await self._encoded_voice(notification_text, codec, bitrate)
+        if encoded is None:
+            return None
+        return base64.b64encode(encoded[0]).decode('utf-8'), encoded[1]
+    
+    async def generate_voice_notification_artifact(self, notification_text: str, codec: str = CODEC_PCM) -> Optional[dict]:
+        """Generate voice and publish it in the audio artifact store.
+        
+        Args:
+            notification_text: Text content to convert to voice.
+            codec: Result of ``negotiate_codec``.
+            
+        Returns:
+            {"url", "hash", "size", "audio_format"}, or None if failed.
+        """
+        encoded = await self._encoded_voice(notification_text, codec)
+        if encoded is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.artifacts.put, encoded[0], encoded[1])
+        except Exception as e:
+            print(f"❌ Error storing audio artifact: {e}")
+            return None
+    
+    async def encode_voice_variants(self, notification_text: str, codecs: Iterable[str], by_reference: bool = False) -> Dict[str, dict]:
+        """Encoded copies of a notification for broadcasting to clients with different codecs.
+        
+        Args:
+            notification_text: Text whose audio was already generated.
+            codecs: Codecs negotiated by the receiving clients.
+            by_reference: Also publish each variant as an artifact for clients
+                receiving audio by URL.
+            
+        Returns:
+            Codec -> {"audioBase64", "audioFormat"} for every compressed codec,
+            plus {"audioUrl", "audioHash", "audioSize"} (PCM included) when
+            ``by_reference`` is set.
+        """
+        variants = {}
+        for codec in set(codecs):
+            if codec != CODEC_PCM:
+                payload = await self.generate_voice_notification_payload(notification_text, codec)
+                if payload:
+                    variants[codec] = {"audioBase64": payload[0], "audioFormat": payload[1]}
+            if by_reference:
+                artifact = await self.generate_voice_notification_artifact(notification_text, codec)
+                if artifact:
+                    variants.setdefault(codec, {}).update({
+                        "audioUrl": artifact["url"],
+                        "audioHash": artifact["hash"],
+                        "audioSize": artifact["size"],
+                    })
+        return variants
+    
     async def generate_emergency_voice_notification(self, notification_text: str) -> Optional[bytes]:
         """Generate urgent voice notification with appropriate tone.
         
@@ -171,12 +468,13 @@ class NotificationVoiceService:
         print(f"🚨 Generating emergency voice notification")
         return await self.generate_voice_notification(urgent_text)
     
-    def create_notification_response(self, audio_base64: str, notification_text: str) -> dict:
+    def create_notification_response(self, audio_base64: str, notification_text: str, audio_format: str = "audio/pcm") -> dict:
         """Create standardized notification response.
         
         Args:
             audio_base64: Base64 encoded audio data.
             notification_text: Original notification text.
+            audio_format: MIME type of the encoded audio.
             
         Returns:
             Standardized response dictionary.
@@ -186,7 +484,7 @@ class NotificationVoiceService:
             "message": "Voice notification generated successfully",
             "notificationText": notification_text,
             "audioBase64": audio_base64,
-            "audioFormat": "audio/pcm",
+            "audioFormat": audio_format,
             "timestamp": datetime.datetime.now().isoformat(),
             "service": "notification_voice_service"
         }
@@ -220,22 +518,22 @@ class NotificationTemplates:
     @staticmethod
     def medicine_reminder(medicine_name: str, time: str) -> str:
         """Create medicine reminder notification text."""
-        return f"Nhắc nhở uống thuốc: Đã đến giờ uống {medicine_name} lúc {time}. Nhớ uống thuốc đúng giờ để đảm bảo hiệu quả điều trị nhé."
+        return REMINDER_TEMPLATES["medicine_reminder"].format(medicine_name=medicine_name, time=time)
     
     @staticmethod
     def appointment_reminder(doctor_name: str, time: str, date: str) -> str:
         """Create appointment reminder notification text."""
-        return f"Nhắc nhở lịch khám: Bác có lịch khám với bác sĩ {doctor_name} vào {time} ngày {date}. Nhớ chuẩn bị đầy đủ giấy tờ và đến đúng giờ nhé."
+        return REMINDER_TEMPLATES["appointment_reminder"].format(doctor_name=doctor_name, time=time, date=date)
     
     @staticmethod
     def exercise_reminder(exercise_type: str, duration: str) -> str:
         """Create exercise reminder notification text."""
-        return f"Nhắc nhở tập thể dục: Đã đến giờ {exercise_type} trong {duration}. Tập thể dục đều đặn giúp cơ thể khỏe mạnh và tinh thần sảng khoái."
+        return REMINDER_TEMPLATES["exercise_reminder"].format(exercise_type=exercise_type, duration=duration)
     
     @staticmethod
     def health_check_reminder(check_type: str) -> str:
         """Create health check reminder notification text."""
-        return f"Nhắc nhở kiểm tra sức khỏe: Đã đến giờ {check_type}. Theo dõi sức khỏe định kỳ giúp phát hiện sớm các vấn đề và có biện pháp điều trị kịp thời."
+        return REMINDER_TEMPLATES["health_check_reminder"].format(check_type=check_type)
     
     @staticmethod
     def emergency_alert(message: str) -> str:
@@ -250,4 +548,4 @@ class NotificationTemplates:
     @staticmethod
     def meal_reminder(meal_type: str) -> str:
         """Create meal reminder notification text."""
-        return f"Nhắc nhở ăn uống: Đã đến giờ {meal_type}. Ăn uống đúng giờ và đầy đủ dinh dưỡng giúp cơ thể khỏe mạnh."
+        return REMINDER_TEMPLATES["meal_reminder"].format(meal_type=meal_type)
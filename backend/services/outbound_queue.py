@@ -0,0 +1,284 @@
+"""
+Bounded, prioritized outbound queue for a single WebSocket
+
+Producers (the Gemini receive loop, notification broadcasts, keepalives)
+only enqueue; a per-connection writer task does the actual ``send_text`` /
+``send_bytes``. A slow client therefore fills its own queue instead of
+stalling the code that produces the messages.
+
+Control messages are always sent before text, and text before audio. When
+the queue is full the oldest queued audio frame is evicted first; queued
+audio can also be purged explicitly when generation is interrupted.
+
+A producer that needs to know whether a message actually went out (e.g. a
+broadcast reporting per-recipient delivery) passes a future to ``put``; it
+resolves to True once the frame is written and to False if the frame is
+evicted, purged or the connection fails first.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple, Union
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CONTROL = 0
+PRIORITY_TEXT = 1
+PRIORITY_AUDIO = 2
+_PRIORITIES = (PRIORITY_CONTROL, PRIORITY_TEXT, PRIORITY_AUDIO)
+
+# (payload, enqueued_at, delivery future) - str payloads go out as text frames, bytes as binary
+_Item = Tuple[Union[str, bytes], float, Optional[asyncio.Future]]
+
+
+def _resolve(waiter: Optional[asyncio.Future], sent: bool) -> None:
+    if waiter is not None and not waiter.done():
+        waiter.set_result(sent)
+
+
+class OutboundQueue:
+    """Per-connection send queue drained by a single writer task."""
+
+    def __init__(
+        self,
+        websocket,
+        max_size: int = None,
+        send_timeout: float = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        name: str = "",
+    ):
+        """Initialize outbound queue.
+
+        Args:
+            websocket: FastAPI WebSocket to write to.
+            max_size: Maximum queued messages across all priorities.
+            send_timeout: Seconds a single send may take before the client is
+                considered stuck.
+            on_error: Called once with the exception when a send fails.
+            name: Label used in log messages.
+        """
+        self.websocket = websocket
+        self.max_size = max_size or settings.WEBSOCKET_OUTBOUND_QUEUE_SIZE
+        self.send_timeout = send_timeout or settings.WEBSOCKET_SEND_TIMEOUT
+        self.on_error = on_error
+        self.name = name
+        self._queues: List[Deque[_Item]] = [deque() for _ in _PRIORITIES]
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Backpressure metrics
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.purged = 0
+        self.send_errors = 0
+        self.max_depth = 0
+        self.slow_sends = 0
+        self._total_wait = 0.0
+        self._total_send = 0.0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self) -> None:
+        """Start the writer task on the running loop."""
+        if self._task is None and not self._closed:
+            self._task = asyncio.create_task(self._writer_loop())
+
+    def put_json(self, data: dict, priority: int = PRIORITY_CONTROL) -> bool:
+        """Serialize and queue a JSON text message."""
+        return self.put(json.dumps(data), priority)
+
+    def put(self, payload: Union[str, bytes], priority: int = PRIORITY_CONTROL, waiter: Optional[asyncio.Future] = None) -> bool:
+        """Queue a text (str) or binary (bytes) frame without blocking.
+
+        Args:
+            payload: Pre-serialized message.
+            priority: PRIORITY_CONTROL, PRIORITY_TEXT or PRIORITY_AUDIO.
+            waiter: Optional future resolved with whether the frame was sent.
+
+        Returns:
+            False if the message was dropped (queue closed or full).
+        """
+        if self._closed:
+            _resolve(waiter, False)
+            return False
+        if len(self) >= self.max_size and not self._make_room(priority):
+            self.dropped += 1
+            logger.warning(f"Outbound queue {self.name} full ({self.max_size}), dropping message")
+            _resolve(waiter, False)
+            return False
+        self._queues[priority].append((payload, time.monotonic(), waiter))
+        self.enqueued += 1
+        depth = len(self)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _make_room(self, priority: int) -> bool:
+        """Evict the oldest frame of the least important queue below ``priority``."""
+        for level in reversed(_PRIORITIES):
+            if level < priority:
+                break
+            if self._queues[level] and (level > priority or level == PRIORITY_AUDIO):
+                _resolve(self._queues[level].popleft()[2], False)
+                self.dropped += 1
+                return True
+        return False
+
+    def purge(self, priority: int = PRIORITY_AUDIO) -> int:
+        """Discard everything queued at ``priority`` (e.g. stale audio after an interrupt).
+
+        Returns:
+            Number of frames discarded.
+        """
+        count = len(self._queues[priority])
+        self._clear(self._queues[priority])
+        self.purged += count
+        if not len(self):
+            self._idle.set()
+        return count
+
+    @staticmethod
+    def _clear(queue: Deque[_Item]) -> None:
+        while queue:
+            _resolve(queue.popleft()[2], False)
+
+    # ------------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------------
+    def _pop(self) -> Optional[_Item]:
+        for queue in self._queues:
+            if queue:
+                return queue.popleft()
+        return None
+
+    async def _writer_loop(self) -> None:
+        waiter = None
+        try:
+            while True:
+                item = self._pop()
+                if item is None:
+                    self._ready.clear()
+                    self._idle.set()
+                    await self._ready.wait()
+                    continue
+                payload, enqueued_at, waiter = item
+                started = time.monotonic()
+                self._total_wait += started - enqueued_at
+                if isinstance(payload, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), timeout=self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                elapsed = time.monotonic() - started
+                self._total_send += elapsed
+                if elapsed > 0.5:
+                    self.slow_sends += 1
+                self.sent += 1
+                _resolve(waiter, True)
+        except asyncio.CancelledError:
+            _resolve(waiter, False)
+        except Exception as e:
+            _resolve(waiter, False)
+            self.send_errors += 1
+            self._closed = True
+            # Nothing queued can be sent any more
+            for queue in self._queues:
+                self._clear(queue)
+            self._idle.set()
+            logger.error(f"Outbound queue {self.name} writer stopped: {e!r}")
+            if self.on_error:
+                try:
+                    self.on_error(e)
+                except Exception as callback_error:
+                    logger.error(f"Outbound queue error callback failed: {callback_error}")
+
+    async def drain(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far has been sent.
+
+        Returns:
+            True if the queue emptied within ``timeout``.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return not len(self)
+        except asyncio.TimeoutError:
+            return False
+
+    def stop(self) -> None:
+        """Stop accepting messages and cancel the writer without draining."""
+        self._closed = True
+        for queue in self._queues:
+            self._clear(queue)
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def close(self, drain_timeout: float = 1.0) -> None:
+        """Flush control/text messages (best effort), then stop the writer."""
+        if self._task and not self._task.done() and not self._closed:
+            self.purge(PRIORITY_AUDIO)
+            await self.drain(drain_timeout)
+        self.stop()
+        if self._task:
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        """Backpressure metrics for this connection."""
+        return {
+            "depth": len(self),
+            "depth_by_priority": [len(q) for q in self._queues],
+            "max_depth": self.max_depth,
+            "capacity": self.max_size,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "purged": self.purged,
+            "send_errors": self.send_errors,
+            "slow_sends": self.slow_sends,
+            "avg_queue_wait_ms": round(self._total_wait / self.sent * 1000, 2) if self.sent else 0.0,
+            "avg_send_ms": round(self._total_send / self.sent * 1000, 2) if self.sent else 0.0,
+        }
+
+
+def aggregate_stats(queues) -> dict:
+    """Sum backpressure metrics over several queues."""
+    totals = {
+        "queued": 0,
+        "enqueued": 0,
+        "sent": 0,
+        "dropped": 0,
+        "purged": 0,
+        "send_errors": 0,
+        "slow_sends": 0,
+        "max_depth": 0,
+    }
+    for queue in queues:
+        totals["queued"] += len(queue)
+        totals["enqueued"] += queue.enqueued
+        totals["sent"] += queue.sent
+        totals["dropped"] += queue.dropped
+        totals["purged"] += queue.purged
+        totals["send_errors"] += queue.send_errors
+        totals["slow_sends"] += queue.slow_sends
+        totals["max_depth"] = max(totals["max_depth"], queue.max_depth)
+    return totals
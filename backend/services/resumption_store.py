@@ -0,0 +1,231 @@
+"""
+Per-user Gemini Live session resumption handles
+
+Handles are kept in an in-memory TTL map keyed by (user_id, device_id) and
+written through to the ``user_sessions`` table by a background flusher.
+``session_resumption_update`` messages therefore only touch a dict on the
+receive path; a burst of updates for the same connection is coalesced into
+one row update per flush. Other workers fall back to the table on a miss.
+
+Sessions without a user are kept in memory only (``user_sessions.user_id``
+is required) and only when the client sent a device id, so a connection
+never resumes another user's session.
+"""
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE_ID = "default"
+
+
+class _HandleEntry:
+    __slots__ = ("handle", "websocket_session_id", "updated_at", "updated_utc")
+
+    def __init__(self, handle: str, websocket_session_id: Optional[str]):
+        self.handle = handle
+        self.websocket_session_id = websocket_session_id
+        self.updated_at = time.monotonic()
+        self.updated_utc = datetime.datetime.utcnow()
+
+
+class ResumptionHandleStore:
+    """TTL map of resumption handles with batched write-through to the DB."""
+
+    def __init__(self, session_db_service=None, ttl_seconds: int = None, flush_interval: float = None):
+        """Initialize handle store.
+
+        Args:
+            session_db_service: SessionDBService. Created lazily if None.
+            ttl_seconds: Handle lifetime. Uses SESSION_TIMEOUT_SECONDS if None.
+            flush_interval: Seconds between background DB writes.
+        """
+        self._session_db_service = session_db_service
+        self.ttl_seconds = ttl_seconds or settings.SESSION_TIMEOUT_SECONDS
+        self.flush_interval = flush_interval or settings.RESUMPTION_FLUSH_INTERVAL
+        self._handles: Dict[Tuple[str, str], _HandleEntry] = {}
+        # Latest unsaved entry per live connection
+        self._dirty: Dict[str, dict] = {}
+        self._flusher_task: Optional[asyncio.Task] = None
+        self._db_unavailable = False
+        # Stats
+        self.updates = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def session_db_service(self):
+        if self._session_db_service is None and not self._db_unavailable:
+            try:
+                from db.db_services.session_service import SessionDBService
+                self._session_db_service = SessionDBService()
+            except Exception as e:
+                self._db_unavailable = True
+                logger.warning(f"Resumption handles will not be persisted: {e}")
+        return self._session_db_service
+
+    @staticmethod
+    def _key(user_id: Optional[str], device_id: Optional[str]) -> Optional[Tuple[str, str]]:
+        """Map key; anonymous sessions need an explicit device id to resume."""
+        if not user_id and not device_id:
+            return None
+        return (user_id or "", device_id or DEFAULT_DEVICE_ID)
+
+    # ------------------------------------------------------------------
+    # Receive path
+    # ------------------------------------------------------------------
+    def put(self, user_id: Optional[str], device_id: Optional[str], handle: str,
+            websocket_session_id: Optional[str] = None) -> None:
+        """Record the newest handle of a user's device without blocking.
+
+        Args:
+            user_id: User of the live session (None for anonymous sessions).
+            device_id: Client device id (DEFAULT_DEVICE_ID if None).
+            handle: New resumption handle from Gemini.
+            websocket_session_id: Live session id, used as the DB row key.
+        """
+        key = self._key(user_id, device_id)
+        if not handle or key is None:
+            return
+        entry = _HandleEntry(handle, websocket_session_id)
+        self._handles[key] = entry
+        self.updates += 1
+        if user_id and websocket_session_id:
+            self._dirty[websocket_session_id] = {
+                "user_id": user_id,
+                "device_id": device_id or DEFAULT_DEVICE_ID,
+                "websocket_session_id": websocket_session_id,
+                "handle": handle,
+                "updated_at": entry.updated_utc,
+            }
+            self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher_task and not self._flusher_task.done():
+            return
+        try:
+            self._flusher_task = asyncio.get_running_loop().create_task(self._flush_loop())
+        except RuntimeError:
+            pass
+
+    async def _flush_loop(self) -> None:
+        try:
+            while self._dirty:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Resumption handle flusher stopped: {e}")
+
+    async def flush(self) -> int:
+        """Write all pending handles in one transaction.
+
+        Returns:
+            Number of rows written.
+        """
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+        service = self.session_db_service
+        if service is None:
+            return 0
+        written = await service.save_resumption_handles(list(batch.values()))
+        if not written:
+            # Keep newer updates that arrived meanwhile, retry the rest later
+            for session_id, entry in batch.items():
+                self._dirty.setdefault(session_id, entry)
+            return 0
+        self.flushes += 1
+        self.rows_written += written
+        return written
+
+    # ------------------------------------------------------------------
+    # Connect path
+    # ------------------------------------------------------------------
+    def get(self, user_id: Optional[str], device_id: Optional[str]) -> Optional[str]:
+        """Get a live handle from memory only."""
+        key = self._key(user_id, device_id)
+        entry = self._handles.get(key) if key is not None else None
+        if entry is None:
+            return None
+        if time.monotonic() - entry.updated_at >= self.ttl_seconds:
+            self._handles.pop(key, None)
+            return None
+        return entry.handle
+
+    async def load(self, user_id: Optional[str], device_id: Optional[str]) -> Optional[str]:
+        """Get a live handle, falling back to the DB (e.g. written by another worker).
+
+        Args:
+            user_id: User of the new session. Anonymous sessions never resume
+                from the DB.
+            device_id: Client device id.
+
+        Returns:
+            Resumption handle or None.
+        """
+        handle = self.get(user_id, device_id)
+        if handle:
+            self.hits += 1
+            return handle
+        service = self.session_db_service if user_id else None
+        if service is not None:
+            row = await service.get_latest_resumption_handle(
+                user_id, device_id or DEFAULT_DEVICE_ID, self.ttl_seconds
+            )
+            if row:
+                self.db_hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def forget(self, user_id: Optional[str], device_id: Optional[str]) -> None:
+        """Drop the in-memory handle of a user's device (e.g. resumption failed)."""
+        key = self._key(user_id, device_id)
+        if key is not None:
+            self._handles.pop(key, None)
+
+    def purge_expired(self) -> int:
+        """Remove expired handles from memory."""
+        now = time.monotonic()
+        expired = [key for key, entry in self._handles.items() if now - entry.updated_at >= self.ttl_seconds]
+        for key in expired:
+            del self._handles[key]
+        return len(expired)
+
+    async def shutdown(self) -> None:
+        """Stop the flusher and write pending handles."""
+        if self._flusher_task and not self._flusher_task.done():
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        """Get store statistics."""
+        self.purge_expired()
+        return {
+            "handles": len(self._handles),
+            "pending_writes": len(self._dirty),
+            "updates": self.updates,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+        }
+
+
+# Global instance shared by the application
+resumption_store = ResumptionHandleStore()
@@ -3,7 +3,12 @@ Schedule Notification Service
 Automatically sends voice notifications when schedules are due
 """
 import asyncio
+import base64
 import logging
+import os
+import socket
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import List, Optional
 from sqlalchemy.orm import Session
@@ -11,21 +16,44 @@ from sqlalchemy.orm import Session
 from db.db_config import get_db
 from db.db_services.notification_service import NotificationDBService
 from db.models import NotificationType
-from services.voice_notification_service import VoiceNotificationService
+from config.settings import settings
+from services.due_notifications import DueNotificationQueue
+from services.notification_voice_service import NotificationVoiceService
+from services.voice_prerender import build_notification_text, get_voice_prerender_service
+from services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 
+
+def dispatch_owner_id(name: str) -> str:
+    """Identity a dispatcher writes to ``claimed_by`` (unique per process and loop)"""
+    return f"{name}@{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
 class ScheduleNotificationService:
     """Service for automatically sending schedule notifications"""
     
-    def __init__(self, notification_db_service: NotificationDBService, voice_service: VoiceNotificationService):
+    def __init__(self, notification_db_service: NotificationDBService, voice_service: NotificationVoiceService):
         self.notification_db_service = notification_db_service
         self.voice_service = voice_service
         self.is_running = False
-        self.check_interval = 60  # Check every 60 seconds
+        # Notifications due within the dispatch window, earliest first
+        self.due_queue = DueNotificationQueue()
+        self.window = settings.SCHEDULE_DISPATCH_WINDOW_MINUTES * 60
+        self.reload_interval = settings.SCHEDULE_DISPATCH_RELOAD_MINUTES * 60
+        self.retry_delay = settings.SCHEDULE_DISPATCH_RETRY_SECONDS
+        self._next_reload = 0.0
+        # Due rows are claimed under this owner, so other workers skip them
+        self.owner = dispatch_owner_id("schedule")
+        self.claim_lease = settings.SCHEDULE_CLAIM_LEASE_SECONDS
+        self.claim_batch_size = settings.SCHEDULE_CLAIM_BATCH_SIZE
         
     async def start_service(self):
-        """Start the schedule notification service"""
+        """Start the schedule notification service
+        
+        Sleeps until the earliest queued notification is due (or the queue
+        changes), then loads and sends only the due rows.
+        """
         if self.is_running:
             logger.warning("Schedule notification service is already running")
             return
@@ -36,59 +64,182 @@ class ScheduleNotificationService:
         while self.is_running:
             try:
                 await self.check_and_send_notifications()
-                await asyncio.sleep(self.check_interval)
+                timeout = self._next_reload - time.time()
+                next_due = self.due_queue.next_due()
+                if next_due is not None:
+                    timeout = min(timeout, next_due - time.time())
+                await self.due_queue.wait(timeout)
             except Exception as e:
                 logger.error(f"Error in schedule notification service: {e}")
-                await asyncio.sleep(self.check_interval)
+                await asyncio.sleep(self.retry_delay)
     
     async def stop_service(self):
         """Stop the schedule notification service"""
         self.is_running = False
         logger.info("Stopping schedule notification service")
     
+    def schedule(self, notification_id: str, scheduled_at: datetime) -> bool:
+        """Queue a notification for dispatch at ``scheduled_at`` (after create / reschedule / edit)"""
+        return self.due_queue.schedule(notification_id, scheduled_at)
+    
+    def cancel(self, notification_id: str) -> None:
+        """Stop a queued notification from being sent (after delete / complete)"""
+        self.due_queue.cancel(notification_id)
+    
+    async def reload_window(self):
+        """Load the unsent notifications due within the dispatch window"""
+        now = time.time()
+        window_end = now + self.window
+        self.due_queue.begin_reload()
+        rows = await asyncio.to_thread(
+            self.notification_db_service.get_unsent_schedule_window,
+            datetime.utcfromtimestamp(window_end)
+        )
+        self.due_queue.finish_reload(rows, window_end)
+        self._next_reload = now + min(self.reload_interval, self.window)
+        logger.debug(f"Dispatch window reloaded: {len(self.due_queue)} notifications queued")
+    
     async def check_and_send_notifications(self):
-        """Check for due notifications and send them"""
+        """Send the queued notifications that are due"""
         try:
-            # Get notifications that are due (within the next 5 minutes)
-            now = datetime.utcnow()
-            due_time = now + timedelta(minutes=5)
+            if time.time() >= self._next_reload:
+                await self.reload_window()
             
-            # Get all pending notifications
-            notifications = await self.notification_db_service.get_pending_notifications()
+            due_ids = self.due_queue.pop_due()
+            if not due_ids:
+                return
             
-            for notification in notifications:
-                try:
-                    # Check if notification is due
-                    if notification.scheduled_at <= due_time and not notification.is_sent:
-                        await self.send_schedule_notification(notification)
-                except Exception as e:
-                    logger.error(f"Error processing notification {notification.id}: {e}")
+            for start in range(0, len(due_ids), self.claim_batch_size):
+                await self._send_claimed_batch(due_ids[start:start + self.claim_batch_size])
                     
         except Exception as e:
             logger.error(f"Error checking notifications: {e}")
     
-    async def send_schedule_notification(self, notification):
-        """Send a specific schedule notification"""
+    async def _send_claimed_batch(self, due_ids: List[str]):
+        """Claim due notifications, send them, and confirm the delivered ones in one update
+        
+        Rows that are already sent, deleted, or claimed by another worker are
+        not returned by the claim and are skipped here. Undelivered rows are
+        released and retried after ``retry_delay``. The lease of the rest of
+        the batch is renewed before each send, and a notification whose claim
+        was lost meanwhile is skipped; if this process dies mid-batch, its
+        claims expire after ``claim_lease`` and the next window reload of any
+        worker picks them up again.
+        """
+        claimed = await asyncio.to_thread(
+            self.notification_db_service.claim_due_notifications,
+            self.owner, self.claim_lease,
+            notification_ids=due_ids,
+            limit=len(due_ids)
+        )
+        if not claimed:
+            return
+        await self._synthesize_missing_voices(claimed)
+        
+        delivered, failed = [], []
+        for index, notification in enumerate(claimed):
+            remaining = [str(item.id) for item in claimed[index:]]
+            owned = await asyncio.to_thread(
+                self.notification_db_service.renew_notification_claims, self.owner, remaining, self.claim_lease
+            )
+            if str(notification.id) not in owned:
+                logger.warning(f"Lost claim on notification {notification.id} - skipping")
+                continue
+            try:
+                sent = await self.send_schedule_notification(notification, mark_sent=False)
+            except Exception as e:
+                logger.error(f"Error processing notification {notification.id}: {e}")
+                sent = False
+            (delivered if sent else failed).append(str(notification.id))
+        
+        if delivered:
+            confirmed = await asyncio.to_thread(
+                self.notification_db_service.confirm_notifications_sent, self.owner, delivered
+            )
+            logger.info(f"Marked {confirmed}/{len(delivered)} schedule notifications as sent")
+        if failed:
+            await asyncio.to_thread(self.notification_db_service.release_notification_claims, self.owner, failed)
+            retry_at = time.time() + self.retry_delay
+            for notification_id in failed:
+                self.due_queue.schedule(notification_id, retry_at)
+    
+    async def _synthesize_missing_voices(self, notifications):
+        """Synthesize a wave of due notifications without pre-rendered audio as one batch.
+        
+        The audio lands in the TTS cache, so each send below is a cache hit.
+        """
+        prerender_service = get_voice_prerender_service()
+        texts = []
+        for notification in notifications:
+            text = build_notification_text(notification.title, notification.message)
+            if prerender_service is None or not prerender_service.has_audio(
+                str(notification.id), notification.voice_file_path, text
+            ):
+                texts.append(text)
+        if len(texts) > 1:
+            logger.info(f"Synthesizing {len(texts)} due notifications in one batch")
+            await self.voice_service.generate_voice_notifications_batch(texts)
+    
+    async def send_schedule_notification(self, notification, mark_sent: bool = True) -> bool:
+        """Send a specific schedule notification
+        
+        Args:
+            notification: Notification row to send
+            mark_sent: Mark it sent here; the dispatcher passes False and
+                confirms its claimed batch in one update instead
+        
+        Returns:
+            True if it was delivered (or kept in the outbox)
+        """
         try:
             logger.info(f"Sending schedule notification: {notification.title}")
             
-            # Generate voice notification
-            notification_text = f"Lịch trình: {notification.title}. {notification.message}"
+            notification_text = build_notification_text(notification.title, notification.message)
             
-            voice_base64 = await self.voice_service.generate_voice_notification_base64(notification_text)
+            # Prefer the audio rendered ahead of time; synthesize only if it is missing or stale
+            voice_base64 = None
+            prerender_service = get_voice_prerender_service()
+            if prerender_service is not None:
+                audio = await prerender_service.load_audio(
+                    str(notification.id), notification.voice_file_path, notification_text
+                )
+                if audio:
+                    voice_base64 = base64.b64encode(audio).decode('utf-8')
+            if voice_base64 is None:
+                voice_base64 = await self.voice_service.generate_voice_notification_base64(notification_text)
             
             if voice_base64:
-                # Mark notification as sent
-                await self.notification_db_service.mark_notification_sent(str(notification.id))
+                # Deliver to the user's devices and family members allowed to receive notifications
+                notification_data = {
+                    "message": "Voice notification generated successfully",
+                    "notificationText": notification_text,
+                    "audioBase64": voice_base64,
+                    "audioFormat": "audio/pcm",
+                    "notificationId": str(notification.id),
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "service": "schedule_notification_service"
+                }
+                variants = await self.voice_service.encode_voice_variants(
+                    notification_text, websocket_manager.get_audio_codecs(), websocket_manager.has_audio_by_reference()
+                )
+                report = await websocket_manager.send_voice_notification_to_users(
+                    [str(notification.user_id)], notification_data, variants
+                )
+                logger.info(f"Voice notification generated and sent to {report['sent']}/{report['recipients']} devices for: {notification.title}")
                 
-                # Broadcast to connected clients (if WebSocket manager is available)
-                # This would be handled by the main application
-                logger.info(f"Voice notification generated and sent for: {notification.title}")
+                # Sent means delivered to a device or kept in the outbox until one acknowledges it;
+                # otherwise leave it unsent so the next check retries
+                if report["sent"] or report.get("delivery_seq") is not None:
+                    if mark_sent:
+                        await asyncio.to_thread(self.notification_db_service.mark_notification_sent, str(notification.id))
+                    return True
+                logger.warning(f"Notification {notification.id} reached no device - will retry")
             else:
                 logger.warning(f"Failed to generate voice for notification: {notification.title}")
                 
         except Exception as e:
             logger.error(f"Error sending schedule notification {notification.id}: {e}")
+        return False
     
     async def send_immediate_notification(self, user_id: str, title: str, message: str, notification_type: str = "custom"):
         """Send an immediate notification (for testing)"""
@@ -108,8 +259,8 @@ class ScheduleNotificationService:
             )
             
             if notification:
-                # Send immediately
-                await self.send_schedule_notification(notification)
+                # Send immediately, through a claim so another worker's window reload does not send it too
+                await self._send_claimed_batch([str(notification.id)])
                 return True
             else:
                 logger.error("Failed to create immediate notification")
@@ -126,7 +277,7 @@ def get_schedule_notification_service() -> Optional[ScheduleNotificationService]
     """Get the global schedule notification service instance"""
     return schedule_notification_service
 
-def initialize_schedule_notification_service(notification_db_service: NotificationDBService, voice_service: VoiceNotificationService):
+def initialize_schedule_notification_service(notification_db_service: NotificationDBService, voice_service: NotificationVoiceService):
     """Initialize the global schedule notification service"""
     global schedule_notification_service
     schedule_notification_service = ScheduleNotificationService(notification_db_service, voice_service)
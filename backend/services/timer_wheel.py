@@ -0,0 +1,149 @@
+"""
+Hashed timer wheel
+
+One background task advances a ring of slots every ``tick`` seconds and hands
+all keys that expired in that tick to a single callback, instead of one
+sleeping task per key. Scheduling and cancelling are O(1); a timer further
+away than one revolution waits out extra ``rounds`` in its slot.
+
+Used by the WebSocket manager for connection keepalives: every connection has
+one timer, and each tick pings, idle-checks and reaps the due connections as
+one batch.
+"""
+import asyncio
+import inspect
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Ring of ``slots`` buckets advanced every ``tick`` seconds by one task."""
+
+    def __init__(
+        self,
+        tick: float,
+        slots: int,
+        on_expire: Callable[[List[Hashable]], Union[None, Awaitable[None]]],
+        name: str = "timer-wheel",
+    ):
+        """Initialize timer wheel.
+
+        Args:
+            tick: Seconds per slot (timer resolution).
+            slots: Number of slots in one revolution.
+            on_expire: Called with the keys due in a tick (may be a coroutine function).
+            name: Name used in logs.
+        """
+        self.tick = tick
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(max(slots, 1))]
+        self.on_expire = on_expire
+        self.name = name
+        # key -> slot index
+        self._index: Dict[Hashable, int] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        # Stats
+        self.ticks = 0
+        self.fired = 0
+        self.late_ticks = 0
+        self.max_batch = 0
+        self.max_tick_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        """(Re)arm the timer of ``key`` to expire after ``delay`` seconds."""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % len(self.slots)
+        self.slots[slot][key] = (ticks - 1) // len(self.slots)
+        self._index[key] = slot
+        self._ensure_running()
+
+    def cancel(self, key: Hashable) -> None:
+        """Disarm the timer of ``key`` (no-op if none)."""
+        slot = self._index.pop(key, None)
+        if slot is not None:
+            self.slots[slot].pop(key, None)
+
+    def _ensure_running(self) -> None:
+        if self._task and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts/tools): timers start with the next scheduling on a loop
+            return
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task (timers stay armed)."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _advance(self) -> List[Hashable]:
+        """Move to the next slot; returns the keys that expire there."""
+        self._cursor = (self._cursor + 1) % len(self.slots)
+        bucket = self.slots[self._cursor]
+        due = []
+        for key, rounds in list(bucket.items()):
+            if rounds:
+                bucket[key] = rounds - 1
+            else:
+                due.append(key)
+                del bucket[key]
+                del self._index[key]
+        return due
+
+    async def _run(self) -> None:
+        next_at = time.monotonic() + self.tick
+        try:
+            while True:
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+                # Catch up on ticks missed while the loop was busy, without sleeping between them
+                while next_at <= time.monotonic():
+                    started = time.monotonic()
+                    if started - next_at > self.tick:
+                        self.late_ticks += 1
+                    next_at += self.tick
+                    self.ticks += 1
+                    due = self._advance()
+                    if not due:
+                        continue
+                    self.fired += len(due)
+                    self.max_batch = max(self.max_batch, len(due))
+                    try:
+                        result = self.on_expire(due)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as e:
+                        logger.error(f"❌ {self.name} callback failed for {len(due)} timers: {e}")
+                    self.max_tick_ms = max(self.max_tick_ms, (time.monotonic() - started) * 1000)
+        except asyncio.CancelledError:
+            pass
+
+    def get_stats(self) -> dict:
+        """Get timer wheel statistics."""
+        return {
+            "timers": len(self._index),
+            "tick_seconds": self.tick,
+            "slots": len(self.slots),
+            "ticks": self.ticks,
+            "fired": self.fired,
+            "late_ticks": self.late_ticks,
+            "max_batch": self.max_batch,
+            "max_tick_ms": round(self.max_tick_ms, 2),
+        }
@@ -0,0 +1,281 @@
+"""
+Content-addressed cache for synthesized notification audio
+
+Voice notifications are mostly the same handful of texts (water reminders,
+repeated medicine reminders, re-broadcasts), and every synthesis opens a
+Gemini Live session that takes seconds. Audio is cached under
+``sha256(text, voice, language, model)`` in two tiers:
+
+- memory: LRU bounded by TTS_CACHE_MEMORY_BYTES
+- disk: one file per key under TTS_CACHE_DIR, bounded by TTS_CACHE_DISK_BYTES
+  and evicted least-recently-used first (file mtime is bumped on every hit)
+
+Concurrent misses for the same key are coalesced: only the first caller
+synthesizes, the others await its result.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_SUFFIX = ".pcm"
+
+
+def cache_key(text: str, voice: str, language: str, model: str) -> str:
+    """Stable content hash of everything that determines the synthesized audio."""
+    payload = json.dumps([text, voice, language, model], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    """Two-tier (memory LRU + disk) audio cache with single-flight synthesis."""
+
+    def __init__(self, cache_dir: str = None, memory_bytes: int = None, disk_bytes: int = None):
+        """Initialize TTS cache.
+
+        Args:
+            cache_dir: Directory of the disk tier. Uses settings if None.
+            memory_bytes: Byte budget of the memory tier (0 disables it).
+            disk_bytes: Byte budget of the disk tier (0 disables it).
+        """
+        self.cache_dir = cache_dir or settings.TTS_CACHE_DIR
+        self.memory_bytes = settings.TTS_CACHE_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.disk_bytes = settings.TTS_CACHE_DISK_BYTES if disk_bytes is None else disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        # key -> (size, last use); loaded lazily from the directory
+        self._disk_index: Optional["OrderedDict[str, Tuple[int, float]]"] = None
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+        return audio
+
+    def _memory_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    # ------------------------------------------------------------------
+    # Disk tier (blocking - called through asyncio.to_thread)
+    # ------------------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_FILE_SUFFIX)
+
+    def _load_disk_index(self) -> "OrderedDict[str, Tuple[int, float]]":
+        if self._disk_index is not None:
+            return self._disk_index
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(CACHE_FILE_SUFFIX):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-len(CACHE_FILE_SUFFIX)], stat.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((key, (size, mtime)) for mtime, key, size in entries)
+        self._disk_size = sum(size for size, _ in self._disk_index.values())
+        return self._disk_index
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if self.disk_bytes <= 0:
+            return None
+        with self._disk_lock:
+            index = self._load_disk_index()
+            if key not in index:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                now = time.time()
+                os.utime(path, (now, now))
+            except OSError:
+                size, _ = index.pop(key)
+                self._disk_size -= size
+                return None
+            index[key] = (len(audio), now)
+            index.move_to_end(key)
+            return audio
+
+    def _disk_put(self, key: str, audio: bytes) -> None:
+        if self.disk_bytes <= 0 or len(audio) > self.disk_bytes:
+            return
+        with self._disk_lock:
+            index = self._load_disk_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+            previous = index.pop(key, None)
+            if previous is not None:
+                self._disk_size -= previous[0]
+            index[key] = (len(audio), time.time())
+            self._disk_size += len(audio)
+            while self._disk_size > self.disk_bytes and len(index) > 1:
+                old_key, (size, _) = index.popitem(last=False)
+                self._disk_size -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look a key up in memory, then on disk (promoting disk hits to memory)."""
+        audio = self._memory_get(key)
+        if audio is not None:
+            self.memory_hits += 1
+            return audio
+        try:
+            audio = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logger.warning(f"⚠️ TTS cache read failed: {e}")
+            audio = None
+        if audio is not None:
+            self.disk_hits += 1
+            self._memory_put(key, audio)
+        return audio
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """Store audio in both tiers."""
+        self._memory_put(key, audio)
+        try:
+            await asyncio.to_thread(self._disk_put, key, audio)
+        except Exception as e:
+            logger.warning(f"⚠️ TTS cache write failed: {e}")
+
+    async def get_or_create(self, key: str, producer: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """Return cached audio, or run ``producer`` once for all concurrent callers.
+
+        Args:
+            key: Result of ``cache_key``.
+            producer: Synthesizes the audio; a None result is not cached.
+
+        Returns:
+            Audio bytes, or None if synthesis failed.
+        """
+        audio = await self.get(key)
+        if audio is not None:
+            return audio
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if inflight.cancelled():
+                    # The synthesizing caller was cancelled, not us
+                    return None
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        try:
+            audio = await producer()
+            if audio:
+                await self.put(key, audio)
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; mark it retrieved for the no-waiter case
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def is_inflight(self, key: str) -> bool:
+        """Whether a synthesis for ``key`` is running."""
+        return key in self._inflight
+
+    def begin_flight(self, key: str) -> bool:
+        """Claim the synthesis of ``key`` for a caller that produces it incrementally.
+
+        Concurrent ``get_or_create`` calls wait for the matching ``end_flight``.
+
+        Returns:
+            False if another caller is already synthesizing ``key``.
+        """
+        if key in self._inflight:
+            return False
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        self.misses += 1
+        return True
+
+    async def end_flight(self, key: str, audio: Optional[bytes]) -> None:
+        """Finish a claimed synthesis: cache the audio and wake the waiters."""
+        try:
+            if audio:
+                await self.put(key, audio)
+        finally:
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(audio)
+
+    def clear_memory(self) -> None:
+        """Drop the memory tier (the disk tier is kept)."""
+        self._memory.clear()
+        self._memory_size = 0
+
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+            "disk_bytes": self._disk_size if self._disk_index is not None else None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+
+# Global instance shared by the application
+tts_cache = TTSAudioCache()
@@ -0,0 +1,368 @@
+"""
+Ahead-of-time voice rendering for scheduled notifications
+
+Synthesizing a reminder takes seconds and depends on the TTS provider being
+responsive at exactly ``scheduled_at``. ``VoicePrerenderService`` renders the
+audio as soon as a notification is created or rescheduled (and, as a safety
+net, periodically for every voice notification due within
+VOICE_PRERENDER_HORIZON_HOURS), writes it to VOICE_PRERENDER_DIR and records
+``voice_file_path`` / ``voice_generated_at`` on the notification. Dispatch
+then only reads the file.
+
+File names carry the TTS cache key of the rendered text, so audio rendered
+for an older title/message is never played after an edit.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+AUDIO_FILE_SUFFIX = ".pcm"
+# Characters of the cache key kept in file names
+KEY_PREFIX_LENGTH = 16
+# Queued notifications a worker renders together
+MAX_QUEUED_BATCH = 50
+
+
+def build_notification_text(title: str, message: Optional[str]) -> str:
+    """Spoken text of a scheduled notification (shared by pre-render and dispatch)."""
+    return f"Lịch trình: {title}. {message or ''}".strip()
+
+
+class VoicePrerenderService:
+    """Background renderer filling notification voice files ahead of dispatch."""
+
+    def __init__(
+        self,
+        notification_db_service,
+        voice_service,
+        audio_dir: str = None,
+        horizon_hours: float = None,
+        scan_interval: float = None,
+        concurrency: int = None,
+    ):
+        """Initialize pre-render service.
+
+        Args:
+            notification_db_service: NotificationDBService instance.
+            voice_service: NotificationVoiceService used for synthesis.
+            audio_dir: Directory of rendered files. Uses settings if None.
+            horizon_hours: Render notifications due within this many hours.
+            scan_interval: Seconds between safety-net scans of the table.
+            concurrency: Renders running at the same time.
+        """
+        self.notification_db_service = notification_db_service
+        self.voice_service = voice_service
+        self.audio_dir = audio_dir or settings.VOICE_PRERENDER_DIR
+        self.horizon_hours = horizon_hours or settings.VOICE_PRERENDER_HORIZON_HOURS
+        self.scan_interval = scan_interval or settings.VOICE_PRERENDER_SCAN_INTERVAL
+        self.concurrency = concurrency or settings.VOICE_PRERENDER_CONCURRENCY
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: Set[str] = set()
+        # Queued or rendering notifications that were deleted meanwhile
+        self._cancelled: Set[str] = set()
+        self._tasks = []
+        self.is_running = False
+        # Stats
+        self.rendered = 0
+        self.failed = 0
+        self.file_hits = 0
+        self.file_misses = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """Start the scanner and render workers on the running loop."""
+        if self.is_running:
+            return
+        self.is_running = True
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self._tasks = [asyncio.create_task(self._scan_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"✅ Voice pre-render started (horizon={self.horizon_hours}h, workers={self.concurrency})")
+
+    async def stop(self) -> None:
+        """Stop background tasks."""
+        self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def schedule(self, notification_id: str, scheduled_at: Optional[datetime] = None) -> bool:
+        """Queue a notification for rendering (after create / reschedule / edit).
+
+        Args:
+            notification_id: Notification to render.
+            scheduled_at: Due time; notifications beyond the horizon are left to the scanner.
+
+        Returns:
+            True if the notification was queued.
+        """
+        if scheduled_at is not None:
+            if scheduled_at.tzinfo is not None:
+                scheduled_at = scheduled_at.astimezone(timezone.utc).replace(tzinfo=None)
+            if scheduled_at > datetime.utcnow() + timedelta(hours=self.horizon_hours):
+                return False
+        notification_id = str(notification_id)
+        if notification_id in self._queued:
+            return False
+        self._queued.add(notification_id)
+        self._queue.put_nowait(notification_id)
+        return True
+
+    async def cancel(self, notification_id: str) -> None:
+        """Drop a notification's pending render and its rendered files (after delete)."""
+        notification_id = str(notification_id)
+        if notification_id in self._queued:
+            # Still in the queue or being synthesized: skipped / not stored by the worker
+            self._cancelled.add(notification_id)
+        removed = await asyncio.to_thread(self._remove_rendered_files, notification_id)
+        if removed:
+            logger.info(f"Removed {removed} pre-rendered voice files of deleted notification {notification_id}")
+
+    def _remove_rendered_files(self, notification_id: str) -> int:
+        if not os.path.isdir(self.audio_dir):
+            return 0
+        prefix = f"{notification_id}-"
+        removed = 0
+        for name in os.listdir(self.audio_dir):
+            if name.startswith(prefix) and name.endswith(AUDIO_FILE_SUFFIX):
+                self._remove_file(os.path.join(self.audio_dir, name))
+                removed += 1
+        return removed
+
+    async def _scan_loop(self) -> None:
+        try:
+            while self.is_running:
+                try:
+                    await self.scan()
+                    await asyncio.to_thread(self.purge_old_files)
+                except Exception as e:
+                    logger.error(f"❌ Voice pre-render scan failed: {e}")
+                await asyncio.sleep(self.scan_interval)
+        except asyncio.CancelledError:
+            pass
+
+    async def scan(self) -> int:
+        """Render every voice notification inside the horizon that has no audio yet, as one batch."""
+        until = datetime.utcnow() + timedelta(hours=self.horizon_hours)
+        rows = await asyncio.to_thread(self.notification_db_service.get_notifications_needing_voice, until)
+        rows = [row for row in rows if row["id"] not in self._queued]
+        if not rows:
+            return 0
+        return await self.render_batch(rows)
+
+    async def _worker(self) -> None:
+        try:
+            while True:
+                # Take everything queued meanwhile (e.g. a week of reminders created at once)
+                batch = [await self._queue.get()]
+                while not self._queue.empty() and len(batch) < MAX_QUEUED_BATCH:
+                    batch.append(self._queue.get_nowait())
+                pending = [notification_id for notification_id in batch if notification_id not in self._cancelled]
+                try:
+                    if len(pending) == 1:
+                        await self.render(pending[0])
+                    elif pending:
+                        await self._render_queued(pending)
+                except Exception as e:
+                    self.failed += len(pending)
+                    logger.error(f"❌ Failed to pre-render voice for notifications {pending}: {e}")
+                finally:
+                    self._queued.difference_update(batch)
+                    self._cancelled.difference_update(batch)
+        except asyncio.CancelledError:
+            pass
+
+    async def _render_queued(self, notification_ids: List[str]) -> int:
+        """Render several queued notifications over shared batch sessions."""
+        rows = []
+        for notification_id in notification_ids:
+            notification = await asyncio.to_thread(self.notification_db_service.get_notification_serialized, notification_id)
+            if not notification or notification["is_sent"] or not notification["has_voice"]:
+                continue
+            text = build_notification_text(notification["title"], notification["message"])
+            if not self.has_audio(notification_id, notification["voice_file_path"], text):
+                rows.append(notification)
+        if not rows:
+            return 0
+        return await self.render_batch(rows)
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+    def _file_path(self, notification_id: str, text: str) -> str:
+        key = self.voice_service.get_cache_key(text)[:KEY_PREFIX_LENGTH]
+        return os.path.join(self.audio_dir, f"{notification_id}-{key}{AUDIO_FILE_SUFFIX}")
+
+    @staticmethod
+    def _write_file(path: str, audio: bytes) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+    async def render(self, notification_id: str) -> Optional[str]:
+        """Synthesize one notification and record its voice file.
+
+        Returns:
+            Path of the rendered file, or None if nothing was rendered.
+        """
+        notification = await asyncio.to_thread(self.notification_db_service.get_notification_serialized, notification_id)
+        if not notification or notification["is_sent"] or not notification["has_voice"]:
+            return None
+        text = build_notification_text(notification["title"], notification["message"])
+        path = self._file_path(notification_id, text)
+        if notification["voice_file_path"] == path and os.path.exists(path):
+            return path
+
+        audio = await self.voice_service.generate_voice_notification(text)
+        return await self._store(notification_id, text, audio, notification["voice_file_path"])
+
+    async def render_batch(self, rows: List[dict]) -> int:
+        """Synthesize many notifications over the voice service's shared batch sessions.
+
+        Args:
+            rows: Dictionaries with id, title and message.
+
+        Returns:
+            Number of notifications rendered.
+        """
+        ids = [row["id"] for row in rows]
+        self._queued.update(ids)
+        try:
+            texts = [build_notification_text(row["title"], row["message"]) for row in rows]
+            audios = await self.voice_service.generate_voice_notifications_batch(texts)
+            paths = [
+                await self._store(row["id"], text, audio, row.get("voice_file_path"))
+                for row, text, audio in zip(rows, texts, audios)
+            ]
+        finally:
+            self._queued.difference_update(ids)
+            self._cancelled.difference_update(ids)
+        return sum(1 for path in paths if path)
+
+    async def _store(self, notification_id: str, text: str, audio: Optional[bytes], previous: Optional[str]) -> Optional[str]:
+        """Write rendered audio and record it on the notification."""
+        if not audio:
+            self.failed += 1
+            logger.warning(f"⚠️ No audio rendered for notification {notification_id}")
+            return None
+        if notification_id in self._cancelled:
+            # Deleted while it was being synthesized
+            return None
+        path = self._file_path(notification_id, text)
+        await asyncio.to_thread(self._write_file, path, audio)
+        await self.notification_db_service.update_notification_voice(notification_id, path, text)
+
+        if previous and previous != path:
+            await asyncio.to_thread(self._remove_file, previous)
+        self.rendered += 1
+        logger.info(f"✅ Pre-rendered voice for notification {notification_id} ({len(audio)} bytes)")
+        return path
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+    def has_audio(self, notification_id: str, voice_file_path: Optional[str], text: str) -> bool:
+        """Whether a notification has a rendered file for its current text."""
+        return (
+            bool(voice_file_path)
+            and voice_file_path == self._file_path(str(notification_id), text)
+            and os.path.exists(voice_file_path)
+        )
+
+    async def load_audio(self, notification_id: str, voice_file_path: Optional[str], text: str) -> Optional[bytes]:
+        """Read the pre-rendered audio of a notification if it matches the current text.
+
+        Args:
+            notification_id: Notification being dispatched.
+            voice_file_path: Recorded voice file path of the notification.
+            text: Text that is about to be spoken.
+
+        Returns:
+            Audio bytes, or None if the notification has to be synthesized now.
+        """
+        if not voice_file_path or voice_file_path != self._file_path(str(notification_id), text):
+            self.file_misses += 1
+            return None
+        try:
+            audio = await asyncio.to_thread(self._read_file, voice_file_path)
+        except OSError:
+            audio = None
+        if audio:
+            self.file_hits += 1
+        else:
+            self.file_misses += 1
+        return audio
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def purge_old_files(self) -> int:
+        """Delete rendered files older than VOICE_PRERENDER_RETENTION_DAYS."""
+        if not os.path.isdir(self.audio_dir):
+            return 0
+        cutoff = time.time() - settings.VOICE_PRERENDER_RETENTION_DAYS * 86400
+        removed = 0
+        for name in os.listdir(self.audio_dir):
+            path = os.path.join(self.audio_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def get_stats(self) -> dict:
+        """Get pre-render statistics."""
+        return {
+            "running": self.is_running,
+            "queued": len(self._queued),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "file_hits": self.file_hits,
+            "file_misses": self.file_misses,
+        }
+
+
+# Global instance
+voice_prerender_service: Optional[VoicePrerenderService] = None
+
+
+def get_voice_prerender_service() -> Optional[VoicePrerenderService]:
+    """Get the global voice pre-render service instance"""
+    return voice_prerender_service
+
+
+def initialize_voice_prerender_service(notification_db_service, voice_service) -> VoicePrerenderService:
+    """Initialize the global voice pre-render service"""
+    global voice_prerender_service
+    voice_prerender_service = VoicePrerenderService(notification_db_service, voice_service)
+    logger.info("Voice pre-render service initialized")
+    return voice_prerender_service
@@ -0,0 +1,242 @@
+"""
+Template-segment stitching for reminder voices
+
+Most reminder texts come from ``NotificationTemplates``: a fixed sentence
+with one or two slots (medicine name, time, date...). Instead of
+synthesizing every variant from scratch, a matching text is split into its
+fixed phrases and slot values, each piece is synthesized on its own (and
+cached in the content-addressed TTS cache, so fixed phrases are rendered
+once per voice and common slot values such as drug names or times are
+shared by every reminder), and the PCM is joined with short crossfades.
+
+Only a cache miss on a brand-new slot value reaches the TTS provider; the
+fixed phrases, which make up most of the audio, never do again.
+"""
+import asyncio
+import logging
+import re
+import string
+from array import array
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 24000  # Gemini Live audio output
+# Samples below this amplitude count as silence when trimming segment edges
+SILENCE_AMPLITUDE = 300
+# Silence kept at each trimmed edge
+EDGE_PADDING_MS = 40
+
+_SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+_EDGE_PUNCTUATION = string.whitespace + ".,:;"
+
+
+class ReminderTemplate:
+    """A reminder sentence with named ``{slot}`` placeholders."""
+
+    def __init__(self, name: str, pattern: str):
+        """Initialize template.
+
+        Args:
+            name: Template name (e.g. "medicine_reminder").
+            pattern: Text with ``{slot}`` placeholders.
+        """
+        self.name = name
+        self.pattern = pattern
+        self.slots = _SLOT_PATTERN.findall(pattern)
+        # Alternating fixed phrases and slot names, e.g. ["Đã đến giờ uống ", "medicine_name", " lúc ", "time", ...]
+        self._parts = _SLOT_PATTERN.split(pattern)
+        regex = ""
+        for index, part in enumerate(self._parts):
+            regex += f"(?P<{part}>.+?)" if index % 2 else re.escape(part)
+        self._regex = re.compile(f"^{regex}$", re.DOTALL)
+
+    def format(self, **slots) -> str:
+        """Fill in the slots."""
+        return self.pattern.format(**slots)
+
+    def match(self, text: str) -> Optional[Dict[str, str]]:
+        """Slot values if ``text`` was produced by this template."""
+        found = self._regex.match(text.strip())
+        return found.groupdict() if found else None
+
+    def segments(self, slots: Dict[str, str]) -> List[Tuple[str, bool]]:
+        """Spoken pieces in order as (text, is_slot); empty pieces are dropped."""
+        pieces = []
+        for index, part in enumerate(self._parts):
+            is_slot = bool(index % 2)
+            if is_slot:
+                text = slots[part].strip(_EDGE_PUNCTUATION)
+            else:
+                # Keep trailing sentence punctuation for intonation
+                text = part.strip().lstrip(_EDGE_PUNCTUATION)
+            if text:
+                pieces.append((text, is_slot))
+        return pieces
+
+    @property
+    def fixed_phrases(self) -> List[str]:
+        """Fixed pieces, rendered once per voice."""
+        return [text for text, is_slot in self.segments({slot: "" for slot in self.slots}) if not is_slot]
+
+
+REMINDER_TEMPLATES: Dict[str, ReminderTemplate] = {
+    template.name: template
+    for template in (
+        ReminderTemplate(
+            "medicine_reminder",
+            "Nhắc nhở uống thuốc: Đã đến giờ uống {medicine_name} lúc {time}. "
+            "Nhớ uống thuốc đúng giờ để đảm bảo hiệu quả điều trị nhé.",
+        ),
+        ReminderTemplate(
+            "appointment_reminder",
+            "Nhắc nhở lịch khám: Bác có lịch khám với bác sĩ {doctor_name} vào {time} ngày {date}. "
+            "Nhớ chuẩn bị đầy đủ giấy tờ và đến đúng giờ nhé.",
+        ),
+        ReminderTemplate(
+            "exercise_reminder",
+            "Nhắc nhở tập thể dục: Đã đến giờ {exercise_type} trong {duration}. "
+            "Tập thể dục đều đặn giúp cơ thể khỏe mạnh và tinh thần sảng khoái.",
+        ),
+        ReminderTemplate(
+            "health_check_reminder",
+            "Nhắc nhở kiểm tra sức khỏe: Đã đến giờ {check_type}. "
+            "Theo dõi sức khỏe định kỳ giúp phát hiện sớm các vấn đề và có biện pháp điều trị kịp thời.",
+        ),
+        ReminderTemplate(
+            "meal_reminder",
+            "Nhắc nhở ăn uống: Đã đến giờ {meal_type}. "
+            "Ăn uống đúng giờ và đầy đủ dinh dưỡng giúp cơ thể khỏe mạnh.",
+        ),
+    )
+}
+
+
+def match_template(text: str) -> Optional[Tuple[ReminderTemplate, Dict[str, str]]]:
+    """Find the reminder template that produced ``text``."""
+    for template in REMINDER_TEMPLATES.values():
+        slots = template.match(text)
+        if slots is not None:
+            return template, slots
+    return None
+
+
+# ----------------------------------------------------------------------
+# PCM helpers (16-bit mono little-endian)
+# ----------------------------------------------------------------------
+def _samples(pcm: bytes) -> array:
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    return samples
+
+
+def trim_silence(samples: array, sample_rate: int = SAMPLE_RATE) -> array:
+    """Cut leading/trailing silence, keeping EDGE_PADDING_MS at each edge."""
+    start, end = 0, len(samples)
+    while start < end and abs(samples[start]) < SILENCE_AMPLITUDE:
+        start += 1
+    while end > start and abs(samples[end - 1]) < SILENCE_AMPLITUDE:
+        end -= 1
+    if start >= end:
+        return samples
+    padding = sample_rate * EDGE_PADDING_MS // 1000
+    return samples[max(0, start - padding):min(len(samples), end + padding)]
+
+
+def crossfade_join(segments: Iterable[array], crossfade_samples: int) -> array:
+    """Concatenate segments, overlapping each boundary with a linear crossfade."""
+    output = array("h")
+    for segment in segments:
+        overlap = min(crossfade_samples, len(output), len(segment))
+        if overlap:
+            tail_start = len(output) - overlap
+            for i in range(overlap):
+                weight = (i + 1) / (overlap + 1)
+                mixed = output[tail_start + i] * (1.0 - weight) + segment[i] * weight
+                output[tail_start + i] = max(-32768, min(32767, int(mixed)))
+        output.extend(segment[overlap:])
+    return output
+
+
+class TemplateVoiceStitcher:
+    """Renders template-generated texts from separately synthesized pieces."""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+        crossfade_ms: int = None,
+        sample_rate: int = SAMPLE_RATE,
+    ):
+        """Initialize stitcher.
+
+        Args:
+            synthesize: Returns (cached) PCM for one piece of text.
+            crossfade_ms: Overlap at each boundary. Uses settings if None.
+            sample_rate: PCM sample rate of the synthesized audio.
+        """
+        self.synthesize = synthesize
+        self.sample_rate = sample_rate
+        crossfade_ms = settings.VOICE_STITCH_CROSSFADE_MS if crossfade_ms is None else crossfade_ms
+        self.crossfade_samples = sample_rate * crossfade_ms // 1000
+        # Stats
+        self.stitched = 0
+        self.fallbacks = 0
+
+    def can_render(self, text: str) -> bool:
+        """Whether ``text`` matches a reminder template."""
+        return match_template(text) is not None
+
+    async def render(self, text: str) -> Optional[bytes]:
+        """Render a template-generated text.
+
+        Args:
+            text: Full reminder text.
+
+        Returns:
+            Stitched PCM, or None if the text matches no template or a piece
+            could not be synthesized (the caller then synthesizes the whole text).
+        """
+        matched = match_template(text)
+        if matched is None:
+            return None
+        template, slots = matched
+        pieces = template.segments(slots)
+        audios = await asyncio.gather(*(self.synthesize(piece) for piece, _ in pieces))
+        if not all(audios):
+            self.fallbacks += 1
+            logger.warning(f"⚠️ Could not render every piece of {template.name}, synthesizing the full text")
+            return None
+        joined = await asyncio.to_thread(self._join, audios)
+        self.stitched += 1
+        return joined
+
+    def _join(self, audios: List[bytes]) -> bytes:
+        segments = [trim_silence(_samples(audio), self.sample_rate) for audio in audios]
+        return crossfade_join(segments, self.crossfade_samples).tobytes()
+
+    async def prewarm(self, slot_values: Iterable[str] = ()) -> int:
+        """Render every fixed phrase (and optional common slot values) into the cache.
+
+        Args:
+            slot_values: Common slot values, e.g. drug names or times.
+
+        Returns:
+            Number of pieces that could be rendered.
+        """
+        texts = {phrase for template in REMINDER_TEMPLATES.values() for phrase in template.fixed_phrases}
+        texts.update(value.strip(_EDGE_PUNCTUATION) for value in slot_values if value and value.strip())
+        results = []
+        for text in sorted(texts):
+            results.append(await self.synthesize(text))
+        rendered = sum(1 for audio in results if audio)
+        logger.info(f"✅ Pre-rendered {rendered}/{len(texts)} reminder voice segments")
+        return rendered
+
+    def get_stats(self) -> dict:
+        """Get stitcher statistics."""
+        return {
+            "stitched": self.stitched,
+            "fallbacks": self.fallbacks,
+        }
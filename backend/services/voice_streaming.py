@@ -0,0 +1,129 @@
+"""
+Chunked delivery of voice notifications over WebSocket
+
+A streamed notification is sent as three kinds of JSON messages sharing a
+``stream_id``:
+
+- ``voice_notification_stream_start``: text, type and audio format
+- ``voice_notification_chunk``: ``seq`` (0, 1, 2...) and base64 PCM
+- ``voice_notification_stream_end``: number of chunks and whether the
+  utterance completed; clients that missed a ``seq`` can discard the stream
+
+Clients start playback at the first chunk instead of waiting for the whole
+utterance to be synthesized and base64-encoded.
+"""
+import base64
+import datetime
+import logging
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+STREAM_AUDIO_FORMAT = "audio/pcm;rate=24000"
+
+
+class VoiceChunkStream:
+    """Builds the start / chunk / end messages of one streamed utterance."""
+
+    def __init__(self, notification_text: str, notification_type: str = "info", request_id: str = ""):
+        """Initialize stream framing.
+
+        Args:
+            notification_text: Text being spoken.
+            notification_type: Notification type (info, emergency...).
+            request_id: Client request id echoed in every message.
+        """
+        self.stream_id = uuid.uuid4().hex
+        self.notification_text = notification_text
+        self.notification_type = notification_type
+        self.request_id = request_id
+        self.seq = 0
+        self.bytes_sent = 0
+
+    def start_message(self) -> dict:
+        return {
+            "type": "voice_notification_stream_start",
+            "stream_id": self.stream_id,
+            "notification_text": self.notification_text,
+            "notification_type": self.notification_type,
+            "audio_format": STREAM_AUDIO_FORMAT,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "request_id": self.request_id,
+        }
+
+    def chunk_message(self, chunk: bytes) -> dict:
+        message = {
+            "type": "voice_notification_chunk",
+            "stream_id": self.stream_id,
+            "seq": self.seq,
+            "audio_base64": base64.b64encode(chunk).decode("utf-8"),
+        }
+        self.seq += 1
+        self.bytes_sent += len(chunk)
+        return message
+
+    def end_message(self, success: bool, error: Optional[str] = None) -> dict:
+        message = {
+            "type": "voice_notification_stream_end",
+            "stream_id": self.stream_id,
+            "chunks": self.seq,
+            "bytes": self.bytes_sent,
+            "success": success,
+            "request_id": self.request_id,
+        }
+        if error:
+            message["error"] = error
+        return message
+
+
+async def relay_voice_stream(
+    chunks: AsyncIterator[bytes],
+    stream: VoiceChunkStream,
+    send: Callable[[dict], Awaitable[None]],
+) -> AsyncIterator[bytes]:
+    """Send every chunk as a framed message while passing it through.
+
+    The end marker is always sent, also when ``chunks`` fails or the consumer
+    stops early (then with ``success`` False).
+
+    Args:
+        chunks: Audio chunks, e.g. ``NotificationVoiceService.stream_voice_notification``.
+        stream: Framing of this utterance.
+        send: Delivers one message (to one or many WebSockets).
+
+    Yields:
+        The audio chunks, unchanged.
+    """
+    await send(stream.start_message())
+    completed = False
+    error = None
+    try:
+        async for chunk in chunks:
+            await send(stream.chunk_message(chunk))
+            yield chunk
+        completed = True
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        await send(stream.end_message(completed and stream.seq > 0, error))
+
+
+async def send_voice_stream(
+    chunks: AsyncIterator[bytes],
+    stream: VoiceChunkStream,
+    send: Callable[[dict], Awaitable[None]],
+) -> bool:
+    """Deliver a whole utterance as framed messages.
+
+    Returns:
+        True if at least one chunk was sent and synthesis completed.
+    """
+    try:
+        async for _ in relay_voice_stream(chunks, stream, send):
+            pass
+    except Exception as e:
+        logger.error(f"❌ Voice stream {stream.stream_id} failed after {stream.seq} chunks: {e}")
+        return False
+    return stream.seq > 0
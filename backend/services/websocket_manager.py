@@ -4,99 +4,556 @@ WebSocket connection manager để broadcast voice notifications
 import asyncio
 import json
 import logging
-from typing import Set, Dict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import WebSocket
 import datetime
+import time
+
+from config.settings import settings
+from services.notification_channel import NotificationReplayBuffer
+from services.outbound_queue import OutboundQueue, PRIORITY_CONTROL, PRIORITY_TEXT, aggregate_stats
+from services.timer_wheel import TimerWheel
 
 logger = logging.getLogger(__name__)
 
+# Kết quả gửi của từng connection trong delivery report
+DELIVERY_SENT = "sent"          # writer task đã gửi xong
+DELIVERY_QUEUED = "queued"      # đã vào queue, không chờ kết quả (wait=False)
+DELIVERY_PENDING = "pending"    # vẫn còn trong queue khi hết deadline
+DELIVERY_DROPPED = "dropped"    # queue đóng hoặc đầy
+DELIVERY_FAILED = "failed"      # connection đã ngắt hoặc gửi lỗi
+
 class WebSocketConnectionManager:
     """Manager để quản lý WebSocket connections và broadcast messages"""
     
     def __init__(self):
         # Set để lưu trữ active WebSocket connections
         self.active_connections: Set[WebSocket] = set()
-        # Per-connection send locks để tránh concurrent send gây lỗi
-        self._send_locks: Dict[WebSocket, asyncio.Lock] = {}
+        # Per-connection outbound queue; writer task của queue là nơi duy nhất gọi send
+        self._outbound: Dict[WebSocket, OutboundQueue] = {}
+        # Codec notification audio đã negotiate của từng connection (không có = PCM)
+        self._audio_codecs: Dict[WebSocket, str] = {}
+        # Connections nhận notification audio qua URL thay vì base64 inline
+        self._audio_by_reference: Set[WebSocket] = set()
+        # Index theo user: user_id -> {device key -> connection}, để gửi có mục tiêu
+        self._user_connections: Dict[str, Dict[str, WebSocket]] = {}
+        self._connection_users: Dict[WebSocket, Tuple[str, str]] = {}
+        # NotificationRecipientResolver (user + gia đình); None = chỉ gửi cho chính user
+        self.recipient_resolver = None
+        # Notifications gần đây (seq + resume token) để replay cho push channel
+        self.replay_buffer = NotificationReplayBuffer()
+        # NotificationOutbox: notifications gửi cho users được lưu tới khi client ack; None = tắt
+        self.outbox = None
+        # Connections đã báo hỗ trợ ack (acks=1): chỉ chúng được replay outbox; client cũ giữ fire-and-forget
+        self._ack_connections: Set[WebSocket] = set()
+        # Một timer wheel cho keepalive / idle check / reap của mọi connection (thay vì một task mỗi socket)
+        self.keepalive_wheel = TimerWheel(
+            settings.WEBSOCKET_WHEEL_TICK,
+            settings.WEBSOCKET_WHEEL_SLOTS,
+            self._on_keepalive_due,
+            name="websocket-keepalive"
+        )
+        # Thời điểm (monotonic) client gửi message gần nhất / gửi ping-keepalive gần nhất
+        self._last_activity: Dict[WebSocket, float] = {}
+        self._last_pong: Dict[WebSocket, float] = {}
+        self._keepalive_counts: Dict[WebSocket, int] = {}
+        self.reaped = 0
     
     def add_connection(self, websocket: WebSocket):
         """Thêm WebSocket connection vào danh sách active"""
         self.active_connections.add(websocket)
-        # Tạo lock cho kết nối mới
-        if websocket not in self._send_locks:
-            self._send_locks[websocket] = asyncio.Lock()
+        # Tạo outbound queue cho kết nối mới
+        if websocket not in self._outbound:
+            queue = OutboundQueue(
+                websocket,
+                on_error=lambda e, ws=websocket: self._on_send_error(ws, e),
+                name=f"ws-{id(websocket):x}"
+            )
+            queue.start()
+            self._outbound[websocket] = queue
+            self._last_activity[websocket] = time.monotonic()
+            self.keepalive_wheel.schedule(websocket, settings.WEBSOCKET_PING_INTERVAL)
         logger.info(f"WebSocket connection added. Total connections: {len(self.active_connections)}")
     
     def remove_connection(self, websocket: WebSocket):
         """Xóa WebSocket connection khỏi danh sách active"""
         self.active_connections.discard(websocket)
-        # Xóa lock tương ứng
+        self._audio_codecs.pop(websocket, None)
+        self._audio_by_reference.discard(websocket)
+        self._ack_connections.discard(websocket)
+        self._unregister_user(websocket)
+        self.keepalive_wheel.cancel(websocket)
+        self._last_activity.pop(websocket, None)
+        self._last_pong.pop(websocket, None)
+        self._keepalive_counts.pop(websocket, None)
+        # Dừng outbound queue tương ứng
+        queue = self._outbound.pop(websocket, None)
+        if queue is not None:
+            queue.stop()
+        logger.info(f"WebSocket connection removed. Total connections: {len(self.active_connections)}")
+
+    def touch(self, websocket: WebSocket, pong: bool = False):
+        """Ghi nhận client vừa gửi message (pong=True cho keepalive/ping của client)"""
+        if websocket in self._last_activity:
+            now = time.monotonic()
+            self._last_activity[websocket] = now
+            if pong:
+                self._last_pong[websocket] = now
+
+    def get_outbound(self, websocket: WebSocket) -> Optional[OutboundQueue]:
+        """Lấy outbound queue của một WebSocket (None nếu không được quản lý)"""
+        return self._outbound.get(websocket)
+
+    def register_user(self, websocket: WebSocket, user_id: str, device_id: Optional[str] = None):
+        """
+        Gắn connection với user (và device) để nhận notification có mục tiêu
+        
+        Args:
+            websocket: WebSocket connection đã add_connection
+            user_id: User của connection (từ config message của Gemini Live)
+            device_id: Device của client; connection mới của cùng device thay thế connection cũ
+        """
+        if websocket not in self.active_connections or not user_id:
+            return
+        self._unregister_user(websocket)
+        user_id = str(user_id)
+        device_key = str(device_id) if device_id else f"conn-{id(websocket):x}"
+        self._user_connections.setdefault(user_id, {})[device_key] = websocket
+        self._connection_users[websocket] = (user_id, device_key)
+        logger.info(f"WebSocket connection registered for user {user_id} (device {device_key})")
+
+    def _unregister_user(self, websocket: WebSocket):
+        entry = self._connection_users.pop(websocket, None)
+        if entry is None:
+            return
+        user_id, device_key = entry
+        devices = self._user_connections.get(user_id)
+        if devices is not None and devices.get(device_key) is websocket:
+            del devices[device_key]
+            if not devices:
+                del self._user_connections[user_id]
+
+    def get_user_connections(self, user_ids: Iterable[str]) -> List[WebSocket]:
+        """Connections của các users (chỉ lookup theo index, không duyệt mọi connection)"""
+        connections = []
+        for user_id in set(str(user_id) for user_id in user_ids):
+            connections.extend(self._user_connections.get(user_id, {}).values())
+        return connections
+
+    async def resolve_recipients(self, user_ids: Iterable[str], include_family: bool = True) -> Set[str]:
+        """Users nhận notification: chính các users, cộng family members được phép nhận"""
+        recipients = set(str(user_id) for user_id in user_ids)
+        if include_family and self.recipient_resolver is not None:
+            for user_id in list(recipients):
+                recipients |= await self.recipient_resolver.resolve(user_id)
+        return recipients
+
+    async def send_to_users(
+        self,
+        user_ids: Iterable[str],
+        data: dict,
+        include_family: bool = True,
+        priority: int = PRIORITY_TEXT
+    ) -> dict:
+        """
+        Gửi message tới mọi device của các users (và gia đình của họ)
+        
+        Args:
+            user_ids: Users nhận message
+            data: Message để gửi (serialize một lần)
+            include_family: Thêm family members có can_receive_notifications
+            priority: Priority trong outbound queue
+        
+        Returns:
+            Delivery report (xem _fan_out)
+        """
+        recipients = await self.resolve_recipients(user_ids, include_family)
+        seq, data = self._number_notification(data)
+        payload = json.dumps(data)
+        self.replay_buffer.record(seq, frozenset(recipients), lambda connection: payload)
+        return await self._fan_out(self.get_user_connections(recipients), lambda connection: payload, priority)
+
+    async def send_to_user(self, user_id: str, data: dict, include_family: bool = True, priority: int = PRIORITY_TEXT) -> dict:
+        """Gửi message tới mọi device của một user (và gia đình nếu include_family)"""
+        return await self.send_to_users([user_id], data, include_family, priority)
+
+    def set_audio_codec(self, websocket: WebSocket, codec: str):
+        """Ghi nhận codec notification audio mà client đã negotiate"""
+        if websocket in self.active_connections:
+            self._audio_codecs[websocket] = codec
+
+    def get_audio_codec(self, websocket: WebSocket) -> str:
+        """Codec notification audio của một connection (mặc định PCM)"""
+        return self._audio_codecs.get(websocket, "pcm")
+
+    def get_audio_codecs(self) -> Set[str]:
+        """Tập codec đang được các connected clients sử dụng"""
+        return {self.get_audio_codec(connection) for connection in self.active_connections}
+
+    def set_audio_by_reference(self, websocket: WebSocket, enabled: bool = True):
+        """Client nhận notification audio qua URL + hash (audio artifact store)"""
+        if enabled and websocket in self.active_connections:
+            self._audio_by_reference.add(websocket)
+        else:
+            self._audio_by_reference.discard(websocket)
+
+    def is_audio_by_reference(self, websocket: WebSocket) -> bool:
+        return websocket in self._audio_by_reference
+
+    def has_audio_by_reference(self) -> bool:
+        """Có connection nào nhận audio qua URL không"""
+        return bool(self._audio_by_reference)
+
+    def _on_send_error(self, websocket: WebSocket, error: Exception):
+        """Writer task gặp lỗi/timeout: client không còn đọc được, bỏ kết nối"""
+        logger.warning(f"Dropping WebSocket connection after send failure: {error!r}")
+        self._drop(websocket, 1011, "Send failed")
+
+    def _drop(self, websocket: WebSocket, code: int, reason: str):
+        """Bỏ connection và đóng socket (session đang chạy trên socket cũng kết thúc)"""
+        self.remove_connection(websocket)
         try:
-            self._send_locks.pop(websocket, None)
+            asyncio.create_task(websocket.close(code=code, reason=reason))
         except Exception:
             pass
-        logger.info(f"WebSocket connection removed. Total connections: {len(self.active_connections)}")
 
-    def _get_lock(self, websocket: WebSocket) -> asyncio.Lock:
-        """Lấy (hoặc tạo) lock cho một WebSocket cụ thể"""
-        lock = self._send_locks.get(websocket)
-        if lock is None:
-            lock = asyncio.Lock()
-            self._send_locks[websocket] = lock
-        return lock
+    def _is_dead(self, websocket: WebSocket) -> bool:
+        """Socket đã ngắt hoặc queue đã đóng (không cần gửi gì để biết)"""
+        if hasattr(websocket, 'client_state') and websocket.client_state.name != 'CONNECTED':
+            return True
+        queue = self._outbound.get(websocket)
+        return queue is None or queue.closed
+
+    def _on_keepalive_due(self, connections: List[WebSocket]):
+        """
+        Timer wheel tick: keepalive, idle check và reap cho các connections tới hạn, một batch
+        
+        Connection đã ngắt bị reap; connection im lặng quá WEBSOCKET_IDLE_TIMEOUT
+        (nếu bật) bị đóng; còn lại được gửi keepalive và hẹn lần tiếp theo.
+        """
+        now = time.monotonic()
+        timestamp = datetime.datetime.now()
+        idle_timeout = settings.WEBSOCKET_IDLE_TIMEOUT
+        for connection in connections:
+            if connection not in self.active_connections:
+                continue
+            if self._is_dead(connection):
+                self.reaped += 1
+                self.remove_connection(connection)
+                continue
+            if idle_timeout and now - self._last_activity.get(connection, now) > idle_timeout:
+                logger.info(f"Closing idle WebSocket connection {self._connection_label(connection)}")
+                self.reaped += 1
+                self._drop(connection, 1001, "Idle timeout")
+                continue
+            count = self._keepalive_counts.get(connection, 0)
+            self._enqueue(connection, json.dumps({
+                "type": "keepalive",
+                "timestamp": timestamp.isoformat(),
+                "count": count,
+                "server_time": timestamp.strftime("%H:%M:%S")
+            }))
+            self._keepalive_counts[connection] = count + 1
+            self.keepalive_wheel.schedule(connection, settings.WEBSOCKET_PING_INTERVAL)
+
+    def get_keepalive_stats(self) -> dict:
+        """Idle / last-pong metrics của các connections và trạng thái timer wheel"""
+        now = time.monotonic()
+        idle = sorted(now - self._last_activity.get(connection, now) for connection in self.active_connections)
+        pong_ages = [now - self._last_pong[connection] for connection in self.active_connections if connection in self._last_pong]
+        return {
+            "wheel": self.keepalive_wheel.get_stats(),
+            "reaped": self.reaped,
+            "idle_seconds_p50": round(idle[len(idle) // 2], 1) if idle else None,
+            "idle_seconds_max": round(idle[-1], 1) if idle else None,
+            "idle_over_ping_interval": sum(1 for seconds in idle if seconds > settings.WEBSOCKET_PING_INTERVAL),
+            "last_pong_age_max": round(max(pong_ages), 1) if pong_ages else None,
+            "never_ponged": len(self.active_connections) - len(pong_ages),
+        }
+
+    def _enqueue(self, websocket: WebSocket, payload: str, priority: int = PRIORITY_CONTROL) -> bool:
+        """Đưa message đã serialize vào queue của connection (không chờ network)"""
+        queue = self._outbound.get(websocket)
+        if queue is None or queue.closed:
+            return False
+        return queue.put(payload, priority)
     
-    async def broadcast_voice_notification(self, notification_data: dict):
+    async def broadcast_voice_notification(self, notification_data: dict, variants: Optional[Dict[str, dict]] = None) -> dict:
         """
         Broadcast voice notification tới tất cả connected clients
         
         Args:
-            notification_data: Dictionary chứa voice notification data
+            notification_data: Dictionary chứa voice notification data (PCM)
+            variants: Codec -> fields thay thế (audioBase64, audioFormat) cho clients
+                đã negotiate codec nén, và audioUrl/audioHash cho clients nhận audio qua URL
+        
+        Returns:
+            Delivery report (xem _fan_out)
         """
         if not self.active_connections:
+            # Vẫn ghi vào replay buffer để devices nhận lại khi resume
             logger.warning("No active WebSocket connections to broadcast to")
-            return
         
-        message = {
+        logger.info(f"Broadcasting voice notification to {len(self.active_connections)} connections")
+        report = await self._deliver_voice_notification(list(self.active_connections), notification_data, variants, broadcast=True)
+        logger.info(f"Voice notification broadcast completed: {report['sent']}/{report['recipients']} sent")
+        return report
+    
+    async def send_voice_notification_to_users(
+        self,
+        user_ids: Iterable[str],
+        notification_data: dict,
+        variants: Optional[Dict[str, dict]] = None,
+        include_family: bool = True
+    ) -> dict:
+        """
+        Gửi voice notification tới devices của các users (và gia đình của họ)
+        
+        Args:
+            user_ids: Users nhận notification
+            notification_data: Dictionary chứa voice notification data (PCM)
+            variants: Như broadcast_voice_notification
+            include_family: Thêm family members có can_receive_notifications
+        
+        Returns:
+            Delivery report (xem _fan_out)
+        """
+        recipients = await self.resolve_recipients(user_ids, include_family)
+        # Lưu vào outbox trước khi gửi: devices offline nhận lại khi kết nối, tới khi ack
+        delivery_seq = None
+        if self.outbox is not None:
+            delivery_seq = await self.outbox.put(recipients, notification_data, variants)
+        connections = self.get_user_connections(recipients)
+        if not connections:
+            logger.info(f"No connected devices for notification recipients {sorted(recipients)}")
+        report = await self._deliver_voice_notification(
+            connections, notification_data, variants, recipients=recipients, delivery_seq=delivery_seq
+        )
+        report["delivery_seq"] = delivery_seq
+        return report
+    
+    async def _deliver_voice_notification(
+        self,
+        connections: List[WebSocket],
+        notification_data: dict,
+        variants: Optional[Dict[str, dict]] = None,
+        broadcast: bool = False,
+        recipients: Optional[Set[str]] = None,
+        delivery_seq: Optional[int] = None
+    ) -> dict:
+        """Gửi voice notification cho các connections, serialize một lần mỗi variant"""
+        seq, message = self._number_notification({
             "type": "voice_notification_response",
             "success": True,
             "data": notification_data,
-            "broadcast": True  # Flag để client biết đây là broadcast message
-        }
+            "broadcast": broadcast  # Flag để client biết đây là broadcast message
+        })
+        if delivery_seq is not None:
+            # Client ack bằng {"type": "ack", "delivery_seq": n}
+            message["delivery_seq"] = delivery_seq
         
-        # List để track failed connections
-        failed_connections = []
+        # Serialize một lần cho mỗi (codec, delivery) đang được dùng
+        payloads = {}
+        variants = variants or {}
+
+        def payload_for(connection) -> str:
+            key = (self.get_audio_codec(connection), connection in self._audio_by_reference)
+            if key not in payloads:
+                # Codec không encode được thì dùng PCM
+                fields = variants[key[0]] if key[0] in variants else variants.get("pcm", {})
+                data = {**notification_data, **fields}
+                if key[1] and "audioUrl" in data:
+                    # Chỉ gửi URL + hash; client tự fetch hoặc dùng cache trên máy
+                    data = {k: v for k, v in data.items() if k != "audioBase64"}
+                payloads[key] = json.dumps({**message, "data": data})
+            return payloads[key]
         
-        logger.info(f"Broadcasting voice notification to {len(self.active_connections)} connections")
+        if delivery_seq is None:
+            self.replay_buffer.record(seq, None if broadcast else frozenset(recipients or ()), payload_for)
+        else:
+            # Outbox replay thay cho replay buffer (không gửi trùng khi resume)
+            self.replay_buffer.record(seq, frozenset(), payload_for)
+        return await self._fan_out(connections, payload_for, PRIORITY_TEXT)
+    
+    async def broadcast_message(self, data: dict, priority: int = PRIORITY_TEXT, wait: bool = False) -> dict:
+        """
+        Broadcast một message bất kỳ (vd. voice stream chunk) tới tất cả connected clients
+
+        Args:
+            data: Message để gửi (serialize một lần)
+            priority: Priority trong outbound queue
+            wait: Chờ kết quả gửi; mặc định không chờ để stream chunks không bị chậm
+                theo client chậm nhất
+
+        Returns:
+            Delivery report (xem _fan_out)
+        """
+        payload = json.dumps(data)
+        return await self._fan_out(list(self.active_connections), lambda connection: payload, priority, wait=wait)
+
+    async def users_sender(self, user_ids: Iterable[str], include_family: bool = True, priority: int = PRIORITY_TEXT):
+        """
+        Hàm gửi messages (vd. voice stream chunks) tới devices của các users, như broadcast_message
+        
+        Recipients được resolve một lần cho cả stream; connections được lấy lại mỗi message
+        nên device kết nối giữa chừng vẫn nhận phần còn lại.
+        """
+        recipients = await self.resolve_recipients(user_ids, include_family)
+
+        async def send(data: dict) -> dict:
+            payload = json.dumps(data)
+            return await self._fan_out(self.get_user_connections(recipients), lambda connection: payload, priority, wait=False)
+        return send
+
+    def _number_notification(self, message: dict) -> Tuple[int, dict]:
+        """Đánh seq + resume token cho notification (ghi vào replay buffer sau khi serialize)"""
+        seq = self.replay_buffer.next_seq()
+        return seq, {**message, "seq": seq, "resume_token": self.replay_buffer.token(seq)}
+
+    async def send_payloads(self, websocket: WebSocket, payloads: List[str], priority: int = PRIORITY_TEXT) -> dict:
+        """Gửi các messages đã serialize (vd. notifications replay) tới một connection, theo thứ tự"""
+        report = self._report({})
+        for payload in payloads:
+            report = await self._fan_out([websocket], lambda connection, payload=payload: payload, priority, wait=False)
+        return report
+
+    async def enable_acks(self, websocket: WebSocket, user_id: str):
+        """
+        Client báo hỗ trợ ack: từ giờ notifications của user được giữ trong outbox
+        tới khi ack và được gửi lại khi kết nối (replay_pending)
+        """
+        if websocket not in self.active_connections or not user_id:
+            return
+        self._ack_connections.add(websocket)
+        if self.outbox is not None:
+            await self.outbox.add_ack_user(user_id)
+
+    def supports_acks(self, websocket: WebSocket) -> bool:
+        return websocket in self._ack_connections
+
+    async def replay_pending(self, websocket: WebSocket, user_id: str) -> int:
+        """
+        Gửi lại các notifications trong outbox mà user chưa ack (khi device kết nối)
+        
+        Chỉ cho connections đã enable_acks: client cũ không ack nên sẽ bị phát lại
+        mọi notification cũ ở mỗi lần kết nối.
+        
+        Returns:
+            Số notifications đã đưa vào queue
+        """
+        if self.outbox is None or not user_id or websocket not in self._ack_connections:
+            return 0
+        codec = self.get_audio_codec(websocket)
+        by_reference = self.is_audio_by_reference(websocket)
+        payloads = []
+        for item in self.outbox.pending(user_id):
+            fields = await self.outbox.audio_fields(item, codec, by_reference)
+            if fields is None:
+                logger.warning(f"Audio of pending notification {item['seq']} is gone - skipping replay")
+                continue
+            payloads.append(json.dumps({
+                "type": "voice_notification_response",
+                "success": True,
+                "data": {**item["data"], **fields},
+                "broadcast": False,
+                "delivery_seq": item["seq"],
+                "replayed": True
+            }))
+        if payloads:
+            await self.send_payloads(websocket, payloads)
+            logger.info(f"Replayed {len(payloads)} unacknowledged notifications to user {user_id}")
+        return len(payloads)
+
+    async def ack_notifications(self, user_id: str, delivery_seq) -> int:
+        """Client đã nhận notifications của user tới delivery_seq (ack cộng dồn)"""
+        if self.outbox is None or not user_id:
+            return 0
+        return await self.outbox.ack(user_id, delivery_seq)
+
+    def _connection_label(self, websocket: WebSocket) -> str:
+        """Tên của connection trong delivery report: "user/device" nếu đã register"""
+        entry = self._connection_users.get(websocket)
+        if entry is not None:
+            return f"{entry[0]}/{entry[1]}"
+        return f"conn-{id(websocket):x}"
+
+    @staticmethod
+    def _report(results: Dict[str, str]) -> dict:
+        """Tổng hợp kết quả gửi theo từng connection"""
+        report = {"recipients": len(results)}
+        for status in (DELIVERY_SENT, DELIVERY_QUEUED, DELIVERY_PENDING, DELIVERY_DROPPED, DELIVERY_FAILED):
+            report[status] = sum(1 for value in results.values() if value == status)
+        report["results"] = results
+        return report
+
+    async def _fan_out(
+        self,
+        connections: Iterable[WebSocket],
+        payload_for: Callable[[WebSocket], str],
+        priority: int = PRIORITY_TEXT,
+        wait: bool = True,
+        deadline: float = None
+    ) -> dict:
+        """
+        Đưa payload vào queue của mọi connection rồi chờ các writer tasks gửi song song
         
-        # Send message to all active connections with better error handling
-        for connection in list(self.active_connections):  # Create a copy to avoid modification during iteration
+        Mỗi connection có writer task riêng (gửi với WEBSOCKET_SEND_TIMEOUT), nên
+        tổng thời gian bị chặn bởi deadline / lần gửi chậm nhất, không phải tổng
+        các lần gửi.
+        
+        Args:
+            connections: Connections nhận message
+            payload_for: Payload đã serialize cho từng connection (cache theo variant)
+            priority: Priority trong outbound queue
+            wait: Chờ kết quả gửi; False thì chỉ báo "queued"
+            deadline: Số giây tối đa chờ. Dùng settings nếu None
+        
+        Returns:
+            {"recipients", "sent", "queued", "pending", "dropped", "failed",
+            "results": {label: status}}; "pending" là message vẫn còn trong queue
+            khi hết deadline
+        """
+        deadline = settings.WEBSOCKET_BROADCAST_DEADLINE if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        results: Dict[str, str] = {}
+        waiters: Dict[asyncio.Future, str] = {}
+        failed_connections = []
+        
+        for connection in connections:
+            label = self._connection_label(connection)
             try:
                 # Check connection state before sending safely
-                if hasattr(connection, 'client_state') and connection.client_state.name == 'CONNECTED':
-                    # Serialize sends per-connection
-                    lock = self._get_lock(connection)
-                    async with lock:
-                        await asyncio.wait_for(
-                            connection.send_text(json.dumps(message)),
-                            timeout=10.0  # 10 second timeout for send
-                        )
-                    logger.debug(f"Voice notification sent to WebSocket connection")
-                else:
-                    logger.warning("WebSocket not connected, marking for removal")
+                if hasattr(connection, 'client_state') and connection.client_state.name != 'CONNECTED':
+                    results[label] = DELIVERY_FAILED
                     failed_connections.append(connection)
-            except asyncio.TimeoutError:
-                logger.error("Timeout sending voice notification to WebSocket")
-                failed_connections.append(connection)
+                    continue
+                queue = self._outbound.get(connection)
+                waiter = loop.create_future() if wait else None
+                if queue is None or not queue.put(payload_for(connection), priority, waiter):
+                    results[label] = DELIVERY_DROPPED
+                elif waiter is None:
+                    results[label] = DELIVERY_QUEUED
+                else:
+                    waiters[waiter] = label
             except Exception as e:
-                logger.error(f"Failed to send voice notification to WebSocket: {e}")
+                logger.error(f"Failed to queue message for WebSocket: {e}")
+                results[label] = DELIVERY_FAILED
                 failed_connections.append(connection)
         
         # Remove failed connections
         for connection in failed_connections:
             self.remove_connection(connection)
         
-        logger.info(f"Voice notification broadcast completed. Sent to {len(self.active_connections)} clients")
-    
+        if waiters:
+            done, not_done = await asyncio.wait(waiters, timeout=deadline)
+            for waiter in done:
+                results[waiters[waiter]] = DELIVERY_SENT if waiter.result() else DELIVERY_FAILED
+            for waiter in not_done:
+                # Still queued: the writer's own send timeout decides about this client
+                results[waiters[waiter]] = DELIVERY_PENDING
+        
+        return self._report(results)
+
     async def send_to_connection(self, websocket: WebSocket, data: dict):
         """
         Gửi message tới một WebSocket connection cụ thể
@@ -106,9 +563,11 @@ class WebSocketConnectionManager:
             data: Data để gửi
         """
         try:
-            # Serialize sends per-connection to avoid concurrent send errors
-            lock = self._get_lock(websocket)
-            async with lock:
+            if websocket in self._outbound:
+                if not self._enqueue(websocket, json.dumps(data)):
+                    raise RuntimeError("Outbound queue closed or full")
+            else:
+                # Connection không được quản lý bởi manager: gửi trực tiếp
                 await websocket.send_text(json.dumps(data))
         except Exception as e:
             logger.error(f"Failed to send data to WebSocket: {e}")
@@ -121,30 +580,10 @@ class WebSocketConnectionManager:
     
     async def cleanup_dead_connections(self):
         """Cleanup dead or invalid WebSocket connections"""
-        dead_connections = []
-        
-        for connection in list(self.active_connections):
-            try:
-                # Check if connection is still alive
-                if connection.client_state.name != 'CONNECTED':
-                    dead_connections.append(connection)
-                    continue
-                
-                # Try to send a ping to check connection health
-                try:
-                    await asyncio.wait_for(
-                        connection.send_text(json.dumps({"type": "ping"})),
-                        timeout=5.0
-                    )
-                except (asyncio.TimeoutError, Exception):
-                    dead_connections.append(connection)
-                    
-            except Exception as e:
-                logger.warning(f"Error checking connection health: {e}")
-                dead_connections.append(connection)
-        
-        # Remove dead connections
+        # Chỉ kiểm tra trạng thái; ping do keepalive wheel gửi theo lịch
+        dead_connections = [connection for connection in list(self.active_connections) if self._is_dead(connection)]
         for connection in dead_connections:
+            self.reaped += 1
             self.remove_connection(connection)
         
         if dead_connections:
@@ -156,8 +595,14 @@ class WebSocketConnectionManager:
         """Get detailed connection statistics"""
         return {
             "total_connections": len(self.active_connections),
+            "users_connected": len(self._user_connections),
+            "recipient_resolver": self.recipient_resolver.get_stats() if self.recipient_resolver else None,
+            "notification_replay": self.replay_buffer.get_stats(),
+            "notification_outbox": self.outbox.get_stats() if self.outbox else None,
             "timestamp": datetime.datetime.now().isoformat(),
-            "status": "healthy" if self.active_connections else "no_connections"
+            "status": "healthy" if self.active_connections else "no_connections",
+            "outbound": aggregate_stats(self._outbound.values()),
+            "keepalive": self.get_keepalive_stats()
         }
     
     async def broadcast_keepalive(self):
@@ -171,25 +616,15 @@ class WebSocketConnectionManager:
             "connection_count": len(self.active_connections)
         }
         
-        failed_connections = []
+        payload = json.dumps(keepalive_message)
+        connections = list(self.active_connections)
+        report = await self._fan_out(connections, lambda connection: payload, PRIORITY_CONTROL)
         
-        for connection in list(self.active_connections):
-            try:
-                if connection.client_state.name == 'CONNECTED':
-                    lock = self._get_lock(connection)
-                    async with lock:
-                        await asyncio.wait_for(
-                            connection.send_text(json.dumps(keepalive_message)),
-                            timeout=5.0
-                        )
-                else:
-                    failed_connections.append(connection)
-            except Exception:
-                failed_connections.append(connection)
-        
-        # Remove failed connections
-        for connection in failed_connections:
-            self.remove_connection(connection)
+        # Remove connections whose queue is closed or full
+        for connection in connections:
+            if report["results"].get(self._connection_label(connection)) == DELIVERY_DROPPED:
+                self.remove_connection(connection)
+        return report
 
 
 # Global instance để sử dụng trong toàn bộ application
@@ -0,0 +1,20 @@
+"""
+Shared pytest setup for the backend services
+
+Settings are read at import time, so the required keys and every runtime
+path are set here before any service module is imported. Tests never touch
+the network or the database: live sessions use the offline stub client and
+DB services are replaced by in-memory fakes.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-google-key")
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+os.environ.setdefault("SESSION_TOKEN_SECRET", "test-session-secret")
+os.environ["RUNTIME_DIR"] = tempfile.mkdtemp(prefix="backend-tests-")
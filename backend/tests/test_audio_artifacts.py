@@ -0,0 +1,67 @@
+"""AudioArtifactStore: content-addressed files, lookups, byte ranges and retention."""
+import hashlib
+import os
+import time
+
+import pytest
+
+from config.settings import settings
+from services.audio_artifacts import ARTIFACT_URL_PATH, AudioArtifactStore, parse_range
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AudioArtifactStore(root_dir=str(tmp_path), base_url="https://api.example.com/")
+
+
+def test_put_names_files_by_content_hash(store):
+    artifact = store.put(b"opus-bytes", "audio/ogg;codecs=opus")
+    again = store.put(b"opus-bytes", "audio/ogg")
+
+    digest = hashlib.sha256(b"opus-bytes").hexdigest()
+    assert artifact == again
+    assert artifact["hash"] == digest and artifact["size"] == 10
+    assert artifact["url"] == f"https://api.example.com{ARTIFACT_URL_PATH}/{digest}.ogg"
+    assert artifact["audio_format"] == "audio/ogg;codecs=opus"
+    assert store.get_stats()["stored"] == 1 and store.get_stats()["reused"] == 1
+
+
+def test_resolve_rejects_unknown_and_malformed_names(store):
+    digest = store.put(b"pcm", "audio/pcm;rate=24000")["hash"]
+
+    path, content_hash, mime_type = store.resolve(f"{digest}.pcm")
+
+    assert content_hash == digest and mime_type == "audio/pcm;rate=24000"
+    assert store.read(path) == b"pcm" and store.read(path, 1, 1) == b"c"
+    assert store.resolve(f"{digest}.ogg") is None
+    assert store.resolve("../../etc/passwd") is None
+    assert store.resolve(f"{digest.upper()}.pcm") is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=50-500", (50, 99)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=9-3", "bytes=-0", "bytes=a-b"])
+def test_parse_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+def test_purge_removes_only_expired_files(store):
+    old = store.resolve(f"{store.put(b'old', 'audio/aac')['hash']}.aac")[0]
+    fresh = store.resolve(f"{store.put(b'fresh', 'audio/aac')['hash']}.aac")[0]
+    expired = time.time() - (settings.AUDIO_ARTIFACT_RETENTION_DAYS + 1) * 86400
+    os.utime(old, (expired, expired))
+
+    assert store.purge_old_files() == 1
+    assert not os.path.exists(old) and os.path.exists(fresh)
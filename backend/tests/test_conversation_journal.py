@@ -0,0 +1,92 @@
+"""ConversationJournal: buffered appends, close vs. flusher, rotation, compaction and scoped reads."""
+import asyncio
+
+import pytest
+
+from services.conversation_journal import ConversationJournal
+from services.memoir_extraction_service import MemoirExtractionService
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return ConversationJournal(journal_dir=str(tmp_path), flush_interval=0.01, fsync_interval=0.01)
+
+
+def test_entries_are_read_back_in_append_order(journal):
+    async def scenario():
+        for index in range(5):
+            journal.append("conv-1", {"role": "user", "text": f"m{index}"})
+        journal.append("conv-2", {"role": "user", "text": "other"})
+        await journal.flush()
+        entries = [entry async for entry in journal.aiter_entries("conv-1", batch_size=2)]
+        await journal.shutdown()
+        return entries
+
+    entries = asyncio.run(scenario())
+    assert [entry["text"] for entry in entries] == [f"m{index}" for index in range(5)]
+
+
+def test_close_racing_the_flusher_loses_nothing_and_releases_the_file(journal):
+    async def scenario():
+        for index in range(200):
+            journal.append("conv", {"i": index})
+        await asyncio.gather(journal.close("conv"), journal.flush(), journal.flush("conv"))
+        return [entry["i"] for entry in journal.iter_entries("conv")], dict(journal._handles)
+
+    written, handles = asyncio.run(scenario())
+    assert written == list(range(200))
+    assert handles == {}
+
+
+def test_append_after_close_reopens_the_conversation(journal):
+    async def scenario():
+        journal.append("conv", {"i": 0})
+        await journal.close("conv")
+        journal.append("conv", {"i": 1})
+        await journal.close("conv")
+        return [entry["i"] for entry in journal.iter_entries("conv")]
+
+    assert asyncio.run(scenario()) == [0, 1]
+
+
+def test_reading_requires_a_conversation_key(journal):
+    with pytest.raises(ValueError):
+        list(journal.iter_entries(None))
+
+
+def test_rotation_and_compaction_keep_entries_and_drop_torn_lines(tmp_path):
+    journal = ConversationJournal(journal_dir=str(tmp_path), flush_interval=0.01, max_bytes=200)
+
+    async def scenario():
+        for index in range(30):
+            journal.append("conv", {"i": index, "pad": "x" * 20})
+            await journal.flush("conv")
+        await journal.close("conv")
+
+    asyncio.run(scenario())
+    assert len(journal._paths_for("conv")) > 1
+    with open(journal._active_path("conv"), "a", encoding="utf-8") as f:
+        f.write('{"i": "torn')
+
+    kept = journal.compact("conv")
+
+    assert kept == 30
+    assert journal._paths_for("conv") == [journal._active_path("conv")]
+    assert [entry["i"] for entry in journal.iter_entries("conv")] == list(range(30))
+
+
+def test_history_without_a_conversation_never_scans_the_journal(journal, tmp_path):
+    async def scenario():
+        journal.append("someone-else", {"role": "user", "text": "private"})
+        await journal.flush()
+        service = MemoirExtractionService(client=object(), model="test")
+        service.conversation_journal = journal
+        service.conversation_file = tmp_path / "missing_history.json"
+        unscoped = await service.load_conversation_history()
+        scoped = await service.load_conversation_history("someone-else")
+        await journal.shutdown()
+        return unscoped, scoped
+
+    unscoped, scoped = asyncio.run(scenario())
+    assert unscoped == []
+    assert [entry["text"] for entry in scoped] == ["private"]
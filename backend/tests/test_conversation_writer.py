@@ -0,0 +1,103 @@
+"""ConversationMessageWriter / ConversationWriteBehind: ordering, batching and bounded retries."""
+import asyncio
+
+from services.conversation_writer import ConversationMessageWriter, ConversationWriteBehind
+
+
+class FakeConversationService:
+    """Records bulk inserts; fails the first ``failures`` calls."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def add_messages_bulk(self, conversation_id, messages):
+        if self.failures:
+            self.failures -= 1
+            return 0
+        self.batches.append((conversation_id, list(messages)))
+        return len(messages)
+
+
+def test_message_order_continues_from_start_order():
+    writer = ConversationMessageWriter(FakeConversationService(), "conv", start_order=7)
+
+    orders = [writer.enqueue("user", f"m{index}") for index in range(3)]
+
+    assert orders == [8, 9, 10]
+    assert writer.pending_count == 3
+
+
+def test_flush_writes_pending_messages_as_one_batch():
+    service = FakeConversationService()
+    writer = ConversationMessageWriter(service, "conv")
+
+    async def scenario():
+        for index in range(4):
+            writer.enqueue("user", f"m{index}")
+        return await writer.flush()
+
+    assert asyncio.run(scenario())
+    assert len(service.batches) == 1
+    assert [message["content"] for message in service.batches[0][1]] == ["m0", "m1", "m2", "m3"]
+    assert writer.messages_written == 4
+
+
+def test_full_batch_wakes_the_background_flush():
+    service = FakeConversationService()
+
+    async def scenario():
+        writer = ConversationMessageWriter(service, "conv", batch_size=2, flush_interval=60)
+        writer.start()
+        writer.enqueue("user", "a")
+        writer.enqueue("user", "b")
+        await asyncio.sleep(0.05)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert len(service.batches) == 1
+
+
+def test_failed_batch_is_retried_then_dropped_after_max_retries():
+    service = FakeConversationService(failures=10)
+    writer = ConversationMessageWriter(service, "conv", max_retries=2)
+
+    async def scenario():
+        writer.enqueue("user", "lost")
+        return [await writer.flush() for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [False, False, True]
+    assert writer.pending_count == 0
+    assert writer.dropped_messages == 1
+    assert writer.failed_batches == 3
+
+
+def test_retry_keeps_order_with_messages_queued_meanwhile():
+    service = FakeConversationService(failures=1)
+    writer = ConversationMessageWriter(service, "conv", max_retries=3)
+
+    async def scenario():
+        writer.enqueue("user", "first")
+        await writer.flush()
+        writer.enqueue("user", "second")
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert [message["content"] for message in service.batches[0][1]] == ["first", "second"]
+
+
+def test_registry_drains_writers_and_aggregates_stats():
+    service = FakeConversationService()
+    registry = ConversationWriteBehind(service)
+
+    async def scenario():
+        registry.enqueue("conv-1", "user", "a")
+        registry.enqueue("conv-2", "user", "b")
+        registry.enqueue("conv-2", "assistant", "c")
+        await registry.shutdown()
+        return registry.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["open_conversations"] == 0
+    assert stats["messages_written"] == 3
+    assert stats["dropped_messages"] == 0
@@ -0,0 +1,72 @@
+"""DueNotificationQueue: heap order, lazy cancel / reschedule and window reloads."""
+from datetime import datetime, timezone
+
+from services.due_notifications import DueNotificationQueue, to_timestamp
+
+NOW = 1_700_000_000.0
+
+
+def make_queue(window_end=NOW + 3600):
+    queue = DueNotificationQueue()
+    queue.window_end = window_end
+    return queue
+
+
+def test_pop_due_returns_earliest_first_and_only_due():
+    queue = make_queue()
+    queue.schedule("c", NOW + 30)
+    queue.schedule("a", NOW - 10)
+    queue.schedule("b", NOW)
+    queue.schedule("later", NOW + 60)
+
+    assert queue.pop_due(NOW + 30) == ["a", "b", "c"]
+    assert queue.next_due() == NOW + 60
+    assert len(queue) == 1
+
+
+def test_reschedule_and_cancel_leave_no_stale_entries():
+    queue = make_queue()
+    queue.schedule("moved", NOW - 5)
+    queue.schedule("moved", NOW + 100)
+    queue.schedule("cancelled", NOW - 1)
+    queue.cancel("cancelled")
+    queue.schedule("due", NOW)
+
+    assert queue.pop_due(NOW) == ["due"]
+    assert queue.next_due() == NOW + 100
+    assert queue.pop_due(NOW + 100) == ["moved"]
+    assert queue.next_due() is None
+
+
+def test_entries_outside_window_are_left_to_reload():
+    queue = make_queue(window_end=NOW + 60)
+
+    assert not queue.schedule("far", NOW + 120)
+    assert queue.schedule("near", NOW + 30)
+    assert len(queue) == 1
+
+
+def test_changes_during_reload_win_over_query_result():
+    queue = make_queue()
+    queue.begin_reload()
+    # Endpoints change rows while the window query runs
+    queue.cancel("deleted")
+    queue.schedule("moved", NOW + 50)
+    queue.finish_reload(
+        [
+            {"id": "deleted", "scheduled_at": NOW + 1},
+            {"id": "moved", "scheduled_at": NOW + 2},
+            {"id": "kept", "scheduled_at": NOW + 3},
+        ],
+        window_end=NOW + 3600,
+    )
+
+    assert queue.pop_due(NOW + 100) == ["kept", "moved"]
+    assert queue.reloads == 1
+
+
+def test_naive_datetimes_are_treated_as_utc():
+    naive = datetime(2026, 1, 1, 8, 0, 0)
+    aware = naive.replace(tzinfo=timezone.utc)
+
+    assert to_timestamp(naive) == aware.timestamp()
@@ -0,0 +1,72 @@
+"""LiveConfigCache: per (user, memory version) caching and per-connect resumption handles."""
+from google.genai import types
+
+from services.live_config_cache import LiveConfigCache
+
+
+class CountingBuilder:
+    def __init__(self, instruction="base"):
+        self.instruction = instruction
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return types.LiveConnectConfig(response_modalities=["AUDIO"], system_instruction=self.instruction)
+
+
+def test_config_is_built_once_per_user_and_version():
+    cache = LiveConfigCache()
+    builder = CountingBuilder()
+
+    first = cache.get("u1", 1, builder)
+    second = cache.get("u1", 1, builder)
+
+    assert first is second
+    assert builder.calls == 1
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_new_memory_version_rebuilds_and_evicts_the_old_one():
+    cache = LiveConfigCache()
+    cache.get("u1", 1, CountingBuilder("v1"))
+    cache.get("u2", 1, CountingBuilder("other"))
+
+    rebuilt = cache.get("u1", 2, CountingBuilder("v2"))
+
+    assert rebuilt.system_instruction == "v2"
+    assert ("u1", 1) not in cache._configs
+    assert ("u2", 1) in cache._configs
+
+
+def test_resumption_handle_is_applied_to_a_copy():
+    cache = LiveConfigCache()
+    builder = CountingBuilder()
+    cached = cache.get("u1", 1, builder)
+
+    resumed = cache.get("u1", 1, builder, previous_session_handle="handle-1")
+
+    assert resumed is not cached
+    assert resumed.session_resumption.handle == "handle-1"
+    assert cached.session_resumption is None
+    assert builder.calls == 1
+
+
+def test_least_recently_used_entry_is_dropped_at_capacity():
+    cache = LiveConfigCache(max_entries=2)
+    cache.get("a", 1, CountingBuilder())
+    cache.get("b", 1, CountingBuilder())
+    cache.get("a", 1, CountingBuilder())
+    cache.get("c", 1, CountingBuilder())
+
+    assert list(cache._configs) == [("a", 1), ("c", 1)]
+
+
+def test_invalidate_drops_one_user_or_everything():
+    cache = LiveConfigCache()
+    for user in ("a", "b"):
+        cache.get(user, 1, CountingBuilder())
+
+    cache.invalidate("a")
+    assert list(cache._configs) == [("b", 1)]
+    cache.invalidate()
+    assert cache.get_stats()["entries"] == 0
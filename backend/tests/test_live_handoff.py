@@ -0,0 +1,294 @@
+"""Gemini Live connect path on the offline stub: warm pool, speculative connect, resumption."""
+import asyncio
+import contextlib
+import json
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+
+from api_services.auth_service import authenticate_websocket, generate_session_token
+from services.gemini_service import GeminiService
+from services.live_image_gate import ImageFrameGate
+from services.live_pool import WarmSessionPool
+from services.live_session import LiveSessionRegistry
+from services.live_stub import StubLiveSession, _message
+from services.resumption_store import ResumptionHandleStore
+from services.websocket_manager import websocket_manager
+
+USER = "11111111-1111-4111-8111-111111111111"
+OTHER_USER = "22222222-2222-4222-8222-222222222222"
+
+
+def signed_in(user_id, **query_params):
+    return {"token": generate_session_token(user_id), **query_params}
+
+
+class RecordingSession(StubLiveSession):
+    """Stub session that records context turns and hands out a resumption handle."""
+
+    def __init__(self, new_handle=None):
+        super().__init__(response_delay=0, audio_chunks=1, chunk_bytes=480)
+        self.new_handle = new_handle
+        self.context_turns = []
+
+    async def send_client_content(self, turns=None, turn_complete=True, **kwargs):
+        if not turn_complete:
+            self.context_turns.append(turns)
+        await super().send_client_content(turns=turns, turn_complete=turn_complete, **kwargs)
+
+    async def receive(self):
+        async for message in super().receive():
+            if self.new_handle and message.server_content and message.server_content.turn_complete:
+                yield _message(session_resumption_update=SimpleNamespace(resumable=True, new_handle=self.new_handle))
+            yield message
+
+
+class RecordingLive:
+    """``client.aio.live`` recording every connect and the session it returned."""
+
+    def __init__(self, new_handle=None):
+        self.new_handle = new_handle
+        self.connects = []
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model=None, config=None):
+        await asyncio.sleep(0.01)
+        session = RecordingSession(self.new_handle)
+        self.connects.append(SimpleNamespace(config=config, session=session))
+        yield session
+
+
+class RecordingRegistry(LiveSessionRegistry):
+    def __init__(self):
+        super().__init__()
+        self.contexts = []
+
+    def register(self, context):
+        self.contexts.append(context)
+        super().register(context)
+
+
+class FakeSessionDB:
+    async def get_latest_resumption_handle(self, user_id, device_id, ttl_seconds):
+        return None
+
+    async def save_resumption_handles(self, rows):
+        return len(rows)
+
+
+class ScriptedWebSocket:
+    """Client that sends its config, optionally one text turn, then disconnects."""
+
+    def __init__(self, query_params=None, config=None, text_turn=None, messages=()):
+        self.client_state = SimpleNamespace(name="CONNECTED")
+        self.query_params = query_params or {}
+        self.headers = {}
+        self.config = config or {}
+        self.text_turn = text_turn
+        self.messages = list(messages)
+        self.sent = []
+
+    async def receive_text(self):
+        return json.dumps(self.config)
+
+    async def receive(self):
+        if self.messages:
+            return {"type": "websocket.receive", "text": json.dumps(self.messages.pop(0))}
+        if self.text_turn:
+            text, self.text_turn = self.text_turn, None
+            return {"type": "websocket.receive", "text": json.dumps({"text": text})}
+        # Leave time for the reply to the text turn before hanging up
+        await asyncio.sleep(0.05)
+        self.client_state.name = "DISCONNECTED"
+        raise WebSocketDisconnect(code=1000)
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.client_state.name = "DISCONNECTED"
+
+
+def make_service(live, pool_size=0):
+    service = GeminiService(live_client=SimpleNamespace(aio=SimpleNamespace(live=live)))
+    service.conversation_service = None
+    service.session_registry = RecordingRegistry()
+    service.resumption_store = ResumptionHandleStore(session_db_service=FakeSessionDB())
+    # Shared (user-less) memory is non-empty, so a pre-user session that leaked it would show
+    service._load_user_memory = lambda user_id=None: f"memory of {user_id or 'shared'}"
+    service.warm_pool = WarmSessionPool(
+        service.live_client, service.model, service._create_pre_user_live_config, size=pool_size
+    )
+    return service
+
+
+async def warm_up(pool):
+    pool.start()
+    for _ in range(100):
+        if pool.get_stats()["warm"] == pool.size:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("warm pool never filled")
+
+
+async def connect(service, websocket):
+    # Same as the /gemini-live endpoint: the user comes from the session token
+    user_id = authenticate_websocket(websocket)
+    await asyncio.wait_for(service.handle_websocket_connection(websocket, user_id), timeout=5)
+    return service.session_registry.contexts[-1]
+
+
+def instruction(connect_record):
+    return connect_record.config.system_instruction
+
+
+def test_warm_pool_session_gets_user_memory_as_context():
+    live = RecordingLive()
+    service = make_service(live, pool_size=1)
+
+    async def scenario():
+        await warm_up(service.warm_pool)
+        ctx = await connect(service, ScriptedWebSocket(query_params=signed_in(USER), config={"user_id": USER}))
+        await service.warm_pool.shutdown()
+        return ctx
+
+    ctx = asyncio.run(scenario())
+
+    used = live.connects[0]
+    assert ctx.connect_source == "warm_pool"
+    assert service.warm_pool.hits == 1
+    # Opened before the user was known: no memory of anyone in the instruction
+    assert instruction(used) == service.SYSTEM_INSTRUCTION
+    assert len(used.session.context_turns) == 1
+    assert f"memory of {USER}" in used.session.context_turns[0]["parts"][0]["text"]
+
+
+def test_speculative_connect_bakes_token_user_memory_into_config():
+    live = RecordingLive()
+    service = make_service(live)
+
+    ctx = asyncio.run(connect(service, ScriptedWebSocket(query_params=signed_in(USER), config={})))
+
+    assert ctx.connect_source == "speculative"
+    assert len(live.connects) == 1
+    assert f"memory of {USER}" in instruction(live.connects[0])
+    assert live.connects[0].session.context_turns == []
+
+
+def test_config_user_cannot_override_the_token_user():
+    live = RecordingLive()
+    service = make_service(live)
+
+    ctx = asyncio.run(connect(
+        service, ScriptedWebSocket(query_params=signed_in(USER), config={"user_id": OTHER_USER})
+    ))
+
+    assert ctx.user_id == USER
+    assert len(live.connects) == 1
+    assert f"memory of {OTHER_USER}" not in instruction(live.connects[0])
+
+
+def test_unverified_user_id_keeps_the_session_anonymous(monkeypatch):
+    live = RecordingLive()
+    service = make_service(live)
+    registered = []
+    monkeypatch.setattr(websocket_manager, "register_user", lambda *args: registered.append(args))
+
+    ctx = asyncio.run(connect(service, ScriptedWebSocket(
+        query_params={"user_id": USER, "token": "forged"}, config={"user_id": USER}
+    )))
+
+    assert ctx.user_id is None
+    assert registered == []
+    assert len(live.connects) == 1
+    assert f"memory of {USER}" not in instruction(live.connects[0])
+    assert live.connects[0].session.context_turns == []
+
+
+def test_token_identity_resumes_without_warm_pool():
+    live = RecordingLive()
+    service = make_service(live, pool_size=1)
+
+    async def scenario():
+        await warm_up(service.warm_pool)
+        service.resumption_store.put(USER, "phone", "handle-1")
+        ctx = await connect(service, ScriptedWebSocket(query_params=signed_in(USER, device_id="phone")))
+        await service.warm_pool.shutdown()
+        return ctx
+
+    ctx = asyncio.run(scenario())
+
+    assert service.warm_pool.hits == 0
+    assert ctx.connect_source == "speculative"
+    assert live.connects[-1].config.session_resumption.handle == "handle-1"
+
+
+def test_handle_found_after_config_triggers_resume_connect():
+    live = RecordingLive()
+    service = make_service(live)
+    service.resumption_store.put(USER, "phone", "handle-2")
+
+    ctx = asyncio.run(connect(service, ScriptedWebSocket(query_params=signed_in(USER), config={"device_id": "phone"})))
+
+    assert ctx.connect_source == "resume"
+    assert len(live.connects) == 2
+    assert live.connects[0].config.session_resumption is None
+    assert live.connects[1].config.session_resumption.handle == "handle-2"
+
+
+def test_new_resumption_handle_is_stored_for_user_device():
+    live = RecordingLive(new_handle="handle-3")
+    service = make_service(live)
+
+    asyncio.run(connect(service, ScriptedWebSocket(
+        query_params=signed_in(USER, device_id="tablet"), text_turn="Xin chào"
+    )))
+
+    assert service.resumption_store.get(USER, "tablet") == "handle-3"
+
+
+def test_acks_need_a_session_token(monkeypatch):
+    service = make_service(RecordingLive())
+    acked, enabled = [], []
+
+    async def ack_notifications(user_id, delivery_seq):
+        acked.append((user_id, delivery_seq))
+
+    async def enable_acks(websocket, user_id):
+        enabled.append(user_id)
+
+    monkeypatch.setattr(websocket_manager, "ack_notifications", ack_notifications)
+    monkeypatch.setattr(websocket_manager, "enable_acks", enable_acks)
+    ack = {"type": "ack", "delivery_seq": 7}
+    anonymous = ScriptedWebSocket(query_params={"user_id": USER, "acks": "1"}, messages=[ack])
+    verified = ScriptedWebSocket(query_params=signed_in(USER, acks="1"), messages=[ack])
+
+    asyncio.run(connect(service, anonymous))
+    asyncio.run(connect(service, verified))
+
+    assert enabled == [USER] and acked == [(USER, 7)]
+    rejected = [json.loads(data) for data in anonymous.sent if isinstance(data, str) and "ack_rejected" in data]
+    assert rejected and rejected[0]["delivery_seq"] == 7
+
+
+def test_frames_skip_the_worker_thread_when_the_image_gate_is_off(monkeypatch):
+    service = make_service(RecordingLive())
+    ctx = SimpleNamespace(image_gate=ImageFrameGate(enabled=False))
+    sent = []
+
+    async def send_realtime_input(media=None, **kwargs):
+        sent.append(media)
+
+    async def no_thread(*args, **kwargs):
+        raise AssertionError("disabled gate must not hop to a thread")
+
+    monkeypatch.setattr(asyncio, "to_thread", no_thread)
+    session = SimpleNamespace(send_realtime_input=send_realtime_input)
+
+    asyncio.run(service._forward_image(ctx, session, b"jpeg", "image/jpeg"))
+
+    assert [(blob.data, blob.mime_type) for blob in sent] == [(b"jpeg", "image/jpeg")]
+    assert ctx.image_gate.get_stats()["frames_out"] == 1
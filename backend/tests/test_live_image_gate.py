@@ -0,0 +1,77 @@
+"""ImageFrameGate: opt-in gating of unchanged / too frequent camera frames and downscaling."""
+import pytest
+
+from services import live_image_gate
+from services.live_image_gate import ImageFrameGate
+
+pytestmark = pytest.mark.skipif(not live_image_gate.OPENCV_AVAILABLE, reason="frame gate needs OpenCV")
+
+
+def jpeg(pattern="horizontal", size=(240, 320)):
+    cv2, np = live_image_gate.cv2, live_image_gate.np
+    height, width = size
+    if pattern == "horizontal":
+        image = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    else:
+        image = np.tile(np.linspace(0, 255, height, dtype=np.uint8)[:, None], (1, width))
+        image = np.ascontiguousarray(image[:, ::-1])
+        image[:, : width // 2] = 255 - image[:, : width // 2]
+    ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_GRAY2BGR))
+    assert ok
+    return encoded.tobytes()
+
+
+def make_gate(**overrides):
+    options = dict(enabled=True, hash_threshold=6, min_interval=0.0, max_dimension=1024, jpeg_quality=80)
+    options.update(overrides)
+    return ImageFrameGate(**options)
+
+
+def test_gate_is_off_by_default():
+    gate = ImageFrameGate()
+    frame = jpeg()
+
+    assert not gate.enabled
+    assert gate.process(frame, "image/jpeg") == (frame, "image/jpeg")
+    assert gate.process(frame, "image/jpeg") == (frame, "image/jpeg")
+
+
+def test_unchanged_frame_is_dropped_and_changed_frame_forwarded():
+    gate = make_gate()
+
+    first = gate.process(jpeg(), "image/jpeg")
+    repeat = gate.process(jpeg(), "image/jpeg")
+    changed = gate.process(jpeg("vertical"), "image/jpeg")
+
+    assert first is not None
+    assert repeat is None
+    assert changed is not None
+    assert gate.get_stats()["frames_unchanged"] == 1
+
+
+def test_frames_faster_than_min_interval_are_throttled():
+    gate = make_gate(min_interval=60.0)
+
+    assert gate.process(jpeg(), "image/jpeg") is not None
+    assert gate.process(jpeg("vertical"), "image/jpeg") is None
+    assert gate.frames_throttled == 1
+
+
+def test_large_frames_are_downscaled_to_max_dimension():
+    cv2, np = live_image_gate.cv2, live_image_gate.np
+    gate = make_gate(max_dimension=160)
+
+    data, mime_type = gate.process(jpeg(size=(480, 640)), "image/png")
+    decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    assert mime_type == "image/jpeg"
+    assert max(decoded.shape[:2]) == 160
+
+
+def test_undecodable_frame_passes_through_and_reset_forgets_last_frame():
+    gate = make_gate()
+
+    assert gate.process(b"not an image", "image/jpeg") == (b"not an image", "image/jpeg")
+    gate.process(jpeg(), "image/jpeg")
+    gate.reset()
+    assert gate.process(jpeg(), "image/jpeg") is not None
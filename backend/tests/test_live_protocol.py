@@ -0,0 +1,85 @@
+"""Live audio protocol negotiation and Opus re-framing."""
+from types import SimpleNamespace
+
+import pytest
+
+from services import live_protocol
+from services.live_protocol import (
+    DOWNLINK_OPUS, DOWNLINK_PCM, OUTPUT_SAMPLE_RATE, PROTOCOL_BINARY, PROTOCOL_JSON,
+    LiveProtocol, OpusDownlinkEncoder, negotiate_protocol,
+)
+
+FRAME_BYTES = OUTPUT_SAMPLE_RATE * live_protocol.OPUS_FRAME_MS // 1000 * 2
+
+
+class FakeOpusEncoder:
+    """Stands in for opuslib.Encoder: one packet per frame, tagged with its size."""
+
+    def __init__(self, sample_rate, channels, application):
+        self.bitrate = None
+
+    def encode(self, frame, frame_samples):
+        return b"opus:%d" % len(frame)
+
+
+@pytest.fixture
+def fake_opus(monkeypatch):
+    monkeypatch.setattr(live_protocol, "opuslib", SimpleNamespace(Encoder=FakeOpusEncoder, APPLICATION_VOIP=2048))
+    monkeypatch.setattr(live_protocol, "OPUS_AVAILABLE", True)
+
+
+@pytest.mark.parametrize("config", [{}, None, {"protocol": "2"}, {"protocol": {"version": 9}}, {"protocol": {"version": "x"}}])
+def test_missing_or_unknown_protocol_falls_back_to_json(config):
+    protocol = negotiate_protocol(config)
+
+    assert protocol.version == PROTOCOL_JSON
+    assert not protocol.binary_audio
+    assert protocol.to_dict()["audio_downlink"] == "base64"
+
+
+def test_binary_pcm_passes_chunks_through():
+    protocol = negotiate_protocol({"protocol": {"version": 2}})
+
+    assert protocol.binary_audio
+    assert protocol.audio_downlink == DOWNLINK_PCM
+    assert protocol.encode_audio(b"\x01\x02") == [b"\x01\x02"]
+    assert protocol.end_of_turn() == []
+
+
+def test_opus_request_without_opuslib_uses_pcm(monkeypatch):
+    monkeypatch.setattr(live_protocol, "OPUS_AVAILABLE", False)
+
+    protocol = negotiate_protocol({"protocol": {"version": 2, "audio_downlink": "opus"}})
+
+    assert protocol.version == PROTOCOL_BINARY
+    assert protocol.audio_downlink == DOWNLINK_PCM
+
+
+def test_opus_is_only_used_with_binary_frames(fake_opus):
+    assert negotiate_protocol({"protocol": {"version": 1, "audio_downlink": "opus"}}).audio_downlink == DOWNLINK_PCM
+    protocol = negotiate_protocol({"protocol": {"version": 2, "audio_downlink": "opus"}})
+    assert protocol.audio_downlink == DOWNLINK_OPUS
+    assert protocol.to_dict()["frame_ms"] == live_protocol.OPUS_FRAME_MS
+
+
+def test_opus_encoder_reframes_chunks_into_whole_frames(fake_opus):
+    encoder = OpusDownlinkEncoder()
+
+    first = encoder.encode(b"\x00" * (FRAME_BYTES + 10))
+    second = encoder.encode(b"\x00" * (FRAME_BYTES - 10))
+    tail = encoder.encode(b"\x00" * 100) + encoder.flush()
+
+    assert first == [b"opus:%d" % FRAME_BYTES]
+    assert second == [b"opus:%d" % FRAME_BYTES]
+    # The tail is padded with silence to one whole frame
+    assert tail == [b"opus:%d" % FRAME_BYTES]
+    assert encoder.flush() == []
+
+
+def test_interrupt_drops_partially_encoded_audio(fake_opus):
+    protocol = LiveProtocol(PROTOCOL_BINARY, DOWNLINK_OPUS)
+    protocol.encode_audio(b"\x00" * 100)
+
+    protocol.interrupted()
+
+    assert protocol.end_of_turn() == []
@@ -0,0 +1,92 @@
+"""UplinkAudioGate: frame coalescing and voice activity gating."""
+import math
+import struct
+
+import pytest
+
+from services import live_vad
+from services.live_vad import UplinkAudioGate
+
+CHUNK_MS = 20
+CHUNK_BYTES = live_vad.SAMPLE_RATE * CHUNK_MS // 1000 * 2
+
+
+def silence(chunks=1):
+    return b"\x00" * CHUNK_BYTES * chunks
+
+
+def tone(chunks=1, freq=220.0, amplitude=10000):
+    samples = CHUNK_BYTES // 2 * chunks
+    return struct.pack(
+        f"<{samples}h",
+        *(int(amplitude * math.sin(2 * math.pi * freq * n / live_vad.SAMPLE_RATE)) for n in range(samples)),
+    )
+
+
+def make_gate(**overrides):
+    options = dict(
+        vad_enabled=True, chunk_ms=CHUNK_MS, energy_threshold_dbfs=-40.0, noise_margin_db=10.0,
+        max_zero_crossing_rate=0.25, hangover_ms=2 * CHUNK_MS, preroll_ms=2 * CHUNK_MS,
+    )
+    options.update(overrides)
+    return UplinkAudioGate(**options)
+
+
+def test_without_vad_frames_are_coalesced_into_fixed_chunks():
+    gate = make_gate(vad_enabled=False)
+
+    first, _ = gate.feed(b"\x01" * (CHUNK_BYTES // 2))
+    second, _ = gate.feed(b"\x01" * CHUNK_BYTES)
+
+    assert first == []
+    assert [len(chunk) for chunk in second] == [CHUNK_BYTES]
+    assert gate.flush() == [b"\x01" * (CHUNK_BYTES // 2)]
+
+
+@pytest.mark.skipif(not live_vad.NUMPY_AVAILABLE, reason="VAD needs NumPy")
+def test_silence_is_dropped_and_speech_is_forwarded_with_preroll():
+    gate = make_gate()
+
+    dropped, _ = gate.feed(silence(5))
+    forwarded, ended = gate.feed(tone(3))
+
+    assert dropped == []
+    # Two pre-roll chunks of silence, then the speech
+    assert len(forwarded) == 5
+    assert forwarded[:2] == [silence(), silence()]
+    assert not ended
+    assert gate.speaking
+
+
+@pytest.mark.skipif(not live_vad.NUMPY_AVAILABLE, reason="VAD needs NumPy")
+def test_hangover_then_stream_end_when_speech_stops():
+    gate = make_gate(preroll_ms=0)
+    gate.feed(tone(2))
+
+    tail, ended = gate.feed(silence(4))
+
+    # Two hangover chunks still go out, the third silent chunk closes the gate
+    assert len(tail) == 2
+    assert ended
+    assert not gate.speaking
+    assert gate.get_stats()["speech_segments"] == 1
+
+
+@pytest.mark.skipif(not live_vad.NUMPY_AVAILABLE, reason="VAD needs NumPy")
+def test_loud_noise_with_high_zero_crossing_rate_is_not_speech():
+    gate = make_gate(noise_margin_db=40.0)
+    hiss = struct.pack(f"<{CHUNK_BYTES // 2}h", *((3000 if n % 2 else -3000) for n in range(CHUNK_BYTES // 2)))
+
+    assert not gate.is_speech(hiss)
+    # A voiced tone at the same settings (fresh noise floor) passes
+    assert make_gate(noise_margin_db=40.0).is_speech(tone())
+
+
+def test_gate_stays_open_when_vad_is_disabled(monkeypatch):
+    monkeypatch.setattr(live_vad, "NUMPY_AVAILABLE", False)
+
+    gate = make_gate(vad_enabled=True)
+    out, ended = gate.feed(silence(3))
+
+    assert not gate.vad_enabled
+    assert len(out) == 3 and not ended
@@ -0,0 +1,105 @@
+"""UserMemoryStore: dedupe, per-user bounds, ranked injection and versions."""
+import pytest
+
+from user_memory import config as memory_config
+from user_memory.memory_store import UserMemoryStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_config, "USER_MEMORY_FILE", str(tmp_path / "no_legacy.txt"))
+    return UserMemoryStore(db_path=str(tmp_path / "memory.sqlite3"))
+
+
+def test_facts_are_kept_per_user(store):
+    store.add_fact("u1", "Bà thích uống trà xanh")
+    store.add_fact("u2", "Ông bị tiểu đường")
+
+    assert [fact["content"] for fact in store.get_facts("u1")] == ["Bà thích uống trà xanh"]
+    assert [fact["content"] for fact in store.get_facts("u2")] == ["Ông bị tiểu đường"]
+
+
+def test_exact_and_near_duplicates_bump_mentions(store):
+    first = store.add_fact("u1", "Thích đi bộ buổi sáng", category="preferences")
+    again = store.add_fact("u1", "thích đi bộ, buổi sáng!", category="preferences")
+    longer = store.add_fact("u1", "Thích đi bộ buổi sáng ở công viên", category="preferences")
+
+    facts = store.get_facts("u1")
+    assert (first["status"], again["status"], longer["status"]) == ("added", "duplicate", "merged")
+    assert len(facts) == 1
+    assert facts[0]["content"] == "Thích đi bộ buổi sáng ở công viên"
+    assert facts[0]["mentions"] == 3
+
+
+def test_empty_fact_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.add_fact("u1", "   ")
+
+
+def test_user_is_compacted_to_max_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_config, "USER_MEMORY_FILE", str(tmp_path / "no_legacy.txt"))
+    store = UserMemoryStore(db_path=str(tmp_path / "memory.sqlite3"), max_entries=3)
+
+    for index in range(6):
+        store.add_fact("u1", f"fact number {index} about topic{index}", category="other")
+
+    assert len(store.get_facts("u1")) == 3
+
+
+def test_injection_respects_budget_and_query(store):
+    store.add_fact("u1", "Uống thuốc huyết áp lúc 8 giờ sáng", category="health")
+    store.add_fact("u1", "Con gái tên là Lan sống ở Hà Nội", category="family")
+    store.add_fact("u1", "Thích nghe nhạc Trịnh Công Sơn", category="preferences")
+
+    ranked = store.get_relevant_facts("u1", query="con gái Lan", limit=1)
+    text = store.format_for_prompt("u1")
+
+    assert [fact["content"] for fact in ranked] == ["Con gái tên là Lan sống ở Hà Nội"]
+    assert "Uống thuốc huyết áp lúc 8 giờ sáng" in text
+    assert store.get_relevant_facts("u1", max_chars=10) == []
+
+
+def test_every_write_changes_the_version(store):
+    before = store.get_version("u1")
+    store.add_fact("u1", "Thích hoa hồng")
+    after_add = store.get_version("u1")
+    store.add_fact("u1", "Thích hoa hồng")
+    after_duplicate = store.get_version("u1")
+    store.delete_user("u1")
+
+    assert before < after_add < after_duplicate < store.get_version("u1")
+    assert store.get_version("u2") == 0
+
+
+def test_version_sees_writes_from_another_process(store):
+    # A second store on the same file stands in for another worker
+    other_worker = UserMemoryStore(db_path=store.db_path)
+    seen = store.get_version("u1")
+
+    other_worker.add_fact("u1", "Bà dị ứng hải sản")
+
+    assert store.get_version("u1") > seen
+
+
+def test_legacy_file_is_imported_once_under_the_shared_key(tmp_path, monkeypatch):
+    legacy = tmp_path / "user_memory.txt"
+    legacy.write_text("# 2025-01-02 10:00:00\nThích ăn phở\n", encoding="utf-8")
+    monkeypatch.setattr(memory_config, "USER_MEMORY_FILE", str(legacy))
+    db_path = str(tmp_path / "memory.sqlite3")
+
+    UserMemoryStore(db_path=db_path).get_facts(memory_config.SHARED_USER_KEY)
+    store = UserMemoryStore(db_path=db_path)
+
+    assert [fact["content"] for fact in store.get_facts(memory_config.SHARED_USER_KEY)] == ["Thích ăn phở"]
+
+
+def test_legacy_facts_can_be_handed_to_their_user(tmp_path, monkeypatch):
+    legacy = tmp_path / "user_memory.txt"
+    legacy.write_text("# 2025-01-02 10:00:00\nThích ăn phở\n", encoding="utf-8")
+    monkeypatch.setattr(memory_config, "USER_MEMORY_FILE", str(legacy))
+    monkeypatch.setattr(memory_config, "LEGACY_MEMORY_OWNER", "u1")
+
+    store = UserMemoryStore(db_path=str(tmp_path / "memory.sqlite3"))
+
+    assert [fact["content"] for fact in store.get_facts("u1")] == ["Thích ăn phở"]
+    assert store.get_facts(memory_config.SHARED_USER_KEY) == []
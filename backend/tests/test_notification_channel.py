@@ -0,0 +1,125 @@
+"""Session tokens, WebSocket authentication, and the /notifications push channel."""
+import asyncio
+import json
+import os
+import uuid
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+
+from api_services import auth_service
+from api_services.auth_service import authenticate_websocket, generate_session_token, verify_session_token
+from services.notification_channel import NotificationReplayBuffer, handle_notification_channel
+from services.websocket_manager import WebSocketConnectionManager
+
+USER = str(uuid.UUID("22222222-2222-4222-8222-222222222222"))
+
+
+class ChannelWebSocket:
+    def __init__(self, query_params=None, headers=None, messages=()):
+        self.query_params = query_params or {}
+        self.headers = headers or {}
+        self.client_state = SimpleNamespace(name="CONNECTED")
+        self.incoming = list(messages)
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def receive_text(self):
+        # Let the outbound writer flush before the next client message
+        await asyncio.sleep(0.01)
+        if not self.incoming:
+            raise WebSocketDisconnect(1000)
+        return self.incoming.pop(0)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+        self.client_state.name = "DISCONNECTED"
+
+
+def test_session_token_round_trip_and_tampering():
+    token = generate_session_token(USER)
+
+    assert verify_session_token(token) == USER
+    assert verify_session_token(token[:-2] + "xx") is None
+    assert verify_session_token(token.replace(USER, str(uuid.uuid4()))) is None
+    assert verify_session_token(None) is None
+    assert verify_session_token("garbage") is None
+
+
+def test_expired_and_non_uuid_tokens_are_rejected(monkeypatch):
+    monkeypatch.setattr(auth_service.settings, "SESSION_TOKEN_TTL_HOURS", -1)
+    assert verify_session_token(generate_session_token(USER)) is None
+
+    monkeypatch.setattr(auth_service.settings, "SESSION_TOKEN_TTL_HOURS", 1)
+    assert verify_session_token(generate_session_token("test_user")) is None
+
+
+def test_generated_secret_is_persisted_for_restarts_and_workers(tmp_path, monkeypatch):
+    path = tmp_path / "runtime" / "session_token_secret"
+    monkeypatch.setattr(auth_service.settings, "SESSION_TOKEN_SECRET", "")
+    monkeypatch.setattr(auth_service.settings, "SESSION_TOKEN_SECRET_FILE", str(path))
+
+    first = auth_service._load_token_secret()
+    second = auth_service._load_token_secret()
+
+    assert first == second == path.read_text().strip().encode()
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    monkeypatch.setattr(auth_service.settings, "SESSION_TOKEN_SECRET", "configured")
+    assert auth_service._load_token_secret() == b"configured"
+
+
+def test_websocket_token_from_header_or_query():
+    token = generate_session_token(USER)
+
+    assert authenticate_websocket(ChannelWebSocket(headers={"authorization": f"Bearer {token}"})) == USER
+    assert authenticate_websocket(ChannelWebSocket(query_params={"token": token})) == USER
+    assert authenticate_websocket(ChannelWebSocket(query_params={"user_id": USER})) is None
+
+
+def test_channel_requires_a_matching_authenticated_user():
+    manager = WebSocketConnectionManager()
+    anonymous = ChannelWebSocket()
+    mismatched = ChannelWebSocket(query_params={"user_id": str(uuid.uuid4())})
+
+    async def scenario():
+        await handle_notification_channel(anonymous, manager, None)
+        await handle_notification_channel(mismatched, manager, USER)
+
+    asyncio.run(scenario())
+    assert anonymous.closed == 4001 and mismatched.closed == 4003
+    assert manager.get_connection_count() == 0
+
+
+def test_channel_sends_ready_then_answers_pings():
+    manager = WebSocketConnectionManager()
+    websocket = ChannelWebSocket(
+        query_params={"user_id": USER.upper(), "device_id": "phone"},
+        messages=['{"type": "ping"}', "not json"],
+    )
+
+    asyncio.run(handle_notification_channel(websocket, manager, USER))
+
+    ready, pong = websocket.sent
+    assert ready["type"] == "notification_channel_ready"
+    assert ready["resync"] is False and ready["replayed"] == 0 and ready["pending"] == 0
+    assert ready["notification_audio"]["delivery"] == "inline"
+    assert pong["type"] == "pong"
+    assert manager.get_connection_count() == 0 and manager.get_user_connections([USER]) == []
+
+
+def test_replay_buffer_returns_missed_notifications_for_the_user():
+    buffer = NotificationReplayBuffer(max_entries=2, ttl=60)
+    for recipients in (frozenset({USER}), None, frozenset({"other"})):
+        seq = buffer.next_seq()
+        buffer.record(seq, recipients, lambda ws, seq=seq: f"n{seq}")
+
+    assert [payload_for(None) for payload_for in buffer.missed(buffer.token(1), USER)] == ["n2"]
+    # seq 1 was evicted: resuming from before it needs a resync
+    assert buffer.missed(buffer.token(0), USER) is None
+    assert buffer.missed("other-epoch:2", USER) is None
@@ -0,0 +1,157 @@
+"""NotificationOutbox put / ack / replay, and replay opt-in on the WebSocket manager."""
+import asyncio
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from config.settings import settings
+from services.audio_artifacts import AudioArtifactStore
+from services.notification_outbox import NotificationOutbox
+from services.websocket_manager import WebSocketConnectionManager
+
+PCM = base64.b64encode(b"\x01\x02" * 200).decode()
+
+
+def notification(title):
+    return {"title": title, "audioBase64": PCM, "audioFormat": "audio/pcm"}
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    artifacts = AudioArtifactStore(root_dir=str(tmp_path / "audio"))
+
+    def make():
+        return NotificationOutbox(log_path=str(tmp_path / "outbox.jsonl"), artifacts=artifacts)
+
+    return make
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.client_state = SimpleNamespace(name="CONNECTED")
+        self.query_params = {}
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.client_state.name = "DISCONNECTED"
+
+
+def test_put_keeps_only_ack_capable_recipients(make_outbox):
+    async def scenario():
+        outbox = make_outbox()
+        legacy_only = await outbox.put(["legacy"], notification("ignored"))
+        await outbox.add_ack_user("u1")
+        seq = await outbox.put(["u1", "legacy"], notification("kept"))
+        return outbox, legacy_only, seq
+
+    outbox, legacy_only, seq = asyncio.run(scenario())
+    assert legacy_only is None
+    assert seq == 1
+    assert [item["data"]["title"] for item in outbox.pending("u1")] == ["kept"]
+    assert outbox.pending("legacy") == []
+    # Audio lives in the artifact store, not in the log
+    assert "audioBase64" not in outbox.pending("u1")[0]["data"]
+
+
+def test_acks_are_cumulative_per_user(make_outbox):
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.add_ack_user("u1")
+        await outbox.add_ack_user("u2")
+        seqs = [await outbox.put(["u1", "u2"], notification(f"n{i}")) for i in range(3)]
+        acked = await outbox.ack("u1", seqs[1])
+        return outbox, seqs, acked
+
+    outbox, seqs, acked = asyncio.run(scenario())
+    assert seqs == [1, 2, 3]
+    assert acked == 2
+    assert [item["seq"] for item in outbox.pending("u1")] == [3]
+    assert [item["seq"] for item in outbox.pending("u2")] == [1, 2, 3]
+
+
+def test_pending_and_ack_capable_users_survive_restart(make_outbox):
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.add_ack_user("u1")
+        await outbox.put(["u1"], notification("first"))
+        await outbox.put(["u1"], notification("second"))
+        await outbox.ack("u1", 1)
+
+    asyncio.run(scenario())
+    reloaded = make_outbox()
+
+    assert reloaded.accepts("u1")
+    assert [item["data"]["title"] for item in reloaded.pending("u1")] == ["second"]
+
+
+def test_replay_only_to_sockets_that_enabled_acks(make_outbox):
+    async def scenario():
+        manager = WebSocketConnectionManager()
+        manager.outbox = make_outbox()
+
+        ack_socket, legacy_socket = FakeWebSocket(), FakeWebSocket()
+        for ws in (ack_socket, legacy_socket):
+            manager.add_connection(ws)
+        await manager.enable_acks(ack_socket, "u1")
+        seq = await manager.outbox.put(["u1"], notification("while offline"))
+
+        legacy_replayed = await manager.replay_pending(legacy_socket, "u1")
+        ack_replayed = await manager.replay_pending(ack_socket, "u1")
+        await manager.get_outbound(ack_socket).drain(timeout=1.0)
+        acked = await manager.ack_notifications("u1", seq)
+        replayed_after_ack = await manager.replay_pending(ack_socket, "u1")
+        for ws in (ack_socket, legacy_socket):
+            manager.remove_connection(ws)
+        await manager.keepalive_wheel.stop()
+        return seq, legacy_replayed, ack_replayed, acked, replayed_after_ack, ack_socket.sent, legacy_socket.sent
+
+    seq, legacy_replayed, ack_replayed, acked, after_ack, ack_sent, legacy_sent = asyncio.run(scenario())
+    assert legacy_replayed == 0
+    assert legacy_sent == []
+    assert ack_replayed == 1
+    assert ack_sent[0]["delivery_seq"] == seq
+    assert ack_sent[0]["replayed"] is True
+    assert base64.b64decode(ack_sent[0]["data"]["audioBase64"]) == base64.b64decode(PCM)
+    assert acked == 1
+    assert after_ack == 0
+
+
+def test_expired_entries_are_compacted_on_the_next_put(make_outbox, tmp_path):
+    async def scenario():
+        outbox = make_outbox()
+        outbox.compact_after = 2
+        await outbox.add_ack_user("u1")
+        for title in ("old", "older"):
+            await outbox.put(["u1"], notification(title))
+        for item in outbox._items.values():
+            item["at"] -= outbox.retention + 1
+        await outbox.put(["u1"], notification("new"))
+        return outbox
+
+    outbox = asyncio.run(scenario())
+
+    assert outbox.expired == 2 and outbox.compactions == 1
+    with open(tmp_path / "outbox.jsonl", encoding="utf-8") as f:
+        puts = [json.loads(line) for line in f if '"put"' in line]
+    assert [entry["data"]["title"] for entry in puts] == ["new"]
+
+
+def test_audio_outlives_pending_notifications(make_outbox, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIO_ARTIFACT_RETENTION_DAYS", 0)
+
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.add_ack_user("u1")
+        await outbox.put(["u1"], notification("kept"))
+        outbox.artifacts.purge_old_files()
+        return await outbox.audio_fields(outbox.pending("u1")[0], "pcm", by_reference=False)
+
+    assert asyncio.run(scenario())["audioBase64"]
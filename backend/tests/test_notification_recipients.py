@@ -0,0 +1,57 @@
+"""NotificationRecipientResolver: family fan-out, TTL cache and failure fallback."""
+import asyncio
+
+from services.notification_recipients import NotificationRecipientResolver
+
+
+class FakeUserService:
+    def __init__(self, family=None, fail=False):
+        self.family = family or {}
+        self.fail = fail
+        self.calls = []
+
+    def get_notification_recipient_ids(self, user_id):
+        self.calls.append(user_id)
+        if self.fail:
+            raise RuntimeError("database down")
+        return self.family.get(user_id, [])
+
+
+def test_recipients_include_the_user_and_family():
+    users = FakeUserService({"elder": ["son", "daughter"]})
+    resolver = NotificationRecipientResolver(users, ttl=60)
+
+    assert asyncio.run(resolver.resolve("elder")) == {"elder", "son", "daughter"}
+    assert asyncio.run(resolver.resolve("alone")) == {"alone"}
+
+
+def test_resolved_sets_are_cached_until_invalidated():
+    users = FakeUserService({"elder": ["son"]})
+    resolver = NotificationRecipientResolver(users, ttl=60)
+
+    asyncio.run(resolver.resolve("elder"))
+    asyncio.run(resolver.resolve("elder"))
+    assert users.calls == ["elder"]
+
+    users.family["elder"] = ["son", "daughter"]
+    resolver.invalidate("elder")
+    assert asyncio.run(resolver.resolve("elder")) == {"elder", "son", "daughter"}
+    assert resolver.get_stats() == {"cached_users": 1, "hits": 1, "lookups": 2}
+
+
+def test_expired_entries_are_looked_up_again():
+    users = FakeUserService({"elder": ["son"]})
+    resolver = NotificationRecipientResolver(users, ttl=0)
+
+    asyncio.run(resolver.resolve("elder"))
+    asyncio.run(resolver.resolve("elder"))
+
+    assert users.calls == ["elder", "elder"]
+
+
+def test_lookup_failure_falls_back_to_the_user_alone_without_caching():
+    users = FakeUserService(fail=True)
+    resolver = NotificationRecipientResolver(users, ttl=60)
+
+    assert asyncio.run(resolver.resolve("elder")) == {"elder"}
+    assert resolver.get_stats()["cached_users"] == 0
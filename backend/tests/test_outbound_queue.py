@@ -0,0 +1,123 @@
+"""OutboundQueue: priority order, eviction when full, purge and delivery futures."""
+import asyncio
+import json
+
+from services.outbound_queue import OutboundQueue, PRIORITY_AUDIO, PRIORITY_CONTROL, PRIORITY_TEXT
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+
+def test_sends_control_before_text_before_audio():
+    async def scenario():
+        ws = RecordingWebSocket()
+        queue = OutboundQueue(ws, max_size=10, send_timeout=1.0)
+        queue.put(b"audio-1", PRIORITY_AUDIO)
+        queue.put("text-1", PRIORITY_TEXT)
+        queue.put(b"audio-2", PRIORITY_AUDIO)
+        queue.put_json({"control": 1}, PRIORITY_CONTROL)
+        queue.put("text-2", PRIORITY_TEXT)
+        queue.start()
+        assert await queue.drain(timeout=1.0)
+        await queue.close()
+        return ws.frames
+
+    frames = asyncio.run(scenario())
+    assert frames == [json.dumps({"control": 1}), "text-1", "text-2", b"audio-1", b"audio-2"]
+
+
+def test_full_queue_evicts_oldest_audio_first():
+    async def scenario():
+        queue = OutboundQueue(RecordingWebSocket(), max_size=3, send_timeout=1.0)
+        oldest = asyncio.get_running_loop().create_future()
+        queue.put(b"audio-1", PRIORITY_AUDIO, waiter=oldest)
+        queue.put(b"audio-2", PRIORITY_AUDIO)
+        queue.put("text-1", PRIORITY_TEXT)
+        accepted = queue.put("text-2", PRIORITY_TEXT)
+        return queue, accepted, oldest.result()
+
+    queue, accepted, oldest_sent = asyncio.run(scenario())
+    assert accepted
+    assert oldest_sent is False
+    assert queue.get_stats()["depth_by_priority"] == [0, 2, 1]
+    assert queue.dropped == 1
+
+
+def test_full_queue_never_evicts_more_important_frames():
+    async def scenario():
+        queue = OutboundQueue(RecordingWebSocket(), max_size=2, send_timeout=1.0)
+        queue.put("control", PRIORITY_CONTROL)
+        queue.put("text", PRIORITY_TEXT)
+        return queue, queue.put(b"audio", PRIORITY_AUDIO), queue.put("text-2", PRIORITY_TEXT)
+
+    queue, audio_accepted, text_accepted = asyncio.run(scenario())
+    assert not audio_accepted
+    assert not text_accepted
+    assert queue.get_stats()["depth_by_priority"] == [1, 1, 0]
+
+
+def test_newer_audio_replaces_older_audio_when_full():
+    async def scenario():
+        queue = OutboundQueue(RecordingWebSocket(), max_size=2, send_timeout=1.0)
+        for index in range(5):
+            queue.put(f"audio-{index}".encode(), PRIORITY_AUDIO)
+        return [item[0] for item in queue._queues[PRIORITY_AUDIO]]
+
+    assert asyncio.run(scenario()) == [b"audio-3", b"audio-4"]
+
+
+def test_purge_discards_queued_audio_and_resolves_waiters():
+    async def scenario():
+        queue = OutboundQueue(RecordingWebSocket(), max_size=10, send_timeout=1.0)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.put(b"audio-1", PRIORITY_AUDIO, waiter=waiter)
+        queue.put(b"audio-2", PRIORITY_AUDIO)
+        queue.put("text", PRIORITY_TEXT)
+        return queue, queue.purge(PRIORITY_AUDIO), waiter.result()
+
+    queue, purged, sent = asyncio.run(scenario())
+    assert purged == 2
+    assert sent is False
+    assert len(queue) == 1
+
+
+def test_waiter_resolves_true_once_sent():
+    async def scenario():
+        queue = OutboundQueue(RecordingWebSocket(), max_size=10, send_timeout=1.0)
+        queue.start()
+        waiter = asyncio.get_running_loop().create_future()
+        queue.put("hello", PRIORITY_TEXT, waiter=waiter)
+        sent = await asyncio.wait_for(waiter, timeout=1.0)
+        await queue.close()
+        return sent
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_send_failure_closes_queue_and_reports_error():
+    class BrokenWebSocket(RecordingWebSocket):
+        async def send_text(self, data):
+            raise ConnectionError("client gone")
+
+    async def scenario():
+        errors = []
+        queue = OutboundQueue(BrokenWebSocket(), max_size=10, send_timeout=1.0, on_error=errors.append)
+        queue.start()
+        queue.put("first", PRIORITY_TEXT)
+        queue.put("second", PRIORITY_TEXT)
+        await queue.drain(timeout=1.0)
+        return queue, errors, queue.put("third", PRIORITY_TEXT)
+
+    queue, errors, accepted = asyncio.run(scenario())
+    assert queue.closed
+    assert len(errors) == 1 and isinstance(errors[0], ConnectionError)
+    assert not accepted
+    assert len(queue) == 0
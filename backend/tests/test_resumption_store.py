@@ -0,0 +1,93 @@
+"""ResumptionHandleStore: per (user, device) handles, coalesced writes and DB fallback."""
+import asyncio
+
+from services.resumption_store import DEFAULT_DEVICE_ID, ResumptionHandleStore
+
+
+class FakeSessionDB:
+    def __init__(self, stored=None, fail_writes=False):
+        self.stored = stored or {}
+        self.fail_writes = fail_writes
+        self.written = []
+
+    async def save_resumption_handles(self, rows):
+        if self.fail_writes:
+            return 0
+        self.written.append(list(rows))
+        return len(rows)
+
+    async def get_latest_resumption_handle(self, user_id, device_id, ttl_seconds):
+        handle = self.stored.get((user_id, device_id))
+        return (handle,) if handle else None
+
+
+def test_handles_are_kept_per_user_and_device():
+    store = ResumptionHandleStore(session_db_service=FakeSessionDB())
+    store.put("u1", "phone", "h-phone")
+    store.put("u1", None, "h-default")
+    store.put("u2", "phone", "h-other")
+
+    assert store.get("u1", "phone") == "h-phone"
+    assert store.get("u1", DEFAULT_DEVICE_ID) == "h-default"
+    assert store.get("u2", "phone") == "h-other"
+    assert store.get("u3", "phone") is None
+
+
+def test_anonymous_sessions_need_a_device_id():
+    store = ResumptionHandleStore(session_db_service=FakeSessionDB())
+    store.put(None, None, "h-nobody")
+    store.put(None, "kiosk", "h-kiosk")
+
+    assert store.get(None, None) is None
+    assert store.get(None, "kiosk") == "h-kiosk"
+    assert store.get_stats()["pending_writes"] == 0
+
+
+def test_burst_of_updates_is_written_as_one_row_per_session():
+    db = FakeSessionDB()
+    store = ResumptionHandleStore(session_db_service=db, flush_interval=60)
+
+    async def scenario():
+        for index in range(5):
+            store.put("u1", "phone", f"h{index}", websocket_session_id="ws-1")
+        store.put("u2", "tablet", "other", websocket_session_id="ws-2")
+        written = await store.flush()
+        await store.shutdown()
+        return written
+
+    assert asyncio.run(scenario()) == 2
+    assert sorted(row["handle"] for row in db.written[0]) == ["h4", "other"]
+
+
+def test_failed_write_is_retried_on_next_flush():
+    db = FakeSessionDB(fail_writes=True)
+    store = ResumptionHandleStore(session_db_service=db, flush_interval=60)
+
+    async def scenario():
+        store.put("u1", "phone", "h1", websocket_session_id="ws-1")
+        first = await store.flush()
+        db.fail_writes = False
+        second = await store.flush()
+        await store.shutdown()
+        return first, second
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_miss_falls_back_to_the_database_for_known_users():
+    store = ResumptionHandleStore(session_db_service=FakeSessionDB({("u1", "phone"): "from-db"}))
+
+    async def scenario():
+        return await store.load("u1", "phone"), await store.load(None, "phone")
+
+    assert asyncio.run(scenario()) == ("from-db", None)
+    assert store.db_hits == 1
+
+
+def test_expired_handles_are_not_returned():
+    store = ResumptionHandleStore(session_db_service=FakeSessionDB(), ttl_seconds=1)
+    store.put("u1", "phone", "h1")
+    store._handles[("u1", "phone")].updated_at -= 2
+
+    assert store.get("u1", "phone") is None
+    assert store.purge_expired() == 0
@@ -0,0 +1,159 @@
+"""Claim / lease dispatch of due schedule notifications across workers."""
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services.schedule_notification_service import ScheduleNotificationService
+
+LEASE = 300
+
+
+class FakeNotificationDB:
+    """In-memory stand-in for the claim queries of NotificationDBService.
+
+    Mirrors the SQL: a claim takes unsent rows whose lease is free or expired,
+    renew / confirm / release only touch rows still owned by the caller.
+    """
+
+    def __init__(self, ids, due_at=None):
+        due_at = due_at or datetime.utcnow() - timedelta(seconds=1)
+        self.rows = {
+            notification_id: SimpleNamespace(
+                id=notification_id, scheduled_at=due_at, title=notification_id, message="",
+                voice_file_path=None, user_id="user-1", is_sent=False,
+                claimed_by=None, claimed_until=None,
+            )
+            for notification_id in ids
+        }
+        self.renewals = []
+        self._lock = threading.Lock()
+
+    def get_unsent_schedule_window(self, until):
+        return [
+            {"id": row.id, "scheduled_at": row.scheduled_at}
+            for row in self.rows.values() if not row.is_sent and row.scheduled_at <= until
+        ]
+
+    def claim_due_notifications(self, owner, lease_seconds, due_before=None, notification_ids=None,
+                                voice_only=False, limit=100):
+        now = datetime.utcnow()
+        claimed = []
+        with self._lock:
+            for notification_id in notification_ids:
+                row = self.rows.get(notification_id)
+                lease_free = row is not None and (row.claimed_until is None or row.claimed_until < now)
+                if row and not row.is_sent and row.scheduled_at <= now and lease_free:
+                    row.claimed_by = owner
+                    row.claimed_until = now + timedelta(seconds=lease_seconds)
+                    claimed.append(row)
+        return claimed[:limit]
+
+    def renew_notification_claims(self, owner, ids, lease_seconds):
+        now = datetime.utcnow()
+        owned = []
+        with self._lock:
+            for notification_id in ids:
+                row = self.rows[notification_id]
+                if row.claimed_by == owner and not row.is_sent:
+                    row.claimed_until = now + timedelta(seconds=lease_seconds)
+                    owned.append(notification_id)
+        self.renewals.append((owner, list(ids), owned))
+        return owned
+
+    def confirm_notifications_sent(self, owner, ids):
+        confirmed = 0
+        with self._lock:
+            for notification_id in ids:
+                row = self.rows[notification_id]
+                if row.claimed_by == owner:
+                    row.is_sent = True
+                    row.claimed_by = row.claimed_until = None
+                    confirmed += 1
+        return confirmed
+
+    def release_notification_claims(self, owner, ids):
+        with self._lock:
+            for notification_id in ids:
+                row = self.rows[notification_id]
+                if row.claimed_by == owner:
+                    row.claimed_by = row.claimed_until = None
+        return len(ids)
+
+
+class RecordingDispatcher(ScheduleNotificationService):
+    """Dispatcher whose sends are recorded instead of synthesized and pushed."""
+
+    def __init__(self, db, sent, fail=(), on_send=None):
+        super().__init__(db, None)
+        self.sent = sent
+        self.fail = set(fail)
+        self.on_send = on_send
+
+    async def _synthesize_missing_voices(self, notifications):
+        return None
+
+    async def send_schedule_notification(self, notification, mark_sent=True):
+        assert not mark_sent, "the dispatcher confirms its batch itself"
+        await asyncio.sleep(0.001)
+        if self.on_send:
+            self.on_send(notification)
+        self.sent.append((self.owner, notification.id))
+        return notification.id not in self.fail
+
+
+def test_concurrent_workers_send_each_notification_once():
+    db = FakeNotificationDB([f"n{i}" for i in range(20)])
+    sent = []
+    workers = [RecordingDispatcher(db, sent) for _ in range(3)]
+
+    async def scenario():
+        await asyncio.gather(*(worker.check_and_send_notifications() for worker in workers))
+
+    asyncio.run(scenario())
+
+    sent_ids = [notification_id for _, notification_id in sent]
+    assert sorted(sent_ids) == sorted(db.rows)
+    assert len(sent_ids) == len(set(sent_ids))
+    assert all(row.is_sent and row.claimed_by is None for row in db.rows.values())
+
+
+def test_lease_is_renewed_for_rest_of_batch_before_each_send():
+    db = FakeNotificationDB(["a", "b", "c"])
+    worker = RecordingDispatcher(db, [])
+
+    asyncio.run(worker.check_and_send_notifications())
+
+    assert [ids for _, ids, _ in db.renewals] == [["a", "b", "c"], ["b", "c"], ["c"]]
+    assert all(owner == worker.owner for owner, _, _ in db.renewals)
+
+
+def test_notification_whose_claim_was_lost_is_skipped():
+    db = FakeNotificationDB(["a", "b", "c"])
+
+    def steal_b(notification):
+        # Lease of "b" expired while "a" was sent and another worker claimed it
+        if notification.id == "a":
+            db.rows["b"].claimed_by = "other-worker"
+
+    sent = []
+    worker = RecordingDispatcher(db, sent, on_send=steal_b)
+    asyncio.run(worker.check_and_send_notifications())
+
+    assert [notification_id for _, notification_id in sent] == ["a", "c"]
+    assert db.rows["b"].claimed_by == "other-worker"
+    assert not db.rows["b"].is_sent
+    assert db.rows["a"].is_sent and db.rows["c"].is_sent
+
+
+def test_failed_send_is_released_and_requeued():
+    db = FakeNotificationDB(["ok", "broken"])
+    worker = RecordingDispatcher(db, [], fail={"broken"})
+
+    asyncio.run(worker.check_and_send_notifications())
+
+    assert db.rows["ok"].is_sent
+    assert not db.rows["broken"].is_sent
+    assert db.rows["broken"].claimed_by is None
+    assert len(worker.due_queue) == 1
+    assert worker.due_queue.next_due() is not None
@@ -0,0 +1,84 @@
+"""TimerWheel: expiry order, rounds beyond one revolution, re-arm and cancel."""
+import asyncio
+
+from services.timer_wheel import TimerWheel
+
+
+def advance(wheel, ticks):
+    """Advance the wheel by hand; returns the keys due at each tick."""
+    return [wheel._advance() for _ in range(ticks)]
+
+
+def make_wheel(slots=8, tick=1.0):
+    return TimerWheel(tick=tick, slots=slots, on_expire=lambda keys: None)
+
+
+def test_keys_expire_in_delay_order():
+    wheel = make_wheel()
+    wheel.schedule("c", 3)
+    wheel.schedule("a", 1)
+    wheel.schedule("b", 2)
+    wheel.schedule("a2", 1)
+
+    due = advance(wheel, 4)
+
+    assert due == [["a", "a2"], ["b"], ["c"], []]
+    assert len(wheel) == 0
+
+
+def test_delay_is_rounded_up_to_whole_ticks():
+    wheel = make_wheel(tick=0.5)
+    wheel.schedule("key", 1.2)
+
+    assert advance(wheel, 3) == [[], [], ["key"]]
+
+
+def test_timer_beyond_one_revolution_waits_extra_rounds():
+    wheel = make_wheel(slots=4)
+    wheel.schedule("late", 10)
+    wheel.schedule("soon", 2)
+
+    due = advance(wheel, 10)
+
+    assert due[1] == ["soon"]
+    assert due[9] == ["late"]
+    assert [index for index, keys in enumerate(due) if keys] == [1, 9]
+
+
+def test_reschedule_replaces_previous_timer():
+    wheel = make_wheel()
+    wheel.schedule("key", 1)
+    wheel.schedule("key", 3)
+
+    assert advance(wheel, 3) == [[], [], ["key"]]
+
+
+def test_cancel_disarms_timer():
+    wheel = make_wheel()
+    wheel.schedule("key", 1)
+    wheel.cancel("key")
+    wheel.cancel("missing")
+
+    assert "key" not in wheel
+    assert advance(wheel, 2) == [[], []]
+
+
+def test_running_wheel_fires_batches_through_callback():
+    async def scenario():
+        fired = []
+
+        async def on_expire(keys):
+            fired.append(sorted(keys))
+
+        wheel = TimerWheel(tick=0.01, slots=16, on_expire=on_expire)
+        wheel.schedule("b", 0.03)
+        wheel.schedule("a", 0.01)
+        wheel.schedule("a2", 0.01)
+        await asyncio.sleep(0.1)
+        await wheel.stop()
+        return fired, wheel.get_stats()
+
+    fired, stats = asyncio.run(scenario())
+    assert fired == [["a", "a2"], ["b"]]
+    assert stats["fired"] == 3
+    assert stats["timers"] == 0
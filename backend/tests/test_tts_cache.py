@@ -0,0 +1,92 @@
+"""TTSAudioCache: content keys, memory/disk tiers, LRU eviction and single-flight synthesis."""
+import asyncio
+
+import pytest
+
+from services.tts_cache import TTSAudioCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSAudioCache(cache_dir=str(tmp_path), memory_bytes=1000, disk_bytes=1000)
+
+
+def test_cache_key_depends_on_every_synthesis_input():
+    base = cache_key("Uống nước", "Aoede", "vi-VN", "model")
+
+    assert base == cache_key("Uống nước", "Aoede", "vi-VN", "model")
+    assert len({base, cache_key("Uống nước!", "Aoede", "vi-VN", "model"),
+                cache_key("Uống nước", "Puck", "vi-VN", "model"),
+                cache_key("Uống nước", "Aoede", "en-US", "model")}) == 4
+
+
+def test_disk_tier_survives_a_new_process(cache, tmp_path):
+    async def scenario():
+        await cache.put("k1", b"audio")
+        cache.clear_memory()
+        from_disk = await cache.get("k1")
+        fresh = TTSAudioCache(cache_dir=str(tmp_path), memory_bytes=1000, disk_bytes=1000)
+        return from_disk, await fresh.get("k1"), cache
+
+    from_disk, reloaded, cache = asyncio.run(scenario())
+    assert from_disk == b"audio" and reloaded == b"audio"
+    assert cache.disk_hits == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TTSAudioCache(cache_dir=str(tmp_path), memory_bytes=250, disk_bytes=250)
+
+    async def scenario():
+        await cache.put("a", b"a" * 100)
+        await cache.put("b", b"b" * 100)
+        # A disk read marks "a" as recently used
+        cache.clear_memory()
+        await cache.get("a")
+        await cache.put("c", b"c" * 100)
+        cache.clear_memory()
+        return [await cache.get(key) is not None for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == [True, False, True]
+    assert cache.evictions == 1
+
+
+def test_concurrent_misses_synthesize_once(cache):
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"voice"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_create("k", produce) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [b"voice"] * 5
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+
+
+def test_failed_synthesis_is_not_cached(cache):
+    async def fail():
+        return None
+
+    async def produce():
+        return b"second try"
+
+    async def scenario():
+        first = await cache.get_or_create("k", fail)
+        return first, await cache.get_or_create("k", produce)
+
+    assert asyncio.run(scenario()) == (None, b"second try")
+
+
+def test_incremental_flight_wakes_waiters(cache):
+    async def scenario():
+        assert cache.begin_flight("k")
+        assert not cache.begin_flight("k")
+        waiter = asyncio.create_task(cache.get_or_create("k", lambda: None))
+        await asyncio.sleep(0)
+        await cache.end_flight("k", b"streamed")
+        return await waiter, cache.is_inflight("k")
+
+    assert asyncio.run(scenario()) == (b"streamed", False)
@@ -0,0 +1,103 @@
+"""Reminder voice stitching: template matching, silence trimming, crossfades and rendering."""
+import asyncio
+from array import array
+
+from services.voice_stitching import (
+    EDGE_PADDING_MS,
+    REMINDER_TEMPLATES,
+    SAMPLE_RATE,
+    TemplateVoiceStitcher,
+    crossfade_join,
+    match_template,
+    trim_silence,
+)
+
+MEDICINE = REMINDER_TEMPLATES["medicine_reminder"]
+
+
+def tone(samples: int, amplitude: int = 5000) -> bytes:
+    return array("h", [amplitude] * samples).tobytes()
+
+
+def test_template_text_round_trips_to_its_slots():
+    text = MEDICINE.format(medicine_name="Paracetamol", time="8:00")
+
+    template, slots = match_template(text)
+
+    assert template is MEDICINE
+    assert slots == {"medicine_name": "Paracetamol", "time": "8:00"}
+    assert match_template("Xin chào bác") is None
+
+
+def test_segments_alternate_fixed_phrases_and_slot_values():
+    pieces = MEDICINE.segments({"medicine_name": "Paracetamol", "time": "8:00"})
+
+    assert ("Paracetamol", True) in pieces and ("8:00", True) in pieces
+    assert [text for text, is_slot in pieces if not is_slot] == MEDICINE.fixed_phrases
+    assert all(text for text, _ in pieces)
+
+
+def test_trim_silence_keeps_padding_around_speech():
+    padding = SAMPLE_RATE * EDGE_PADDING_MS // 1000
+    samples = array("h", [0] * 5000 + [5000] * 100 + [0] * 5000)
+
+    trimmed = trim_silence(samples)
+
+    assert len(trimmed) == 100 + 2 * padding
+    assert trim_silence(array("h", [0] * 10)) == array("h", [0] * 10)
+
+
+def test_crossfade_join_overlaps_each_boundary():
+    a, b = array("h", [1000] * 100), array("h", [-1000] * 100)
+
+    joined = crossfade_join([a, b], crossfade_samples=10)
+
+    assert len(joined) == 190
+    assert joined[0] == 1000 and joined[-1] == -1000
+    assert -1000 < joined[95] < 1000
+
+
+def test_render_synthesizes_each_piece_and_stitches_them():
+    requested = []
+
+    async def synthesize(text):
+        requested.append(text)
+        return tone(480)
+
+    stitcher = TemplateVoiceStitcher(synthesize, crossfade_ms=0)
+    text = MEDICINE.format(medicine_name="Paracetamol", time="8:00")
+
+    audio = asyncio.run(stitcher.render(text))
+
+    pieces = MEDICINE.segments({"medicine_name": "Paracetamol", "time": "8:00"})
+    assert sorted(requested) == sorted(piece for piece, _ in pieces)
+    assert len(audio) == len(pieces) * 480 * 2
+    assert stitcher.get_stats() == {"stitched": 1, "fallbacks": 0}
+
+
+def test_render_falls_back_when_a_piece_is_missing():
+    async def synthesize(text):
+        return None if text == "Paracetamol" else tone(480)
+
+    stitcher = TemplateVoiceStitcher(synthesize, crossfade_ms=0)
+
+    text = MEDICINE.format(medicine_name="Paracetamol", time="8:00")
+    assert asyncio.run(stitcher.render(text)) is None
+    assert asyncio.run(stitcher.render("Xin chào bác")) is None
+    assert stitcher.get_stats() == {"stitched": 0, "fallbacks": 1}
+
+
+def test_prewarm_renders_fixed_phrases_and_slot_values_once():
+    requested = []
+
+    async def synthesize(text):
+        requested.append(text)
+        return tone(10)
+
+    stitcher = TemplateVoiceStitcher(synthesize, crossfade_ms=0)
+
+    rendered = asyncio.run(stitcher.prewarm(["Paracetamol", " 8:00. ", ""]))
+
+    assert rendered == len(requested) == len(set(requested))
+    assert "Paracetamol" in requested and "8:00" in requested
+    assert set(MEDICINE.fixed_phrases) <= set(requested)
@@ -0,0 +1,77 @@
+"""Voice notification streaming: start / chunk / end framing and failure handling."""
+import asyncio
+import base64
+
+from services.voice_streaming import VoiceChunkStream, relay_voice_stream, send_voice_stream
+
+
+async def chunks_of(*parts, fail_after=None):
+    for index, part in enumerate(parts):
+        if fail_after is not None and index == fail_after:
+            raise RuntimeError("tts failed")
+        yield part
+
+
+def collect():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    return sent, send
+
+
+def test_stream_is_framed_with_sequential_chunks():
+    sent, send = collect()
+    stream = VoiceChunkStream("Uống thuốc", "info", request_id="r1")
+
+    ok = asyncio.run(send_voice_stream(chunks_of(b"ab", b"cde"), stream, send))
+
+    assert ok is True
+    assert [m["type"] for m in sent] == [
+        "voice_notification_stream_start",
+        "voice_notification_chunk",
+        "voice_notification_chunk",
+        "voice_notification_stream_end",
+    ]
+    assert {m["stream_id"] for m in sent} == {stream.stream_id}
+    assert [m["seq"] for m in sent[1:3]] == [0, 1]
+    assert base64.b64decode(sent[2]["audio_base64"]) == b"cde"
+    assert sent[-1]["chunks"] == 2 and sent[-1]["bytes"] == 5 and sent[-1]["success"] is True
+    assert sent[0]["request_id"] == sent[-1]["request_id"] == "r1"
+
+
+def test_failed_synthesis_still_sends_an_unsuccessful_end():
+    sent, send = collect()
+    stream = VoiceChunkStream("Uống thuốc")
+
+    ok = asyncio.run(send_voice_stream(chunks_of(b"ab", b"cd", fail_after=1), stream, send))
+
+    assert ok is False
+    assert sent[-1]["type"] == "voice_notification_stream_end"
+    assert sent[-1]["success"] is False and sent[-1]["error"] == "tts failed"
+    assert sent[-1]["chunks"] == 1
+
+
+def test_empty_stream_is_not_a_success():
+    sent, send = collect()
+
+    ok = asyncio.run(send_voice_stream(chunks_of(), VoiceChunkStream("x"), send))
+
+    assert ok is False
+    assert sent[-1]["success"] is False and sent[-1]["chunks"] == 0
+
+
+def test_relay_passes_chunks_through_and_ends_when_consumer_stops():
+    sent, send = collect()
+    stream = VoiceChunkStream("x")
+
+    async def scenario():
+        relay = relay_voice_stream(chunks_of(b"a", b"b", b"c"), stream, send)
+        first = await relay.__anext__()
+        await relay.aclose()
+        return first
+
+    assert asyncio.run(scenario()) == b"a"
+    assert sent[-1]["type"] == "voice_notification_stream_end"
+    assert sent[-1]["success"] is False
@@ -13,12 +13,32 @@ USER_MEMORY_FILE = os.path.join(USER_MEMORY_DIR, 'user_memory.txt')
 # Backup directory
 BACKUP_DIR = os.path.join(USER_MEMORY_DIR, 'backups')
 
+# Per-user memory store (SQLite), kept with other runtime data outside code-watched dirs
+_RUNTIME_DIR = os.getenv('RUNTIME_DIR', os.path.abspath(os.path.join(USER_MEMORY_DIR, '..', '..', 'runtime_data')))
+USER_MEMORY_DB = os.getenv('USER_MEMORY_DB', os.path.join(_RUNTIME_DIR, 'user_memory.sqlite3'))
+
+# Memory key for sessions without a user (and for facts imported from USER_MEMORY_FILE)
+SHARED_USER_KEY = 'anonymous'
+
+# Owner of the facts imported from USER_MEMORY_FILE. The legacy file was one global
+# memory that cannot be attributed to a user, so by default its facts stay under
+# SHARED_USER_KEY and only reach sessions without a verified user. Single-user
+# deployments can hand them to that user's id (only read by the one-time import).
+LEGACY_MEMORY_OWNER = os.getenv('USER_MEMORY_LEGACY_OWNER') or SHARED_USER_KEY
+
 # Maximum file size (in bytes) before warning
 MAX_FILE_SIZE = 1024 * 1024  # 1MB
 
 # Maximum number of entries before cleanup
 MAX_ENTRIES = 1000
 
+# Maximum facts / characters injected into a session's system instruction
+MAX_INJECTED_FACTS = 20
+MAX_INJECTED_CHARS = 2000
+
+# Token overlap above which a new fact replaces an existing one instead of being added
+DUPLICATE_SIMILARITY = 0.8
+
 # Backup frequency (in days)
 BACKUP_FREQUENCY_DAYS = 7
 
@@ -33,6 +53,30 @@ MEMORY_CATEGORIES = {
     'other': 'Thông tin khác'
 }
 
+# Keywords used to categorize facts when the model does not give a category (checked in order)
+CATEGORY_KEYWORDS = {
+    'medication': ['thuốc', 'viên', 'liều', 'mg', 'insulin', 'kháng sinh', 'uống thuốc', 'toa'],
+    'medical_history': ['tiền sử', 'từng bị', 'phẫu thuật', 'mổ', 'tiểu đường', 'huyết áp', 'tim mạch', 'đột quỵ', 'ung thư', 'bệnh'],
+    'health': ['sức khỏe', 'đau', 'mệt', 'mất ngủ', 'cân nặng', 'đường huyết', 'triệu chứng', 'dị ứng'],
+    'family': ['gia đình', 'con trai', 'con gái', 'cháu', 'vợ', 'chồng', 'bố', 'mẹ', 'anh trai', 'chị gái'],
+    'preferences': ['thích', 'không thích', 'ghét', 'sở thích', 'muốn', 'yêu'],
+    'lifestyle': ['đi dạo', 'tập', 'thể dục', 'buổi sáng', 'buổi tối', 'thói quen', 'ăn', 'ngủ'],
+}
+
+# Weight of each category when ranking facts for injection
+CATEGORY_WEIGHTS = {
+    'medication': 3.0,
+    'medical_history': 3.0,
+    'health': 2.5,
+    'family': 2.0,
+    'preferences': 1.5,
+    'lifestyle': 1.5,
+    'other': 1.0,
+}
+
+# Half-life (days) of the recency bonus when ranking facts
+RECENCY_HALF_LIFE_DAYS = 30
+
 # File encoding
 FILE_ENCODING = 'utf-8'
 
@@ -0,0 +1,380 @@
+"""
+Per-user memory store for the update_system_prompt tool
+
+Facts are kept in a small SQLite database (``USER_MEMORY_DB``), indexed by
+user and category:
+
+- each fact is normalized and deduplicated; near-duplicates replace the older
+  wording and bump a mention counter
+- each user is bounded to ``MAX_ENTRIES`` facts / ``MAX_FILE_SIZE`` characters,
+  lowest-ranked facts are compacted away first
+- sessions only get a bounded, ranked subset (``MAX_INJECTED_FACTS`` /
+  ``MAX_INJECTED_CHARS``) in their system instruction
+- every write bumps a per-user version used to cache built live configs
+
+Facts from the legacy global ``user_memory.txt`` are imported once under
+``LEGACY_MEMORY_OWNER``: ``SHARED_USER_KEY`` unless ``USER_MEMORY_LEGACY_OWNER``
+names the user they belong to. Facts under the shared key are only injected
+into sessions without a verified user.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+from user_memory import config as memory_config
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_LEGACY_HEADER_RE = re.compile(r"^#\s*(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s*$")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, NFC-normalize and strip punctuation for dedupe/matching."""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return " ".join(_WORD_RE.findall(text))
+
+
+def _tokens(text: str) -> set:
+    return set(_normalize(text).split())
+
+
+def _similarity(a: set, b: set) -> float:
+    """Overlap of two token sets; 1.0 when one fact contains the other."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class UserMemoryStore:
+    """SQLite-backed, per-user categorized memory."""
+
+    def __init__(self, db_path: str = None, max_entries: int = None, max_chars: int = None):
+        """Initialize memory store.
+
+        Args:
+            db_path: SQLite file. Uses USER_MEMORY_DB if None.
+            max_entries: Maximum facts kept per user.
+            max_chars: Maximum total characters kept per user.
+        """
+        self.db_path = db_path or memory_config.USER_MEMORY_DB
+        self.max_entries = max_entries or memory_config.MAX_ENTRIES
+        self.max_chars = max_chars or memory_config.MAX_FILE_SIZE
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Connection / schema
+    # ------------------------------------------------------------------
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use (caller holds _lock)."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS memory_facts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_key TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    content_key TEXT NOT NULL,
+                    mentions INTEGER NOT NULL DEFAULT 1,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (user_key, content_key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_memory_facts_user_category
+                    ON memory_facts (user_key, category);
+                CREATE TABLE IF NOT EXISTS memory_versions (
+                    user_key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS memory_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+            self._conn = conn
+            self._import_legacy_file(conn)
+        return self._conn
+
+    def _import_legacy_file(self, conn: sqlite3.Connection) -> None:
+        """Import facts from the old global user_memory.txt once."""
+        if conn.execute("SELECT 1 FROM memory_meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        imported = 0
+        try:
+            if os.path.exists(memory_config.USER_MEMORY_FILE):
+                with open(memory_config.USER_MEMORY_FILE, "r", encoding=memory_config.FILE_ENCODING) as f:
+                    lines = f.read().splitlines()
+                timestamp = None
+                buffer: List[str] = []
+
+                def _flush():
+                    nonlocal imported
+                    content = " ".join(line.strip() for line in buffer if line.strip())
+                    if timestamp and content:
+                        self._add_locked(conn, memory_config.LEGACY_MEMORY_OWNER, content, None, timestamp)
+                        imported += 1
+
+                for line in lines:
+                    match = _LEGACY_HEADER_RE.match(line.strip())
+                    if match:
+                        _flush()
+                        buffer = []
+                        try:
+                            timestamp = time.mktime(time.strptime(match.group(1), memory_config.TIMESTAMP_FORMAT))
+                        except ValueError:
+                            timestamp = time.time()
+                    elif not line.startswith("#"):
+                        buffer.append(line)
+                _flush()
+        except Exception as e:
+            logger.error(f"❌ Failed to import legacy user memory file: {e}")
+        conn.execute("INSERT OR REPLACE INTO memory_meta (key, value) VALUES ('legacy_imported', ?)", (str(imported),))
+        conn.commit()
+        if imported:
+            logger.info(f"✅ Imported {imported} legacy memory entries into '{memory_config.LEGACY_MEMORY_OWNER}'")
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    @staticmethod
+    def classify(content: str) -> str:
+        """Pick a MEMORY_CATEGORIES key for a fact from keywords."""
+        padded = f" {_normalize(content)} "
+        for category, keywords in memory_config.CATEGORY_KEYWORDS.items():
+            for keyword in keywords:
+                if f" {_normalize(keyword)} " in padded:
+                    return category
+        return "other"
+
+    def add_fact(self, user_key: str, content: str, category: Optional[str] = None) -> Dict:
+        """Remember a fact for a user.
+
+        Args:
+            user_key: User id (or SHARED_USER_KEY).
+            content: Fact text.
+            category: MEMORY_CATEGORIES key. Classified from keywords if None/unknown.
+
+        Returns:
+            Dict with status ("added", "merged" or "duplicate"), id and category.
+        """
+        content = (content or "").strip()
+        if not content:
+            raise ValueError("Memory content is empty")
+        with self._lock:
+            conn = self._connection()
+            result = self._add_locked(conn, user_key, content, category, time.time())
+            self._compact_locked(conn, user_key)
+            conn.commit()
+            return result
+
+    def _add_locked(self, conn: sqlite3.Connection, user_key: str, content: str,
+                    category: Optional[str], now: float) -> Dict:
+        if category not in memory_config.MEMORY_CATEGORIES:
+            category = self.classify(content)
+        normalized = _normalize(content)
+        content_key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+        existing = conn.execute(
+            "SELECT id, category FROM memory_facts WHERE user_key = ? AND content_key = ?",
+            (user_key, content_key)
+        ).fetchone()
+        if existing:
+            conn.execute(
+                "UPDATE memory_facts SET mentions = mentions + 1, updated_at = ? WHERE id = ?",
+                (now, existing["id"])
+            )
+            self._bump_version(conn, user_key)
+            return {"status": "duplicate", "id": existing["id"], "category": existing["category"]}
+
+        # Near-duplicates in the same category: a fact that covers an older one
+        # replaces its wording, a fact already covered just bumps the older one
+        new_tokens = set(normalized.split())
+        best_row, best_score = None, 0.0
+        for row in conn.execute(
+            "SELECT id, content FROM memory_facts WHERE user_key = ? AND category = ?",
+            (user_key, category)
+        ):
+            old_tokens = _tokens(row["content"])
+            score = _similarity(new_tokens, old_tokens)
+            if score > best_score:
+                best_row, best_score = (row, old_tokens), score
+        if best_row is not None and best_score >= memory_config.DUPLICATE_SIMILARITY:
+            row, old_tokens = best_row
+            if len(new_tokens) >= len(old_tokens):
+                conn.execute(
+                    "UPDATE memory_facts SET content = ?, content_key = ?, mentions = mentions + 1, updated_at = ? WHERE id = ?",
+                    (content, content_key, now, row["id"])
+                )
+                status = "merged"
+            else:
+                conn.execute(
+                    "UPDATE memory_facts SET mentions = mentions + 1, updated_at = ? WHERE id = ?",
+                    (now, row["id"])
+                )
+                status = "duplicate"
+            self._bump_version(conn, user_key)
+            return {"status": status, "id": row["id"], "category": category}
+
+        cursor = conn.execute(
+            "INSERT INTO memory_facts (user_key, category, content, content_key, mentions, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?)",
+            (user_key, category, content, content_key, now, now)
+        )
+        self._bump_version(conn, user_key)
+        return {"status": "added", "id": cursor.lastrowid, "category": category}
+
+    def _bump_version(self, conn: sqlite3.Connection, user_key: str) -> None:
+        conn.execute(
+            "INSERT INTO memory_versions (user_key, version) VALUES (?, 1) "
+            "ON CONFLICT(user_key) DO UPDATE SET version = version + 1",
+            (user_key,)
+        )
+
+    def _compact_locked(self, conn: sqlite3.Connection, user_key: str) -> int:
+        """Drop the lowest-ranked facts beyond the per-user limits."""
+        rows = [dict(row) for row in conn.execute(
+            "SELECT id, category, content, mentions, updated_at FROM memory_facts WHERE user_key = ?",
+            (user_key,)
+        )]
+        total_chars = sum(len(row["content"]) for row in rows)
+        if len(rows) <= self.max_entries and total_chars <= self.max_chars:
+            return 0
+        now = time.time()
+        rows.sort(key=lambda row: self._score(row, now))
+        removed = []
+        while rows and (len(rows) > self.max_entries or total_chars > self.max_chars):
+            row = rows.pop(0)
+            total_chars -= len(row["content"])
+            removed.append(row["id"])
+        conn.executemany("DELETE FROM memory_facts WHERE id = ?", [(fact_id,) for fact_id in removed])
+        self._bump_version(conn, user_key)
+        logger.info(f"Compacted memory of {user_key}: removed {len(removed)} facts")
+        return len(removed)
+
+    def compact(self, user_key: str) -> int:
+        """Enforce per-user limits now.
+
+        Returns:
+            Number of facts removed.
+        """
+        with self._lock:
+            conn = self._connection()
+            removed = self._compact_locked(conn, user_key)
+            conn.commit()
+            return removed
+
+    def delete_user(self, user_key: str) -> int:
+        """Forget everything about a user."""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("DELETE FROM memory_facts WHERE user_key = ?", (user_key,))
+            self._bump_version(conn, user_key)
+            conn.commit()
+            return cursor.rowcount
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def get_version(self, user_key: str) -> int:
+        """Version of a user's memory; changes on every write.
+
+        Read from the database every time (one primary-key lookup), so writes
+        made by other worker processes are seen immediately.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT version FROM memory_versions WHERE user_key = ?", (user_key,)
+            ).fetchone()
+        return row["version"] if row else 0
+
+    def get_facts(self, user_key: str, category: Optional[str] = None) -> List[Dict]:
+        """All facts of a user, newest first."""
+        query = "SELECT id, category, content, mentions, created_at, updated_at FROM memory_facts WHERE user_key = ?"
+        params: list = [user_key]
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        with self._lock:
+            rows = self._connection().execute(query + " ORDER BY updated_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _score(fact: Dict, now: float, query_tokens: Optional[set] = None) -> float:
+        """Rank a fact: category importance + repetition + recency (+ query overlap)."""
+        score = memory_config.CATEGORY_WEIGHTS.get(fact["category"], 1.0)
+        score += 0.5 * math.log1p(fact["mentions"])
+        age_days = max(0.0, (now - fact["updated_at"]) / 86400.0)
+        score += 0.5 ** (age_days / memory_config.RECENCY_HALF_LIFE_DAYS)
+        if query_tokens:
+            fact_tokens = _tokens(fact["content"])
+            if fact_tokens:
+                score += 3.0 * len(fact_tokens & query_tokens) / len(fact_tokens)
+        return score
+
+    def get_relevant_facts(self, user_key: str, query: Optional[str] = None,
+                           limit: int = None, max_chars: int = None) -> List[Dict]:
+        """Best-ranked facts of a user within the injection budget.
+
+        Args:
+            user_key: User id (or SHARED_USER_KEY).
+            query: Optional text (e.g. recent conversation) to rank by overlap.
+            limit: Maximum number of facts.
+            max_chars: Maximum total characters.
+        """
+        limit = limit or memory_config.MAX_INJECTED_FACTS
+        max_chars = max_chars or memory_config.MAX_INJECTED_CHARS
+        facts = self.get_facts(user_key)
+        if not facts:
+            return []
+        now = time.time()
+        query_tokens = _tokens(query) if query else None
+        facts.sort(key=lambda fact: self._score(fact, now, query_tokens), reverse=True)
+        selected, used = [], 0
+        for fact in facts:
+            if len(selected) >= limit:
+                break
+            if used + len(fact["content"]) > max_chars:
+                continue
+            selected.append(fact)
+            used += len(fact["content"])
+        return selected
+
+    def format_for_prompt(self, user_key: str, query: Optional[str] = None) -> str:
+        """Relevant facts grouped by category, ready for the system instruction."""
+        facts = self.get_relevant_facts(user_key, query)
+        if not facts:
+            return ""
+        grouped: Dict[str, List[str]] = {}
+        for fact in facts:
+            grouped.setdefault(fact["category"], []).append(fact["content"])
+        sections = []
+        for category, label in memory_config.MEMORY_CATEGORIES.items():
+            if category in grouped:
+                lines = "\n".join(f"- {content}" for content in grouped[category])
+                sections.append(f"{label}:\n{lines}")
+        return "\n\n".join(sections)
+
+    def get_stats(self) -> Dict:
+        """Store statistics."""
+        with self._lock:
+            conn = self._connection()
+            users, facts = conn.execute("SELECT COUNT(DISTINCT user_key), COUNT(*) FROM memory_facts").fetchone()
+        return {"users": users, "facts": facts, "db_path": self.db_path}
+
+
+# Global instance shared by the application
+memory_store = UserMemoryStore()